@@ -0,0 +1,84 @@
+import argparse
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.common import add_common_arguments, seed_everything, select, write_results
+from benchmarks.end_to_end import DEFAULT_SOLVER, DEFAULT_TIMEOUT, Instance, run_instance
+
+# Balancers from the networks/ library solved with each --colour-encoding, every run spawned as in end_to_end. The
+# number of colours is the number of edges in the network, so the larger networks are where the encodings differ most
+
+DEFAULT_REPETITIONS = 3
+
+ENCODINGS = ('binary', 'one_hot', 'order')
+
+# The network's colours, then the instance
+BALANCERS: Tuple[Tuple[int, Instance], ...] = (
+    (6, Instance('belt_balancer/4x4-unsat', 'belt_balancer', ('networks/4x4', '8', '4'), False)),
+    (6, Instance('belt_balancer/4x4-sat', 'belt_balancer', ('networks/4x4', '9', '4'), True)),
+    (6, Instance('belt_balancer/4x4-fast-sat', 'belt_balancer', ('networks/4x4', '10', '4', '--fast'), True)),
+    (7, Instance('belt_balancer/3x7-fast-unsat', 'belt_balancer', ('networks/3x7', '8', '7', '--fast'), False)),
+    (8, Instance('belt_balancer/6x6-fast-unsat', 'belt_balancer', ('networks/6x6', '12', '6', '--fast'), False)),
+    (8, Instance('belt_balancer/8x8-fast-unsat', 'belt_balancer', ('networks/8x8', '11', '8', '--fast'), False)),
+    (8, Instance('belt_balancer/8x8-fast-sat', 'belt_balancer', ('networks/8x8', '12', '8', '--fast'), True)),
+)
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    failed = [run for run in result['runs'] if run.get('timeout') or 'error' in run]
+    if len(failed) != 0:
+        return f'{result["name"]}: ' + ('timed out' if failed[0].get('timeout') else failed[0]['error'])
+    summary = result['summary']
+    return (f'{result["name"]:<45} encode {summary["encode_time"]["median"]:.3f}s, solve {summary["solve_time"]["median"]:.3f}s, '
+            f'{summary["clauses"]["median"]:.0f} clauses, {summary["variables"]["median"]:.0f} variables')
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Compares the colour encodings by balancer solve time')
+    add_common_arguments(parser, DEFAULT_REPETITIONS)
+    parser.add_argument('--solver', type=str, default=DEFAULT_SOLVER, help='Backend SAT solver to use')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds before a single run is abandoned')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = get_parser().parse_args(argv)
+
+    cases = dict((f'{instance.name}/{encoding}', (colours, Instance(instance.name, instance.tool, instance.argv + ('--colour-encoding', encoding),
+                                                                    instance.satisfiable)))
+                 for colours, instance in BALANCERS for encoding in ENCODINGS)
+    names = select(cases.keys(), args.filter)
+    if args.list:
+        for name in names:
+            colours, instance = cases[name]
+            print(f'{name:<45} {instance.tool} {" ".join(instance.argv)} ({colours} colours)')
+        return
+    if len(names) == 0:
+        raise RuntimeError('No benchmarks match the filter')
+
+    if args.output is not None:
+        args.output = os.path.abspath(args.output)
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    seed_everything(args.seed)
+
+    results = []
+    for name in names:
+        colours, instance = cases[name]
+        result = run_instance(instance, args.solver, args.seed, args.repetitions, args.timeout)
+        result['name'] = name
+        result['colours'] = colours
+        print(format_result(result), file=sys.stderr, flush=True)
+        results.append(result)
+
+    settings = {
+        'solver': args.solver,
+        'seed': args.seed,
+        'repetitions': args.repetitions,
+        'timeout': args.timeout,
+    }
+    write_results('colour', settings, results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import random
+import re
+import statistics
+import subprocess
+import sys
+from typing import Any, Dict, Iterable, List, Optional, Sequence
+
+RESULTS_FORMAT_VERSION = 1
+DEFAULT_SEED = 0
+
+
+def git_revision() -> Optional[Dict[str, Any]]:
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    try:
+        commit = subprocess.run(['git', 'rev-parse', 'HEAD'], cwd=root, capture_output=True, text=True, check=True).stdout.strip()
+        status = subprocess.run(['git', 'status', '--porcelain', '--untracked-files=no'], cwd=root, capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return {'commit': commit, 'dirty': len(status.strip()) != 0}
+
+
+def package_version(name: str) -> Optional[str]:
+    try:
+        from importlib.metadata import PackageNotFoundError, version
+    except ImportError:
+        return None
+    try:
+        return version(name)
+    except PackageNotFoundError:
+        return None
+
+
+def environment() -> Dict[str, Any]:
+    # Enough to tell whether two result files are comparable
+    return {
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'processor': platform.processor(),
+        'cpu_count': os.cpu_count(),
+        'numpy': package_version('numpy'),
+        'python-sat': package_version('python-sat'),
+        'git': git_revision(),
+    }
+
+
+def seed_everything(seed: int):
+    random.seed(seed)
+    try:
+        import numpy as np
+    except ImportError:
+        return
+    np.random.seed(seed)
+
+
+def summarise(values: Sequence[float]) -> Dict[str, float]:
+    values = list(values)
+    if len(values) == 0:
+        return {}
+    return {
+        'n': len(values),
+        'median': statistics.median(values),
+        'mean': statistics.fmean(values),
+        'stdev': statistics.stdev(values) if len(values) > 1 else 0.0,
+        'min': min(values),
+        'max': max(values),
+    }
+
+
+def summarise_runs(runs: List[Dict[str, Any]], metrics: Iterable[str]) -> Dict[str, Dict[str, float]]:
+    summary = {}
+    for metric in metrics:
+        values = [run[metric] for run in runs if run.get(metric) is not None]
+        if len(values) != 0:
+            summary[metric] = summarise(values)
+    return summary
+
+
+def select(names: Iterable[str], pattern: Optional[str]) -> List[str]:
+    if pattern is None:
+        return list(names)
+    expression = re.compile(pattern)
+    return [name for name in names if expression.search(name)]
+
+
+def add_common_arguments(parser: argparse.ArgumentParser, repetitions: int):
+    parser.add_argument('--repetitions', type=int, default=repetitions, help='Number of times every benchmark is measured')
+    parser.add_argument('--filter', type=str, help='Only run benchmarks whose name matches this regular expression')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Seed for every random number generator')
+    parser.add_argument('--output', type=str, help='JSON file to write results to (defaults to standard out)')
+    parser.add_argument('--list', action='store_true', help='List the benchmarks and exit')
+
+
+def write_results(suite: str, settings: Dict[str, Any], results: List[Dict[str, Any]], output: Optional[str]):
+    data = {
+        'format': RESULTS_FORMAT_VERSION,
+        'suite': suite,
+        'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+        'environment': environment(),
+        'settings': settings,
+        'results': results,
+    }
+    if output is None:
+        json.dump(data, sys.stdout, indent=2)
+        print()
+    else:
+        with open(output, 'w') as f:
+            json.dump(data, f, indent=2)
+
+
+def read_results(filename: str) -> Dict[str, Any]:
+    with open(filename) as f:
+        data = json.load(f)
+    if data.get('format') != RESULTS_FORMAT_VERSION:
+        raise RuntimeError(f'Unsupported benchmark results format in {filename}')
+    return data
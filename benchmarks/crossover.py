@@ -0,0 +1,134 @@
+import argparse
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.common import add_common_arguments, seed_everything, select, summarise_runs, write_results
+from benchmarks.end_to_end import DEFAULT_SOLVER, DEFAULT_TIMEOUT, Instance, run_instance
+from benchmarks.micro import Counter
+
+# Where the at most one encodings overtake the pairwise one: the size of the CNF each gives for n literals (exact, so
+# measured once), and the time taken to solve balancers whose per tile splitter type one-hot is that wide (one more
+# than the number of splitter types in the network, every run spawned as in end_to_end)
+
+DEFAULT_REPETITIONS = 3
+
+SIZES = (2, 3, 4, 5, 6, 7, 8, 10, 12, 16, 24, 32, 64)
+
+SIZE_METRICS = ('clauses', 'literals', 'variables')
+
+# The network, the options and the width of the one-hot
+BALANCERS: Tuple[Tuple[str, Tuple[str, ...], int], ...] = (
+    ('4x4-fast-sat', ('networks/4x4', '10', '4', '--fast'), 5),
+    ('8x8-fast-sat', ('networks/8x8', '12', '8', '--fast'), 8),
+    ('3x7-fast-unsat', ('networks/3x7', '8', '7', '--fast'), 8),
+    ('6x6-fast-unsat', ('networks/6x6', '12', '6', '--fast'), 10),
+)
+
+
+def encoding_names() -> List[str]:
+    from factorio_sat.cardinality import AMO_ENCODINGS
+    return list(AMO_ENCODINGS.keys())
+
+
+def measure_size(encoding: str, count: int) -> Dict[str, Any]:
+    from factorio_sat.cardinality import at_most_one
+
+    counter = Counter(count)
+    clauses = at_most_one(list(range(1, count + 1)), counter, encoding)
+    return {
+        'clauses': len(clauses),
+        'literals': sum(len(clause) for clause in clauses),
+        'variables': counter.top - count,
+    }
+
+
+def size_crossovers(results: List[Dict[str, Any]], metric: str) -> Dict[str, Optional[int]]:
+    # The smallest width from which an encoding stays smaller than the pairwise one
+    values = dict(((result['encoding'], result['size']), result['summary'][metric]['median']) for result in results if 'encoding' in result)
+    crossovers = {}
+    for encoding in set(encoding for encoding, _ in values) - {'quadratic'}:
+        sizes = sorted(size for name, size in values if name == encoding and (('quadratic', size) in values))
+        crossovers[encoding] = next((size for i, size in enumerate(sizes)
+                                     if all(values[encoding, later] < values['quadratic', later] for later in sizes[i:])), None)
+    return crossovers
+
+
+def format_size_result(result: Dict[str, Any]) -> str:
+    summary = result['summary']
+    return (f'{result["name"]:<40} {summary["clauses"]["median"]:>8.0f} clauses {summary["literals"]["median"]:>8.0f} literals '
+            f'{summary["variables"]["median"]:>6.0f} variables')
+
+
+def format_solve_result(result: Dict[str, Any]) -> str:
+    failed = [run for run in result['runs'] if run.get('timeout') or 'error' in run]
+    if len(failed) != 0:
+        return f'{result["name"]}: ' + ('timed out' if failed[0].get('timeout') else failed[0]['error'])
+    summary = result['summary']
+    return (f'{result["name"]:<40} encode {summary["encode_time"]["median"]:.3f}s, solve {summary["solve_time"]["median"]:.3f}s, '
+            f'{summary["clauses"]["median"]:.0f} clauses')
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Compares the at most one encodings by CNF size and by balancer solve time')
+    add_common_arguments(parser, DEFAULT_REPETITIONS)
+    parser.add_argument('--solver', type=str, default=DEFAULT_SOLVER, help='Backend SAT solver to use')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds before a single run is abandoned')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = get_parser().parse_args(argv)
+
+    encodings = encoding_names()
+    size_cases = dict((f'size/{encoding}/{size}', (encoding, size)) for encoding in encodings for size in SIZES)
+    solve_cases = dict((f'solve/{name}/{encoding}', (Instance(f'belt_balancer/{name}', 'belt_balancer', argv + ('--node-encoding', encoding)), width))
+                       for name, argv, width in BALANCERS for encoding in encodings)
+    names = select(list(size_cases.keys()) + list(solve_cases.keys()), args.filter)
+    if args.list:
+        for name in names:
+            if name in size_cases:
+                print(f'{name:<40} at most one of {size_cases[name][1]} literals')
+            else:
+                instance, width = solve_cases[name]
+                print(f'{name:<40} {instance.tool} {" ".join(instance.argv)} (one-hot of {width})')
+        return
+    if len(names) == 0:
+        raise RuntimeError('No benchmarks match the filter')
+
+    if args.output is not None:
+        args.output = os.path.abspath(args.output)
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    seed_everything(args.seed)
+
+    results = []
+    for name in names:
+        if name in size_cases:
+            encoding, size = size_cases[name]
+            runs = [measure_size(encoding, size)]
+            result = {'name': name, 'encoding': encoding, 'size': size, 'runs': runs, 'summary': summarise_runs(runs, SIZE_METRICS)}
+            print(format_size_result(result), file=sys.stderr, flush=True)
+        else:
+            instance, width = solve_cases[name]
+            result = run_instance(instance, args.solver, args.seed, args.repetitions, args.timeout)
+            result['name'] = name
+            result['one_hot'] = width
+            print(format_solve_result(result), file=sys.stderr, flush=True)
+        results.append(result)
+
+    crossovers = size_crossovers(results, 'literals')
+    for encoding, size in sorted(crossovers.items()):
+        print(f'{encoding} has fewer literals than quadratic from ' + ('never' if size is None else f'{size} literals'), file=sys.stderr)
+
+    settings = {
+        'solver': args.solver,
+        'seed': args.seed,
+        'repetitions': args.repetitions,
+        'timeout': args.timeout,
+        'crossovers': crossovers,
+    }
+    write_results('crossover', settings, results, args.output)
+
+
+if __name__ == '__main__':
+    main()
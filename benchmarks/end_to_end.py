@@ -0,0 +1,230 @@
+import argparse
+import importlib
+import multiprocessing
+import os
+import resource
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.common import add_common_arguments, seed_everything, select, summarise_runs, write_results
+
+# Every repetition runs in a freshly spawned interpreter, so peak RSS belongs to that instance alone and nothing
+# (imported modules, solver state, allocator arenas) carries over from the previous one
+
+DEFAULT_REPETITIONS = 3
+DEFAULT_TIMEOUT = 600
+DEFAULT_SOLVER = 'g3'
+
+METRICS = ('encode_time', 'solve_time', 'total_time', 'peak_rss', 'variables', 'clauses', 'literals', 'models', 'models_per_second')
+
+
+@dataclass(frozen=True)
+class Instance:
+    name: str
+    tool: str
+    argv: Tuple[str, ...]
+    satisfiable: Optional[bool] = None  # Known answer, a run that disagrees is reported as an error
+    max_models: int = 1  # Enumerates (as with --all) up to this many models when more than one
+    max_enumerate_time: float = 30.0
+
+
+INSTANCES: Tuple[Instance, ...] = (
+    # Balancers from networks/ either side of the smallest width that fits at the minimum height, --fast prunes differently
+    # and moves that width
+    Instance('belt_balancer/4x4-unsat', 'belt_balancer', ('networks/4x4', '8', '4'), False),
+    Instance('belt_balancer/4x4-sat', 'belt_balancer', ('networks/4x4', '9', '4'), True),
+    Instance('belt_balancer/4x4-fast-unsat', 'belt_balancer', ('networks/4x4', '9', '4', '--fast'), False),
+    Instance('belt_balancer/4x4-fast-sat', 'belt_balancer', ('networks/4x4', '10', '4', '--fast'), True),
+    Instance('belt_balancer/8x8-fast-unsat', 'belt_balancer', ('networks/8x8', '11', '8', '--fast'), False),
+    Instance('belt_balancer/8x8-fast-sat', 'belt_balancer', ('networks/8x8', '12', '8', '--fast'), True),
+    # No 6x6 or 3x7 size is satisfiable within seconds, the widest unsatisfiable sizes that still are stand in for them
+    Instance('belt_balancer/6x6-fast-unsat', 'belt_balancer', ('networks/6x6', '12', '6', '--fast'), False),
+    Instance('belt_balancer/3x7-fast-unsat', 'belt_balancer', ('networks/3x7', '8', '7', '--fast'), False),
+    Instance('belt_balancer/4x4-all', 'belt_balancer', ('networks/4x4', '10', '4', '--fast', '--all'), True, max_models=100),
+
+    Instance('make_block/8x8', 'make_block', ('8', '8'), True),
+    Instance('make_block/16x16', 'make_block', ('16', '16'), True),
+    Instance('make_block/8x8-tile', 'make_block', ('8', '8', '--tile'), True),
+    Instance('make_block/6x6-all', 'make_block', ('6', '6', '--all'), True, max_models=500),
+
+    Instance('interchange/5x4-unsat', 'interchange', ('5', '4'), False),
+    Instance('interchange/6x4-sat', 'interchange', ('6', '4'), True),
+    Instance('interchange/12x8', 'interchange', ('12', '8'), True),
+    Instance('interchange/6x4-all', 'interchange', ('6', '4', '--all'), True, max_models=100),
+
+    Instance('belt_balancer_net_free/4-unsat', 'belt_balancer_net_free', ('8', '4', '4', '4'), False),
+    Instance('belt_balancer_net_free/4-sat', 'belt_balancer_net_free', ('9', '4', '4', '4'), True),
+    Instance('belt_balancer_net_free_power_of_2/4-unsat', 'belt_balancer_net_free_power_of_2', ('7', '4'), False),
+    Instance('belt_balancer_net_free_power_of_2/4-sat', 'belt_balancer_net_free_power_of_2', ('8', '4'), True),
+    Instance('belt_balancer_net_free_power_of_2/8-sat', 'belt_balancer_net_free_power_of_2', ('12', '8'), True),
+)
+
+
+def peak_rss() -> int:
+    maximum = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximum if sys.platform == 'darwin' else maximum * 1024
+
+
+def measure(instance: Instance, solver: str, seed: int) -> Dict[str, Any]:
+    seed_everything(seed)
+    start_rss = peak_rss()
+
+    module = importlib.import_module('factorio_sat.' + instance.tool)
+    from factorio_sat import enumeration
+
+    args = module.get_parser().parse_args(list(instance.argv) + ['--solver', solver])
+    start = time.perf_counter()
+    grid = module.create_grid(args)
+    encode_time = time.perf_counter() - start
+
+    result = {
+        'encode_time': encode_time,
+        'variables': grid.pool.top,
+        'clauses': len(grid.clauses),
+        'literals': sum(len(clause) for clause in grid.clauses),
+    }
+
+    # The same iterator the tools write their output from, every model is parsed as it would be for output
+    start = time.perf_counter()
+    models = grid.itermodels(solver=solver, ignore_colour=True, projection=args.projection, orbit=enumeration.get_orbit(grid, args))
+    first = next(models, None)
+    if first is not None:
+        grid.parse_solution(first)
+    result['solve_time'] = time.perf_counter() - start
+    result['satisfiable'] = first is not None
+
+    count = 0 if first is None else 1
+    if first is not None and instance.max_models > 1:
+        enumerate_start = time.perf_counter()
+        for model in models:
+            grid.parse_solution(model)
+            count += 1
+            if count >= instance.max_models or time.perf_counter() - enumerate_start >= instance.max_enumerate_time:
+                break
+        enumerate_time = time.perf_counter() - enumerate_start
+        result['models'] = count
+        result['models_per_second'] = (count - 1) / enumerate_time if enumerate_time > 0 else None
+    models.close()
+
+    result['total_time'] = result['encode_time'] + time.perf_counter() - start
+    result['peak_rss'] = peak_rss()
+    result['start_rss'] = start_rss
+    return result
+
+
+def measure_worker(connection, instance: Instance, solver: str, seed: int):
+    try:
+        connection.send(('done', measure(instance, solver, seed)))
+    except BaseException as e:
+        connection.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        connection.close()
+
+
+def run_once(instance: Instance, solver: str, seed: int, timeout: float) -> Dict[str, Any]:
+    # Hash randomisation changes set iteration order (and with it variable numbering), so it is pinned for the child
+    os.environ['PYTHONHASHSEED'] = str(seed)
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=measure_worker, args=(sender, instance, solver, seed), daemon=True)
+    start = time.perf_counter()
+    try:
+        process.start()
+        sender.close()
+        if not receiver.poll(timeout):
+            return {'timeout': True, 'wall_time': time.perf_counter() - start}
+        try:
+            kind, value = receiver.recv()
+        except EOFError:
+            return {'error': f'Benchmark process exited unexpectedly (exit code {process.exitcode})'}
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+        receiver.close()
+
+    if kind == 'error':
+        return {'error': value}
+    value['wall_time'] = time.perf_counter() - start
+    if instance.satisfiable is not None and value['satisfiable'] != instance.satisfiable:
+        value['error'] = f'Expected {"SAT" if instance.satisfiable else "UNSAT"}, got {"SAT" if value["satisfiable"] else "UNSAT"}'
+    return value
+
+
+def run_instance(instance: Instance, solver: str, seed: int, repetitions: int, timeout: float) -> Dict[str, Any]:
+    runs = []
+    for _ in range(repetitions):
+        run = run_once(instance, solver, seed, timeout)
+        runs.append(run)
+        if run.get('timeout') or 'error' in run:  # Repeating won't help, and a timeout would be paid again
+            break
+
+    return {
+        'name': instance.name,
+        'tool': instance.tool,
+        'argv': list(instance.argv),
+        'expected': instance.satisfiable,
+        'max_models': instance.max_models,
+        'runs': runs,
+        'summary': summarise_runs([run for run in runs if not run.get('timeout') and 'error' not in run], METRICS),
+    }
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    failed = [run for run in result['runs'] if run.get('timeout') or 'error' in run]
+    if len(failed) != 0:
+        return f'{result["name"]}: ' + ('timed out' if failed[0].get('timeout') else failed[0]['error'])
+
+    summary = result['summary']
+    text = (f'{result["name"]}: encode {summary["encode_time"]["median"]:.3f}s, solve {summary["solve_time"]["median"]:.3f}s, '
+            f'{summary["clauses"]["median"]:.0f} clauses, {summary["peak_rss"]["median"] / 2**20:.0f} MiB')
+    if 'models_per_second' in summary:
+        text += f', {summary["models_per_second"]["median"]:.1f} models/s'
+    return text
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Measures end to end generation (encoding and solving) on fixed instances')
+    add_common_arguments(parser, DEFAULT_REPETITIONS)
+    parser.add_argument('--solver', type=str, default=DEFAULT_SOLVER, help='Backend SAT solver to use')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds before a single run is abandoned')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = get_parser().parse_args(argv)
+
+    instances = dict((instance.name, instance) for instance in INSTANCES)
+    names = select(instances.keys(), args.filter)
+    if args.list:
+        for name in names:
+            instance = instances[name]
+            print(f'{name:<45} {instance.tool} {" ".join(instance.argv)}')
+        return
+    if len(names) == 0:
+        raise RuntimeError('No benchmarks match the filter')
+
+    # Instances refer to networks/ relative to the repository root
+    if args.output is not None:
+        args.output = os.path.abspath(args.output)
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+    results = []
+    for name in names:
+        result = run_instance(instances[name], args.solver, args.seed, args.repetitions, args.timeout)
+        print(format_result(result), file=sys.stderr, flush=True)
+        results.append(result)
+
+    settings = {
+        'solver': args.solver,
+        'seed': args.seed,
+        'repetitions': args.repetitions,
+        'timeout': args.timeout,
+    }
+    write_results('end_to_end', settings, results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+import argparse
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.common import add_common_arguments, seed_everything, select, write_results
+from benchmarks.end_to_end import DEFAULT_SOLVER, DEFAULT_TIMEOUT, Instance, run_instance
+
+# Net free n to n balancers solved with each --flow-encoding, every run spawned as in end_to_end. Order flows need a literal
+# per unit of the largest flow, which is small for powers of two and large otherwise (40 for 5 inputs, 56 for 7)
+
+DEFAULT_REPETITIONS = 3
+
+ENCODINGS = ('binary', 'order')
+
+# The number of inputs, then the instance
+BALANCERS: Tuple[Tuple[int, Instance], ...] = (
+    (2, Instance('belt_balancer_net_free/2-sat', 'belt_balancer_net_free', ('3', '2', '2', '2'), True)),
+    (3, Instance('belt_balancer_net_free/3-unsat', 'belt_balancer_net_free', ('9', '3', '3', '3'), False)),
+    (4, Instance('belt_balancer_net_free/4-unsat', 'belt_balancer_net_free', ('8', '4', '4', '4'), False)),
+    (4, Instance('belt_balancer_net_free/4-sat', 'belt_balancer_net_free', ('9', '4', '4', '4'), True)),
+    (5, Instance('belt_balancer_net_free/5-unsat', 'belt_balancer_net_free', ('8', '5', '5', '5'), False)),
+    (6, Instance('belt_balancer_net_free/6-unsat', 'belt_balancer_net_free', ('10', '6', '6', '6'), False)),
+    (7, Instance('belt_balancer_net_free/7-unsat', 'belt_balancer_net_free', ('10', '7', '7', '7'), False)),
+    (8, Instance('belt_balancer_net_free/8-unsat', 'belt_balancer_net_free', ('9', '8', '8', '8'), False)),
+    (8, Instance('belt_balancer_net_free/8-sat', 'belt_balancer_net_free', ('13', '8', '8', '8'), True)),
+)
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    failed = [run for run in result['runs'] if run.get('timeout') or 'error' in run]
+    if len(failed) != 0:
+        return f'{result["name"]}: ' + ('timed out' if failed[0].get('timeout') else failed[0]['error'])
+    summary = result['summary']
+    return (f'{result["name"]:<45} encode {summary["encode_time"]["median"]:.3f}s, solve {summary["solve_time"]["median"]:.3f}s, '
+            f'{summary["clauses"]["median"]:.0f} clauses, {summary["variables"]["median"]:.0f} variables')
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Compares the flow encodings by net free balancer solve time')
+    add_common_arguments(parser, DEFAULT_REPETITIONS)
+    parser.add_argument('--solver', type=str, default=DEFAULT_SOLVER, help='Backend SAT solver to use')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds before a single run is abandoned')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = get_parser().parse_args(argv)
+
+    cases = dict((f'{instance.name}/{encoding}', (inputs, Instance(instance.name, instance.tool, instance.argv + ('--flow-encoding', encoding),
+                                                                   instance.satisfiable)))
+                 for inputs, instance in BALANCERS for encoding in ENCODINGS)
+    names = select(cases.keys(), args.filter)
+    if args.list:
+        for name in names:
+            _, instance = cases[name]
+            print(f'{name:<45} {instance.tool} {" ".join(instance.argv)}')
+        return
+    if len(names) == 0:
+        raise RuntimeError('No benchmarks match the filter')
+
+    if args.output is not None:
+        args.output = os.path.abspath(args.output)
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    seed_everything(args.seed)
+
+    results = []
+    for name in names:
+        inputs, instance = cases[name]
+        result = run_instance(instance, args.solver, args.seed, args.repetitions, args.timeout)
+        result['name'] = name
+        result['inputs'] = inputs
+        print(format_result(result), file=sys.stderr, flush=True)
+        results.append(result)
+
+    settings = {
+        'solver': args.solver,
+        'seed': args.seed,
+        'repetitions': args.repetitions,
+        'timeout': args.timeout,
+    }
+    write_results('flow', settings, results, args.output)
+
+
+if __name__ == '__main__':
+    main()
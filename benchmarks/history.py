@@ -0,0 +1,392 @@
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import random
+import sqlite3
+import statistics
+import sys
+from dataclasses import dataclass
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+from benchmarks.common import environment, read_results
+
+# Every repetition is stored (not just the summary), so two commits can be compared with a significance test instead of
+# eyeballing medians. Runs are only ever compared with runs from the same machine fingerprint.
+
+DEFAULT_STORE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), '.benchmarks', 'history.sqlite')
+DEFAULT_ALPHA = 0.05
+DEFAULT_THRESHOLD = 0.05  # Relative change below which a significant difference is still ignored
+PERMUTATION_SAMPLES = 20000  # Exact above this many splits is too slow, a seeded sample is used instead
+
+# Fields of a run that are not measurements
+IGNORED_FIELDS = {'satisfiable', 'timeout', 'error'}
+# Summarised per instance rather than per repetition
+SCALAR_FIELDS = ('clauses', 'literals', 'variables', 'peak_memory', 'allocated_blocks')
+# Deterministic for a given commit, any change at all is reported
+EXACT_METRICS = {'clauses', 'literals', 'variables'}
+HIGHER_IS_BETTER = {'models', 'models_per_second', 'clauses_per_second', 'variables_per_second'}
+DEFAULT_REPORT_METRICS = {
+    'end_to_end': 'total_time',
+    'micro': 'time',
+    'startup': 'time',
+    'crossover': 'solve_time',
+    'underground': 'solve_time',
+    'colour': 'solve_time',
+    'flow': 'solve_time',
+    'levels': 'encode_time',
+}
+
+SPARK_CHARACTERS = '▁▂▃▄▅▆▇█'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    suite TEXT NOT NULL,
+    git_commit TEXT,
+    dirty INTEGER NOT NULL,
+    fingerprint TEXT NOT NULL,
+    created TEXT NOT NULL,
+    environment TEXT NOT NULL,
+    settings TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS measurements (
+    run_id INTEGER NOT NULL REFERENCES runs(id) ON DELETE CASCADE,
+    name TEXT NOT NULL,
+    metric TEXT NOT NULL,
+    sample_values TEXT NOT NULL,
+    PRIMARY KEY (run_id, name, metric)
+);
+'''
+
+
+def fingerprint(env: Dict[str, Any]) -> str:
+    # Whatever changes the timings without changing the code, the commit itself is kept separately
+    keys = ('implementation', 'python', 'machine', 'processor', 'cpu_count', 'numpy', 'python-sat')
+    system = env.get('platform', '').split('-')[0]
+    text = json.dumps([system] + [env.get(key) for key in keys])
+    return hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+
+
+def measurements(result: Dict[str, Any]) -> Dict[str, List[float]]:
+    values: Dict[str, List[float]] = {}
+    for run in result['runs']:
+        if run.get('timeout') or 'error' in run:
+            continue
+        for metric, value in run.items():
+            if metric not in IGNORED_FIELDS and isinstance(value, (int, float)) and not isinstance(value, bool):
+                values.setdefault(metric, []).append(float(value))
+    for metric in SCALAR_FIELDS:
+        value = result.get(metric)
+        if metric not in values and isinstance(value, (int, float)):
+            values[metric] = [float(value)]
+    return values
+
+
+@dataclass
+class Run:
+    id: int
+    suite: str
+    commit: Optional[str]
+    dirty: bool
+    fingerprint: str
+    created: str
+
+    @property
+    def label(self) -> str:
+        commit = 'unknown' if self.commit is None else self.commit[:10]
+        return commit + ('+' if self.dirty else '')
+
+
+class Store:
+    def __init__(self, filename: str):
+        directory = os.path.dirname(filename)
+        if directory != '':
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(filename)
+        self.connection.execute('PRAGMA foreign_keys = ON')
+        self.connection.executescript(SCHEMA)
+
+    def close(self):
+        self.connection.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def record(self, data: Dict[str, Any]) -> int:
+        env = data['environment']
+        git = env.get('git') or {}
+        with self.connection:
+            cursor = self.connection.execute(
+                'INSERT INTO runs (suite, git_commit, dirty, fingerprint, created, environment, settings) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (data['suite'], git.get('commit'), int(bool(git.get('dirty'))), fingerprint(env), data['created'],
+                 json.dumps(env), json.dumps(data['settings'])))
+            run_id = cursor.lastrowid
+            for result in data['results']:
+                for metric, values in measurements(result).items():
+                    self.connection.execute('INSERT INTO measurements (run_id, name, metric, sample_values) VALUES (?, ?, ?, ?)',
+                                            (run_id, result['name'], metric, json.dumps(values)))
+        return run_id
+
+    def runs(self, suite: Optional[str] = None, machine: Optional[str] = None) -> List[Run]:
+        query = 'SELECT id, suite, git_commit, dirty, fingerprint, created FROM runs'
+        conditions, parameters = [], []
+        if suite is not None:
+            conditions.append('suite = ?')
+            parameters.append(suite)
+        if machine is not None:
+            conditions.append('fingerprint = ?')
+            parameters.append(machine)
+        if len(conditions) != 0:
+            query += ' WHERE ' + ' AND '.join(conditions)
+        query += ' ORDER BY created, id'
+        return [Run(row[0], row[1], row[2], bool(row[3]), row[4], row[5]) for row in self.connection.execute(query, parameters)]
+
+    def measurements(self, run_id: int) -> Dict[Tuple[str, str], List[float]]:
+        rows = self.connection.execute('SELECT name, metric, sample_values FROM measurements WHERE run_id = ?', (run_id,))
+        return dict(((name, metric), json.loads(values)) for name, metric, values in rows)
+
+    def delete(self, run_id: int):
+        with self.connection:
+            self.connection.execute('DELETE FROM runs WHERE id = ?', (run_id,))
+
+
+def splits(count: int, size: int, rng: random.Random) -> Iterator[Sequence[int]]:
+    if math.comb(count, size) <= PERMUTATION_SAMPLES:
+        yield from itertools.combinations(range(count), size)
+        return
+    indices = list(range(count))
+    for _ in range(PERMUTATION_SAMPLES):
+        yield rng.sample(indices, size)
+
+
+def permutation_p_value(base: List[float], head: List[float], seed: int = 0) -> float:
+    # One sided: how often relabelling the samples makes head look at least this much larger than base
+    observed = statistics.fmean(head) - statistics.fmean(base)
+    pooled = base + head
+    total = sum(pooled)
+    extreme = 0
+    count = 0
+    for indices in splits(len(pooled), len(head), random.Random(seed)):
+        head_sum = sum(pooled[i] for i in indices)
+        difference = head_sum / len(head) - (total - head_sum) / len(base)
+        if difference >= observed - 1e-12 * max(abs(observed), 1):
+            extreme += 1
+        count += 1
+    return extreme / count
+
+
+@dataclass
+class Change:
+    name: str
+    metric: str
+    base: float
+    head: float
+    p_value: Optional[float]
+    regression: bool
+
+    @property
+    def relative(self) -> float:
+        if self.base == 0:
+            return math.inf if self.head != 0 else 0.0
+        return (self.head - self.base) / abs(self.base)
+
+
+def compare_measurements(base: Dict[Tuple[str, str], List[float]], head: Dict[Tuple[str, str], List[float]],
+                         alpha: float, threshold: float) -> List[Change]:
+    changes = []
+    for key in sorted(base.keys() & head.keys()):
+        name, metric = key
+        base_values, head_values = base[key], head[key]
+        base_median, head_median = statistics.median(base_values), statistics.median(head_values)
+
+        if metric in EXACT_METRICS:
+            if base_median != head_median:
+                changes.append(Change(name, metric, base_median, head_median, None, head_median > base_median))
+            continue
+
+        # Tested in the direction that would be a regression, and the other way round for an improvement
+        worse, better = (base_values, head_values), (head_values, base_values)
+        if metric in HIGHER_IS_BETTER:
+            worse, better = better, worse
+        regression_p = permutation_p_value(*worse)
+        improvement_p = permutation_p_value(*better)
+
+        relative = abs(head_median - base_median) / abs(base_median) if base_median != 0 else math.inf
+        if relative < threshold:
+            continue
+        if regression_p <= alpha:
+            changes.append(Change(name, metric, base_median, head_median, regression_p, True))
+        elif improvement_p <= alpha:
+            changes.append(Change(name, metric, base_median, head_median, improvement_p, False))
+    return changes
+
+
+def find_run(runs: List[Run], commit: Optional[str]) -> Optional[Run]:
+    # The latest run of a commit (prefix), or the latest run of all
+    matching = [run for run in runs if commit is None or (run.commit is not None and run.commit.startswith(commit))]
+    return matching[-1] if len(matching) != 0 else None
+
+
+def select_runs(store: Store, suite: str, machine: str, base: Optional[str], head: Optional[str]) -> Tuple[Run, Run]:
+    runs = store.runs(suite, machine)
+    head_run = find_run(runs, head)
+    if head_run is None:
+        raise RuntimeError(f'No {suite} runs recorded for {head or "this machine"}')
+
+    if base is not None:
+        base_run = find_run(runs, base)
+    else:  # The latest run of an earlier commit, a dirty tree counts as a commit of its own
+        earlier = [run for run in runs if run.created <= head_run.created and run.id != head_run.id
+                   and (run.commit, run.dirty) != (head_run.commit, head_run.dirty)]
+        base_run = earlier[-1] if len(earlier) != 0 else None
+    if base_run is None:
+        raise RuntimeError(f'No {suite} run to compare {head_run.label} with')
+    return base_run, head_run
+
+
+def format_value(metric: str, value: float) -> str:
+    if metric.endswith('_time') or metric == 'time':
+        return f'{value:.4g}s'
+    if metric.endswith('rss') or metric == 'peak_memory':
+        return f'{value / 2**20:.1f} MiB'
+    return f'{value:.6g}'
+
+
+def write_changes(changes: List[Change], base: Run, head: Run, file=None):
+    if file is None:
+        file = sys.stdout
+    print(f'Comparing {base.label} ({base.created}) with {head.label} ({head.created})', file=file)
+    for title, regression in (('Regressions', True), ('Improvements', False)):
+        selected = [change for change in changes if change.regression == regression]
+        if len(selected) == 0:
+            continue
+        print(f'\n{title}:', file=file)
+        for change in sorted(selected, key=lambda change: (change.name, change.metric)):
+            p_value = 'exact' if change.p_value is None else f'p={change.p_value:.3f}'
+            print(f'  {change.name:<45} {change.metric:<20} {format_value(change.metric, change.base):>12} -> '
+                  f'{format_value(change.metric, change.head):>12} {100 * change.relative:>+8.1f}% ({p_value})', file=file)
+    if len(changes) == 0:
+        print('No significant changes', file=file)
+
+
+def family(name: str) -> str:
+    return name.split('/', 1)[0]
+
+
+def sparkline(values: List[Optional[float]]) -> str:
+    present = [value for value in values if value is not None]
+    if len(present) == 0:
+        return ' ' * len(values)
+    low, high = min(present), max(present)
+    result = ''
+    for value in values:
+        if value is None:
+            result += ' '
+        elif high == low:
+            result += SPARK_CHARACTERS[len(SPARK_CHARACTERS) // 2]
+        else:
+            result += SPARK_CHARACTERS[round((value - low) / (high - low) * (len(SPARK_CHARACTERS) - 1))]
+    return result
+
+
+def trends(store: Store, runs: List[Run], metric: str) -> Dict[str, List[Optional[float]]]:
+    # Median of every instance in every run, in the order the runs were made
+    result: Dict[str, List[Optional[float]]] = {}
+    for i, run in enumerate(runs):
+        for (name, run_metric), values in store.measurements(run.id).items():
+            if run_metric == metric:
+                result.setdefault(name, [None] * len(runs))[i] = statistics.median(values)
+    return result
+
+
+def write_report(store: Store, runs: List[Run], metric: str, family_filter: Optional[str], output_format: str, file=None):
+    if file is None:
+        file = sys.stdout
+    series = trends(store, runs, metric)
+    names = sorted(name for name in series if family_filter is None or family(name) == family_filter)
+
+    if output_format == 'csv':
+        print(','.join(['name'] + [run.label for run in runs]), file=file)
+        for name in names:
+            print(','.join([name] + ['' if value is None else repr(value) for value in series[name]]), file=file)
+        return
+
+    print(f'{metric} over {len(runs)} runs: ' + ', '.join(run.label for run in runs), file=file)
+    for group, members in itertools.groupby(names, key=family):
+        print(f'\n{group}', file=file)
+        for name in members:
+            values = series[name]
+            present = [value for value in values if value is not None]
+            change = ''
+            if len(present) > 1 and present[0] != 0:
+                change = f'{100 * (present[-1] - present[0]) / abs(present[0]):+.1f}%'
+            print(f'  {name:<45} {sparkline(values)}  {format_value(metric, present[-1]):>12} {change:>8}', file=file)
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Keeps benchmark results per commit and machine, and finds regressions between them')
+    parser.add_argument('--store', type=str, default=DEFAULT_STORE, help='SQLite file the results are kept in')
+    parser.add_argument('--machine', type=str, help='Machine fingerprint to use (defaults to this machine)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    record = subparsers.add_parser('record', help='Add results written by the benchmark suites to the store')
+    record.add_argument('results', nargs='+', help='JSON results files')
+
+    subparsers.add_parser('list', help='List the recorded runs')
+
+    compare = subparsers.add_parser('compare', help='Report significant changes between two commits, exits with 1 when anything regressed')
+    compare.add_argument('--suite', type=str, default='end_to_end', help='Which suite to compare')
+    compare.add_argument('--base', type=str, help='Commit (prefix) to compare against (defaults to the run before the head)')
+    compare.add_argument('--head', type=str, help='Commit (prefix) to compare (defaults to the latest run)')
+    compare.add_argument('--alpha', type=float, default=DEFAULT_ALPHA, help='Significance level of the permutation test')
+    compare.add_argument('--threshold', type=float, default=DEFAULT_THRESHOLD, help='Ignore relative changes smaller than this')
+
+    report = subparsers.add_parser('report', help='Show how every instance changed over the recorded runs, grouped by family')
+    report.add_argument('--suite', type=str, default='end_to_end', help='Which suite to report on')
+    report.add_argument('--metric', type=str, help='Metric to chart (defaults to total_time, or time for micro and startup)')
+    report.add_argument('--family', type=str, help='Only this family of instances (e.g. belt_balancer)')
+    report.add_argument('--limit', type=int, default=30, help='Number of most recent runs to include')
+    report.add_argument('--format', type=str, choices=('text', 'csv'), default='text', help='Output format')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = get_parser().parse_args(argv)
+    machine = args.machine if args.machine is not None else fingerprint(environment())
+
+    with Store(args.store) as store:
+        if args.command == 'record':
+            for filename in args.results:
+                data = read_results(filename)
+                run_id = store.record(data)
+                print(f'Recorded {filename} as run {run_id} ({data["suite"]}, machine {fingerprint(data["environment"])})', file=sys.stderr)
+
+        elif args.command == 'list':
+            for run in store.runs():
+                marker = '*' if run.fingerprint == machine else ' '
+                print(f'{run.id:>5} {marker} {run.suite:<12} {run.label:<12} {run.fingerprint} {run.created}')
+
+        elif args.command == 'compare':
+            base, head = select_runs(store, args.suite, machine, args.base, args.head)
+            changes = compare_measurements(store.measurements(base.id), store.measurements(head.id), args.alpha, args.threshold)
+            write_changes(changes, base, head)
+            if any(change.regression for change in changes):
+                return 1
+
+        elif args.command == 'report':
+            runs = store.runs(args.suite, machine)[-args.limit:]
+            if len(runs) == 0:
+                raise RuntimeError(f'No {args.suite} runs recorded for this machine')
+            metric = args.metric if args.metric is not None else DEFAULT_REPORT_METRICS.get(args.suite, 'time')
+            write_report(store, runs, metric, args.family, args.format)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,151 @@
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.common import add_common_arguments, seed_everything, select, summarise_runs, write_results
+from benchmarks.end_to_end import DEFAULT_SOLVER, DEFAULT_TIMEOUT, Instance, peak_rss, run_instance
+
+# The --level-encoding choices of belt_balancer_net_free_power_of_2, by the time and memory taken to encode the larger
+# balancers (each in a freshly spawned interpreter as in end_to_end, but never solved) and by the time taken to solve
+# the small ones
+
+DEFAULT_REPETITIONS = 3
+
+ENCODINGS = ('library', 'unary', 'popcount')
+
+ENCODE_METRICS = ('encode_time', 'peak_rss', 'variables', 'clauses', 'literals')
+
+# Width and size, encoded only
+ENCODE_SIZES: Tuple[Tuple[str, str], ...] = (
+    ('16', '16'),
+    ('32', '32'),
+    ('64', '64'),
+)
+
+INSTANCES: Tuple[Instance, ...] = (
+    Instance('belt_balancer_net_free_power_of_2/8-unsat', 'belt_balancer_net_free_power_of_2', ('9', '8', '--underground-length', '8'), False),
+    Instance('belt_balancer_net_free_power_of_2/8-sat', 'belt_balancer_net_free_power_of_2', ('12', '8'), True),
+)
+
+
+def measure_encode(argv: Tuple[str, ...], seed: int) -> Dict[str, Any]:
+    seed_everything(seed)
+    from factorio_sat import belt_balancer_net_free_power_of_2
+
+    args = belt_balancer_net_free_power_of_2.get_parser().parse_args(list(argv))
+    start = time.perf_counter()
+    grid = belt_balancer_net_free_power_of_2.create_grid(args)
+    return {
+        'encode_time': time.perf_counter() - start,
+        'peak_rss': peak_rss(),
+        'variables': grid.pool.top,
+        'clauses': len(grid.clauses),
+        'literals': sum(len(clause) for clause in grid.clauses),
+    }
+
+
+def encode_worker(connection, argv: Tuple[str, ...], seed: int):
+    try:
+        connection.send(('done', measure_encode(argv, seed)))
+    except BaseException as e:
+        connection.send(('error', f'{type(e).__name__}: {e}'))
+    finally:
+        connection.close()
+
+
+def encode_once(argv: Tuple[str, ...], seed: int, timeout: float) -> Dict[str, Any]:
+    os.environ['PYTHONHASHSEED'] = str(seed)
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=encode_worker, args=(sender, argv, seed), daemon=True)
+    try:
+        process.start()
+        sender.close()
+        if not receiver.poll(timeout):
+            return {'timeout': True}
+        try:
+            kind, value = receiver.recv()
+        except EOFError:
+            return {'error': f'Benchmark process exited unexpectedly (exit code {process.exitcode})'}
+    finally:
+        if process.is_alive():
+            process.kill()
+        process.join()
+        receiver.close()
+    return {'error': value} if kind == 'error' else value
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    failed = [run for run in result['runs'] if run.get('timeout') or 'error' in run]
+    if len(failed) != 0:
+        return f'{result["name"]}: ' + ('timed out' if failed[0].get('timeout') else failed[0]['error'])
+    summary = result['summary']
+    text = f'{result["name"]:<60} encode {summary["encode_time"]["median"]:.3f}s, '
+    if 'solve_time' in summary:
+        text += f'solve {summary["solve_time"]["median"]:.3f}s, '
+    return text + f'{summary["clauses"]["median"]:.0f} clauses, {summary["peak_rss"]["median"] / 2**20:.0f} MiB'
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Compares the level encodings of the power of two balancers')
+    add_common_arguments(parser, DEFAULT_REPETITIONS)
+    parser.add_argument('--solver', type=str, default=DEFAULT_SOLVER, help='Backend SAT solver to use')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds before a single run is abandoned')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = get_parser().parse_args(argv)
+
+    cases = {}
+    for encoding in ENCODINGS:
+        for width, size in ENCODE_SIZES:
+            cases[f'encode/{size}-lanes-{width}-wide/{encoding}'] = 'encode', (width, size, '--level-encoding', encoding)
+        for instance in INSTANCES:
+            argv = instance.argv + ('--level-encoding', encoding)
+            cases[f'solve/{instance.name}/{encoding}'] = 'solve', Instance(instance.name, instance.tool, argv, instance.satisfiable)
+    names = select(cases.keys(), args.filter)
+    if args.list:
+        for name in names:
+            kind, case = cases[name]
+            print(f'{name:<60} belt_balancer_net_free_power_of_2 {" ".join(case if kind == "encode" else case.argv)}')
+        return
+    if len(names) == 0:
+        raise RuntimeError('No benchmarks match the filter')
+
+    if args.output is not None:
+        args.output = os.path.abspath(args.output)
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    seed_everything(args.seed)
+
+    results = []
+    for name in names:
+        kind, case = cases[name]
+        if kind == 'encode':
+            runs = []
+            for _ in range(args.repetitions):
+                runs.append(encode_once(case, args.seed, args.timeout))
+                if runs[-1].get('timeout') or 'error' in runs[-1]:
+                    break
+            result = {'name': name, 'argv': list(case), 'runs': runs,
+                      'summary': summarise_runs([run for run in runs if not run.get('timeout') and 'error' not in run], ENCODE_METRICS)}
+        else:
+            result = run_instance(case, args.solver, args.seed, args.repetitions, args.timeout)
+            result['name'] = name
+        print(format_result(result), file=sys.stderr, flush=True)
+        results.append(result)
+
+    settings = {
+        'solver': args.solver,
+        'seed': args.seed,
+        'repetitions': args.repetitions,
+        'timeout': args.timeout,
+    }
+    write_results('levels', settings, results, args.output)
+
+
+if __name__ == '__main__':
+    main()
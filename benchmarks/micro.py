@@ -0,0 +1,359 @@
+import argparse
+import gc
+import importlib
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from benchmarks.common import add_common_arguments, seed_everything, select, summarise_runs, write_results
+
+# Primitives are looked up by name every time a case is built, so an alternative implementation swapped in with
+# --replace is what the case (and anything else calling the primitive through its module) runs
+
+DEFAULT_REPETITIONS = 5
+MIN_TIME = 0.1  # Calls are batched until one repetition takes at least this long
+
+METRICS = ('time', 'clauses_per_second', 'variables_per_second')
+
+# Builds the call to measure from the primitive and a size, the call returns (clauses, variables allocated)
+Thunk = Callable[[], Tuple[List[List[int]], int]]
+CaseBuilder = Callable[[Callable[..., Any], int], Thunk]
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    target: str  # Dotted path of the primitive, e.g. factorio_sat.cardinality.heule_amo
+    sizes: Tuple[int, ...]
+    build: CaseBuilder
+
+
+class Counter:
+    # Stands in for the allocators (and IDPool) the encoders are given
+    def __init__(self, start: int):
+        self.top = start
+
+    def __call__(self) -> int:
+        self.top += 1
+        return self.top
+
+    def id(self, *_) -> int:
+        return self()
+
+
+def literals(count: int, start: int = 1) -> List[int]:
+    return list(range(start, start + count))
+
+
+def allocating(function: Callable[[Counter], List[List[int]]], start: int) -> Thunk:
+    def thunk():
+        counter = Counter(start)
+        clauses = function(counter)
+        return clauses, counter.top - start
+    return thunk
+
+
+def build_add_numbers(add_numbers, bits: int) -> Thunk:
+    a, b, output = literals(bits), literals(bits, bits + 1), literals(bits + 1, 2 * bits + 1)
+    return allocating(lambda counter: add_numbers(a, b, output, counter), 3 * bits + 1)
+
+
+def build_get_popcount(get_popcount, bits: int) -> Thunk:
+    from factorio_sat.util import bin_length
+    inputs, output = literals(bits), literals(bin_length(bits + 1), bits + 1)
+    return allocating(lambda counter: get_popcount(inputs, output, counter), bits + len(output))
+
+
+def build_set_numbers(set_numbers, bits: int) -> Thunk:
+    # Every pair of values, as when linking the colours of neighbouring tiles
+    a, b = literals(bits), literals(bits, bits + 1)
+    values = [(value_a, value_b) for value_a in range(1 << bits) for value_b in range(1 << bits)]
+
+    def thunk():
+        clauses = []
+        for value_a, value_b in values:
+            clauses += set_numbers(value_a, value_b, a, b)
+        return clauses, 0
+    return thunk
+
+
+def build_implies(implies, count: int) -> Thunk:
+    condition = literals(2)
+    consequences = [[lit, -(lit + 1)] for lit in literals(count, 3)]
+    return lambda: (implies(condition, consequences), 0)
+
+
+def build_amo(amo, count: int) -> Thunk:
+    inputs = literals(count)
+    return allocating(lambda counter: amo(inputs, counter), count)
+
+
+def build_library_equals(encoding_name: str) -> CaseBuilder:
+    def build(library_equals, count: int) -> Thunk:
+        from pysat.card import EncType
+        from pysat.formula import IDPool
+        encoding = getattr(EncType, encoding_name)
+        inputs = literals(count)
+
+        def thunk():
+            pool = IDPool(start_from=count + 1)
+            clauses = library_equals(inputs, count // 4, pool, encoding)
+            return clauses, pool.top - count
+        return thunk
+    return build
+
+
+def tile_template():
+    from factorio_sat.solver import Grid
+    return Grid(1, 1, 4).template
+
+
+def build_instantiate(instantiate, count: int) -> Thunk:
+    # One call per tile of a count x count grid
+    from pysat.formula import IDPool
+    template = tile_template()
+
+    def thunk():
+        pool = IDPool()
+        for _ in range(count * count):
+            instantiate(template, pool)
+        return [], pool.top
+    return thunk
+
+
+def build_grid(init, size: int) -> Thunk:
+    from factorio_sat.template import BaseGrid
+    template = tile_template()
+
+    def thunk():
+        grid = BaseGrid.__new__(BaseGrid)
+        init(grid, template, size, size)
+        return grid.clauses, grid.pool.top
+    return thunk
+
+
+def build_pattern_clauses(clauses, size: int) -> Thunk:
+    # The semicircle rules in every frame of a size x size grid, each pattern is compiled once but the literal arrays of
+    # the grid are gathered again every time
+    from factorio_sat.optimisations import SEMICIRCLES
+    from factorio_sat.patterns import ALL_FRAMES
+    from factorio_sat.solver import Grid
+    from factorio_sat.template import EdgeMode
+    grid = Grid(size, size, None)
+
+    def thunk():
+        grid.field_literals.clear()
+        result = []
+        for pattern in SEMICIRCLES:
+            result += clauses(pattern, grid, ALL_FRAMES, EdgeMode.NO_WRAP)
+        return result, 0
+    return thunk
+
+
+CASES: Tuple[Case, ...] = (
+    Case('util.add_numbers', 'factorio_sat.util.add_numbers', (8, 64), build_add_numbers),
+    Case('util.get_popcount', 'factorio_sat.util.get_popcount', (16, 256), build_get_popcount),
+    Case('util.set_numbers', 'factorio_sat.util.set_numbers', (3, 5), build_set_numbers),
+    Case('util.implies', 'factorio_sat.util.implies', (16, 1024), build_implies),
+
+    Case('cardinality.quadratic_amo', 'factorio_sat.cardinality.quadratic_amo', (8, 64), build_amo),
+    Case('cardinality.heule_amo', 'factorio_sat.cardinality.heule_amo', (8, 64, 512), build_amo),
+    Case('cardinality.logarithmic_amo', 'factorio_sat.cardinality.logarithmic_amo', (8, 64, 512), build_amo),
+    Case('cardinality.ladder_amo', 'factorio_sat.cardinality.ladder_amo', (8, 64, 512), build_amo),
+    Case('cardinality.commander_amo', 'factorio_sat.cardinality.commander_amo', (8, 64, 512), build_amo),
+    Case('cardinality.product_amo', 'factorio_sat.cardinality.product_amo', (8, 64, 512), build_amo),
+    Case('cardinality.library_equals.seqcounter', 'factorio_sat.cardinality.library_equals', (16, 128), build_library_equals('seqcounter')),
+    Case('cardinality.library_equals.totalizer', 'factorio_sat.cardinality.library_equals', (16, 128), build_library_equals('totalizer')),
+    Case('cardinality.library_equals.kmtotalizer', 'factorio_sat.cardinality.library_equals', (16, 128), build_library_equals('kmtotalizer')),
+    Case('cardinality.library_equals.sortnetwrk', 'factorio_sat.cardinality.library_equals', (16, 128), build_library_equals('sortnetwrk')),
+    Case('cardinality.library_equals.cardnetwrk', 'factorio_sat.cardinality.library_equals', (16, 128), build_library_equals('cardnetwrk')),
+
+    Case('template.CompositeTemplate.instantiate', 'factorio_sat.template.CompositeTemplate.instantiate', (8, 32), build_instantiate),
+    Case('template.BaseGrid.__init__', 'factorio_sat.template.BaseGrid.__init__', (8, 32), build_grid),
+
+    Case('patterns.Pattern.clauses', 'factorio_sat.patterns.Pattern.clauses', (8, 32), build_pattern_clauses),
+)
+
+
+def resolve(target: str) -> Tuple[Any, str]:
+    # The object holding the primitive (a module or a class) and its attribute name
+    parts = target.split('.')
+    for split in range(len(parts) - 1, 0, -1):
+        try:
+            owner = importlib.import_module('.'.join(parts[:split]))
+        except ImportError:
+            continue
+        for name in parts[split:-1]:
+            owner = getattr(owner, name)
+        return owner, parts[-1]
+    raise RuntimeError(f'Cannot find {target}')
+
+
+def load_implementation(path: str) -> Callable[..., Any]:
+    if ':' not in path:
+        raise RuntimeError(f'Expected module:attribute, got {path}')
+    module_name, attribute = path.split(':', 1)
+    result: Any = importlib.import_module(module_name)
+    for name in attribute.split('.'):
+        result = getattr(result, name)
+    return result
+
+
+class Replaced:
+    def __init__(self, target: str, implementation: Optional[Callable[..., Any]]):
+        self.owner, self.name = resolve(target)
+        self.implementation = implementation
+        self.original = None
+
+    def __enter__(self) -> Callable[..., Any]:
+        self.original = getattr(self.owner, self.name)
+        if self.implementation is not None:
+            setattr(self.owner, self.name, self.implementation)
+        return getattr(self.owner, self.name)
+
+    def __exit__(self, *_):
+        setattr(self.owner, self.name, self.original)
+
+
+def batch_size(thunk: Thunk, min_time: float) -> int:
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            thunk()
+        if time.perf_counter() - start >= min_time:
+            return number
+        number *= 2
+
+
+def measure(thunk: Thunk, repetitions: int, min_time: float) -> Dict[str, Any]:
+    clauses, variables = thunk()
+    clause_count = len(clauses)
+    literal_count = sum(len(clause) for clause in clauses)
+    del clauses
+
+    # Blocks still allocated after a call are the output, peak covers the temporaries as well
+    gc.collect()
+    blocks = sys.getallocatedblocks()
+    tracemalloc.start()
+    try:
+        result = thunk()
+        _, peak_memory = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    retained_blocks = sys.getallocatedblocks() - blocks
+    del result
+
+    number = batch_size(thunk, min_time)
+    runs = []
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        for _ in range(repetitions):
+            start = time.perf_counter()
+            for _ in range(number):
+                thunk()
+            elapsed = (time.perf_counter() - start) / number
+            runs.append({
+                'time': elapsed,
+                'clauses_per_second': clause_count / elapsed if clause_count != 0 else None,
+                'variables_per_second': variables / elapsed if variables != 0 else None,
+            })
+    finally:
+        if enabled:
+            gc.enable()
+
+    return {
+        'clauses': clause_count,
+        'literals': literal_count,
+        'variables': variables,
+        'peak_memory': peak_memory,
+        'allocated_blocks': retained_blocks,
+        'calls_per_repetition': number,
+        'runs': runs,
+        'summary': summarise_runs(runs, METRICS),
+    }
+
+
+def run_case(case: Case, size: int, implementation: Optional[Callable[..., Any]], repetitions: int, min_time: float) -> Dict[str, Any]:
+    with Replaced(case.target, implementation) as primitive:
+        return measure(case.build(primitive, size), repetitions, min_time)
+
+
+def format_result(result: Dict[str, Any], baseline: Optional[Dict[str, Any]] = None) -> str:
+    summary = result['summary']
+    text = f'{result["name"]:<50} {1e6 * summary["time"]["median"]:>10.1f} us'
+    if 'clauses_per_second' in summary:
+        text += f' {summary["clauses_per_second"]["median"]:>12.0f} clauses/s'
+    else:
+        text += f' {summary["variables_per_second"]["median"]:>12.0f} vars/s   '
+    text += f' {result["peak_memory"] / 1024:>9.1f} KiB peak {result["allocated_blocks"]:>8} blocks'
+    if baseline is not None:
+        text += f'  {baseline["summary"]["time"]["median"] / summary["time"]["median"]:.2f}x'
+    return text
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Measures the clause building primitives (util, cardinality and template) in isolation')
+    add_common_arguments(parser, DEFAULT_REPETITIONS)
+    parser.add_argument('--min-time', type=float, default=MIN_TIME, help='Seconds every repetition runs for (calls are batched to reach it)')
+    parser.add_argument('--replace', type=str, action='append', default=[], metavar='TARGET=MODULE:ATTRIBUTE',
+                        help='Also measure an alternative implementation of a primitive (e.g. factorio_sat.cardinality.heule_amo=scratch:heule_amo) '
+                        'and report its speedup over the current one')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = get_parser().parse_args(argv)
+
+    replacements: Dict[str, Tuple[str, Callable[..., Any]]] = {}
+    for replacement in args.replace:
+        if '=' not in replacement:
+            raise RuntimeError(f'Expected TARGET=MODULE:ATTRIBUTE, got {replacement}')
+        target, path = replacement.split('=', 1)
+        replacements[target] = path, load_implementation(path)
+
+    names = [f'{case.name}/{size}' for case in CASES for size in case.sizes]
+    selected = set(select(names, args.filter))
+    if args.list:
+        for case in CASES:
+            for size in case.sizes:
+                if f'{case.name}/{size}' in selected:
+                    print(f'{case.name + "/" + str(size):<50} {case.target}')
+        return
+    if len(selected) == 0:
+        raise RuntimeError('No benchmarks match the filter')
+
+    seed_everything(args.seed)
+    results = []
+    for case in CASES:
+        for size in case.sizes:
+            name = f'{case.name}/{size}'
+            if name not in selected:
+                continue
+
+            result = {'name': name, 'target': case.target, 'size': size, 'implementation': None}
+            result.update(run_case(case, size, None, args.repetitions, args.min_time))
+            print(format_result(result), file=sys.stderr, flush=True)
+            results.append(result)
+
+            if case.target in replacements:
+                path, implementation = replacements[case.target]
+                alternative = {'name': f'{name}@{path}', 'target': case.target, 'size': size, 'implementation': path}
+                alternative.update(run_case(case, size, implementation, args.repetitions, args.min_time))
+                print(format_result(alternative, result), file=sys.stderr, flush=True)
+                results.append(alternative)
+
+    settings = {
+        'seed': args.seed,
+        'repetitions': args.repetitions,
+        'min_time': args.min_time,
+        'replacements': dict((target, path) for target, (path, _) in replacements.items()),
+    }
+    write_results('micro', settings, results, args.output)
+
+
+if __name__ == '__main__':
+    main()
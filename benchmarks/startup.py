@@ -0,0 +1,174 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.common import add_common_arguments, seed_everything, select, summarise_runs, write_results
+
+# Every run is a fresh interpreter started the way a console script is, the interpreter alone is measured as well so
+# the cost of the tool itself can be told apart from Python starting up
+
+DEFAULT_REPETITIONS = 10
+DEFAULT_TIMEOUT = 60
+
+METRICS = ('time', 'overhead')
+
+# Loaded by some modes only, a tool loading one of these for --help is a regression
+HEAVY_MODULES = ('numpy', 'pysat', 'pygame', 'OpenGL', 'ffmpeg', 'graphviz', 'luaparser', 'PIL')
+
+# Runs a module as "python -m" would, then reports every module that was loaded
+PROBE = '''
+import json, runpy, sys
+module = sys.argv[1]
+sys.argv = [module] + sys.argv[2:]
+try:
+    runpy.run_module(module, run_name='__main__', alter_sys=True)
+except SystemExit:
+    pass
+sys.stderr.write('\\n' + json.dumps(sorted(sys.modules)) + '\\n')
+'''
+
+
+@dataclass(frozen=True)
+class Case:
+    name: str
+    module: Optional[str]  # None starts the interpreter alone
+    argv: Tuple[str, ...] = ()
+
+
+TOOLS = (
+    'belt_balancer', 'belt_balancer_net_free', 'belt_balancer_net_free_power_of_2', 'blueprint', 'blueprint_book', 'calculate_optimal',
+    'interchange', 'make_block', 'network', 'pipe', 'render', 'replay', 'rotate', 'serve', 'stringifier', 'symmetry',
+)
+
+CASES: Tuple[Case, ...] = (
+    Case('python', None),
+    # What loading lazily saves, for comparison
+    Case('import/numpy', 'numpy.version'),
+    Case('import/pysat', 'pysat.solvers'),
+) + tuple(Case(f'{tool}/help', f'factorio_sat.{tool}', ('--help',)) for tool in TOOLS) + (
+    Case('fetch_assets/help', 'factorio_sat.assets.fetch', ('--help',)),
+)
+
+
+def command(case: Case) -> List[str]:
+    if case.module is None:
+        return [sys.executable, '-c', 'pass']
+    return [sys.executable, '-m', case.module] + list(case.argv)
+
+
+def run_once(case: Case, timeout: float) -> Dict[str, Any]:
+    start = time.perf_counter()
+    try:
+        process = subprocess.run(command(case), stdin=subprocess.DEVNULL, capture_output=True, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        return {'timeout': True}
+    elapsed = time.perf_counter() - start
+    if process.returncode != 0:
+        lines = process.stderr.decode(errors='replace').strip().splitlines()
+        return {'error': lines[-1] if len(lines) != 0 else f'Exit code {process.returncode}'}
+    return {'time': elapsed}
+
+
+def loaded_modules(case: Case, timeout: float) -> Optional[List[str]]:
+    if case.module is None:
+        return None
+    process = subprocess.run([sys.executable, '-c', PROBE, case.module] + list(case.argv), stdin=subprocess.DEVNULL, capture_output=True,
+                             timeout=timeout)
+    lines = process.stderr.decode(errors='replace').strip().splitlines()
+    if len(lines) == 0:
+        raise RuntimeError(f'{case.name} did not report its modules')
+    return json.loads(lines[-1])
+
+
+def run_case(case: Case, repetitions: int, timeout: float, baseline: Optional[float]) -> Dict[str, Any]:
+    runs = []
+    for _ in range(repetitions):
+        run = run_once(case, timeout)
+        if baseline is not None and 'time' in run:
+            run['overhead'] = run['time'] - baseline
+        runs.append(run)
+        if run.get('timeout') or 'error' in run:
+            break
+
+    result: Dict[str, Any] = {
+        'name': case.name,
+        'module': case.module,
+        'argv': list(case.argv),
+        'runs': runs,
+        'summary': summarise_runs([run for run in runs if not run.get('timeout') and 'error' not in run], METRICS),
+    }
+    modules = loaded_modules(case, timeout)
+    if modules is not None:
+        result['modules'] = len(modules)
+        result['heavy_modules'] = sorted(set(name.split('.')[0] for name in modules) & set(HEAVY_MODULES))
+    return result
+
+
+def format_result(result: Dict[str, Any]) -> str:
+    failed = [run for run in result['runs'] if run.get('timeout') or 'error' in run]
+    if len(failed) != 0:
+        return f'{result["name"]}: ' + ('timed out' if failed[0].get('timeout') else failed[0]['error'])
+
+    summary = result['summary']
+    text = f'{result["name"]:<45} {1e3 * summary["time"]["median"]:>8.1f} ms'
+    if 'overhead' in summary:
+        text += f' {1e3 * summary["overhead"]["median"]:>+8.1f} ms'
+    if 'modules' in result:
+        text += f' {result["modules"]:>5} modules'
+        if len(result['heavy_modules']) != 0:
+            text += ' (' + ', '.join(result['heavy_modules']) + ')'
+    return text
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Measures how long the console tools take to start, and which heavy dependencies they load')
+    add_common_arguments(parser, DEFAULT_REPETITIONS)
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds before a single run is abandoned')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = get_parser().parse_args(argv)
+
+    cases = dict((case.name, case) for case in CASES)
+    names = select(cases.keys(), args.filter)
+    if args.list:
+        for name in names:
+            print(f'{name:<45} {" ".join(command(cases[name])[1:])}')
+        return
+    if len(names) == 0:
+        raise RuntimeError('No benchmarks match the filter')
+
+    # The tools are run from the repository root, as they are when not installed
+    if args.output is not None:
+        args.output = os.path.abspath(args.output)
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    os.chdir(root)
+    os.environ['PYTHONPATH'] = os.pathsep.join(filter(None, [root, os.environ.get('PYTHONPATH')]))
+    os.environ['PYTHONHASHSEED'] = str(args.seed)
+    seed_everything(args.seed)
+
+    baseline_result = run_case(cases['python'], args.repetitions, args.timeout, None)
+    baseline = baseline_result['summary'].get('time', {}).get('median')
+
+    results = []
+    for name in names:
+        result = baseline_result if name == 'python' else run_case(cases[name], args.repetitions, args.timeout, baseline)
+        print(format_result(result), file=sys.stderr, flush=True)
+        results.append(result)
+
+    settings = {
+        'seed': args.seed,
+        'repetitions': args.repetitions,
+        'timeout': args.timeout,
+    }
+    write_results('startup', settings, results, args.output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,122 @@
+import argparse
+import importlib
+import os
+import sys
+from typing import Any, Dict, List, Optional, Tuple
+
+from benchmarks.common import add_common_arguments, seed_everything, select, summarise_runs, write_results
+from benchmarks.end_to_end import DEFAULT_SOLVER, DEFAULT_TIMEOUT, Instance, run_instance
+
+# The window and ladder encodings of the underground length rules, by the size of the clauses those two passes add
+# (encoded in process, sizes are exact) and by the time taken to solve with each (spawned as in end_to_end)
+
+DEFAULT_REPETITIONS = 3
+
+ENCODINGS = ('window', 'ladder')
+
+# The passes the encodings change
+FAMILIES = ('solver.Grid.enforce_maximum_underground_length', 'optimisations.prevent_empty_along_underground')
+
+SIZE_METRICS = ('clauses', 'literals', 'variables', 'total_clauses', 'total_literals')
+
+INSTANCES: Tuple[Instance, ...] = (
+    Instance('belt_balancer/4x4-fast-sat', 'belt_balancer', ('networks/4x4', '10', '4', '--fast'), True),
+    Instance('belt_balancer/4x4-fast-blue-sat', 'belt_balancer', ('networks/4x4', '10', '4', '--fast', '--underground-length', '8'), True),
+    Instance('belt_balancer/8x8-fast-blue-sat', 'belt_balancer', ('networks/8x8', '12', '8', '--fast', '--underground-length', '8'), True),
+    Instance('belt_balancer/4x4-fast-unbounded-sat', 'belt_balancer', ('networks/4x4', '16', '4', '--fast', '--underground-length', '-1'), True),
+    Instance('make_block/16x16-blue', 'make_block', ('16', '16', '--underground-length', '8'), True),
+    Instance('interchange/12x8-blue', 'interchange', ('12', '8', '--underground-length', '8'), True),
+)
+
+
+def measure_size(instance: Instance, encoding: str) -> Dict[str, Any]:
+    from factorio_sat.encoding_report import EncodingReport
+
+    module = importlib.import_module('factorio_sat.' + instance.tool)
+    args = module.get_parser().parse_args(list(instance.argv) + ['--underground-encoding', encoding])
+    with EncodingReport() as report:
+        grid = module.create_grid(args)
+    summary = report.summary(grid)
+
+    families = [summary['passes'][name] for name in FAMILIES if name in summary['passes']]
+    return {
+        'clauses': sum(stats['clauses'] for stats in families),
+        'literals': sum(stats['literals'] for stats in families),
+        'variables': sum(stats['variables'] for stats in families),
+        'total_clauses': summary['total']['clauses'],
+        'total_literals': summary['total']['literals'],
+    }
+
+
+def format_size_result(result: Dict[str, Any]) -> str:
+    summary = result['summary']
+    return (f'{result["name"]:<50} {summary["clauses"]["median"]:>8.0f} clauses {summary["literals"]["median"]:>9.0f} literals '
+            f'{summary["variables"]["median"]:>7.0f} variables ({100 * summary["literals"]["median"] / summary["total_literals"]["median"]:.1f}% of literals)')
+
+
+def format_solve_result(result: Dict[str, Any]) -> str:
+    failed = [run for run in result['runs'] if run.get('timeout') or 'error' in run]
+    if len(failed) != 0:
+        return f'{result["name"]}: ' + ('timed out' if failed[0].get('timeout') else failed[0]['error'])
+    summary = result['summary']
+    return (f'{result["name"]:<50} encode {summary["encode_time"]["median"]:.3f}s, solve {summary["solve_time"]["median"]:.3f}s, '
+            f'{summary["clauses"]["median"]:.0f} clauses')
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Compares the window and ladder encodings of the underground length rules')
+    add_common_arguments(parser, DEFAULT_REPETITIONS)
+    parser.add_argument('--solver', type=str, default=DEFAULT_SOLVER, help='Backend SAT solver to use')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT, help='Seconds before a single run is abandoned')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = get_parser().parse_args(argv)
+
+    cases = {}
+    for kind in ('size', 'solve'):
+        for instance in INSTANCES:
+            for encoding in ENCODINGS:
+                cases[f'{kind}/{instance.name}/{encoding}'] = kind, instance, encoding
+    names = select(cases.keys(), args.filter)
+    if args.list:
+        for name in names:
+            _, instance, encoding = cases[name]
+            print(f'{name:<50} {instance.tool} {" ".join(instance.argv)} --underground-encoding {encoding}')
+        return
+    if len(names) == 0:
+        raise RuntimeError('No benchmarks match the filter')
+
+    if args.output is not None:
+        args.output = os.path.abspath(args.output)
+    os.chdir(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    seed_everything(args.seed)
+
+    results = []
+    for name in names:
+        kind, instance, encoding = cases[name]
+        if kind == 'size':
+            runs = [measure_size(instance, encoding)]
+            result = {'name': name, 'tool': instance.tool, 'argv': list(instance.argv), 'encoding': encoding,
+                      'runs': runs, 'summary': summarise_runs(runs, SIZE_METRICS)}
+            print(format_size_result(result), file=sys.stderr, flush=True)
+        else:
+            result = run_instance(Instance(instance.name, instance.tool, instance.argv + ('--underground-encoding', encoding), instance.satisfiable),
+                                  args.solver, args.seed, args.repetitions, args.timeout)
+            result['name'] = name
+            result['encoding'] = encoding
+            print(format_solve_result(result), file=sys.stderr, flush=True)
+        results.append(result)
+
+    settings = {
+        'solver': args.solver,
+        'seed': args.seed,
+        'repetitions': args.repetitions,
+        'timeout': args.timeout,
+    }
+    write_results('underground', settings, results, args.output)
+
+
+if __name__ == '__main__':
+    main()
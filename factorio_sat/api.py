@@ -0,0 +1,173 @@
+import argparse
+import asyncio
+import contextlib
+import io
+import multiprocessing
+import os
+from dataclasses import asdict, dataclass
+from typing import Any, AsyncIterator, Optional, Tuple
+
+from . import belt_balancer, enumeration
+from .cache import open_cache
+from .constraint_groups import ConstraintGroups
+from .network import deduplicate_network, open_network
+from .symmetry import Deduplicator
+
+# Solutions are returned in the same form the command line tools print them: nested lists of tile dictionaries
+Solution = Any
+
+
+@dataclass
+class BalancerOptions:
+    # Mirrors the belt_balancer command line flags
+    turn_90: bool = False
+    turn_180: bool = False
+    custom: bool = False
+    edge_splitters: bool = False
+    edge_belts: bool = False
+    glue_splitters: bool = False
+    expand_underground: bool = False
+    prevent_mergeable_underground: bool = False
+    prevent_bad_patterns: bool = False
+    break_symmetry: bool = False
+    use_ends: bool = False
+    fast: bool = False
+    aligned: bool = False
+    underground_length: int = 4
+    node_encoding: str = 'auto'  # See cardinality.AMO_ENCODING_NAMES
+    cardinality: Tuple[str, ...] = ()  # [SITE=]ENCODING choices, as would be passed with --cardinality
+    underground_encoding: str = 'window'  # See util.UNDERGROUND_ENCODINGS
+    colour_encoding: str = 'binary'  # See util.COLOUR_ENCODINGS
+    solver: str = 'Glucose3'
+    cache: Optional[str] = None
+    projection: str = 'tiles'  # What makes two enumerated balancers different, see enumeration.PROJECTIONS
+    dedupe: Optional[str] = None  # Symmetry group enumerated balancers are deduplicated under, see symmetry.GROUPS
+    translations: bool = False
+    block_orbits: bool = False
+    partial: Optional[str] = None  # Contents of a partial balancer, as would be passed with --partial
+    guard: Tuple[str, ...] = ()  # Patterns of constraint passes to guard, as would be passed with --guard
+    disable_group: Tuple[str, ...] = ()  # Guarded constraint passes to solve without, see constraint_groups
+
+    def to_namespace(self, width: int, height: int) -> argparse.Namespace:
+        args = argparse.Namespace(width=width, height=height, **asdict(self))
+        if self.partial is not None:
+            args.partial = io.StringIO(self.partial)
+        return args
+
+
+def load_network(network):
+    if isinstance(network, (str, os.PathLike)):
+        with open(network) as f:
+            return open_network(f)
+    return network
+
+
+def balancer_worker(connection, network, width: int, height: int, options: BalancerOptions, enumerate_all: bool):
+    try:
+        args = options.to_namespace(width, height)
+        with ConstraintGroups(options.guard) if len(options.guard) != 0 else contextlib.nullcontext():
+            grid = belt_balancer.build_balancer(deduplicate_network(network), args)
+        solutions = grid.itersolve(solver=options.solver, ignore_colour=True, cache=open_cache(options.cache), projection=options.projection,
+                                   orbit=enumeration.get_orbit(grid, args), disabled_groups=options.disable_group)
+        if options.dedupe is not None:
+            solutions = Deduplicator(options.dedupe, options.translations).filter(solutions)
+
+        for solution in solutions:
+            connection.send(('solution', solution.tolist()))
+            if not enumerate_all:
+                break
+        connection.send(('done', None))
+    except BaseException as e:
+        connection.send(('error', e))
+    finally:
+        connection.close()
+
+
+async def run_worker(network, width: int, height: int, options: Optional[BalancerOptions], enumerate_all: bool,
+                     limit: Optional[asyncio.Semaphore]) -> AsyncIterator[Solution]:
+    if options is None:
+        options = BalancerOptions()
+    network = load_network(network)
+
+    if limit is not None:
+        await limit.acquire()
+
+    loop = asyncio.get_running_loop()
+    receiver, sender = multiprocessing.Pipe(duplex=False)
+    process = multiprocessing.Process(target=balancer_worker, args=(sender, network, width, height, options, enumerate_all), daemon=True)
+    try:
+        process.start()
+        sender.close()  # Only the worker holds the sending end, so a dead worker shows up as EOFError
+
+        while True:
+            try:
+                kind, value = await loop.run_in_executor(None, receiver.recv)
+            except EOFError:
+                raise RuntimeError(f'Solver worker exited unexpectedly (exit code {process.exitcode})')
+
+            if kind == 'solution':
+                yield value
+            elif kind == 'done':
+                break
+            elif kind == 'error':
+                raise value
+            else:
+                assert False
+    finally:
+        # Reached on completion, on error and when the awaiting task is cancelled, the worker never outlives its caller
+        if process.is_alive():
+            process.kill()
+        if process.pid is not None:
+            await loop.run_in_executor(None, process.join)
+        receiver.close()
+        if limit is not None:
+            limit.release()
+
+
+async def generate_balancer(network, width: int, height: int, options: Optional[BalancerOptions] = None,
+                            limit: Optional[asyncio.Semaphore] = None) -> Optional[Solution]:
+    solutions = run_worker(network, width, height, options, False, limit)
+    try:
+        async for solution in solutions:
+            return solution
+        return None
+    finally:
+        await solutions.aclose()
+
+
+async def enumerate_balancers(network, width: int, height: int, options: Optional[BalancerOptions] = None,
+                              limit: Optional[asyncio.Semaphore] = None) -> AsyncIterator[Solution]:
+    solutions = run_worker(network, width, height, options, True, limit)
+    try:
+        async for solution in solutions:
+            yield solution
+    finally:
+        await solutions.aclose()
+
+
+class BalancerPool:
+    def __init__(self, max_workers: Optional[int] = None):
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if max_workers < 1:
+            raise RuntimeError('At least one worker is required')
+
+        self.max_workers = max_workers
+        self.limit = asyncio.Semaphore(max_workers)
+
+    async def generate_balancer(self, network, width: int, height: int, options: Optional[BalancerOptions] = None) -> Optional[Solution]:
+        return await generate_balancer(network, width, height, options, self.limit)
+
+    def enumerate_balancers(self, network, width: int, height: int, options: Optional[BalancerOptions] = None) -> AsyncIterator[Solution]:
+        return enumerate_balancers(network, width, height, options, self.limit)
+
+    async def map(self, network, sizes, options: Optional[BalancerOptions] = None) -> Tuple[Optional[Solution], ...]:
+        return tuple(await asyncio.gather(*(self.generate_balancer(network, width, height, options) for width, height in sizes)))
+
+
+__all__ = [
+    'BalancerOptions',
+    'BalancerPool',
+    'enumerate_balancers',
+    'generate_balancer',
+]
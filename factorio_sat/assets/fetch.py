@@ -1,5 +1,6 @@
 import argparse
 import glob
+import importlib.util
 import json
 import shutil
 import sys
@@ -7,13 +8,11 @@ import os
 
 from os import path
 
-ASSETS_DIR = path.join(os.getenv("XDG_DATA_HOME"), "factorio-sat/assets")
 
-try:
-    from luaparser import ast
-except ModuleNotFoundError:
-    print('"luaparser" not installed: recipe fetching will be disabled')
-    ast = None
+def get_assets_directory() -> str:
+    # Read when the assets are used rather than at import, $XDG_DATA_HOME is optional and defaults to ~/.local/share
+    data_home = os.getenv('XDG_DATA_HOME') or path.expanduser(path.join('~', '.local', 'share'))
+    return path.join(data_home, 'factorio-sat', 'assets')
 
 
 def copy_game_tilemaps(base_dir: str, assets_dir: str):
@@ -59,6 +58,8 @@ def copy_game_tilemaps(base_dir: str, assets_dir: str):
 
 
 def decode_lua_data(text):
+    from luaparser import ast
+
     tree = ast.parse(text)
 
     invoke, = tree.body.body
@@ -177,10 +178,13 @@ def main():
 
     game_base_dir = path.join(game_directory, 'data', 'base')
 
-    os.makedirs(ASSETS_DIR, exist_ok=True)
-    copy_game_tilemaps(game_base_dir, ASSETS_DIR)
-    if ast is not None:
-        copy_game_recipes(game_base_dir, ASSETS_DIR)
+    assets_dir = get_assets_directory()
+    os.makedirs(assets_dir, exist_ok=True)
+    copy_game_tilemaps(game_base_dir, assets_dir)
+    if importlib.util.find_spec('luaparser') is not None:
+        copy_game_recipes(game_base_dir, assets_dir)
+    else:
+        print('"luaparser" not installed: recipe fetching will be disabled')
 
 
 if __name__ == '__main__':
@@ -0,0 +1,103 @@
+import queue
+import threading
+import weakref
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+DEFAULT_QUEUE_SIZE = 16
+
+_END = object()
+
+
+def threaded(items: Iterator[Any], queue_size: int = DEFAULT_QUEUE_SIZE, wait: bool = False,
+             stop: Optional[Callable[[threading.Thread], None]] = None) -> Iterator[Any]:
+    # Runs the upstream stages in their own thread, the bounded queue stops a fast producer running ahead of a slow consumer
+    buffer: 'queue.Queue[Any]' = queue.Queue(queue_size)
+    error: List[BaseException] = []
+    stopped = threading.Event()
+
+    def put(item: Any):
+        while not stopped.is_set():
+            try:
+                buffer.put(item, timeout=0.1)
+                return True
+            except queue.Full:
+                pass
+        return False
+
+    def producer():
+        try:
+            for item in items:
+                if not put(item):
+                    break
+        except BaseException as e:
+            error.append(e)
+        finally:
+            if wait and hasattr(items, 'close'):
+                items.close()  # Cleanup of a generator runs on the thread that was driving it
+            put(_END)
+
+    thread = threading.Thread(target=producer, daemon=True)
+    thread.start()
+    try:
+        while True:
+            item = buffer.get()
+            if item is _END:
+                break
+            yield item
+    finally:
+        # The producer may still be blocked upstream when the consumer stops early (or is interrupted). stop cuts that
+        # short so waiting for it returns promptly, without wait it is left to finish on its own.
+        stopped.set()
+        if stop is not None:
+            stop(thread)
+        if wait:
+            thread.join()
+    if len(error) != 0:
+        raise error[0]
+
+
+_solving: Dict[threading.Thread, Any] = {}
+_interrupted: 'weakref.WeakSet[threading.Thread]' = weakref.WeakSet()
+_solving_lock = threading.Lock()
+
+
+def solve_releasing_gil(s, assumptions: List[int] = []) -> Optional[bool]:
+    # pysat only releases the GIL while solving when it expects to be interrupted, a plain solve() holds every other
+    # thread up until it returns. That is only done off the main thread, where SIGINT can't reach the solve anyway and
+    # interrupt_solve stops it instead, the main thread keeps the plain solve so Ctrl-C still works. IPASIR solvers are
+    # called through ctypes, which releases the GIL either way.
+    thread = threading.current_thread()
+    if thread is threading.main_thread() or not hasattr(s, 'solve_limited'):
+        return s.solve(assumptions=assumptions)
+
+    with _solving_lock:
+        if thread in _interrupted:
+            raise RuntimeError('Solve interrupted')
+        _solving[thread] = s
+    try:
+        satisfiable = s.solve_limited(assumptions=assumptions, expect_interrupt=True)
+    finally:
+        with _solving_lock:
+            del _solving[thread]
+            interrupted = thread in _interrupted
+    if interrupted:
+        s.clear_interrupt()  # A warm solver stays usable for the next request
+        raise RuntimeError('Solve interrupted')
+    return satisfiable
+
+
+def interrupt_solve(thread: threading.Thread):
+    # Stops the search running on thread, and any it starts later
+    with _solving_lock:
+        _interrupted.add(thread)
+        s = _solving.get(thread)
+        if s is not None:
+            s.interrupt()
+
+
+__all__ = [
+    'DEFAULT_QUEUE_SIZE',
+    'interrupt_solve',
+    'solve_releasing_gil',
+    'threaded',
+]
@@ -1,21 +1,27 @@
-import argparse
-import json
-from typing import Sequence
+from __future__ import annotations
 
-from pysat.card import EncType
-import numpy as np
+import argparse
+from typing import TYPE_CHECKING, List, Optional, Sequence
 
 from .direction import Direction
-from . import optimisations
 from . import blueprint
-from .cardinality import library_atleast, library_equals, quadratic_one
+from . import capture, encoding_report, enumeration, estimate, constraint_groups, packed, profiling, serve
+from .cache import CACHE_ENVIRONMENT_VARIABLE, open_cache
+from .cardinality import AMO_ENCODING_NAMES, Cardinality, add_cardinality_arguments, parse_cardinality_choices
+from .encoding_report import constraint_pass
 from .network import deduplicate_network, get_input_output_colours, open_network
-from .solver import Grid, TileTemplate
-from .template import EdgeMode, OneHotTemplate
 from .tile import EmptyTile, Belt
-from .util import implies, invert_components, literals_different, set_all_false, set_number, set_numbers
+from .util import COLOUR_ENCODINGS, UNDERGROUND_ENCODINGS, implies, invert_components, literals_different, set_all_false
+
+# The encoding (NumPy, pysat and the templates) is imported by the functions building it, --help and --server don't need it
+if TYPE_CHECKING:
+    from .solver import Grid, TileTemplate
 
+# Where the cardinality constraints are, each can be given its own encoding with --cardinality
+CARDINALITY_SITES = ('checkerboard', 'nodes', 'inputs', 'outputs', 'edge_splitters')
 
+
+@constraint_pass
 def setup_balancer_ends_with_offsets(grid, network, start_offset: int, end_offset: int):
     (input_colour, input_count), (output_colour, output_count) = get_input_output_colours(network)
 
@@ -42,7 +48,10 @@ def setup_balancer_ends_with_offsets(grid, network, start_offset: int, end_offse
         grid.set_tile(grid.width - 1, y, EmptyTile())
 
 
+@constraint_pass
 def setup_balancer_input(grid: Grid, tiles: Sequence[TileTemplate], direction: int, count: int, rest_empty: bool = True):
+    from .cardinality import quadratic_one
+
     assert count <= len(tiles)
     offsets = [grid.allocate_variable() for _ in range(len(tiles) - count)]
 
@@ -64,7 +73,10 @@ def setup_balancer_input(grid: Grid, tiles: Sequence[TileTemplate], direction: i
     return offsets
 
 
+@constraint_pass
 def setup_balancer_output(grid: Grid, tiles: Sequence[TileTemplate], direction: int, count: int, rest_empty: bool = True):
+    from .cardinality import quadratic_one
+
     assert count <= len(tiles)
     offsets = [grid.allocate_variable() for _ in range(len(tiles) - count)]
 
@@ -86,6 +98,7 @@ def setup_balancer_output(grid: Grid, tiles: Sequence[TileTemplate], direction:
     return offsets
 
 
+@constraint_pass
 def setup_balancer_ends(grid: Grid, network, aligned: bool, use_ends: bool):
     (_, input_count), (_, output_count) = get_input_output_colours(network.elements())
 
@@ -104,6 +117,7 @@ def setup_balancer_ends(grid: Grid, network, aligned: bool, use_ends: bool):
                 grid.clauses += implies([end_offset], [start_offsets[i:(i + 1 + output_count - input_count)]])
 
 
+@constraint_pass
 def setup_balancer_ends_90(grid: Grid, network, use_ends: bool):
     (_, input_count), (_, output_count) = get_input_output_colours(network.elements())
 
@@ -113,6 +127,7 @@ def setup_balancer_ends_90(grid: Grid, network, use_ends: bool):
     setup_balancer_output(grid, end_tiles, 3, output_count, not use_ends)
 
 
+@constraint_pass
 def setup_balancer_ends_180(grid: Grid, network):
     (_, input_count), (_, output_count) = get_input_output_colours(network.elements())
 
@@ -121,7 +136,13 @@ def setup_balancer_ends_180(grid: Grid, network):
     setup_balancer_output(grid, tiles, 2, output_count, rest_empty=False)
 
 
-def create_balancer(network, width: int, height: int, underground_length: int) -> Grid:
+@constraint_pass
+def create_balancer(network, width: int, height: int, underground_length: int, node_encoding: str = 'auto',
+                    cardinality: Optional[Cardinality] = None, colour_encoding: str = 'binary') -> Grid:
+    from .cardinality import exactly_one
+    from .solver import Grid
+    from .template import EdgeMode, OneHotTemplate
+
     assert width > 0 and height > 0
 
     all_colours = set()
@@ -130,7 +151,10 @@ def create_balancer(network, width: int, height: int, underground_length: int) -
             all_colours.add(colour)
     all_colours.discard(None)
 
-    grid = Grid(width, height, max(all_colours) + 1, underground_length, {'node': OneHotTemplate(len(network))})
+    if cardinality is None:
+        cardinality = Cardinality()
+
+    grid = Grid(width, height, max(all_colours) + 1, underground_length, {'node': OneHotTemplate(len(network))}, colour_encoding=colour_encoding)
     for colour in range(max(all_colours) + 1):
         if colour in all_colours:
             continue
@@ -141,26 +165,26 @@ def create_balancer(network, width: int, height: int, underground_length: int) -
     grid.prevent_bad_colouring(EdgeMode.NO_WRAP)
 
     checkerboard = [grid.get_tile_instance(x, y).is_splitter for x in range(grid.width) for y in range(grid.height) if (x + y) % 2]
-    grid.clauses += library_equals(checkerboard, sum(network.values()), grid.pool)
+    grid.clauses += cardinality.equals('checkerboard', checkerboard, sum(network.values()), grid.pool)
 
-    # There is exactly one splitter of each type
+    # There is exactly one splitter of each type, counted by column so a shared count can be reused for the edge columns
     for i, count in enumerate(network.values()):
-        literals = [grid.get_tile_instance(x, y).node[i] for x in range(grid.width) for y in range(grid.height)]
-        grid.clauses += library_equals(literals, count, grid.pool, EncType.kmtotalizer)
+        columns = [[grid.get_tile_instance(x, y).node[i] for y in range(grid.height)] for x in range(grid.width)]
+        grid.clauses += cardinality.equals('nodes', sum(columns, []), count, grid.pool, columns)
 
-    # Each splitter has one type
+    # Each splitter has one type, pairwise this grows with the square of the number of types
     for x in range(grid.width):
         for y in range(grid.height):
             tile = grid.get_tile_instance(x, y)
-            grid.clauses += quadratic_one([-tile.is_splitter_head, *tile.node])
+            grid.clauses += exactly_one([-tile.is_splitter_head, *tile.node], grid.allocate_variable, node_encoding)
 
     (input_colour, input_count), (output_colour, output_count) = get_input_output_colours(network.elements())
 
     is_inputs = [grid.get_tile_instance(x, y).is_input for x in range(grid.width) for y in range(grid.height)]
-    grid.clauses += library_equals(is_inputs, input_count, grid.pool)
+    grid.clauses += cardinality.equals('inputs', is_inputs, input_count, grid.pool)
 
     is_outputs = [grid.get_tile_instance(x, y).is_output for x in range(grid.width) for y in range(grid.height)]
-    grid.clauses += library_equals(is_outputs, output_count, grid.pool)
+    grid.clauses += cardinality.equals('outputs', is_outputs, output_count, grid.pool)
 
     for i, (input_colours, output_colours) in enumerate(network):
         assert sum(colour is None for colour in input_colours + output_colours) <= 1
@@ -168,8 +192,8 @@ def create_balancer(network, width: int, height: int, underground_length: int) -
         for x in range(grid.width):
             for y in range(grid.height):
                 tile00 = grid.get_tile_instance(x, y)
-                grid.clauses += implies([tile00.is_input], set_number(input_colour, tile00.colour))
-                grid.clauses += implies([tile00.is_output], set_number(output_colour, tile00.colour))
+                grid.clauses += implies([tile00.is_input], grid.set_colour_value(input_colour, tile00.colour))
+                grid.clauses += implies([tile00.is_output], grid.set_colour_value(output_colour, tile00.colour))
                 if any(colour is None for colour in input_colours):
                     assert not any(colour is None for colour in output_colours)
                     grid.clauses.append([-tile00.node[i], *tile00.output_direction])
@@ -204,11 +228,11 @@ def create_balancer(network, width: int, height: int, underground_length: int) -
                             colour = colour_b
                             assert colour is not None
                         grid.clauses += implies(precondition, literals_different(tile00.input_direction[direction], tile01.input_direction[direction]))
-                        grid.clauses += implies(precondition + [tile00.input_direction[direction]], set_number(colour, tile00.colour))
-                        grid.clauses += implies(precondition + [tile01.input_direction[direction]], set_number(colour, tile01.colour))
+                        grid.clauses += implies(precondition + [tile00.input_direction[direction]], grid.set_colour_value(colour, tile00.colour))
+                        grid.clauses += implies(precondition + [tile01.input_direction[direction]], grid.set_colour_value(colour, tile01.colour))
                     else:
                         grid.clauses += implies(precondition, [[tile00.input_direction[direction]], [tile01.input_direction[direction]]])
-                        grid.clauses += implies(precondition, set_numbers(*input_colours, tile00.colour, tile01.colour))
+                        grid.clauses += implies(precondition, grid.set_colour_values(*input_colours, tile00.colour, tile01.colour))
 
                     colour_a, colour_b = output_colours
                     if colour_a is None or colour_b is None:
@@ -218,15 +242,19 @@ def create_balancer(network, width: int, height: int, underground_length: int) -
                             assert colour is not None
 
                         grid.clauses += implies(precondition, literals_different(tile00.output_direction[direction], tile01.output_direction[direction]))
-                        grid.clauses += implies(precondition + [tile00.output_direction[direction]], set_number(colour, tile10.colour))
-                        grid.clauses += implies(precondition + [tile01.output_direction[direction]], set_number(colour, tile11.colour))
+                        grid.clauses += implies(precondition + [tile00.output_direction[direction]], grid.set_colour_value(colour, tile10.colour))
+                        grid.clauses += implies(precondition + [tile01.output_direction[direction]], grid.set_colour_value(colour, tile11.colour))
                     else:
                         grid.clauses += implies(precondition, [[tile00.output_direction[direction]], [tile01.output_direction[direction]]])
-                        grid.clauses += implies(precondition, set_numbers(*output_colours, tile10.colour, tile11.colour))
+                        grid.clauses += implies(precondition, grid.set_colour_values(*output_colours, tile10.colour, tile11.colour))
     return grid
 
 
-def enforce_edge_splitters(grid: Grid, network):
+@constraint_pass
+def enforce_edge_splitters(grid: Grid, network, cardinality: Optional[Cardinality] = None):
+    if cardinality is None:
+        cardinality = Cardinality()
+
     (network_input_colour, _), (network_output_colour, _) = get_input_output_colours(network.elements())
 
     recirculate_input = 0
@@ -244,22 +272,22 @@ def enforce_edge_splitters(grid: Grid, network):
     if recirculate_input == 0:
         for i, count in input_splitters:
             literals = [grid.get_tile_instance(1, y).node[i] for y in range(grid.height)]
-            grid.clauses += library_equals(literals, count, grid.pool, EncType.kmtotalizer)
+            grid.clauses += cardinality.equals('edge_splitters', literals, count, grid.pool)
             for y in range(grid.height):
                 tile = grid.get_tile_instance(1, y)
                 grid.clauses += implies([tile.node[i]], [[tile.input_direction[0], tile.output_direction[0]]])
     else:
         edge_splitter_min = sum(count for _, count in input_splitters) - recirculate_input
         if edge_splitter_min > 0:
-            literals = [grid.get_tile_instance(1, y).node[i] for y in range(grid.height) for i, _ in input_splitters]
-            grid.clauses += library_atleast(literals, edge_splitter_min, grid.pool)
+            columns = [[grid.get_tile_instance(1, y).node[i] for y in range(grid.height)] for i, _ in input_splitters]
+            grid.clauses += cardinality.atleast('edge_splitters', sum(columns, []), edge_splitter_min, grid.pool, columns)
 
     output_splitters = [(i, count) for i, ((_, output_colours), count) in enumerate(network.items())
                         if all(colour == network_output_colour for colour in output_colours)]
     if recirculate_output == 0:
         for i, count in output_splitters:
             literals = [grid.get_tile_instance(grid.width - 2, y).node[i] for y in range(grid.height)]
-            grid.clauses += library_equals(literals, count, grid.pool, EncType.kmtotalizer)
+            grid.clauses += cardinality.equals('edge_splitters', literals, count, grid.pool)
 
             # grid.clauses.append([grid.get_tile_instance(grid.width - 2, y).node[i] for y in range(grid.height)])
             for y in range(grid.height):
@@ -268,10 +296,11 @@ def enforce_edge_splitters(grid: Grid, network):
     else:
         edge_splitter_min = sum(count for _, count in output_splitters) - recirculate_output
         if edge_splitter_min > 0:
-            literals = [grid.get_tile_instance(grid.width - 2, y).node[i] for y in range(grid.height) for i, _ in output_splitters]
-            grid.clauses += library_atleast(literals, edge_splitter_min, grid.pool)
+            columns = [[grid.get_tile_instance(grid.width - 2, y).node[i] for y in range(grid.height)] for i, _ in output_splitters]
+            grid.clauses += cardinality.atleast('edge_splitters', sum(columns, []), edge_splitter_min, grid.pool, columns)
 
 
+@constraint_pass
 def prevent_double_edge_belts(grid: Grid):
     for x in (1, max(grid.width - 2, 1)):
         for y in range(grid.height - 1):
@@ -284,14 +313,17 @@ def prevent_double_edge_belts(grid: Grid):
             ])
 
 
+@constraint_pass
 def set_nonempty_tiles(grid: Grid, blueprint_or_json: str):
+    import numpy as np
+
     tiles = blueprint.convert_to_tiles(blueprint_or_json)
     for (row, col), tile in np.ndenumerate(tiles):
         if not isinstance(tile, EmptyTile):
             grid.set_tile(col, row, tile)
 
 
-def main():
+def get_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description='Creates a belt balancer from a splitter graph')
     parser.add_argument('network', type=argparse.FileType('r'), help='Splitter network')
     parser.add_argument('width', type=int, help='Belt balancer maximum width')
@@ -316,14 +348,35 @@ def main():
     parser.add_argument('--fast', action='store_true', help='Enables all speed improving options')
     parser.add_argument('--aligned', action='store_true', help='Enforces balancer input aligns with output')
     parser.add_argument('--underground-length', type=int, default=4, help='Sets the maximum length of underground section (excludes ends)')
+    parser.add_argument('--underground-encoding', type=str, choices=UNDERGROUND_ENCODINGS, default='window',
+                        help='Encoding of the underground length rules (ladder grows linearly with the underground length rather than quadratically)')
+    parser.add_argument('--colour-encoding', type=str, choices=COLOUR_ENCODINGS, default='binary',
+                        help='Encoding of the colour of each belt (one_hot and order use more variables, which is fastest depends on the network)')
+    parser.add_argument('--node-encoding', type=str, choices=AMO_ENCODING_NAMES, default='auto',
+                        help='At most one encoding of the splitter type of each tile (auto is pairwise for small networks)')
+    add_cardinality_arguments(parser, CARDINALITY_SITES)
     parser.add_argument('--all', action='store_true', help='Generate all belt balancers')
     parser.add_argument('--solver', type=str, default='Glucose3', help='Backend SAT solver to use')
+    parser.add_argument('--cache', type=str, help=f'Directory of cached solver results (defaults to ${CACHE_ENVIRONMENT_VARIABLE})')
+    parser.add_argument('--server', type=str, help='Forward the request to a running "serve" process at this address')
+    packed.add_output_arguments(parser)
+    enumeration.add_enumeration_arguments(parser)
+    encoding_report.add_report_arguments(parser)
+    constraint_groups.add_group_arguments(parser)
+    profiling.add_profile_arguments(parser)
+    estimate.add_estimate_arguments(parser)
+    capture.add_capture_arguments(parser)
     parser.add_argument('--partial', type=argparse.FileType('r'), help='Partial balancer to base solution from')
+    return parser
+
 
-    args = parser.parse_args()
+def build_balancer(network, args) -> Grid:
+    from . import optimisations
+    from .template import EdgeMode
 
-    if args.underground_length == -1:
-        args.underground_length = float('inf')
+    underground_length = args.underground_length
+    if underground_length == -1:
+        underground_length = float('inf')
 
     if args.edge_splitters and args.edge_belts:
         raise RuntimeError('--edge-splitters and --edge-belts are mutually exclusive')
@@ -334,16 +387,12 @@ def main():
     if args.break_symmetry and args.turn_90:
         raise RuntimeError('--break-symmetry and --90 are mutually exclusive')
 
-    network = open_network(args.network)
-    args.network.close()
-
-    network = deduplicate_network(network)
-
-    grid = create_balancer(network, args.width, args.height, args.underground_length)
+    cardinality = Cardinality(parse_cardinality_choices(args.cardinality, CARDINALITY_SITES))
+    grid = create_balancer(network, args.width, args.height, underground_length, args.node_encoding, cardinality, args.colour_encoding)
     grid.prevent_intersection(EdgeMode.NO_WRAP)
 
     if args.edge_splitters or args.fast:
-        enforce_edge_splitters(grid, network)
+        enforce_edge_splitters(grid, network, cardinality)
     if args.edge_belts:
         prevent_double_edge_belts(grid)
     if args.glue_splitters or args.fast:
@@ -363,8 +412,8 @@ def main():
         optimisations.prevent_zigzags(grid, EdgeMode.NO_WRAP)
         optimisations.prevent_belt_parallel_splitter(grid, EdgeMode.NO_WRAP)
 
-    grid.enforce_maximum_underground_length(EdgeMode.NO_WRAP)
-    optimisations.prevent_empty_along_underground(grid, EdgeMode.NO_WRAP)
+    grid.enforce_maximum_underground_length(EdgeMode.NO_WRAP, args.underground_encoding)
+    optimisations.prevent_empty_along_underground(grid, EdgeMode.NO_WRAP, args.underground_encoding)
 
     if args.partial is not None:
         with args.partial:
@@ -379,10 +428,33 @@ def main():
     else:
         setup_balancer_ends(grid, network, args.aligned, args.use_ends)
 
-    for solution in grid.itersolve(solver=args.solver, ignore_colour=True):
-        print(json.dumps(solution.tolist()))
-        if not args.all:
-            break
+    return grid
+
+
+def create_grid(args) -> Grid:
+    with args.network:
+        network = open_network(args.network)
+
+    return build_balancer(deduplicate_network(network), args)
+
+
+def main(argv: Optional[List[str]] = None):
+    args = get_parser().parse_args(argv)
+
+    if args.server is not None:
+        serve.forward(args.server, 'belt_balancer', argv)
+        return
+
+    if args.estimate_only:
+        estimate.write_estimate(estimate.estimate_generator(create_grid, args))
+        return
+
+    with profiling.profiled(args), capture.captured(args, 'belt_balancer', argv):
+        grid = encoding_report.build_grid(create_grid, args)
+        with packed.open_output(args) as writer:
+            models = grid.itermodels(solver=args.solver, ignore_colour=True, cache=open_cache(args.cache), projection=args.projection,
+                                     orbit=enumeration.get_orbit(grid, args), disabled_groups=args.disable_group)
+            enumeration.write_models(grid, models, args, writer)
 
 
 if __name__ == '__main__':
@@ -1,16 +1,26 @@
+from __future__ import annotations
+
 import argparse
-import json
 import math
 import sys
 import warnings
+from typing import TYPE_CHECKING, Any, List, Optional
 
 from . import belt_balancer
-from . import optimisations
+from . import capture, encoding_report, enumeration, estimate, constraint_groups, packed, profiling, serve
+from .cache import CACHE_ENVIRONMENT_VARIABLE, open_cache
 from .direction import Direction
-from .cardinality import quadratic_amo, quadratic_one
-from .solver import Grid
-from .template import ArrayTemplate, BoolTemplate, EdgeMode, NumberTemplate, flatten
-from .util import add_numbers, implies, literals_same, make_fixed_allocator, set_all_false, set_maximum, set_number, set_numbers_equal
+from .encoding_report import constraint_pass
+from .util import (ClauseList, LiteralType, add_numbers, add_order_numbers, implies, literals_same, make_fixed_allocator, set_all_false, set_maximum,
+                   set_number, set_numbers_equal, set_order_ladder, set_order_number)
+
+if TYPE_CHECKING:
+    from .solver import Grid
+
+# How flows are represented: bits of the flow added with ripple carry adders, or order encoded (literal i set when the flow
+# is greater than i) where halving and adding are bounds on the literals. Order flows need as many literals as the largest
+# flow, so they suit the sizes where that is small (powers of two)
+FLOW_ENCODINGS = ('binary', 'order')
 
 
 def lcm(*args):
@@ -26,7 +36,75 @@ def next_power_of_two(x: int) -> int:
     return 1 << max(x - 1, 0).bit_length()
 
 
-def create_n_to_n_balancer(width: int, height: int, underground_length: int, size: int) -> Grid:
+def flow_template(flow_encoding: str, maximum: int) -> Any:
+    from .template import NumberTemplate, OrderTemplate
+
+    if flow_encoding == 'binary':
+        return NumberTemplate(maximum.bit_length())
+    elif flow_encoding == 'order':
+        return OrderTemplate(maximum)
+    else:
+        raise RuntimeError(f'Unknown flow encoding: {flow_encoding}')
+
+
+def carry_bits(flow_encoding: str, maximum: int) -> int:
+    # Carries of the adders, order flows have none
+    return maximum.bit_length() if flow_encoding == 'binary' else 0
+
+
+def bound_flow(flow_encoding: str, maximum: int, flow: List[LiteralType]) -> ClauseList:
+    if flow_encoding == 'binary':
+        return set_maximum(maximum, flow)
+    return set_order_ladder(flow)
+
+
+def set_flow(flow_encoding: str, value: int, flow: List[LiteralType]) -> ClauseList:
+    if flow_encoding == 'binary':
+        return set_number(value, flow)
+    return set_order_number(value, flow)
+
+
+def top_flow(flow_encoding: str, maximum: int, flow: List[LiteralType]) -> LiteralType:
+    # Set when the flow is at least the top bit of the maximum
+    if flow_encoding == 'binary':
+        return flow[-1]
+    return flow[(1 << (maximum.bit_length() - 1)) - 1]
+
+
+def halve_flows(flow_encoding: str, in_flow0: List[LiteralType], in_flow1: List[LiteralType], out_flow: List[LiteralType],
+                carry: List[LiteralType]) -> ClauseList:
+    # out_flow is half the sum of the input flows
+    if flow_encoding == 'binary':
+        return [
+            *add_numbers(in_flow0[1:], in_flow1[1:], out_flow, make_fixed_allocator(carry), in_flow0[0]),
+            *literals_same(in_flow0[0], in_flow1[0]),
+        ]
+    return add_order_numbers(in_flow0, in_flow1, out_flow, 1)
+
+
+def split_flow(flow_encoding: str, in_flow: List[LiteralType], out_flow: List[LiteralType]) -> ClauseList:
+    # out_flow is half of in_flow
+    if flow_encoding == 'binary':
+        return [
+            [-in_flow[0]],
+            *set_numbers_equal(in_flow[1:], out_flow[:-1]),
+            [-out_flow[-1]],
+        ]
+    return add_order_numbers(in_flow, [], out_flow, 1)
+
+
+def add_flows(flow_encoding: str, in_flow0: List[LiteralType], in_flow1: List[LiteralType], out_flow: List[LiteralType],
+              carry: List[LiteralType]) -> ClauseList:
+    if flow_encoding == 'binary':
+        return add_numbers(in_flow0, in_flow1, out_flow, make_fixed_allocator(carry))
+    return add_order_numbers(in_flow0, in_flow1, out_flow)
+
+
+@constraint_pass
+def create_n_to_n_balancer(width: int, height: int, underground_length: int, size: int, flow_encoding: str = 'binary') -> Grid:
+    from .solver import Grid
+    from .template import ArrayTemplate, BoolTemplate, EdgeMode, flatten
+
     assert width > 0
     assert height > 0
     assert size > 0
@@ -37,14 +115,14 @@ def create_n_to_n_balancer(width: int, height: int, underground_length: int, siz
     denominator //= math.gcd(denominator, size)
 
     full_flow = size * denominator  # 2x2 -> 2, 3x3 -> 6, 4x4 -> 4, 5x5 -> 40, 6x6 -> 12
-    flow_bits = full_flow.bit_length()
+    flow = flow_template(flow_encoding, full_flow)
 
     grid = Grid(width, height, None, underground_length, {
-        'flow':       ArrayTemplate(NumberTemplate(flow_bits), (size - 1,)),
-        'flow_diff':  ArrayTemplate(BoolTemplate(), (size - 1, flow_bits)),
-        'flow_carry': ArrayTemplate(BoolTemplate(), (size - 1, flow_bits - 1)),
-        'flow_ux':    ArrayTemplate(NumberTemplate(flow_bits), (size - 1,)),
-        'flow_uy':    ArrayTemplate(NumberTemplate(flow_bits), (size - 1,)),
+        'flow':       ArrayTemplate(flow, (size - 1,)),
+        'flow_diff':  ArrayTemplate(BoolTemplate(), (size - 1, flow.size)),
+        'flow_carry': ArrayTemplate(BoolTemplate(), (size - 1, max(carry_bits(flow_encoding, full_flow) - 1, 0))),
+        'flow_ux':    ArrayTemplate(flow, (size - 1,)),
+        'flow_uy':    ArrayTemplate(flow, (size - 1,)),
     })
 
     grid.block_underground_through_edges()
@@ -54,7 +132,7 @@ def create_n_to_n_balancer(width: int, height: int, underground_length: int, siz
         grid.clauses += implies([tile.is_splitter], [tile.input_direction, tile.output_direction])
 
         for flow_component in tile.flow:
-            grid.clauses += set_maximum(full_flow, flow_component)
+            grid.clauses += bound_flow(flow_encoding, full_flow, flow_component)
 
     grid.transport_quantity(lambda tile: tile.flow, lambda tile: tile.flow_ux, lambda tile: tile.flow_uy, EdgeMode.NO_WRAP)
 
@@ -79,8 +157,7 @@ def create_n_to_n_balancer(width: int, height: int, underground_length: int, siz
 
                 for in_flow0, in_flow1, flow_carry, out_flow0, out_flow1 in zip(tile00.flow, tile01.flow, tile00.flow_carry, tile10.flow, tile11.flow):
                     grid.clauses += implies(precondition, [
-                        *add_numbers(in_flow0[1:], in_flow1[1:], out_flow0, make_fixed_allocator(flow_carry), in_flow0[0]),
-                        *literals_same(in_flow0[0], in_flow1[0]),
+                        *halve_flows(flow_encoding, in_flow0, in_flow1, out_flow0, flow_carry),
                         *set_numbers_equal(out_flow0, out_flow1),
                     ])
 
@@ -96,25 +173,31 @@ def create_n_to_n_balancer(width: int, height: int, underground_length: int, siz
         tile = grid.get_tile_instance(0, y)
         grid.clauses.append([-tile.is_splitter])
         for i, flow_component in enumerate(tile.flow):
-            grid.clauses += set_number(full_flow if y % size == i else 0, flow_component)
+            grid.clauses += set_flow(flow_encoding, full_flow if y % size == i else 0, flow_component)
 
     for y in range(grid.height):
         tile = grid.get_tile_instance(grid.width - 1, y)
         grid.clauses.append([-tile.is_splitter])
         for flow_component in tile.flow:
-            grid.clauses += set_number(denominator, flow_component)
+            grid.clauses += set_flow(flow_encoding, denominator, flow_component)
 
     return grid
 
 
-def create_n_to_m_balancer(width: int, height: int, underground_length: int, input_count: int, output_count: int) -> Grid:
+@constraint_pass
+def create_n_to_m_balancer(width: int, height: int, underground_length: int, input_count: int, output_count: int,
+                           flow_encoding: str = 'binary') -> Grid:
+    from .cardinality import quadratic_amo
+    from .solver import Grid
+    from .template import ArrayTemplate, BoolTemplate, EdgeMode, flatten
+
     assert width > 0
     assert height > 0
     assert input_count > 0
     assert output_count > 0
 
     if input_count == output_count:
-        return create_n_to_n_balancer(width, height, underground_length, input_count)
+        return create_n_to_n_balancer(width, height, underground_length, input_count, flow_encoding)
 
     # 1x2 -> 2, 1x3 -> 3, 1x4 -> 4, 1x5 -> 5, 1x6 -> 6, 1x7 -> 7, 2x2 -> 2, 2x3 -> 6, 2x4 -> 4, 2x5 -> 10,
     # full_flow = 40
@@ -131,21 +214,22 @@ def create_n_to_m_balancer(width: int, height: int, underground_length: int, inp
 
     print(forward_input_flow, forward_output_flow, backward_input_flow, backward_output_flow, file=sys.stderr)
 
-    flow_bits = max_belt_flow.bit_length()
+    flow = flow_template(flow_encoding, max_belt_flow)
+    flow_carry_bits = carry_bits(flow_encoding, max_belt_flow)
     grid = Grid(width, height, None, underground_length, {
         'forward': {
-            'flow': ArrayTemplate(NumberTemplate(flow_bits), (input_count,)),
-            'diff': ArrayTemplate(BoolTemplate(), (input_count, flow_bits)),
-            'carry': ArrayTemplate(BoolTemplate(), (input_count, flow_bits)),
-            'ux': ArrayTemplate(NumberTemplate(flow_bits), (input_count,)),
-            'uy': ArrayTemplate(NumberTemplate(flow_bits), (input_count,)),
+            'flow': ArrayTemplate(flow, (input_count,)),
+            'diff': ArrayTemplate(BoolTemplate(), (input_count, flow.size)),
+            'carry': ArrayTemplate(BoolTemplate(), (input_count, flow_carry_bits)),
+            'ux': ArrayTemplate(flow, (input_count,)),
+            'uy': ArrayTemplate(flow, (input_count,)),
         },
         'backward': {
-            'flow': ArrayTemplate(NumberTemplate(flow_bits), (output_count,)),
-            'diff': ArrayTemplate(BoolTemplate(), (output_count, flow_bits)),
-            'carry': ArrayTemplate(BoolTemplate(), (output_count, flow_bits)),
-            'ux': ArrayTemplate(NumberTemplate(flow_bits), (output_count,)),
-            'uy': ArrayTemplate(NumberTemplate(flow_bits), (output_count,)),
+            'flow': ArrayTemplate(flow, (output_count,)),
+            'diff': ArrayTemplate(BoolTemplate(), (output_count, flow.size)),
+            'carry': ArrayTemplate(BoolTemplate(), (output_count, flow_carry_bits)),
+            'ux': ArrayTemplate(flow, (output_count,)),
+            'uy': ArrayTemplate(flow, (output_count,)),
         },
     })
 
@@ -154,10 +238,10 @@ def create_n_to_m_balancer(width: int, height: int, underground_length: int, inp
 
     for tile in grid.iterate_tiles():
         for flow_component in tile.forward.flow + tile.backward.flow:
-            grid.clauses += set_maximum(max_belt_flow, flow_component)
+            grid.clauses += bound_flow(flow_encoding, max_belt_flow, flow_component)
 
         for flow_direction in (tile.forward.flow, tile.backward.flow):
-            top_bits = [flow_component[-1] for flow_component in flow_direction]
+            top_bits = [top_flow(flow_encoding, max_belt_flow, flow_component) for flow_component in flow_direction]
             grid.clauses += quadratic_amo(top_bits)
 
     grid.transport_quantity(lambda tile: tile.forward.flow, lambda tile: tile.forward.ux, lambda tile: tile.forward.uy, EdgeMode.NO_WRAP)
@@ -220,8 +304,7 @@ def create_n_to_m_balancer(width: int, height: int, underground_length: int, inp
                         tile11.forward.flow,
                         tile00.forward.carry):
                     grid.clauses += implies(fully_connected_precondition, [
-                        *add_numbers(in_flow0[1:], in_flow1[1:], out_flow0, make_fixed_allocator(flow_carry), in_flow0[0]),
-                        *literals_same(in_flow0[0], in_flow1[0]),
+                        *halve_flows(flow_encoding, in_flow0, in_flow1, out_flow0, flow_carry),
                         *set_numbers_equal(out_flow0, out_flow1),
                     ])
 
@@ -232,8 +315,7 @@ def create_n_to_m_balancer(width: int, height: int, underground_length: int, inp
                         tile11.backward.flow,
                         tile00.backward.carry):
                     grid.clauses += implies(fully_connected_precondition, [
-                        *add_numbers(in_flow0[1:], in_flow1[1:], out_flow0, make_fixed_allocator(flow_carry), in_flow0[0]),
-                        *literals_same(in_flow0[0], in_flow1[0]),
+                        *halve_flows(flow_encoding, in_flow0, in_flow1, out_flow0, flow_carry),
                         *set_numbers_equal(out_flow0, out_flow1),
                     ])
 
@@ -257,13 +339,8 @@ def create_n_to_m_balancer(width: int, height: int, underground_length: int, inp
 
                     for in_flow, out_flow0, out_flow1 in zip(connected_in_tile.forward.flow, tile10.forward.flow, tile11.forward.flow):
                         grid.clauses += implies(partial_input_precondition, [
-                            [-in_flow[0]],
-
-                            *set_numbers_equal(in_flow[1:], out_flow0[:-1]),
-                            *set_numbers_equal(in_flow[1:], out_flow1[:-1]),
-
-                            [-out_flow0[-1]],
-                            [-out_flow1[-1]],
+                            *split_flow(flow_encoding, in_flow, out_flow0),
+                            *split_flow(flow_encoding, in_flow, out_flow1),
                         ])
 
                     for in_flow0, in_flow1, out_flow, flow_carry in zip(
@@ -271,7 +348,7 @@ def create_n_to_m_balancer(width: int, height: int, underground_length: int, inp
                             tile11.backward.flow,
                             connected_in_tile.backward.flow,
                             tile00.backward.carry):
-                        grid.clauses += implies(partial_input_precondition, add_numbers(in_flow0, in_flow1, out_flow, make_fixed_allocator(flow_carry)))
+                        grid.clauses += implies(partial_input_precondition, add_flows(flow_encoding, in_flow0, in_flow1, out_flow, flow_carry))
 
                     partial_output_precondition = [
                         tile00.is_splitter_head,
@@ -285,40 +362,38 @@ def create_n_to_m_balancer(width: int, height: int, underground_length: int, inp
                             tile01.forward.flow,
                             connected_out_tile.forward.flow,
                             tile00.forward.carry):
-                        grid.clauses += implies(partial_output_precondition, add_numbers(in_flow0, in_flow1, out_flow, make_fixed_allocator(flow_carry)))
+                        grid.clauses += implies(partial_output_precondition, add_flows(flow_encoding, in_flow0, in_flow1, out_flow, flow_carry))
 
                     for in_flow, out_flow0, out_flow1 in zip(connected_out_tile.backward.flow, tile00.backward.flow, tile01.backward.flow):
                         grid.clauses += implies(partial_output_precondition, [
-                            [-in_flow[0]],
-
-                            *set_numbers_equal(in_flow[1:], out_flow0[:-1]),
-                            *set_numbers_equal(in_flow[1:], out_flow1[:-1]),
-
-                            [-out_flow0[-1]],
-                            [-out_flow1[-1]],
+                            *split_flow(flow_encoding, in_flow, out_flow0),
+                            *split_flow(flow_encoding, in_flow, out_flow1),
                         ])
 
     for y in range(grid.height):
         tile = grid.get_tile_instance(0, y)
         grid.clauses.append([-tile.is_splitter])
         for i, flow_component in enumerate(tile.forward.flow):
-            grid.clauses += set_number(forward_input_flow if y % input_count == i else 0, flow_component)
+            grid.clauses += set_flow(flow_encoding, forward_input_flow if y % input_count == i else 0, flow_component)
         for flow_component in tile.backward.flow:
-            grid.clauses += set_number(backward_output_flow, flow_component)
+            grid.clauses += set_flow(flow_encoding, backward_output_flow, flow_component)
 
     for y in range(grid.height):
         tile = grid.get_tile_instance(grid.width - 1, y)
         grid.clauses.append([-tile.is_splitter])
         for flow_component in tile.forward.flow:
-            grid.clauses += set_number(forward_output_flow, flow_component)
+            grid.clauses += set_flow(flow_encoding, forward_output_flow, flow_component)
 
         for i, flow_component in enumerate(tile.backward.flow):
-            grid.clauses += set_number(backward_input_flow if y % output_count == i else 0, flow_component)
+            grid.clauses += set_flow(flow_encoding, backward_input_flow if y % output_count == i else 0, flow_component)
 
     return grid
 
 
+@constraint_pass
 def setup_balancer_ends(grid: Grid, input_count: int, output_count: int, aligned: bool):
+    from .cardinality import quadratic_one
+
     start_offsets = []
     for offset in range(grid.height - input_count + 1):
         start_offset = grid.allocate_variable()
@@ -362,7 +437,7 @@ def setup_balancer_ends(grid: Grid, input_count: int, output_count: int, aligned
                 grid.clauses += implies([end_offset], [start_offsets[i:(i + 1 + output_count - input_count)]])
 
 
-def main():
+def get_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description='Creates n to n belt balancers')
     parser.add_argument('width', type=int, help='Belt balancer maximum width')
     parser.add_argument('height', type=int, help='Belt balancer maximum height')
@@ -370,10 +445,26 @@ def main():
     parser.add_argument('output_count', type=int, help='Number of outputs')
     parser.add_argument('--underground-length', type=int, default=4, help='Sets the maximum length of underground section (excludes ends)')
     parser.add_argument('--aligned', action='store_true', help='Enforces balancer input aligns with output')
+    parser.add_argument('--flow-encoding', type=str, choices=FLOW_ENCODINGS, default='binary',
+                        help='Encoding of the flow on each belt (order has no adders, but as many literals as the largest flow)')
     parser.add_argument('--all', action='store_true', help='Generate all belt balancers')
     parser.add_argument('--solver', type=str, default='Glucose3', help='Backend SAT solver to use')
+    parser.add_argument('--cache', type=str, help=f'Directory of cached solver results (defaults to ${CACHE_ENVIRONMENT_VARIABLE})')
+    parser.add_argument('--server', type=str, help='Forward the request to a running "serve" process at this address')
+    packed.add_output_arguments(parser)
+    enumeration.add_enumeration_arguments(parser)
+    encoding_report.add_report_arguments(parser)
+    constraint_groups.add_group_arguments(parser)
+    profiling.add_profile_arguments(parser)
+    estimate.add_estimate_arguments(parser)
+    capture.add_capture_arguments(parser)
     parser.add_argument('--partial', type=argparse.FileType('r'), help='Partial balancer to base solution from')
-    args = parser.parse_args()
+    return parser
+
+
+def create_grid(args) -> Grid:
+    from . import optimisations
+    from .template import EdgeMode
 
     if args.underground_length == -1:
         args.underground_length = float('inf')
@@ -382,7 +473,7 @@ def main():
         # raise RuntimeWarning('Different sized inputs does not always produce good/correct results')
         warnings.warn('Different sized inputs does not always produce good/correct results', RuntimeWarning)
 
-    grid = create_n_to_m_balancer(args.width, args.height, args.underground_length, args.input_count, args.output_count)
+    grid = create_n_to_m_balancer(args.width, args.height, args.underground_length, args.input_count, args.output_count, args.flow_encoding)
 
     setup_balancer_ends(grid, args.input_count, args.output_count, args.aligned)
 
@@ -399,10 +490,27 @@ def main():
         with args.partial:
             belt_balancer.set_nonempty_tiles(grid, args.partial.read())
 
-    for solution in grid.itersolve(solver=args.solver, ignore_colour=True):
-        print(json.dumps(solution.tolist()))
-        if not args.all:
-            break
+    return grid
+
+
+def main(argv: Optional[List[str]] = None):
+    args = get_parser().parse_args(argv)
+
+    if args.server is not None:
+        serve.forward(args.server, 'belt_balancer_net_free', argv)
+        return
+
+    if args.estimate_only:
+        estimate.write_estimate(estimate.estimate_generator(create_grid, args))
+        return
+
+    with profiling.profiled(args), capture.captured(args, 'belt_balancer_net_free', argv):
+        grid = encoding_report.build_grid(create_grid, args)
+
+        with packed.open_output(args) as writer:
+            models = grid.itermodels(solver=args.solver, ignore_colour=True, cache=open_cache(args.cache), projection=args.projection,
+                                     orbit=enumeration.get_orbit(grid, args), disabled_groups=args.disable_group)
+            enumeration.write_models(grid, models, args, writer)
 
 
 if __name__ == '__main__':
@@ -1,17 +1,57 @@
+from __future__ import annotations
+
 import argparse
-import json
 import math
+from typing import TYPE_CHECKING, Any, List, Optional
 
 from . import belt_balancer
-from . import optimisations
+from . import capture, encoding_report, enumeration, estimate, constraint_groups, packed, profiling, serve
+from .cache import CACHE_ENVIRONMENT_VARIABLE, open_cache
 from .direction import Direction
-from .cardinality import library_equals, quadratic_one
-from .solver import Belt, Grid
-from .template import EdgeMode, OneHotTemplate
-from .util import implies, invert_components, is_power_of_two, literals_different, set_all_false, set_numbers_equal
-
+from .encoding_report import constraint_pass
+from .tile import Belt
+from .util import (ClauseList, bin_length, get_popcount, implies, invert_components, is_power_of_two, literals_different, set_all_false, set_number,
+                   set_numbers_equal)
+
+if TYPE_CHECKING:
+    from .solver import Grid
+
+# How a splitter's level (it joins 2**level lanes) is tied to the number of lanes in its colour: a library equals
+# constraint for every level, or one count of the colour per tile compared against each level, in unary (bounded at the
+# largest level) or in binary (a popcount adder tree)
+LEVEL_ENCODINGS = ('library', 'unary', 'popcount')
+
+
+def level_clauses(grid: Grid, tile: Any, levels: int, level_encoding: str) -> ClauseList:
+    from .cardinality import Cardinality, library_equals
+
+    clauses: ClauseList = []
+    if levels <= 0:
+        return clauses
+
+    if level_encoding == 'library':
+        for i in range(levels):
+            clauses += implies([tile.level[i]], library_equals(tile.colour, 2**i, grid.pool))
+    elif level_encoding == 'unary':
+        count = Cardinality().count(tile.colour, 2**(levels - 1), grid.pool, clauses=clauses).outputs
+        for i in range(levels):
+            clauses += implies([tile.level[i]], [[count[2**i - 1]], [-count[2**i]]])
+    elif level_encoding == 'popcount':
+        count = [grid.allocate_variable() for _ in range(bin_length(len(tile.colour) + 1))]
+        clauses += get_popcount(tile.colour, count, grid.allocate_variable)
+        for i in range(levels):
+            clauses += implies([tile.level[i]], set_number(2**i, count))
+    else:
+        raise RuntimeError(f'Unknown level encoding: {level_encoding}')
+    return clauses
+
+
+@constraint_pass
+def create_balancer(width: int, height: int, underground_length: int, level_encoding: str = 'library') -> Grid:
+    from .cardinality import library_equals, quadratic_one
+    from .solver import Grid
+    from .template import EdgeMode, OneHotTemplate
 
-def create_balancer(width: int, height: int, underground_length: int) -> Grid:
     assert width > 0
     assert height > 0
     assert is_power_of_two(height)
@@ -37,8 +77,7 @@ def create_balancer(width: int, height: int, underground_length: int) -> Grid:
         for y in range(grid.height):
             tile00 = grid.get_tile_instance(x, y)
 
-            for i in range(levels):
-                grid.clauses += implies([tile00.level[i]], library_equals(tile00.colour, 2**i, grid.pool))
+            grid.clauses += level_clauses(grid, tile00, levels, level_encoding)
 
             for direction in Direction:
                 dx0, dy0 = direction.vec
@@ -93,22 +132,38 @@ def create_balancer(width: int, height: int, underground_length: int) -> Grid:
     return grid
 
 
-def main():
+def get_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(
         description='Creates n to n belt balancers where n is a power of two. '
                     'Note that the outputs of this program do not include the first and last rows of splitters.')
     parser.add_argument('width', type=int, help='Belt balancer maximum width')
     parser.add_argument('size', type=int, help='Belt balancer size')
     parser.add_argument('--underground-length', type=int, default=4, help='Sets the maximum length of underground section (excludes ends)')
+    parser.add_argument('--level-encoding', type=str, choices=LEVEL_ENCODINGS, default='library',
+                        help='Encoding of the number of lanes a splitter joins (unary and popcount count each tile\'s lanes once)')
     parser.add_argument('--all', action='store_true', help='Generate all belt balancers')
     parser.add_argument('--solver', type=str, default='Glucose3', help='Backend SAT solver to use')
+    parser.add_argument('--cache', type=str, help=f'Directory of cached solver results (defaults to ${CACHE_ENVIRONMENT_VARIABLE})')
+    parser.add_argument('--server', type=str, help='Forward the request to a running "serve" process at this address')
+    packed.add_output_arguments(parser)
+    enumeration.add_enumeration_arguments(parser)
+    encoding_report.add_report_arguments(parser)
+    constraint_groups.add_group_arguments(parser)
+    profiling.add_profile_arguments(parser)
+    estimate.add_estimate_arguments(parser)
+    capture.add_capture_arguments(parser)
     parser.add_argument('--partial', type=argparse.FileType('r'), help='Partial balancer to base solution from')
-    args = parser.parse_args()
+    return parser
+
+
+def create_grid(args) -> Grid:
+    from . import optimisations
+    from .template import EdgeMode
 
     if args.underground_length == -1:
         args.underground_length = float('inf')
 
-    grid = create_balancer(args.width, args.size, args.underground_length)
+    grid = create_balancer(args.width, args.size, args.underground_length, args.level_encoding)
 
     grid.block_belts_through_edges((False, True))
     grid.prevent_intersection(EdgeMode.NO_WRAP)
@@ -122,10 +177,27 @@ def main():
         with args.partial:
             belt_balancer.set_nonempty_tiles(grid, args.partial.read())
 
-    for solution in grid.itersolve(solver=args.solver, ignore_colour=True):
-        print(json.dumps(solution.tolist()))
-        if not args.all:
-            break
+    return grid
+
+
+def main(argv: Optional[List[str]] = None):
+    args = get_parser().parse_args(argv)
+
+    if args.server is not None:
+        serve.forward(args.server, 'belt_balancer_net_free_power_of_2', argv)
+        return
+
+    if args.estimate_only:
+        estimate.write_estimate(estimate.estimate_generator(create_grid, args))
+        return
+
+    with profiling.profiled(args), capture.captured(args, 'belt_balancer_net_free_power_of_2', argv):
+        grid = encoding_report.build_grid(create_grid, args)
+
+        with packed.open_output(args) as writer:
+            models = grid.itermodels(solver=args.solver, ignore_colour=True, cache=open_cache(args.cache), projection=args.projection,
+                                     orbit=enumeration.get_orbit(grid, args), disabled_groups=args.disable_group)
+            enumeration.write_models(grid, models, args, writer)
 
 
 if __name__ == '__main__':
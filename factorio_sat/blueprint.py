@@ -1,4 +1,6 @@
-from typing import Any, Dict, Optional, Tuple
+from __future__ import annotations
+
+from typing import TYPE_CHECKING, Any, Dict, List, Optional, Tuple
 import argparse
 import base64
 import copy
@@ -6,13 +8,16 @@ import enum
 import json
 import math
 import struct
+import sys
 import zlib
 
-import numpy as np
-
+from . import packed, serve
 from .direction import Direction
 from .tile import AssemblingMachine, BaseTile, Belt, BeltConnectedTile, EmptyTile, FillerTile, Inserter, Splitter, UndergroundBelt
 
+if TYPE_CHECKING:
+    import numpy as np
+
 
 class TransportBeltLevel(enum.Enum):
     NORMAL = 'transport-belt', 'underground-belt', 'splitter'
@@ -55,6 +60,8 @@ BLUEPRINT_TEMPLATE = {'blueprint': {'icons': [{'signal': {'type': 'item', 'name'
 
 
 def make_blueprint(tiles, label: Optional[str] = None, level: TransportBeltLevel = TransportBeltLevel.NORMAL):
+    import numpy as np
+
     entities = []
     entity_number = 1
     for (y, x), tile in np.ndenumerate(tiles):
@@ -112,6 +119,8 @@ def make_blueprint(tiles, label: Optional[str] = None, level: TransportBeltLevel
 
 
 def resolve_belt_input_directions(tiles):
+    import numpy as np
+
     for (y, x), tile in np.ndenumerate(tiles):
         if not isinstance(tile, Belt):
             continue
@@ -143,6 +152,8 @@ def resolve_belt_input_directions(tiles):
 
 
 def import_blueprint(data: Any):
+    import numpy as np
+
     if len(data['blueprint']['entities']) == 0:
         return np.full((0, 0), EmptyTile())
 
@@ -200,6 +211,8 @@ def import_blueprint(data: Any):
 
 
 def read_tile(item) -> BaseTile:
+    if isinstance(item, BaseTile):
+        return item
     if 'tile' in item:
         return BaseTile.read(item['tile'])
 
@@ -257,6 +270,8 @@ def write_tile(tile: BaseTile) -> Dict[str, Any]:
 
 
 def convert_to_tiles(blueprint_or_json: str) -> np.ndarray:
+    import numpy as np
+
     try:
         decoded_blueprint = decode_blueprint(blueprint_or_json)
     except Exception:
@@ -271,29 +286,40 @@ def convert_to_tiles(blueprint_or_json: str) -> np.ndarray:
     return tiles
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
+    server_parser = argparse.ArgumentParser(add_help=False)
+    server_parser.add_argument('--server', type=str, help='Forward the request to a running "serve" process at this address')
+
     parser = argparse.ArgumentParser(description='Encode/Decode blueprint strings')
     subparsers = parser.add_subparsers(dest='mode', required=True)
 
-    encode_parser = subparsers.add_parser('encode', help='Convert solver output into blueprint')
+    encode_parser = subparsers.add_parser('encode', help='Convert solver output into blueprint', parents=[server_parser])
     encode_parser.add_argument('--label', type=str, help='Label for created blueprint')
     encode_parser.add_argument('--level', choices=[level.name.lower() for level in TransportBeltLevel], default='normal', help='Belt technology level to use')
+    packed.add_input_arguments(encode_parser)
+
+    decode_parser = subparsers.add_parser('decode', help='Convert blueprint to solver output format', parents=[server_parser])
+    packed.add_output_arguments(decode_parser)
+
+    args = parser.parse_args(argv)
 
-    subparsers.add_parser('decode', help='Convert blueprint to solver output format')
+    if args.server is not None:
+        serve.forward(args.server, 'blueprint', argv, serve.read_stdin())
+        return
 
-    args = parser.parse_args()
+    import numpy as np
 
     if args.mode == 'encode':
-        while True:
-            tiles = np.array(json.loads(input()))
+        for tiles in packed.select_solutions(args):
             tiles = np.vectorize(read_tile)(tiles)
             print(encode_blueprint(make_blueprint(tiles, args.label, TransportBeltLevel[args.level.upper()])))
 
     elif args.mode == 'decode':
-        while True:
-            decoded = decode_blueprint(input())
-            tiles = np.vectorize(write_tile)(import_blueprint(decoded))
-            print(json.dumps(tiles.tolist()))
+        with packed.open_output(args) as writer:
+            for line in sys.stdin:
+                if len(line.strip()) == 0:
+                    continue
+                writer.write(import_blueprint(decode_blueprint(line.strip())))
     else:
         assert False
 
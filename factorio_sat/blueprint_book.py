@@ -1,7 +1,8 @@
 import argparse
 import copy
+from typing import List, Optional
 
-from . import blueprint
+from . import blueprint, serve
 
 
 def unpack_book(blueprint_book):
@@ -25,11 +26,16 @@ def pack_book(blueprints, label=None):
     return blueprint_book
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     parser = argparse.ArgumentParser(description='Manipulates blueprint books')
+    parser.add_argument('--server', type=str, help='Forward the request to a running "serve" process at this address')
     parser.add_argument('mode', choices=['pack', 'unpack'])
     parser.add_argument('--label', type=str, help='Output blueprint book label')
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    if args.server is not None:
+        serve.forward(args.server, 'blueprint_book', argv, serve.read_stdin())
+        return
 
     if args.mode == 'unpack':
         data = blueprint.decode_blueprint(input())
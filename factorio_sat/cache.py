@@ -0,0 +1,88 @@
+import gzip
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional
+
+from .util import ClauseList, LiteralType
+
+CACHE_ENVIRONMENT_VARIABLE = 'FACTORIO_SAT_CACHE'
+
+HASH_CHUNK_SIZE = 4096
+
+
+def hash_clauses(clauses: ClauseList) -> str:
+    # Hash of the DIMACS body, so identical formulas share an entry no matter which tool produced them
+    digest = hashlib.sha256()
+    chunk = []
+    for clause in clauses:
+        chunk.append(' '.join(map(str, clause)) + ' 0\n')
+        if len(chunk) == HASH_CHUNK_SIZE:
+            digest.update(''.join(chunk).encode('ascii'))
+            chunk.clear()
+    digest.update(''.join(chunk).encode('ascii'))
+    return digest.hexdigest()
+
+
+@dataclass(frozen=True)
+class CachedResult:
+    model: Optional[List[LiteralType]]
+    stats: Dict[str, Any]
+
+    @property
+    def satisfiable(self) -> bool:
+        return self.model is not None
+
+
+class SolveCache:
+    def __init__(self, directory: str):
+        self.directory = directory
+
+    def key(self, clauses: ClauseList) -> str:
+        return hash_clauses(clauses)
+
+    def entry_path(self, key: str) -> str:
+        return os.path.join(self.directory, key[:2], key + '.json.gz')
+
+    def lookup(self, key: str) -> Optional[CachedResult]:
+        try:
+            with gzip.open(self.entry_path(key), 'rt') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, EOFError, json.JSONDecodeError):  # Partially written or corrupted entry
+            return None
+        return CachedResult(data['model'], data.get('stats', {}))
+
+    def store(self, key: str, model: Optional[List[LiteralType]], stats: Dict[str, Any]):
+        path = self.entry_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Write then rename so concurrent readers (other users, CI jobs) never see a partial entry
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt') as f:
+                json.dump({'model': model, 'stats': stats}, f)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+
+def open_cache(directory: Optional[str] = None) -> Optional[SolveCache]:
+    if directory is None:
+        directory = os.getenv(CACHE_ENVIRONMENT_VARIABLE)
+    if not directory:
+        return None
+    return SolveCache(directory)
+
+
+__all__ = [
+    'CACHE_ENVIRONMENT_VARIABLE',
+    'CachedResult',
+    'SolveCache',
+    'hash_clauses',
+    'open_cache',
+]
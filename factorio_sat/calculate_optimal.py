@@ -7,13 +7,15 @@ import os
 import re
 from typing import Any, Callable, Dict, Iterator, List, Optional, Protocol, Tuple
 
-import numpy as np
-
 from . import belt_balancer
 from . import blueprint
-from . import optimisations
+from . import capture
+from . import estimate
+from . import profiling
+from .cache import CACHE_ENVIRONMENT_VARIABLE, open_cache
 from .network import deduplicate_network, get_input_output_colours, open_network
-from .template import EdgeMode
+
+CALIBRATION_MARGIN = 4
 
 MAXIMUM_UNDERGROUND_LENGTHS = {
     'normal': 4,
@@ -32,7 +34,10 @@ def factors(value: int) -> Iterator[Tuple[int, int]]:
                 yield b, a
 
 
-def solve_balancer(network, size: Tuple[int, int, int], solver: str):
+def encode_balancer(network, size: Tuple[int, int, int]):
+    from . import optimisations
+    from .template import EdgeMode
+
     maximum_underground_length, width, height = size
 
     network = deduplicate_network(network)
@@ -45,13 +50,48 @@ def solve_balancer(network, size: Tuple[int, int, int], solver: str):
 
     belt_balancer.enforce_edge_splitters(grid, network)
     grid.enforce_maximum_underground_length(EdgeMode.NO_WRAP)
+    return grid
+
+
+def capture_context(network, size: Tuple[int, int, int]) -> Dict[str, Any]:
+    # Enough to encode the job again without the database
+    return {'tool': 'calculate_optimal', 'network': [[list(inputs), list(outputs)] for inputs, outputs in network], 'size': list(size)}
+
 
-    solution = grid.solve(solver)
+def solve_balancer(network, size: Tuple[int, int, int], solver: str, cache_directory: Optional[str] = None, capture_directory: Optional[str] = None):
+    with profiling.phase('encode'):
+        grid = encode_balancer(network, size)
+
+    if capture_directory is None:
+        solution = grid.solve(solver, open_cache(cache_directory))
+    else:
+        with capture.Capture(capture_directory, capture_context(network, size)):
+            solution = grid.solve(solver, open_cache(cache_directory))
     if solution is None:
         return None
     return solution.tolist()
 
 
+def profile_balancer(network, size: Tuple[int, int, int], solver: str, cache_directory: Optional[str] = None, trace_memory: bool = False,
+                     capture_directory: Optional[str] = None):
+    # Workers are reused between jobs, so their startup isn't part of any one job
+    with profiling.Profiler(trace_memory, include_startup=False) as profiler:
+        solution = solve_balancer(network, size, solver, cache_directory, capture_directory)
+    return solution, profiler.summary()
+
+
+def calibrate_balancer(network, size: Tuple[int, int, int]) -> estimate.CostModel:
+    # The model predicts every later size of the same network, so each network is only calibrated once
+    # (with room to grow in both directions, later sizes are larger)
+    maximum_underground_length, width, height = size
+    return estimate.calibrate(lambda width, height: encode_balancer(network, (maximum_underground_length, width, height)),
+                              width + CALIBRATION_MARGIN, height + CALIBRATION_MARGIN)
+
+
+def format_profile(profile: Dict[str, Dict[str, Any]]) -> str:
+    return ', '.join(f'{name} {stats["self_time"]:.2f}s' for name, stats in profile.items() if stats['self_time'] >= 0.01)
+
+
 class NetworkSolutionStore:
     def __init__(self, network_path: str):
         self.network = open_network(network_path)
@@ -59,6 +99,8 @@ class NetworkSolutionStore:
 
         self.exist: Dict[Tuple[int, int, int], bool] = dict()
         self.solutions: Dict[Tuple[int, int, int], Any] = dict()
+        self.profiles: Dict[Tuple[int, int, int], Dict[str, Dict[str, Any]]] = dict()
+        self.cost_model: Optional[estimate.CostModel] = None
 
     @property
     def ordering_key(self):
@@ -98,11 +140,19 @@ class NetworkSolutionStore:
             underground_length, width, height = map(int, key.split(','))
             self.solutions[underground_length, width, height] = val
 
+        self.profiles = {}
+        for key, val in data.get('profiles', {}).items():
+            underground_length, width, height = map(int, key.split(','))
+            self.profiles[underground_length, width, height] = val
+
     def to_json(self):
-        return {
+        data = {
             'exist': dict((','.join(map(str, key)), val) for key, val in self.exist.items()),
             'solutions': dict((','.join(map(str, key)), val) for key, val in self.solutions.items())
         }
+        if len(self.profiles) != 0:
+            data['profiles'] = dict((','.join(map(str, key)), val) for key, val in self.profiles.items())
+        return data
 
     def add_solution(self, size: Tuple[int, int, int], solution: Optional[Any]):
         self.exist[size] = solution is not None
@@ -246,6 +296,12 @@ def main():
 
     compute_parser.add_argument('--threads', type=int, help='Number of compute threads')
     compute_parser.add_argument('--solver', type=str, default='g4', help='Backend SAT solver to use')
+    compute_parser.add_argument('--cache', type=str, help=f'Directory of cached solver results (defaults to ${CACHE_ENVIRONMENT_VARIABLE})')
+    compute_parser.add_argument('--profile', action='store_true', help='Record where each job spent its time and memory alongside its result')
+    compute_parser.add_argument('--profile-memory', action='store_true', help='With --profile, also trace Python allocations per phase')
+    capture.add_capture_arguments(compute_parser)
+    compute_parser.add_argument('--max-memory', type=float, help='Stop optimising a network once the next size is estimated to need more memory (GiB)')
+    compute_parser.add_argument('--cheapest-first', action='store_true', help='Start the networks with the smallest estimated encodings first')
 
     export_crosstable_parser.add_argument('filename', type=str, help='Name of file to export crosstable markdown as')
     args = parser.parse_args()
@@ -284,6 +340,8 @@ def main():
 
     if args.mode == 'query':
         if args.export_blueprints:
+            import numpy as np
+
             def encode_solution(solution, name):
                 label = ' to '.join(name.split('x'))
                 tiles = np.array(solution)
@@ -305,13 +363,29 @@ def main():
 
             print(encode_solution(solution, store.network_name))
     elif args.mode == 'compute':
+        capture_directory = capture.get_capture_directory(args)
+
         async def optimise(executor: concurrent.futures.ProcessPoolExecutor, store: NetworkSolutionStore):
             while True:
                 next_size = args.objective.next_size(store, args.underground_length)
                 if next_size is None:
                     break
+
+                if args.max_memory is not None and store.cost_model is not None:
+                    memory = store.cost_model.predict(*next_size[1:]).memory
+                    if memory > args.max_memory * 2**30:
+                        print(f'{store.network_name}: Skipping {next_size}, estimated to need {estimate.format_bytes(memory)}')
+                        return
+
                 print(f'{store.network_name}: Start {next_size}')
-                solution = await loop.run_in_executor(executor, solve_balancer, store.network, next_size, args.solver)
+                if args.profile:
+                    solution, profile = await loop.run_in_executor(executor, profile_balancer, store.network, next_size, args.solver, args.cache,
+                                                                   args.profile_memory, capture_directory)
+                    store.profiles[next_size] = profile
+                    print(f'{store.network_name}: Profile {next_size}: {format_profile(profile)}')
+                else:
+                    solution = await loop.run_in_executor(executor, solve_balancer, store.network, next_size, args.solver, args.cache,
+                                                          capture_directory)
 
                 store.add_solution(next_size, solution)
                 store.clean()
@@ -320,9 +394,31 @@ def main():
 
             print(f'{store.network_name}: Solution found')
 
+        async def calibrate(executor: concurrent.futures.ProcessPoolExecutor, store: NetworkSolutionStore):
+            next_size = args.objective.next_size(store, args.underground_length)
+            if next_size is None:
+                return
+            try:
+                store.cost_model = await loop.run_in_executor(executor, calibrate_balancer, store.network, next_size)
+            except RuntimeError as e:  # No size up to the first job could be encoded, it is run without an estimate
+                print(f'{store.network_name}: {e}')
+
+        def estimated_clauses(store: NetworkSolutionStore) -> float:
+            next_size = args.objective.next_size(store, args.underground_length)
+            if next_size is None or store.cost_model is None:
+                return 0
+            return store.cost_model.predict(*next_size[1:]).clauses
+
         async def main():
             with concurrent.futures.ProcessPoolExecutor(max_workers=args.threads) as executor:
-                tasks = [optimise(executor, store) for store in stores]
+                ordered_stores = stores
+                if args.max_memory is not None or args.cheapest_first:
+                    await asyncio.gather(*(calibrate(executor, store) for store in stores))
+                if args.cheapest_first:
+                    # Jobs are handed to the workers in the order they are submitted
+                    ordered_stores = sorted(stores, key=estimated_clauses)
+
+                tasks = [optimise(executor, store) for store in ordered_stores]
                 await asyncio.gather(*tasks)
 
         loop = asyncio.new_event_loop()
@@ -0,0 +1,233 @@
+import argparse
+import contextlib
+import datetime
+import itertools
+import json
+import os
+import sys
+import threading
+import time
+from typing import Any, Dict, Iterator, List, Optional
+
+from .util import ClauseList, LiteralType
+
+# Each solve gets its own directory in the capture directory: the clauses (flattened literals and clause lengths in a
+# compressed .npz), and trace.json with what produced them, how the variables are laid out and how long solving took.
+# The trace is written before solving starts, so a solve that never finishes (or is killed) is still captured.
+
+CAPTURE_ENVIRONMENT_VARIABLE = 'FACTORIO_SAT_CAPTURE'
+
+TRACE_FILENAME = 'trace.json'
+CLAUSES_FILENAME = 'clauses.npz'
+
+
+def save_clauses(filename: str, clauses: ClauseList):
+    import numpy as np
+
+    lengths = np.fromiter(map(len, clauses), dtype=np.int32, count=len(clauses))
+    literals = np.fromiter(itertools.chain.from_iterable(clauses), dtype=np.int32, count=int(lengths.sum()))
+    np.savez_compressed(filename, literals=literals, lengths=lengths)
+
+
+def load_clauses(filename: str) -> ClauseList:
+    import numpy as np
+
+    with np.load(filename) as data:
+        literals, lengths = data['literals'], data['lengths']
+    return [clause.tolist() for clause in np.split(literals, np.cumsum(lengths)[:-1])] if len(lengths) != 0 else []
+
+
+def grid_layout(grid) -> Dict[str, Any]:
+    # Tiles are instantiated in row order from variable 1, so the first tile and the per tile count locate every tile
+    # variable, anything above them was allocated by the constraints
+    layout: Dict[str, Any] = {
+        'width': grid.width,
+        'height': grid.height,
+        'variables': grid.pool.top,
+        'clauses': len(grid.clauses),
+    }
+    variable_count = getattr(grid.template, 'variable_count', None)
+    if isinstance(variable_count, int):
+        layout['tile_variables'] = variable_count
+    first_tile = grid.tiles[0, 0]
+    if hasattr(first_tile, '_asdict'):
+        layout['first_tile'] = first_tile._asdict()
+    return layout
+
+
+def read_trace(directory: str) -> Dict[str, Any]:
+    with open(os.path.join(directory, TRACE_FILENAME)) as f:
+        return json.load(f)
+
+
+def find_traces(paths: List[str]) -> List[str]:
+    # Trace directories, or capture directories holding them
+    result = []
+    for path in paths:
+        if os.path.isfile(os.path.join(path, TRACE_FILENAME)):
+            result.append(path)
+            continue
+        if not os.path.isdir(path):
+            raise RuntimeError(f'No trace at {path}')
+        for name in sorted(os.listdir(path)):
+            if os.path.isfile(os.path.join(path, name, TRACE_FILENAME)):
+                result.append(os.path.join(path, name))
+    return result
+
+
+class Recording:
+    def __init__(self, directory: str, trace: Dict[str, Any]):
+        self.directory = directory
+        self.trace = trace
+        self.start = time.perf_counter()
+        self.models = 0
+        self.first_model_time: Optional[float] = None
+
+    def model(self):
+        if self.models == 0:
+            self.first_model_time = time.perf_counter() - self.start
+        self.models += 1
+
+    def write(self):
+        # Replaced in one step, the trace is read while a solve is still running
+        path = os.path.join(self.directory, TRACE_FILENAME)
+        with open(path + '.tmp', 'w') as f:
+            json.dump(self.trace, f, indent=2)
+        os.replace(path + '.tmp', path)
+
+    def finish(self, completed: bool):
+        if self.models != 0:
+            status = 'sat'
+        elif completed:
+            status = 'unsat'
+        else:
+            status = 'unknown'
+        self.trace['result'] = {
+            'status': status,
+            'completed': completed,
+            'models': self.models,
+            'first_model_time': self.first_model_time,
+            'total_time': time.perf_counter() - self.start,
+        }
+        self.write()
+
+
+class NullRecording:
+    def model(self):
+        pass
+
+
+NULL_RECORDING = NullRecording()
+
+
+class Capture:
+    def __init__(self, directory: str, context: Dict[str, Any]):
+        self.directory = directory
+        self.context = context
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+        self.previous: Optional['Capture'] = None
+
+    def __enter__(self):
+        global ACTIVE
+        self.previous = ACTIVE
+        ACTIVE = self
+        return self
+
+    def __exit__(self, *_):
+        global ACTIVE
+        ACTIVE = self.previous
+
+    def create_directory(self) -> str:
+        timestamp = datetime.datetime.now().strftime('%Y%m%d-%H%M%S')
+        with self.lock:
+            index = next(self.counter)
+        directory = os.path.join(self.directory, f'{timestamp}-{os.getpid()}-{index}')
+        os.makedirs(directory)
+        return directory
+
+    def start(self, grid, solver: str, assumptions: List[LiteralType], parameters: Dict[str, Any]) -> Recording:
+        directory = self.create_directory()
+        # Assumptions (the selectors of guarded constraint groups) are saved as units, replays solve the same formula
+        save_clauses(os.path.join(directory, CLAUSES_FILENAME), grid.assumed_clauses(assumptions))
+        recording = Recording(directory, {
+            'created': datetime.datetime.now(datetime.timezone.utc).isoformat(),
+            'context': self.context,
+            'solver': solver,
+            'parameters': parameters,
+            'layout': grid_layout(grid),
+            'result': None,
+        })
+        recording.write()
+        return recording
+
+
+ACTIVE: Optional[Capture] = None
+
+
+@contextlib.contextmanager
+def solving(grid, solver: str, assumptions: List[LiteralType] = [], **parameters) -> Iterator[Any]:
+    # Wraps one solve (or enumeration), the consumer calls model() on what is yielded for every model found
+    if ACTIVE is None:
+        yield NULL_RECORDING
+        return
+
+    recording = ACTIVE.start(grid, solver, assumptions, parameters)
+    completed = False
+    try:
+        yield recording
+        completed = True
+    finally:
+        recording.finish(completed)
+
+
+def strip_capture_option(argv: List[str]) -> List[str]:
+    # Encoding a trace again must not capture it again
+    result = []
+    skip_next = False
+    for arg in argv:
+        if skip_next:
+            skip_next = False
+        elif arg == '--capture':
+            skip_next = True
+        elif not arg.startswith('--capture='):
+            result.append(arg)
+    return result
+
+
+def add_capture_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--capture', type=str, metavar='DIRECTORY',
+                        help=f'Save the clauses, options and timings of every solve to DIRECTORY for "replay" (defaults to ${CAPTURE_ENVIRONMENT_VARIABLE})')
+
+
+def get_capture_directory(args: argparse.Namespace) -> Optional[str]:
+    directory = getattr(args, 'capture', None)
+    if directory is None:
+        directory = os.getenv(CAPTURE_ENVIRONMENT_VARIABLE)
+    return directory or None
+
+
+@contextlib.contextmanager
+def captured(args: argparse.Namespace, tool: str, argv: Optional[List[str]] = None) -> Iterator[Optional[Capture]]:
+    directory = get_capture_directory(args)
+    if directory is None:
+        yield None
+        return
+
+    if argv is None:
+        argv = sys.argv[1:]
+    with Capture(directory, {'tool': tool, 'argv': strip_capture_option(argv), 'cwd': os.getcwd()}) as capture:
+        yield capture
+
+
+__all__ = [
+    'CAPTURE_ENVIRONMENT_VARIABLE',
+    'Capture',
+    'add_capture_arguments',
+    'captured',
+    'find_traces',
+    'load_clauses',
+    'read_trace',
+    'save_clauses',
+    'solving',
+]
@@ -1,13 +1,22 @@
-from typing import List, Optional
+from __future__ import annotations
 
-from pysat.card import CardEnc, EncType
-from pysat.formula import IDPool
+import itertools
+import math
+from dataclasses import dataclass
+from typing import TYPE_CHECKING, Callable, Dict, List, Optional, Sequence, Tuple, Union
 
+from . import constraint_groups, encoding_report
+from .encoding_report import clause_helper
 from .util import AllocatorType, ClauseList, LiteralType, bin_length, implies, set_number
 
+# pysat is only imported by the library encodings, the encoding names are needed by the argument parsers
+if TYPE_CHECKING:
+    from pysat.formula import IDPool
+
 # AMO - At Most One
 
 
+@clause_helper
 def quadratic_amo(literals: List[LiteralType], _: Optional[AllocatorType] = None) -> ClauseList:
     clauses = []
     for i, lit_a in enumerate(literals):
@@ -16,14 +25,18 @@ def quadratic_amo(literals: List[LiteralType], _: Optional[AllocatorType] = None
     return clauses
 
 
+@clause_helper
 def logarithmic_amo(literals: List[LiteralType], allocator: AllocatorType) -> ClauseList:
+    if len(literals) <= 1:
+        return []
     location_literals = [allocator() for _ in range(bin_length(len(literals)))]
-    clauses = [list(literals)]
+    clauses = []
     for i, lit in enumerate(literals):
         clauses += implies([lit], set_number(i, location_literals))
     return clauses
 
 
+@clause_helper
 def heule_amo(literals: List[LiteralType], allocator: AllocatorType, recursive_cutoff: int = 3) -> ClauseList:
     assert recursive_cutoff >= 3
     if len(literals) <= recursive_cutoff:
@@ -35,34 +48,281 @@ def heule_amo(literals: List[LiteralType], allocator: AllocatorType, recursive_c
             heule_amo(literals[middle:] + [-auxilary], allocator, recursive_cutoff)
 
 
+@clause_helper
+def ladder_amo(literals: List[LiteralType], allocator: AllocatorType) -> ClauseList:
+    # Sequential counter, ladder[i] is set once any of the first i + 1 literals is
+    if len(literals) <= 1:
+        return []
+    ladder = [allocator() for _ in range(len(literals) - 1)]
+    clauses = []
+    for i, lit in enumerate(literals):
+        if i < len(ladder):
+            clauses.append([-lit, ladder[i]])
+        if i > 0:
+            clauses.append([-ladder[i - 1], -lit])
+            if i < len(ladder):
+                clauses.append([-ladder[i - 1], ladder[i]])
+    return clauses
+
+
+@clause_helper
+def commander_amo(literals: List[LiteralType], allocator: AllocatorType, group_size: int = 3) -> ClauseList:
+    # Each group has a commander set exactly when one of its literals is, and at most one commander is set
+    assert group_size >= 2
+    if len(literals) <= group_size + 1:
+        return quadratic_amo(literals)
+
+    clauses = []
+    commanders = []
+    for start in range(0, len(literals), group_size):
+        group = literals[start:start + group_size]
+        if len(group) == 1:
+            commanders.append(group[0])
+            continue
+        commander = allocator()
+        clauses += quadratic_amo(group)
+        clauses += [[-lit, commander] for lit in group]
+        clauses.append([-commander, *group])
+        commanders.append(commander)
+    return clauses + commander_amo(commanders, allocator, group_size)
+
+
+@clause_helper
+def product_amo(literals: List[LiteralType], allocator: AllocatorType) -> ClauseList:
+    # Literals are laid out on a grid, two of them set would set two rows or two columns
+    if len(literals) <= 4:
+        return quadratic_amo(literals)
+
+    row_count = math.ceil(math.sqrt(len(literals)))
+    column_count = math.ceil(len(literals) / row_count)
+    rows = [allocator() for _ in range(row_count)]
+    columns = [allocator() for _ in range(column_count)]
+    clauses = []
+    for i, lit in enumerate(literals):
+        row, column = divmod(i, column_count)
+        clauses.append([-lit, rows[row]])
+        clauses.append([-lit, columns[column]])
+    return clauses + product_amo(rows, allocator) + product_amo(columns, allocator)
+
+
+AMO_ENCODINGS: Dict[str, Callable[[List[LiteralType], AllocatorType], ClauseList]] = {
+    'quadratic': quadratic_amo,
+    'ladder': ladder_amo,
+    'commander': commander_amo,
+    'product': product_amo,
+    'heule': heule_amo,
+    'logarithmic': logarithmic_amo,
+}
+AMO_ENCODING_NAMES = ('auto',) + tuple(AMO_ENCODINGS.keys())
+
+# 'auto' keeps the pairwise encoding up to this many literals and uses AUTO_AMO_ENCODING above it. Heule's is the
+# smallest from 5 literals and solved the 8x8 and 3x7 balancers fastest, see benchmarks/crossover.py
+AUTO_AMO_THRESHOLD = 6
+AUTO_AMO_ENCODING = 'heule'
+
+
+def resolve_amo_encoding(encoding: str, count: int) -> str:
+    if encoding == 'auto':
+        return 'quadratic' if count <= AUTO_AMO_THRESHOLD else AUTO_AMO_ENCODING
+    if encoding not in AMO_ENCODINGS:
+        raise RuntimeError(f'Unknown at most one encoding: {encoding}')
+    return encoding
+
+
+@clause_helper
+def at_most_one(literals: List[LiteralType], allocator: AllocatorType, encoding: str = 'auto') -> ClauseList:
+    return AMO_ENCODINGS[resolve_amo_encoding(encoding, len(literals))](literals, allocator)
+
+
+@clause_helper
+def exactly_one(literals: List[LiteralType], allocator: AllocatorType, encoding: str = 'auto') -> ClauseList:
+    return at_most_one(literals, allocator, encoding) + [list(literals)]
+
+
+@clause_helper
 def quadratic_one(literals: List[LiteralType], _: Optional[AllocatorType] = None) -> ClauseList:
     return quadratic_amo(literals) + [list(literals)]
 
 
+@clause_helper
 def logarithmic_one(literals: List[LiteralType], allocator: AllocatorType) -> ClauseList:
     return logarithmic_amo(literals, allocator) + [list(literals)]
 
 
+@clause_helper
 def heule_one(literals: List[LiteralType], allocator: AllocatorType, recursive_cutoff: int = 3) -> ClauseList:
     return heule_amo(literals, allocator, recursive_cutoff) + [list(literals)]
 
 
-def library_equals(inputs: List[LiteralType], n: int, pool: IDPool, encoding=EncType.kmtotalizer) -> ClauseList:
-    clauses = CardEnc.equals(inputs, n, vpool=pool, encoding=encoding).clauses
-    if len(clauses) == 0:
-        raise RuntimeError('Failed to generate clauses')
-    return clauses
+# Cardinality constraints: the pysat.card encodings by name, 'pb' for pysat.pb with unit weights (needs pypblib), and
+# 'shared' for the unary counts Cardinality keeps, which later constraints on the same or sibling literals reuse
+LIBRARY_ENCODINGS = ('seqcounter', 'sortnetwrk', 'cardnetwrk', 'totalizer', 'mtotalizer', 'kmtotalizer', 'pb')
+CARDINALITY_ENCODINGS = LIBRARY_ENCODINGS + ('shared',)
+DEFAULT_CARDINALITY_ENCODING = 'kmtotalizer'
+
 
+def get_pb_module():
+    try:
+        from pysat import pb
+    except (ImportError, AssertionError):  # pysat.pb asserts pypblib is present when it is imported
+        raise RuntimeError('"pypblib" not installed: the pb cardinality encoding will not work')
+    return pb
 
-def library_atmost(inputs: List[LiteralType], n: int, pool: IDPool) -> ClauseList:
-    clauses = CardEnc.atmost(inputs, n, vpool=pool, encoding=EncType.kmtotalizer).clauses
+
+def library_encode(kind: str, inputs: List[LiteralType], n: int, pool: IDPool, encoding: Union[None, int, str]) -> ClauseList:
+    from pysat.card import CardEnc, EncType
+
+    if encoding is None:
+        encoding = DEFAULT_CARDINALITY_ENCODING
+    if encoding == 'pb':
+        pb = get_pb_module()
+        clauses = getattr(pb.PBEnc, kind)(inputs, weights=[1] * len(inputs), bound=n, vpool=pool, encoding=pb.EncType.best).clauses
+    else:
+        if isinstance(encoding, str):
+            if encoding not in LIBRARY_ENCODINGS:
+                raise RuntimeError(f'Unknown cardinality encoding: {encoding}')
+            encoding = getattr(EncType, encoding)
+        clauses = getattr(CardEnc, kind)(inputs, n, vpool=pool, encoding=encoding).clauses
     if len(clauses) == 0:
         raise RuntimeError('Failed to generate clauses')
     return clauses
 
 
-def library_atleast(inputs: List[LiteralType], n: int, pool: IDPool) -> ClauseList:
-    clauses = CardEnc.atleast(inputs, n, vpool=pool, encoding=EncType.kmtotalizer).clauses
-    if len(clauses) == 0:
+@clause_helper
+def library_equals(inputs: List[LiteralType], n: int, pool: IDPool, encoding: Union[None, int, str] = None) -> ClauseList:
+    return library_encode('equals', inputs, n, pool, encoding)
+
+
+@clause_helper
+def library_atmost(inputs: List[LiteralType], n: int, pool: IDPool, encoding: Union[None, int, str] = None) -> ClauseList:
+    return library_encode('atmost', inputs, n, pool, encoding)
+
+
+@clause_helper
+def library_atleast(inputs: List[LiteralType], n: int, pool: IDPool, encoding: Union[None, int, str] = None) -> ClauseList:
+    return library_encode('atleast', inputs, n, pool, encoding)
+
+
+LIBRARY_CONSTRAINTS = {
+    'equals': library_equals,
+    'atmost': library_atmost,
+    'atleast': library_atleast,
+}
+
+
+@dataclass(frozen=True)
+class UnaryCount:
+    outputs: Tuple[LiteralType, ...]  # outputs[i] is set exactly when more than i of the literals are
+    size: int  # Number of literals counted, there are fewer outputs when the count is bounded
+
+
+def merge_counts(a: UnaryCount, b: UnaryCount, allocator: AllocatorType, bound: int) -> Tuple[UnaryCount, ClauseList]:
+    # One totalizer node, counts above bound are only known to be above it
+    size = a.size + b.size
+    outputs = tuple(allocator() for _ in range(min(size, bound + 1)))
+    clauses = []
+    for i in range(len(a.outputs) + 1):
+        for j in range(len(b.outputs) + 1):
+            if 0 < i + j <= len(outputs):
+                clauses.append([-lit for lit in (a.outputs[i - 1:i] + b.outputs[j - 1:j])] + [outputs[i + j - 1]])
+            if i + j < len(outputs):
+                # An output past the end of an unbounded count can't be set, one past a bounded count could be
+                a_next = a.outputs[i:i + 1] if i < len(a.outputs) or len(a.outputs) == a.size else None
+                b_next = b.outputs[j:j + 1] if j < len(b.outputs) or len(b.outputs) == b.size else None
+                if a_next is not None and b_next is not None:
+                    clauses.append(list(a_next + b_next) + [-outputs[i + j]])
+    return UnaryCount(outputs, size), clauses
+
+
+class Cardinality:
+    # Chooses the encoding of each cardinality constraint by the name of its call site (see parse_cardinality_choices),
+    # and keeps the unary counts built for 'shared' ones by the literals they count. A count made of parts (e.g. the
+    # columns of a grid) counts every part on its own first, so a later constraint on one of the parts or on a union of
+    # them only adds unit clauses to what is already there.
+    def __init__(self, choices: Optional[Dict[str, str]] = None):
+        self.choices = {} if choices is None else choices
+        self.counts: Dict[Tuple[LiteralType, ...], UnaryCount] = {}
+
+    def encoding(self, site: str) -> str:
+        return self.choices.get(site, self.choices.get('*', DEFAULT_CARDINALITY_ENCODING))
+
+    def count(self, literals: Sequence[LiteralType], bound: int, pool: IDPool, parts: Optional[Sequence[Sequence[LiteralType]]] = None,
+              clauses: Optional[ClauseList] = None) -> UnaryCount:
+        key = tuple(literals)
+        count = self.counts.get(key)
+        if count is not None and (len(count.outputs) > bound or len(count.outputs) == count.size):
+            return count
+
+        if parts is None:
+            if len(key) == 0:
+                raise RuntimeError('Nothing to count')
+            counts = [UnaryCount((lit,), 1) for lit in key]
+        else:
+            assert tuple(itertools.chain.from_iterable(parts)) == key
+            counts = [self.count(part, bound, pool, None, clauses) for part in parts if len(part) != 0]
+
+        while len(counts) > 1:
+            merged = []
+            for a, b in zip(counts[0::2], counts[1::2]):
+                count, new_clauses = merge_counts(a, b, pool._next, bound)
+                constraint_groups.leave_unguarded(new_clauses)  # Later constraints of other groups may count on it
+                clauses += new_clauses
+                merged.append(count)
+            counts = merged + counts[len(merged) * 2:]
+        self.counts[key] = counts[0]
+        return counts[0]
+
+    def constrain(self, kind: str, site: str, literals: Sequence[LiteralType], n: int, pool: IDPool,
+                  parts: Optional[Sequence[Sequence[LiteralType]]] = None) -> ClauseList:
+        encoding = self.encoding(site)
+        with encoding_report.cardinality_site(site, encoding):
+            if encoding == 'shared':
+                return shared_constraint(self, kind, literals, n, pool, parts)
+            return LIBRARY_CONSTRAINTS[kind](list(literals), n, pool, encoding)
+
+    def equals(self, site: str, literals: Sequence[LiteralType], n: int, pool: IDPool,
+               parts: Optional[Sequence[Sequence[LiteralType]]] = None) -> ClauseList:
+        return self.constrain('equals', site, literals, n, pool, parts)
+
+    def atmost(self, site: str, literals: Sequence[LiteralType], n: int, pool: IDPool,
+               parts: Optional[Sequence[Sequence[LiteralType]]] = None) -> ClauseList:
+        return self.constrain('atmost', site, literals, n, pool, parts)
+
+    def atleast(self, site: str, literals: Sequence[LiteralType], n: int, pool: IDPool,
+                parts: Optional[Sequence[Sequence[LiteralType]]] = None) -> ClauseList:
+        return self.constrain('atleast', site, literals, n, pool, parts)
+
+
+@clause_helper
+def shared_constraint(cardinality: Cardinality, kind: str, literals: Sequence[LiteralType], n: int, pool: IDPool,
+                      parts: Optional[Sequence[Sequence[LiteralType]]] = None) -> ClauseList:
+    if n > len(literals) and kind != 'atmost':
         raise RuntimeError('Failed to generate clauses')
+    clauses: ClauseList = []
+    outputs = cardinality.count(literals, n, pool, parts, clauses).outputs
+    if kind != 'atmost' and n > 0:
+        clauses.append([outputs[n - 1]])
+    if kind != 'atleast' and n < len(outputs):
+        clauses.append([-outputs[n]])
     return clauses
+
+
+def parse_cardinality_choices(values: Sequence[str], sites: Sequence[str]) -> Dict[str, str]:
+    # SITE=ENCODING, or ENCODING alone for every site not given its own
+    choices = {}
+    for value in values:
+        site, _, encoding = value.rpartition('=')
+        if site == '':
+            site = '*'
+        elif site not in sites:
+            raise RuntimeError(f'Unknown cardinality call site: {site} (expected one of {", ".join(sites)})')
+        if encoding not in CARDINALITY_ENCODINGS:
+            raise RuntimeError(f'Unknown cardinality encoding: {encoding} (expected one of {", ".join(CARDINALITY_ENCODINGS)})')
+        choices[site] = encoding
+    return choices
+
+
+def add_cardinality_arguments(parser, sites: Sequence[str]):
+    parser.add_argument('--cardinality', type=str, action='append', default=[], metavar='[SITE=]ENCODING',
+                        help=f'Encoding of the cardinality constraints at a call site ({", ".join(sites)}), or at every other one '
+                        f'({", ".join(CARDINALITY_ENCODINGS)}, defaults to {DEFAULT_CARDINALITY_ENCODING})')
@@ -0,0 +1,95 @@
+import argparse
+import fnmatch
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+# Constraint passes are named as in the encoding report (e.g. optimisations.prevent_zigzags). While guarding, the clauses
+# of every pass matching one of the patterns get the negation of a selector literal for that name (grid.selectors), so the
+# same encoded grid can be solved with any subset of the guarded groups switched off by assuming selectors false.
+# Nested passes keep their own clauses, everything else added by a pass belongs to it. Clauses that only define fresh
+# variables (the unary counts Cardinality shares between passes) are left unguarded, so a count built by one group is
+# still defined when another group that reuses it is solved without the first.
+
+
+class ConstraintGroups:
+    def __init__(self, patterns: Sequence[str]):
+        self.patterns = list(patterns)
+        self.frames: List[List[Tuple[int, int]]] = []
+        self.definitions: Dict[int, List[int]] = {}  # By id, the clauses are kept so their ids aren't reused
+        self.previous: Optional['ConstraintGroups'] = None
+
+    def __enter__(self):
+        global ACTIVE
+        self.previous = ACTIVE
+        ACTIVE = self
+        return self
+
+    def __exit__(self, *_):
+        global ACTIVE
+        ACTIVE = self.previous
+
+    def guards(self, name: str) -> bool:
+        return any(fnmatch.fnmatchcase(name, pattern) for pattern in self.patterns)
+
+    def leave_unguarded(self, clauses: List[List[int]]):
+        for clause in clauses:
+            self.definitions[id(clause)] = clause
+
+    def run_pass(self, name: str, function: Callable[..., Any], first, args, kwargs) -> Any:
+        start = len(getattr(first, 'clauses', ()))
+        self.frames.append([])
+        try:
+            result = function(first, *args, **kwargs)
+        finally:
+            guarded = self.frames.pop()
+
+        grid = first if hasattr(first, 'clauses') else result  # Grid factories (and Grid.__init__) create the grid
+        if not hasattr(grid, 'selectors'):
+            return result
+        end = len(grid.clauses)
+
+        selector = grid.selectors.get(name)
+        if selector is None:
+            selector = grid.selectors[name] = grid.allocate_variable()
+
+        # Clauses are only ever appended, so the ranges guarded by nested passes are skipped over
+        position = start
+        for child_start, child_end in guarded + [(end, end)]:
+            for i in range(position, child_start):
+                if id(grid.clauses[i]) not in self.definitions:
+                    grid.clauses[i] = [*grid.clauses[i], -selector]
+            position = child_end
+
+        if len(self.frames) != 0:
+            self.frames[-1].append((start, end))
+        return result
+
+
+ACTIVE: Optional[ConstraintGroups] = None
+
+
+def leave_unguarded(clauses: List[List[int]]):
+    if ACTIVE is not None:
+        ACTIVE.leave_unguarded(clauses)
+
+
+def add_group_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--guard', metavar='PATTERN', action='append', default=[],
+                        help='Guard the constraint passes matching PATTERN (named as in --encoding-report, e.g. "optimisations.*") so they can be disabled')
+    parser.add_argument('--disable-group', metavar='NAME', action='append', default=[],
+                        help='Solve with the guarded constraint pass NAME switched off, by assumption (a warm --server grid is not encoded again)')
+
+
+def describe_core(groups: Optional[List[str]]) -> Optional[str]:
+    if groups is None:
+        return None
+    if len(groups) == 0:
+        return 'Unsatisfiable whichever guarded constraint groups are enabled'
+    return 'Unsatisfiable with the constraint groups: ' + ', '.join(groups)
+
+
+__all__ = [
+    'ConstraintGroups',
+    'add_group_arguments',
+    'describe_core',
+    'leave_unguarded',
+]
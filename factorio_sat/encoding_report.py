@@ -0,0 +1,292 @@
+import argparse
+import contextlib
+import functools
+import itertools
+import json
+import sys
+import time
+from dataclasses import asdict, dataclass
+from typing import Any, Callable, Dict, Iterator, List, Optional, TextIO, TypeVar
+
+from . import constraint_groups, profiling
+
+# Constraint passes take the grid (or are methods of it, or create it) and append to grid.clauses, clause helpers
+# (cardinality encodings) return their clauses. The decorators cost a couple of checks while nothing is being recorded or guarded.
+
+REPORT_FORMATS = ('table', 'json')
+
+F = TypeVar('F', bound=Callable[..., Any])
+
+
+@dataclass
+class FamilyStats:
+    calls: int = 0
+    clauses: int = 0
+    literals: int = 0
+    variables: int = 0
+    time: float = 0.0
+
+    def add(self, clauses: int, literals: int, variables: int, elapsed: float):
+        self.calls += 1
+        self.clauses += clauses
+        self.literals += literals
+        self.variables += variables
+        self.time += elapsed
+
+
+@dataclass
+class SiteStats(FamilyStats):
+    encoding: str = ''
+
+
+class Frame:
+    def __init__(self, grid):
+        self.grid = grid
+        self.child_clauses = 0
+        self.child_literals = 0
+        self.child_variables = 0
+        self.child_time = 0.0
+
+
+def clause_count(grid) -> int:
+    return len(getattr(grid, 'clauses', ()))
+
+
+def variable_count(grid) -> int:
+    pool = getattr(grid, 'pool', None)
+    return 0 if pool is None else pool.top
+
+
+class EncodingReport:
+    def __init__(self):
+        self.passes: Dict[str, FamilyStats] = {}
+        self.helpers: Dict[str, FamilyStats] = {}
+        self.sites: Dict[str, SiteStats] = {}
+        self.site: Optional[SiteStats] = None
+        self.frames: List[Frame] = []
+        self.in_helper = False
+        self.previous: Optional['EncodingReport'] = None
+        self.total_time = 0.0
+        self.start = 0.0
+
+    def __enter__(self):
+        global ACTIVE
+        self.previous = ACTIVE
+        ACTIVE = self
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *_):
+        global ACTIVE
+        self.total_time = time.perf_counter() - self.start
+        ACTIVE = self.previous
+
+    def run_pass(self, name: str, function: Callable[..., Any], first, args, kwargs) -> Any:
+        # Passes are given the grid, or create it (grid factories and Grid.__init__ itself)
+        start_clauses = clause_count(first)
+        start_variables = variable_count(first)
+        frame = Frame(first)
+        self.frames.append(frame)
+        start = time.perf_counter()
+        try:
+            result = function(first, *args, **kwargs)
+        finally:
+            self.frames.pop()
+        elapsed = time.perf_counter() - start
+
+        grid = first if hasattr(first, 'clauses') else result
+        # Clauses are only ever appended, so everything past the starting length came from this pass (or a nested one)
+        new_clauses = getattr(grid, 'clauses', ())[start_clauses:]
+        clauses = len(new_clauses)
+        literals = sum(len(clause) for clause in new_clauses)
+        variables = variable_count(grid) - start_variables
+
+        # Nested passes are reported on their own, only the remainder is counted against this one
+        self.passes.setdefault(name, FamilyStats()).add(clauses - frame.child_clauses, literals - frame.child_literals,
+                                                        variables - frame.child_variables, elapsed - frame.child_time)
+        if len(self.frames) != 0:
+            parent = self.frames[-1]
+            parent.child_clauses += clauses
+            parent.child_literals += literals
+            parent.child_variables += variables
+            parent.child_time += elapsed
+            if not hasattr(parent.grid, 'pool'):  # A factory, the grid it is building now exists
+                parent.grid = grid
+        return result
+
+    def run_helper(self, name: str, function: Callable[..., Any], args, kwargs) -> Any:
+        if self.in_helper:  # e.g. quadratic_one calling quadratic_amo, only the outer call is counted
+            return function(*args, **kwargs)
+
+        grid = next((frame.grid for frame in reversed(self.frames) if hasattr(frame.grid, 'pool')), None)
+        start_variables = variable_count(grid)
+        self.in_helper = True
+        start = time.perf_counter()
+        try:
+            clauses = function(*args, **kwargs)
+        finally:
+            self.in_helper = False
+        elapsed = time.perf_counter() - start
+
+        literals = sum(len(clause) for clause in clauses)
+        self.helpers.setdefault(name, FamilyStats()).add(len(clauses), literals, variable_count(grid) - start_variables, elapsed)
+        if self.site is not None:
+            self.site.add(len(clauses), literals, variable_count(grid) - start_variables, elapsed)
+        return clauses
+
+    def summary(self, grid) -> Dict[str, Any]:
+        attributed = FamilyStats()
+        for stats in self.passes.values():
+            attributed.clauses += stats.clauses
+            attributed.literals += stats.literals
+            attributed.variables += stats.variables
+            attributed.time += stats.time
+
+        passes = dict((name, asdict(stats)) for name, stats in sorted(self.passes.items(), key=lambda item: -item[1].clauses))
+        total_literals = sum(len(clause) for clause in grid.clauses)
+        passes['other'] = asdict(FamilyStats(
+            0,
+            len(grid.clauses) - attributed.clauses,
+            total_literals - attributed.literals,
+            grid.pool.top - attributed.variables,
+            max(self.total_time - attributed.time, 0.0),
+        ))
+
+        return {
+            'passes': passes,
+            'helpers': dict((name, asdict(stats)) for name, stats in sorted(self.helpers.items(), key=lambda item: -item[1].clauses)),
+            'sites': dict((name, asdict(stats)) for name, stats in sorted(self.sites.items(), key=lambda item: -item[1].clauses)),
+            'total': {
+                'clauses': len(grid.clauses),
+                'literals': total_literals,
+                'variables': grid.pool.top,
+                'time': self.total_time,
+            },
+        }
+
+    def write(self, grid, format: str = 'table', file: Optional[TextIO] = None):
+        if file is None:
+            file = sys.stderr
+
+        summary = self.summary(grid)
+        if format == 'json':
+            print(json.dumps(summary), file=file)
+            return
+        if format != 'table':
+            raise RuntimeError(f'Unknown report format: {format}')
+
+        total = summary['total']
+        site_names = dict((name, f'{name} ({stats["encoding"]})') for name, stats in summary['sites'].items())
+        name_width = max(len(name) for name in itertools.chain(summary['passes'], summary['helpers'], site_names.values(), ['total']))
+
+        def row(name: str, stats: Dict[str, Any]) -> str:
+            share = 100 * stats['clauses'] / total['clauses'] if total['clauses'] != 0 else 0
+            calls = '' if stats.get('calls', 0) == 0 else stats['calls']
+            return (f'{name:<{name_width}} {calls:>7} {stats["clauses"]:>10} {share:>6.1f}% {stats["literals"]:>10} '
+                    f'{stats["variables"]:>9} {1000 * stats["time"]:>9.1f}')
+
+        header = f'{"":<{name_width}} {"calls":>7} {"clauses":>10} {"share":>7} {"literals":>10} {"variables":>9} {"time (ms)":>9}'
+        print(header, file=file)
+        for name, stats in summary['passes'].items():
+            print(row(name, stats), file=file)
+        print(row('total', total), file=file)
+
+        if len(summary['helpers']) != 0:
+            print(file=file)
+            print('Cardinality encodings (already included in the passes above):', file=file)
+            for name, stats in summary['helpers'].items():
+                print(row(name, stats), file=file)
+
+        if len(summary['sites']) != 0:
+            print(file=file)
+            print('Cardinality call sites and their encodings:', file=file)
+            for name, stats in summary['sites'].items():
+                print(row(site_names[name], stats), file=file)
+
+
+ACTIVE: Optional[EncodingReport] = None
+
+
+@contextlib.contextmanager
+def cardinality_site(site: str, encoding: str) -> Iterator[None]:
+    # Clause helpers called within are also counted against the call site, along with the encoding chosen for it
+    if ACTIVE is None or ACTIVE.in_helper:
+        yield
+        return
+
+    stats = ACTIVE.sites.setdefault(site, SiteStats(encoding=encoding))
+    if stats.encoding != encoding:  # The same site with different encodings (e.g. set again by hand)
+        stats.encoding = 'mixed'
+    previous = ACTIVE.site
+    ACTIVE.site = stats
+    try:
+        yield
+    finally:
+        ACTIVE.site = previous
+
+
+def family_name(function: Callable[..., Any]) -> str:
+    module = function.__module__
+    if module == '__main__':  # Run with python -m, the module is still named after its file
+        spec = getattr(sys.modules['__main__'], '__spec__', None)
+        if spec is not None:
+            module = spec.name
+    return module.rsplit('.', 1)[-1] + '.' + function.__qualname__
+
+
+def constraint_pass(function: F) -> F:
+    name = family_name(function)
+
+    def run(grid, *args, **kwargs):
+        if ACTIVE is None and profiling.ACTIVE is None:
+            return function(grid, *args, **kwargs)
+        with profiling.phase(name):
+            if ACTIVE is None:
+                return function(grid, *args, **kwargs)
+            return ACTIVE.run_pass(name, function, grid, args, kwargs)
+
+    @functools.wraps(function)
+    def wrapper(grid, *args, **kwargs):
+        if constraint_groups.ACTIVE is not None and constraint_groups.ACTIVE.guards(name):
+            return constraint_groups.ACTIVE.run_pass(name, run, grid, args, kwargs)
+        return run(grid, *args, **kwargs)
+    return wrapper  # type: ignore
+
+
+def clause_helper(function: F) -> F:
+    name = family_name(function)
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        if ACTIVE is None:
+            return function(*args, **kwargs)
+        return ACTIVE.run_helper(name, function, args, kwargs)
+    return wrapper  # type: ignore
+
+
+def add_report_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--encoding-report', nargs='?', choices=REPORT_FORMATS, const='table',
+                        help='Print the clauses, literals, variables and time each constraint pass adds to stderr')
+
+
+def build_grid(create_grid: Callable[[argparse.Namespace], Any], args: argparse.Namespace):
+    guards = getattr(args, 'guard', [])
+    with constraint_groups.ConstraintGroups(guards) if len(guards) != 0 else contextlib.nullcontext():
+        if args.encoding_report is None:
+            with profiling.phase('encode'):
+                return create_grid(args)
+
+        with EncodingReport() as report, profiling.phase('encode'):
+            grid = create_grid(args)
+    report.write(grid, args.encoding_report)
+    return grid
+
+
+__all__ = [
+    'EncodingReport',
+    'FamilyStats',
+    'add_report_arguments',
+    'build_grid',
+    'clause_helper',
+    'constraint_pass',
+]
@@ -0,0 +1,146 @@
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from typing import TYPE_CHECKING, Callable, Iterator, List, Optional
+
+from . import constraint_groups, profiling
+from .background import DEFAULT_QUEUE_SIZE, interrupt_solve, threaded
+from .packed import SolutionWriter
+from .symmetry import GROUPS, Deduplicator, orbit_images
+from .util import LiteralType
+
+if TYPE_CHECKING:
+    from .solver import Grid
+
+PROGRESS_INTERVAL = 10  # Seconds between progress reports when counting
+
+# What makes two enumerated solutions different: the full tiles, only the tile types, or only the splitter positions
+PROJECTIONS = ('tiles', 'types', 'splitters')
+
+
+def add_enumeration_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--projection', choices=PROJECTIONS, default='tiles',
+                        help='What makes two solutions different with --all/--count (e.g. "splitters" ignores belt routing)')
+    parser.add_argument('--count', action='store_true', help='Count all solutions instead of printing them')
+    parser.add_argument('--dedupe', choices=GROUPS, help='Drop solutions that are a mirror image/rotation of an earlier one')
+    parser.add_argument('--translations', action='store_true', help='With --dedupe, solutions that only differ by a wrapping translation are also duplicates')
+    parser.add_argument('--block-orbits', action='store_true', help='With --dedupe, block every symmetric image of a solution in the solver as well')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE,
+                        help='Solutions buffered between the solver thread and the output with --all/--count, 0 to use a single thread')
+
+
+def get_orbit(grid: Grid, args: argparse.Namespace) -> Optional[Callable[[List[LiteralType]], Iterator[List[LiteralType]]]]:
+    if args.dedupe is None:
+        if args.translations or args.block_orbits:
+            raise RuntimeError('--translations and --block-orbits need --dedupe')
+        return None
+    if not args.block_orbits:
+        return None
+    return orbit_images(grid, args.dedupe, args.translations)
+
+
+class SolverTimer:
+    # Time spent inside the solver, measured on whichever thread drives the models
+    def __init__(self):
+        self.models = 0
+        self.elapsed = 0.0
+
+    def measure(self, models: Iterator[List[LiteralType]]) -> Iterator[List[LiteralType]]:
+        models = iter(models)
+        try:
+            while True:
+                start = time.perf_counter()
+                try:
+                    model = next(models)
+                except StopIteration:
+                    return
+                finally:
+                    self.elapsed += time.perf_counter() - start
+                self.models += 1
+                yield model
+        finally:
+            if hasattr(models, 'close'):
+                models.close()
+
+
+def rate(count: int, elapsed: float) -> float:
+    return count / elapsed if elapsed > 0 else float('inf')
+
+
+def count_models(models: Iterator[List[LiteralType]]) -> int:
+    count = 0
+    start = last_report = time.perf_counter()
+    for _ in models:
+        count += 1
+
+        now = time.perf_counter()
+        if now - last_report >= PROGRESS_INTERVAL:
+            print(f'{count} solutions ({count / (now - start):.1f}/s)', file=sys.stderr)
+            last_report = now
+
+    elapsed = time.perf_counter() - start
+    print(f'{count} solutions in {elapsed:.2f}s ({rate(count, elapsed):.1f}/s)')
+    return count
+
+
+def write_models(grid: Grid, models: Iterator[List[LiteralType]], args: argparse.Namespace, writer: SolutionWriter):
+    if args.queue_size < 0:
+        raise RuntimeError('Queue size must not be negative')
+
+    deduplicator = None
+    if args.dedupe is not None:
+        deduplicator = Deduplicator(args.dedupe, args.translations)
+
+    # With many solutions the solver runs on its own thread, so search resumes as soon as a model is blocked
+    # instead of waiting for it to be parsed and written. The bounded queue holds it back when the output can't keep up.
+    timer = None
+    if (args.all or args.count) and args.queue_size > 0:
+        timer = SolverTimer()
+        models = threaded(timer.measure(models), args.queue_size, wait=True, stop=interrupt_solve)
+
+    start = time.perf_counter()
+    output_time = 0.0
+    written = 0
+    if args.count:
+        if deduplicator is not None:
+            models = (model for model in models if deduplicator.add(grid.parse_solution(model)))
+        count_models(models)
+    else:
+        for model in models:
+            output_start = time.perf_counter()
+            solution = grid.parse_solution(model)
+            if deduplicator is None or deduplicator.add(solution):
+                with profiling.phase('write'):
+                    writer.write(solution)
+                written += 1
+
+                if written == 1:
+                    writer.flush()  # Push the first one out as fast a possible
+            output_time += time.perf_counter() - output_start
+
+            if written == 1 and not args.all:
+                break
+
+    core = constraint_groups.describe_core(grid.unsat_groups)
+    if core is not None:
+        print(core, file=sys.stderr)
+
+    if deduplicator is not None:
+        print(f'{deduplicator.duplicates} symmetric duplicates dropped', file=sys.stderr)
+
+    if timer is not None:
+        report = f'{timer.models} models in {time.perf_counter() - start:.2f}s: solver {timer.elapsed:.2f}s ({rate(timer.models, timer.elapsed):.1f}/s)'
+        if not args.count:
+            report += f', parse and write {output_time:.2f}s ({rate(timer.models, output_time):.1f}/s)'
+        print(report, file=sys.stderr)
+
+
+__all__ = [
+    'SolverTimer',
+    'add_enumeration_arguments',
+    'count_models',
+    'get_orbit',
+    'write_models',
+]
@@ -0,0 +1,255 @@
+from __future__ import annotations
+
+import argparse
+import copy
+import io
+import itertools
+import sys
+from dataclasses import dataclass, field
+from typing import TYPE_CHECKING, Any, Callable, Dict, List, Optional, TextIO, Tuple
+
+from .encoding_report import EncodingReport
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Counts are predicted per constraint family: each family is encoded at a handful of small sizes (with the same network
+# and options) and its clause, literal and variable counts are fitted with a low degree polynomial in width and height.
+
+CALIBRATION_SAMPLES = 8
+# Patterns (e.g. preventing semicircles, or anything along an underground) only appear once the grid is larger than them,
+# so the smallest sizes are not on the same polynomial as the rest
+MIN_CALIBRATION_EXTENT = 6
+MAX_FAILURES = 2 * CALIBRATION_SAMPLES
+CALIBRATION_ERRORS = (AssertionError, RuntimeError, ValueError, IndexError)  # Too small for the network, wrong parity etc.
+
+# Bytes per literal of the clause lists (CPython 3.11, measured with tracemalloc on belt_balancer encodes)
+PYTHON_BYTES_PER_LITERAL = 41
+# Minisat style solvers: 4 bytes per literal plus a clause header in the arena (which grows by doubling), two watchers per clause
+SOLVER_BYTES_PER_LITERAL = 8
+SOLVER_BYTES_PER_CLAUSE = 40
+SOLVER_BYTES_PER_VARIABLE = 64
+
+Size = Tuple[int, int]
+BuildFunction = Callable[[int, int], Any]
+
+# Polynomial terms (powers of width and height), from the simplest model to the most flexible
+BASES: Tuple[Tuple[Tuple[int, int], ...], ...] = (
+    ((0, 0), (1, 1)),
+    ((0, 0), (1, 0), (0, 1), (1, 1)),
+    ((0, 0), (1, 0), (0, 1), (1, 1), (2, 1), (1, 2)),
+    ((0, 0), (1, 0), (0, 1), (1, 1), (2, 0), (0, 2), (2, 1), (1, 2)),
+)
+
+
+@dataclass
+class Estimate:
+    width: int
+    height: int
+    variables: int
+    clauses: int
+    literals: int
+    families: Dict[str, Dict[str, int]] = field(default_factory=dict)
+
+    @property
+    def python_memory(self) -> int:
+        return PYTHON_BYTES_PER_LITERAL * self.literals
+
+    @property
+    def solver_memory(self) -> int:
+        return SOLVER_BYTES_PER_LITERAL * self.literals + SOLVER_BYTES_PER_CLAUSE * self.clauses + SOLVER_BYTES_PER_VARIABLE * self.variables
+
+    @property
+    def memory(self) -> int:
+        # Both are alive at once while the solver is bootstrapped
+        return self.python_memory + self.solver_memory
+
+    def to_json(self) -> Dict[str, Any]:
+        return {
+            'width': self.width,
+            'height': self.height,
+            'variables': self.variables,
+            'clauses': self.clauses,
+            'literals': self.literals,
+            'memory': self.memory,
+            'families': self.families,
+        }
+
+
+def design_matrix(sizes: List[Size], basis: Tuple[Tuple[int, int], ...]) -> np.ndarray:
+    import numpy as np
+
+    return np.array([[float(width) ** a * float(height) ** b for a, b in basis] for width, height in sizes])
+
+
+def usable_bases(sizes: List[Size]) -> List[Tuple[Tuple[int, int], ...]]:
+    # A power is only identifiable if there are more distinct values of that dimension, terms that can't be are dropped
+    widths = len(set(width for width, _ in sizes))
+    heights = len(set(height for _, height in sizes))
+    result = []
+    for basis in BASES:
+        reduced = tuple(sorted(set((min(a, widths - 1), min(b, heights - 1)) for a, b in basis)))
+        if len(reduced) <= len(sizes) and reduced not in result:
+            result.append(reduced)
+    return result
+
+
+def fit(sizes: List[Size], values: List[float]) -> Tuple[Tuple[Tuple[int, int], ...], np.ndarray]:
+    import numpy as np
+
+    # The basis that best predicts each sample from the others (leave-one-out) is used, the cardinality encodings are
+    # not exactly polynomial and a flexible basis fitted to their noise extrapolates badly
+    target = np.array(values, dtype=float)
+
+    best = None
+    for basis in usable_bases(sizes):
+        matrix = design_matrix(sizes, basis)
+        coefficients = np.linalg.lstsq(matrix, target, rcond=None)[0]
+        residuals = target - matrix @ coefficients
+        leverage = np.einsum('ij,ji->i', matrix, np.linalg.pinv(matrix))
+        if np.any(leverage > 1 - 1e-9):  # A sample only this basis can explain, nothing to validate against
+            error = float('inf')
+        else:
+            error = np.sqrt(np.mean((residuals / (1 - leverage)) ** 2))
+        if best is None or error < best[0] * (1 - 1e-6):
+            best = error, basis, coefficients
+    assert best is not None
+    return best[1], best[2]
+
+
+class CostModel:
+    def __init__(self, samples: List[Tuple[Size, Dict[str, Any]]]):
+        if len(samples) == 0:
+            raise RuntimeError('No calibration sizes could be encoded')
+        self.sizes = [size for size, _ in samples]
+
+        families = sorted(set(name for _, summary in samples for name in summary['passes']))
+        self.fits: Dict[Tuple[str, str], Tuple[Tuple[Tuple[int, int], ...], np.ndarray]] = {}
+        for name in families:
+            for quantity in ('clauses', 'literals', 'variables'):
+                values = [summary['passes'].get(name, {}).get(quantity, 0) for _, summary in samples]
+                self.fits[name, quantity] = fit(self.sizes, values)
+
+    def predict(self, width: int, height: int) -> Estimate:
+        families: Dict[str, Dict[str, int]] = {}
+        for (name, quantity), (basis, coefficients) in self.fits.items():
+            value = float(design_matrix([(width, height)], basis) @ coefficients)
+            families.setdefault(name, {})[quantity] = max(int(round(value)), 0)
+
+        return Estimate(
+            width,
+            height,
+            sum(family['variables'] for family in families.values()),
+            sum(family['clauses'] for family in families.values()),
+            sum(family['literals'] for family in families.values()),
+            families,
+        )
+
+
+def encode_sample(build: BuildFunction, width: int, height: int) -> Optional[Dict[str, Any]]:
+    try:
+        with EncodingReport() as report:
+            grid = build(width, height)
+    except CALIBRATION_ERRORS:
+        return None
+    return report.summary(grid)
+
+
+def smallest_size(build: BuildFunction, width: int, height: int) -> Size:
+    # Usually only one dimension is bounded (e.g. the height by the number of inputs), trying the other at its smallest is cheap
+    min_width = min(width, MIN_CALIBRATION_EXTENT)
+    min_height = min(height, MIN_CALIBRATION_EXTENT)
+    for sample_height in range(min_height, height + 1):
+        if encode_sample(build, min_width, sample_height) is not None:
+            return min_width, sample_height
+    for sample_width in range(min_width + 1, width + 1):
+        if encode_sample(build, sample_width, height) is not None:
+            return sample_width, min_height
+    return min_width, min_height
+
+
+def calibration_sizes(width: int, height: int, min_width: int, min_height: int) -> List[Size]:
+    # Smallest sizes first, never larger than the target in either dimension
+    return sorted(itertools.product(range(min_width, width + 1), range(min_height, height + 1)), key=lambda size: (size[0] * size[1], size))
+
+
+def calibrate(build: BuildFunction, width: int, height: int, samples: int = CALIBRATION_SAMPLES) -> CostModel:
+    # The width and height are upper bounds of the sizes encoded, the model can predict any size
+    results: List[Tuple[Size, Dict[str, Any]]] = []
+    failures = 0
+    for size in calibration_sizes(width, height, *smallest_size(build, width, height)):
+        if len(results) >= samples or failures >= MAX_FAILURES:
+            break
+        summary = encode_sample(build, *size)
+        if summary is None:
+            failures += 1
+        else:
+            results.append((size, summary))
+    return CostModel(results)
+
+
+def estimate(build: BuildFunction, width: int, height: int, samples: int = CALIBRATION_SAMPLES) -> Estimate:
+    return calibrate(build, width, height, samples).predict(width, height)
+
+
+def resized_arguments(args: argparse.Namespace, width: int, height: int, contents: Dict[str, str]) -> argparse.Namespace:
+    new_args = copy.copy(args)
+    new_args.width = width
+    new_args.height = height
+    new_args.encoding_report = None
+    for name, value in contents.items():
+        setattr(new_args, name, io.StringIO(value))
+    if getattr(new_args, 'partial', None) is not None:  # Only adds unit clauses, and only fits the original size
+        new_args.partial = None
+    return new_args
+
+
+def estimate_generator(create_grid: Callable[[argparse.Namespace], Any], args: argparse.Namespace, samples: int = CALIBRATION_SAMPLES) -> Estimate:
+    # Input files are read once, every calibration encode gets its own copy
+    contents = {}
+    for name, value in vars(args).items():
+        if isinstance(value, io.IOBase) and name != 'partial':
+            with value:
+                contents[name] = value.read()
+
+    return estimate(lambda width, height: create_grid(resized_arguments(args, width, height, contents)), args.width, args.height, samples)
+
+
+def format_bytes(value: float) -> str:
+    for unit in ('B', 'KiB', 'MiB', 'GiB'):
+        if value < 1024:
+            return f'{value:.1f} {unit}'
+        value /= 1024
+    return f'{value:.1f} TiB'
+
+
+def write_estimate(estimate: Estimate, file: Optional[TextIO] = None):
+    if file is None:
+        file = sys.stdout
+
+    families = sorted(estimate.families.items(), key=lambda item: -item[1]['clauses'])
+    name_width = max([len(name) for name, _ in families] + [len('total')])
+    print(f'{"":<{name_width}} {"clauses":>12} {"literals":>12} {"variables":>10}', file=file)
+    for name, counts in families:
+        if counts['clauses'] == 0 and counts['variables'] == 0:
+            continue
+        print(f'{name:<{name_width}} {counts["clauses"]:>12} {counts["literals"]:>12} {counts["variables"]:>10}', file=file)
+    print(f'{"total":<{name_width}} {estimate.clauses:>12} {estimate.literals:>12} {estimate.variables:>10}', file=file)
+    print(f'Estimated memory: {format_bytes(estimate.memory)} (encoding {format_bytes(estimate.python_memory)}, '
+          f'solver {format_bytes(estimate.solver_memory)})', file=file)
+
+
+def add_estimate_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--estimate-only', action='store_true',
+                        help='Predict the variable, clause and literal counts and the memory needed from a few small encodes, without encoding or solving')
+
+
+__all__ = [
+    'CostModel',
+    'Estimate',
+    'add_estimate_arguments',
+    'calibrate',
+    'estimate',
+    'estimate_generator',
+    'write_estimate',
+]
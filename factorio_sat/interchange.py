@@ -1,78 +1,75 @@
+from __future__ import annotations
+
 import argparse
 from dataclasses import dataclass
-import json
-from typing import Iterable, List
-
-import numpy as np
+from typing import TYPE_CHECKING, Iterable, List, Optional
 
 from . import belt_balancer
-from . import optimisations
-from .cardinality import library_atleast, library_equals
+from . import capture, encoding_report, enumeration, estimate, constraint_groups, packed, profiling, serve
+from .cache import CACHE_ENVIRONMENT_VARIABLE, open_cache
 from .direction import Axis, Direction
-from .solver import Grid
-from .template import EdgeMode
-from .util import LiteralType, implies, invert_components, set_all_false, set_literal, set_not_number, set_number, set_numbers, set_numbers_equal
+from .encoding_report import constraint_pass
+from .util import (UNDERGROUND_ENCODINGS, LiteralType, implies, invert_components, set_all_false, set_literal, set_not_number, set_number, set_numbers,
+                   set_numbers_equal)
+
+if TYPE_CHECKING:
+    from .solver import Grid
 
 
+@constraint_pass
 def prevent_passing(grid: Grid):
-    assert len(grid.get_tile_instance(0, 0).colour) == 1
+    from .patterns import LEFT_FRAMES, Pattern, cells
+    from .template import EdgeMode
 
-    for direction in Direction:
-        inv_direction = direction.reverse
-        for block in grid.iterate_tile_blocks(direction.vec, 2, direction.next.vec, 2, EdgeMode.NO_WRAP):
-            if (block == None).any():
-                continue
+    assert len(grid.get_tile_instance(0, 0).colour) == 1
 
-            for colour_sign in (False, True):
-                grid.clauses.append(invert_components([
-                    set_literal(block[0, 0].colour[0], colour_sign),
-                    set_literal(block[0, 1].colour[0], colour_sign),
-                    set_literal(block[1, 0].colour[0], colour_sign),
-                    set_literal(block[1, 1].colour[0], colour_sign),
+    for colour_sign in (False, True):
+        grid.clauses += Pattern([
+            set_literal(cells[0, 0].colour[0], colour_sign),
+            set_literal(cells[0, 1].colour[0], colour_sign),
+            set_literal(cells[1, 0].colour[0], colour_sign),
+            set_literal(cells[1, 1].colour[0], colour_sign),
 
-                    block[0, 0].input_direction[direction],
-                    block[0, 0].output_direction[direction],
-                    block[0, 1].input_direction[direction],
-                    block[0, 1].output_direction[direction],
+            cells[0, 0].input_direction[Direction.RIGHT],
+            cells[0, 0].output_direction[Direction.RIGHT],
+            cells[0, 1].input_direction[Direction.RIGHT],
+            cells[0, 1].output_direction[Direction.RIGHT],
 
-                    block[1, 0].input_direction[inv_direction],
-                    block[1, 0].output_direction[inv_direction],
-                    block[1, 1].input_direction[inv_direction],
-                    block[1, 1].output_direction[inv_direction],
-                ]))
+            cells[1, 0].input_direction[Direction.LEFT],
+            cells[1, 0].output_direction[Direction.LEFT],
+            cells[1, 1].input_direction[Direction.LEFT],
+            cells[1, 1].output_direction[Direction.LEFT],
+        ]).clauses(grid, LEFT_FRAMES, EdgeMode.NO_WRAP)
 
 
+@constraint_pass
 def prevent_awkward_underground_entry(grid: Grid):
-    for direction in Direction:
-        inv_direction = direction.reverse
-        across_direction = direction.next
-        for block in grid.iterate_tile_blocks(across_direction.vec, 3, direction.vec, 3, EdgeMode.NO_WRAP):
-            if (block == None).any():
-                continue
+    from .patterns import Pattern, cells
+    from .template import EdgeMode
 
-            block[0, 1:3] = None  # Unimportant tiles
+    # Drawn with the underground belt going across, forward is the turn it is entered from
+    grid.clauses += Pattern([
+        cells[0, 0].is_empty,
+        cells[0, 0].underground[Direction.DOWN],
 
-            grid.clauses.append(invert_components([
-                block[0, 0].is_empty,
-                block[0, 0].underground[direction],
+        -cells[1, 0].underground[Direction.DOWN],
 
-                -block[1, 0].underground[direction],
+        cells[1, 1].is_empty,
 
-                block[1, 1].is_empty,
+        cells[2, 0].output_direction[Direction.RIGHT],
 
-                # block[2,0].input_direction[direction],
-                block[2, 0].output_direction[across_direction],
+        cells[2, 1].output_direction[Direction.RIGHT],
 
-                # block[2,1].input_direction[across_direction],
-                block[2, 1].output_direction[across_direction],
+        cells[2, 2].output_direction[Direction.UP],
 
-                block[2, 2].output_direction[inv_direction],
-
-                block[1, 2].output_direction[inv_direction],
-            ]))
+        cells[1, 2].output_direction[Direction.UP],
+    ]).clauses(grid, [(direction.next, direction) for direction in Direction], EdgeMode.NO_WRAP)
 
 
+@constraint_pass
 def require_rotational_symmetry(grid: Grid):
+    import numpy as np
+
     for tile_a, tile_b in zip(grid.tiles.flatten(), np.rot90(grid.tiles, 2).flatten()):
         grid.clauses += set_numbers_equal(
             tile_a.input_direction
@@ -94,7 +91,10 @@ class EdgeTemplate:
     colour: List[LiteralType]
 
 
+@constraint_pass
 def create_edge(grid: Grid, direction: Direction, from_position: int) -> List[EdgeTemplate]:
+    import numpy as np
+
     if direction.axis == Axis.HORIZONTAL:
         line = np.stack([np.full(grid.height, from_position), np.arange(grid.height)], axis=-1)
     elif direction.axis == Axis.VERTICAL:
@@ -127,6 +127,8 @@ def create_edge(grid: Grid, direction: Direction, from_position: int) -> List[Ed
 
 
 def flow_counts(interchange_size: int) -> Iterable[int]:
+    import numpy as np
+
     if interchange_size % 2 == 1:
         counts = (interchange_size // 2) - abs(np.arange(interchange_size * 2 - 1) - (interchange_size - 1)) // 2
     else:
@@ -134,7 +136,10 @@ def flow_counts(interchange_size: int) -> Iterable[int]:
     return counts[1::2]
 
 
+@constraint_pass
 def require_correct_transport_through_edges(grid: Grid):
+    from .cardinality import library_atleast, library_equals
+
     for y, count in zip(range(1, grid.height, 2), flow_counts(grid.height // 2)):
         up_edge = create_edge(grid, Direction.UP, y + 1)
         down_edge = create_edge(grid, Direction.DOWN, y)
@@ -172,17 +177,34 @@ def require_correct_transport_through_edges(grid: Grid):
         grid.clauses += library_equals(forward_flow + invert_components(backward_flow), grid.height + len(backward_edge), grid.pool)
 
 
-def main():
+def get_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description='Finds an interchange for building composite balancers')
     parser.add_argument('width', type=int, help='Interchange width')
     parser.add_argument('height', type=int, help='Combined balancer size')
     parser.add_argument('--underground-length', type=int, default=4, help='Sets the maximum length of underground section (excludes ends)')
+    parser.add_argument('--underground-encoding', type=str, choices=UNDERGROUND_ENCODINGS, default='window',
+                        help='Encoding of the underground length rules (ladder grows linearly with the underground length rather than quadratically)')
     parser.add_argument('--alternating', action='store_true', help='Restrict output colours to an alternating pattern')
     parser.add_argument('--rot-symmetry', action='store_true', help='Restrict output to rotationally symmetric interchanges')
     parser.add_argument('--all', action='store_true', help='Generate all belt balancers')
     parser.add_argument('--solver', type=str, default='Glucose3', help='Backend SAT solver to use')
+    parser.add_argument('--cache', type=str, help=f'Directory of cached solver results (defaults to ${CACHE_ENVIRONMENT_VARIABLE})')
+    parser.add_argument('--server', type=str, help='Forward the request to a running "serve" process at this address')
+    packed.add_output_arguments(parser)
+    enumeration.add_enumeration_arguments(parser)
+    encoding_report.add_report_arguments(parser)
+    constraint_groups.add_group_arguments(parser)
+    profiling.add_profile_arguments(parser)
+    estimate.add_estimate_arguments(parser)
+    capture.add_capture_arguments(parser)
     parser.add_argument('--partial', type=argparse.FileType('r'), help='Partial interchange to base solution from')
-    args = parser.parse_args()
+    return parser
+
+
+def create_grid(args) -> Grid:
+    from . import optimisations
+    from .solver import Grid
+    from .template import EdgeMode
 
     if args.height < 1:
         raise RuntimeError('Height not positive')
@@ -222,13 +244,13 @@ def main():
     grid.prevent_bad_colouring(EdgeMode.NO_WRAP)
 
     grid.prevent_intersection(EdgeMode.NO_WRAP)
-    grid.enforce_maximum_underground_length(EdgeMode.NO_WRAP)
+    grid.enforce_maximum_underground_length(EdgeMode.NO_WRAP, args.underground_encoding)
 
     if args.rot_symmetry:
         require_rotational_symmetry(grid)
         optimisations.expand_underground(grid)
         optimisations.prevent_small_loops(grid)
-        optimisations.prevent_empty_along_underground(grid, EdgeMode.NO_WRAP)
+        optimisations.prevent_empty_along_underground(grid, EdgeMode.NO_WRAP, args.underground_encoding)
         optimisations.prevent_belt_hooks(grid, EdgeMode.NO_WRAP)
         optimisations.prevent_mergeable_underground(grid, EdgeMode.NO_WRAP)
         optimisations.prevent_semicircles(grid, EdgeMode.NO_WRAP)
@@ -245,10 +267,27 @@ def main():
         with args.partial:
             belt_balancer.set_nonempty_tiles(grid, args.partial.read())
 
-    for solution in grid.itersolve(solver=args.solver, ignore_colour=True):
-        print(json.dumps(solution.tolist()))
-        if not args.all:
-            break
+    return grid
+
+
+def main(argv: Optional[List[str]] = None):
+    args = get_parser().parse_args(argv)
+
+    if args.server is not None:
+        serve.forward(args.server, 'interchange', argv)
+        return
+
+    if args.estimate_only:
+        estimate.write_estimate(estimate.estimate_generator(create_grid, args))
+        return
+
+    with profiling.profiled(args), capture.captured(args, 'interchange', argv):
+        grid = encoding_report.build_grid(create_grid, args)
+
+        with packed.open_output(args) as writer:
+            models = grid.itermodels(solver=args.solver, ignore_colour=True, cache=open_cache(args.cache), projection=args.projection,
+                                     orbit=enumeration.get_orbit(grid, args), disabled_groups=args.disable_group)
+            enumeration.write_models(grid, models, args, writer)
 
 
 if __name__ == '__main__':
@@ -55,6 +55,7 @@ class IPASIRSolver:
         self.lib = lib
         self.solver_p = lib.ipasir_init()
         self.variables: Set[int] = set()
+        self.assumptions: List[LiteralType] = []
         self._learn_callback = None
         self._terminate_callback = None
 
@@ -118,9 +119,13 @@ class IPASIRSolver:
 
         self.lib.ipasir_assume(self.solver_p, lit)
 
-    def solve(self):
+    def solve(self, assumptions: List[LiteralType] = []):
         self.check_closed()
 
+        self.assumptions = list(assumptions)
+        for lit in assumptions:
+            self.assume(lit)
+
         res = self.lib.ipasir_solve(self.solver_p)
         if res == 0:  # Terminated
             return None
@@ -146,6 +151,10 @@ class IPASIRSolver:
 
         return bool(self.lib.ipasir_failed(self.solver_p, lit))
 
+    def get_core(self) -> List[LiteralType]:
+        # The assumptions of the last (unsatisfiable) solve it depended on, as pysat returns them
+        return [lit for lit in self.assumptions if self.unsat_used_assumption(lit)]
+
     def __enter__(self):
         self.check_closed()
         return self
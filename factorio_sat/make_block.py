@@ -1,14 +1,21 @@
+from __future__ import annotations
+
 import argparse
-import json
 import sys
+from typing import TYPE_CHECKING, List, Optional
 
-from . import optimisations
-from . import solver
+from . import capture, encoding_report, enumeration, estimate, constraint_groups, packed, profiling, serve
+from .cache import CACHE_ENVIRONMENT_VARIABLE, open_cache
 from .direction import Axis, Direction
-from .template import EdgeMode, EdgeModeType
-from .util import implies, increment_number, invert_components, set_all_false, set_number, set_numbers_equal
+from .encoding_report import constraint_pass
+from .util import UNDERGROUND_ENCODINGS, implies, increment_number, invert_components, set_all_false, set_number, set_numbers_equal
+
+if TYPE_CHECKING:
+    from . import solver
+    from .template import EdgeModeType
 
 
+@constraint_pass
 def ensure_loop_length(grid: solver.Grid, edge_mode: EdgeModeType):
     for y in range(grid.height):
         for x in range(grid.width):
@@ -47,6 +54,7 @@ def ensure_loop_length(grid: solver.Grid, edge_mode: EdgeModeType):
                 grid.clauses += implies([tile_a.underground[direction], tile_b.underground[direction]], set_numbers_equal(colour_a, colour_b))
 
 
+@constraint_pass
 def prevent_parallel(grid: solver.Grid, edge_mode: EdgeModeType):
     for x in range(grid.width):
         for y in range(grid.height):
@@ -62,20 +70,36 @@ def prevent_parallel(grid: solver.Grid, edge_mode: EdgeModeType):
                 grid.clauses.append([-tile_a.underground[direction + 2], -tile_b.underground[direction + 2]])
 
 
-def main():
+def get_parser() -> argparse.ArgumentParser:
     parser = argparse.ArgumentParser(description='Creates a stream of blocks of random belts')
     parser.add_argument('width', type=int, help='Block width')
     parser.add_argument('height', type=int, help='Block height')
     parser.add_argument('--tile', action='store_true', help='Makes output blocks tilable')
     parser.add_argument('--allow-empty', action='store_true', help='Allow empty tiles')
     parser.add_argument('--underground-length', type=int, default=4, help='Maximum length of underground section (excludes ends)')
+    parser.add_argument('--underground-encoding', type=str, choices=UNDERGROUND_ENCODINGS, default='window',
+                        help='Encoding of the underground length rules (ladder grows linearly with the underground length rather than quadratically)')
     parser.add_argument('--no-parallel', action='store_true', help='Prevent parallel underground segments')
     parser.add_argument('--all', action='store_true', help='Produce all blocks')
     parser.add_argument('--label', type=str, help='Output blueprint label')
     parser.add_argument('--solver', type=str, default='Glucose3', help='Backend SAT solver to use')
+    parser.add_argument('--cache', type=str, help=f'Directory of cached solver results (defaults to ${CACHE_ENVIRONMENT_VARIABLE})')
+    parser.add_argument('--server', type=str, help='Forward the request to a running "serve" process at this address')
+    packed.add_output_arguments(parser)
+    enumeration.add_enumeration_arguments(parser)
+    encoding_report.add_report_arguments(parser)
+    constraint_groups.add_group_arguments(parser)
+    profiling.add_profile_arguments(parser)
+    estimate.add_estimate_arguments(parser)
+    capture.add_capture_arguments(parser)
     parser.add_argument('--single-loop', action='store_true', help='Prevent multiple loops')
     parser.add_argument('--output', type=argparse.FileType('w'), nargs='?', help='Output file, if no file provided then results are sent to standard out')
-    args = parser.parse_args()
+    return parser
+
+
+def create_grid(args) -> solver.Grid:
+    from . import optimisations, solver
+    from .template import EdgeMode
 
     if args.allow_empty and args.single_loop:
         raise RuntimeError('Incompatible options: allow-empty + single-loop')
@@ -98,8 +122,8 @@ def main():
     optimisations.prevent_small_loops(grid)
 
     if grid.underground_length > 0:
-        grid.enforce_maximum_underground_length(edge_mode)
-        optimisations.prevent_empty_along_underground(grid, edge_mode)
+        grid.enforce_maximum_underground_length(edge_mode, args.underground_encoding)
+        optimisations.prevent_empty_along_underground(grid, edge_mode, args.underground_encoding)
 
     if args.no_parallel:
         prevent_parallel(grid, edge_mode)
@@ -116,22 +140,31 @@ def main():
 
         grid.clauses.append([-tile.is_splitter])  # Ban splitters
 
-    if args.output is not None:
-        with args.output:
-            for solution in grid.itersolve(solver=args.solver, ignore_colour=True):
-                json.dump(solution.tolist(), args.output)
-                args.output.write('\n')
-                if not args.all:
-                    break
-    else:
-        for i, solution in enumerate(grid.itersolve(solver=args.solver, ignore_colour=True)):
-            print(json.dumps(solution.tolist()))
+    return grid
 
-            if i == 0:
-                sys.stdout.flush()  # Push the first one out as fast a possible
 
-            if not args.all:
-                break
+def main(argv: Optional[List[str]] = None):
+    args = get_parser().parse_args(argv)
+
+    if args.server is not None:
+        serve.forward(args.server, 'make_block', argv)
+        return
+
+    if args.estimate_only:
+        estimate.write_estimate(estimate.estimate_generator(create_grid, args))
+        return
+
+    with profiling.profiled(args), capture.captured(args, 'make_block', argv):
+        grid = encoding_report.build_grid(create_grid, args)
+
+        output = args.output if args.output is not None else sys.stdout
+        with packed.open_output(args, output) as writer:
+            models = grid.itermodels(solver=args.solver, ignore_colour=True, cache=open_cache(args.cache), projection=args.projection,
+                                     orbit=enumeration.get_orbit(grid, args), disabled_groups=args.disable_group)
+            enumeration.write_models(grid, models, args, writer)
+
+    if args.output is not None:
+        args.output.close()
 
 
 if __name__ == '__main__':
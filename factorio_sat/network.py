@@ -1,22 +1,13 @@
 import argparse
 import collections
 import copy
-import json
 import math
 from os import path
-from typing import Tuple
-
-import numpy as np
-from pysat.solvers import Solver
+from typing import List, Optional, Tuple
 
 from .tile import Belt, EmptyTile, FillerTile, Splitter, UndergroundBelt
 from .util import bin_length, get_popcount, read_number, set_not_number
-from . import blueprint
-
-try:
-    from graphviz import Digraph
-except ModuleNotFoundError:
-    print('"graphviz" not installed: network rendering will not work')
+from . import blueprint, packed, serve
 
 
 def create_benes_network(size):
@@ -71,6 +62,11 @@ def create_benes_network(size):
 
 
 def plot(network, filename=None, engine='dot'):
+    try:
+        from graphviz import Digraph
+    except ModuleNotFoundError:
+        raise RuntimeError('"graphviz" not installed: network rendering will not work')
+
     g = Digraph(engine=engine, node_attr={'shape': 'rect', 'height': '0.5', 'width': '0.3'}, graph_attr={'rankdir': 'LR'})
 
     g.node('start', style='invis')
@@ -407,6 +403,8 @@ def calculate_cost(network):
 
 
 def optimise_colours(network, solver='g3'):
+    from pysat.solvers import Solver
+
     starting_cost = calculate_cost(network)
 
     input_colours = set()
@@ -502,6 +500,8 @@ def optimise_colours(network, solver='g3'):
 
 
 def parse_network(tiles, assume_edge_splitter_are_connected=False):
+    import numpy as np
+
     tiles = tiles.T
 
     colour_mapping = np.full_like(tiles, None)
@@ -689,11 +689,14 @@ def tidy_network(network):
     return network
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
+    server_parser = argparse.ArgumentParser(add_help=False)
+    server_parser.add_argument('--server', type=str, help='Forward the request to a running "serve" process at this address')
+
     parser = argparse.ArgumentParser(description='Manipulate belt balancer networks')
     subparsers = parser.add_subparsers(dest='mode', required=True)
 
-    create_parser = subparsers.add_parser('create', help='Create a belt balancer network')
+    create_parser = subparsers.add_parser('create', help='Create a belt balancer network', parents=[server_parser])
     create_parser.add_argument('network', type=argparse.FileType('w'), help='Output network destination')
     create_parser.add_argument('size', type=int, help='Size of the generated balancer')
 
@@ -701,20 +704,24 @@ def main():
     # optimise_parser.add_argument('input_network', type=argparse.FileType('r'), help='Input network destination')
     # optimise_parser.add_argument('output_network', type=argparse.FileType('w'), help='Output network destination')
 
-    flip_parser = subparsers.add_parser('flip', help='Flips a network around (e.g 3 to 4 network -> 4 to 3 network)')
+    flip_parser = subparsers.add_parser('flip', help='Flips a network around (e.g 3 to 4 network -> 4 to 3 network)', parents=[server_parser])
     flip_parser.add_argument('input_network', type=argparse.FileType('r'), help='Input network destination')
     flip_parser.add_argument('output_network', type=argparse.FileType('w'), help='Output network destination')
 
-    render_parser = subparsers.add_parser('render', help='Render a belt balancer network')
+    render_parser = subparsers.add_parser('render', help='Render a belt balancer network', parents=[server_parser])
     render_parser.add_argument('network', type=argparse.FileType('r'), help='Network to render')
     render_parser.add_argument('output', nargs='?', type=str, help='File to render to')
     render_parser.add_argument('--engine', type=str, default='dot', help='Layout command for rendering')
 
-    parse_parser = subparsers.add_parser('parse', help='Reads a belt balancer network from a belt balancer')
+    parse_parser = subparsers.add_parser('parse', help='Reads a belt balancer network from a belt balancer', parents=[server_parser])
     parse_parser.add_argument('output', type=argparse.FileType('w'), help='Network output file')
     parse_parser.add_argument('--assume-valid-output', action='store_true', help='Assume splitters facing outside the balancer bounds are an input/output')
 
-    args = parser.parse_args()
+    args = parser.parse_args(argv)
+
+    if args.server is not None:
+        serve.forward(args.server, 'network', argv, serve.read_stdin() if args.mode == 'parse' else None)
+        return
 
     if args.mode == 'create':
         if args.size <= 1:
@@ -730,7 +737,9 @@ def main():
 
         plot(network, args.output, args.engine)
     elif args.mode == 'parse':
-        tiles = np.array(json.loads(input()))
+        tiles = next(packed.read_solutions(), None)
+        if tiles is None:
+            raise RuntimeError('No balancer to parse')
         for i, row in enumerate(tiles):
             for j, item in enumerate(row):
                 tiles[i, j] = blueprint.read_tile(item)
@@ -1,83 +1,216 @@
 from typing import List, Optional
 
-import numpy as np
-
 from .direction import Direction
+from .encoding_report import constraint_pass
+from .patterns import ALL_FRAMES, LEFT_FRAMES, RIGHT_FRAMES, Cell, Component, Pattern, cells
 from .solver import Grid
 from .template import EdgeMode, EdgeModeType
 from .util import LiteralType, break_symmetry, implies, invert_components, set_literal
 
 
-def prevent_empty_along_underground(grid: Grid, edge_mode: EdgeModeType):
-    underground_length = min(grid.underground_length, max(grid.width, grid.height) - 2)
+def straight_belt(cell: Cell) -> List[Component]:
+    return [
+        cell.input_direction[Direction.RIGHT],
+        cell.output_direction[Direction.RIGHT],
+        cell.is_belt,
+    ]
 
-    for direction in Direction:
-        dx, dy = direction.vec
-        for x in range(grid.width):
-            for y in range(grid.height):
-                tiles = [grid.get_tile_instance(x, y)]
-                for i in range(1, underground_length + 2):
-                    new_tile = grid.get_tile_instance_offset(x, y, dx * i, dy * i, edge_mode)
-                    if new_tile is None:
-                        break
 
-                    tiles.append(new_tile)
+SMALL_LOOP = Pattern([
+    cells[0, 0].input_direction[Direction.LEFT],
+    cells[0, 0].output_direction[Direction.DOWN],
 
-                    start, *middle, end = tiles
-                    if len(middle) > 0:
-                        clause = [
-                            -start.is_underground_in,
-                            -start.input_direction[direction],
-                        ]
+    cells[1, 0].input_direction[Direction.DOWN],
+    cells[1, 0].output_direction[Direction.RIGHT],
 
-                        for tile in middle:
-                            clause.append(-tile.is_empty)
+    cells[1, 1].input_direction[Direction.RIGHT],
+    cells[1, 1].output_direction[Direction.UP],
 
-                        clause += [
-                            -end.is_underground_out,
-                            -end.output_direction[direction],
-                        ]
+    cells[0, 1].input_direction[Direction.UP],
+    cells[0, 1].output_direction[Direction.LEFT],
+])
 
-                        grid.clauses.append(clause)
+BELT_HOOKS = [Pattern([
+    cells[0, 0].is_belt,
+    cells[0, 0].input_direction[in_direction],
+    cells[0, 0].output_direction[Direction.RIGHT],
 
+    cells[0, 1].output_direction[Direction.DOWN],
 
-def prevent_small_loops(grid: Grid):
-    for x in range(grid.width - 1):
-        for y in range(grid.height - 1):
-            tile00 = grid.get_tile_instance(x + 0, y + 0)
-            tile01 = grid.get_tile_instance(x + 0, y + 1)
-            tile10 = grid.get_tile_instance(x + 1, y + 0)
-            tile11 = grid.get_tile_instance(x + 1, y + 1)
+    cells[1, 1].output_direction[Direction.LEFT],
+
+    cells[1, 0].is_belt,
+    cells[1, 0].output_direction[out_direction],
+]) for in_direction in (Direction.RIGHT, Direction.DOWN) for out_direction in (Direction.DOWN, Direction.LEFT)]
+
+SEMICIRCLES = [Pattern([
+    cells[0, 0].input_direction[in_direction],
+    *([-cells[0, 0].is_splitter] if in_direction == Direction.DOWN else []),
+
+    *invert_components(cells[0, 1].all_direction),
+
+    cells[0, 2].input_direction[Direction.UP],
+    cells[0, 2].output_direction[out_direction],
+    *([-cells[0, 2].is_splitter] if out_direction == Direction.UP else []),
+
+    cells[1, 0].input_direction[Direction.DOWN],
+
+    cells[1, 1].input_direction[Direction.RIGHT],
+    -cells[1, 1].is_splitter,
+
+    cells[1, 2].input_direction[Direction.RIGHT],
+]) for in_direction in (Direction.RIGHT, Direction.DOWN) for out_direction in (Direction.UP, Direction.RIGHT)]
+
+# The tile the underground belt surfaces or dives at is cells[0, 0], the empty tile past it cells[0, 1]
+UNDERGROUND_HOOKS = [Pattern([
+    *invert_components(cells[0, 1].all_direction),
+    cells[0, 1].underground[Direction.RIGHT],
+
+    -cells[0, 0].underground[Direction.RIGHT],
+
+    cells[0, -1].input_direction[Direction.DOWN],
+
+    cells[-1, -1].input_direction[Direction.LEFT],
+
+    cells[-1, 0].input_direction[in_direction],
+    -cells[-1, 0].is_splitter,
+]) for in_direction in (Direction.LEFT, Direction.DOWN)] + [Pattern([
+    *invert_components(cells[0, 1].all_direction),
+    cells[0, 1].underground[Direction.LEFT],
+
+    -cells[0, 0].underground[Direction.LEFT],
+
+    cells[0, -1].output_direction[Direction.UP],
+
+    cells[-1, -1].output_direction[Direction.RIGHT],
+
+    cells[-1, 0].output_direction[out_direction],
+    -cells[-1, 0].is_splitter,
+]) for out_direction in (Direction.RIGHT, Direction.UP)]
+
+ZIGZAG = Pattern([
+    cells[0, 0].input_direction[Direction.RIGHT],
+    cells[0, 0].output_direction[Direction.DOWN],
+
+    *invert_components(cells[0, 1].all_direction),
+
+    cells[1, 0].output_direction[Direction.RIGHT],
+
+    cells[1, 1].output_direction[Direction.DOWN],
+])
+
+SPIRALS = [Pattern([
+    cells[1, 0].input_direction[spiral_input_direction],
+    cells[1, 0].output_direction[Direction.DOWN],
+
+    cells[2, 0].output_direction[Direction.RIGHT],
+
+    cells[2, 1].output_direction[Direction.RIGHT],
+    cells[2, 1].is_belt,
+
+    cells[2, 2].output_direction[Direction.UP],
+
+    cells[1, 2].output_direction[Direction.UP],
+
+    cells[0, 2].output_direction[Direction.LEFT],
+
+    cells[0, 1].output_direction[Direction.DOWN],
+]) for spiral_input_direction in (Direction.RIGHT, Direction.DOWN)] + [Pattern([
+    cells[1, 0].output_direction[spiral_input_direction.reverse],
+    cells[1, 0].input_direction[Direction.UP],
+
+    cells[2, 0].input_direction[Direction.LEFT],
+
+    cells[2, 1].input_direction[Direction.LEFT],
+    cells[2, 1].is_belt,
+
+    cells[2, 2].input_direction[Direction.DOWN],
+
+    cells[1, 2].input_direction[Direction.DOWN],
 
-            grid.clauses.append([
-                -tile00.input_direction[2],
-                -tile00.output_direction[3],
+    cells[0, 2].input_direction[Direction.RIGHT],
 
-                -tile01.input_direction[3],
-                -tile01.output_direction[0],
+    cells[0, 1].input_direction[Direction.UP],
+]) for spiral_input_direction in (Direction.RIGHT, Direction.DOWN)]
 
-                -tile11.input_direction[0],
-                -tile11.output_direction[1],
+PARTIAL_SPLITTERS = [
+    Pattern([
+        cells[0, 0].input_direction[Direction.RIGHT],
+        cells[0, 0].is_splitter_head,
 
-                -tile10.input_direction[1],
-                -tile10.output_direction[2],
-            ])
+        -cells[1, 0].input_direction[Direction.RIGHT],
 
-            grid.clauses.append([
-                -tile00.input_direction[1],
-                -tile00.output_direction[0],
+        *straight_belt(cells[0, 1]),
+        *straight_belt(cells[1, 1]),
+    ]),
+    Pattern([
+        -cells[0, 0].input_direction[Direction.RIGHT],
 
-                -tile10.input_direction[0],
-                -tile10.output_direction[3],
+        cells[1, 0].input_direction[Direction.RIGHT],
+        cells[1, 0].is_splitter,
+        -cells[1, 0].is_splitter_head,
 
-                -tile11.input_direction[3],
-                -tile11.output_direction[2],
+        *straight_belt(cells[0, 1]),
+        *straight_belt(cells[1, 1]),
+    ]),
+]
 
-                -tile01.input_direction[2],
-                -tile01.output_direction[1],
-            ])
 
+@constraint_pass
+def prevent_empty_along_underground(grid: Grid, edge_mode: EdgeModeType, encoding: str = 'window'):
+    underground_length = min(grid.underground_length, max(grid.width, grid.height) - 2)
+
+    if encoding == 'ladder':
+        prevent_empty_along_underground_ladder(grid, edge_mode, underground_length)
+        return
+    if encoding != 'window':
+        raise RuntimeError(f'Unknown underground encoding: {encoding}')
+
+    for length in range(1, underground_length + 1):
+        grid.clauses += Pattern([
+            cells[0, 0].is_underground_in,
+            cells[0, 0].input_direction[Direction.RIGHT],
+
+            *(cells[0, i].is_empty for i in range(1, length + 1)),
+
+            cells[0, length + 1].is_underground_out,
+            cells[0, length + 1].output_direction[Direction.RIGHT],
+        ]).clauses(grid, LEFT_FRAMES, edge_mode)
+
+
+def prevent_empty_along_underground_ladder(grid: Grid, edge_mode: EdgeModeType, underground_length: int):
+    # spans[e] is set when the tile with is_empty literal e ends a row of empty tiles straight after an underground
+    # entrance, an exit straight after it is then ruled out without listing the row. The row needs no bound, a longer one
+    # can't be crossed by an underground belt anyway
+    if underground_length < 1:
+        return
+
+    for direction in Direction:
+        dx, dy = direction.vec
+        spans = dict((tile.is_empty, grid.allocate_variable()) for tile in grid.iterate_tiles())
+        for x in range(grid.width):
+            for y in range(grid.height):
+                tile = grid.get_tile_instance(x, y)
+                span = spans[tile.is_empty]
+
+                previous = grid.get_tile_instance_offset(x, y, -dx, -dy, edge_mode)
+                if previous is not None:
+                    grid.clauses += [
+                        [-previous.is_underground_in, -previous.input_direction[direction], -tile.is_empty, span],
+                        [-spans[previous.is_empty], -tile.is_empty, span],
+                    ]
+
+                following = grid.get_tile_instance_offset(x, y, dx, dy, edge_mode)
+                if following is not None:
+                    grid.clauses.append([-span, -following.is_underground_out, -following.output_direction[direction]])
+
+
+@constraint_pass
+def prevent_small_loops(grid: Grid):
+    grid.clauses += SMALL_LOOP.clauses(grid, ((Direction.RIGHT, Direction.DOWN), (Direction.DOWN, Direction.RIGHT)), EdgeMode.NO_WRAP)
 
+
+@constraint_pass
 def glue_splitters(grid: Grid):
     for x in range(grid.width):
         for y in range(grid.height):
@@ -109,6 +242,7 @@ def glue_splitters(grid: Grid):
                 ])
 
 
+@constraint_pass
 def shrink_underground(grid: Grid, edge_mode: EdgeModeType):
     # Has some correctness problems
     for x in range(grid.width):
@@ -131,46 +265,31 @@ def shrink_underground(grid: Grid, edge_mode: EdgeModeType):
                 ], [[-tile_a.is_empty]])
 
 
+@constraint_pass
 def expand_underground_infinite(grid: Grid, min_x: int = 0, min_y: int = 0, max_x: Optional[int] = None, max_y: Optional[int] = None):
     if max_x is None:
         max_x = grid.width - 1
     if max_y is None:
         max_y = grid.height - 1
 
-    for x in range(min_x, max_x + 1):
-        for y in range(min_y, max_y + 1):
-            for direction in Direction:
-                dx, dy = direction.vec
-
-                far_x = x + dx * 1
-                far_y = y + dy * 1
-                if far_x > max_x or far_y > max_y or far_x < min_x or far_y < min_y:
-                    continue
-
-                tiles = [grid.get_tile_instance_offset(x, y, dx * i, dy * i, EdgeMode.NO_WRAP) for i in range(2)]
-                assert all(tile is not None for tile in tiles)
+    # Prevent: Belt, Input Underground
+    grid.clauses += Pattern([
+        *straight_belt(cells[0, 0]),
 
-                # Prevent: Belt, Input Underground
-                grid.clauses.append([
-                    -tiles[0].input_direction[direction],
-                    -tiles[0].output_direction[direction],
-                    -tiles[0].is_belt,
+        cells[0, 1].is_underground_in,
+        cells[0, 1].input_direction[Direction.RIGHT],
+    ]).clauses(grid, LEFT_FRAMES, EdgeMode.NO_WRAP, min_x, min_y, max_x, max_y)
 
-                    -tiles[1].is_underground_in,
-                    -tiles[1].input_direction[direction],
-                ])
+    # Prevent: Output Underground, Belt
+    grid.clauses += Pattern([
+        cells[0, 0].is_underground_out,
+        cells[0, 1].output_direction[Direction.RIGHT],
 
-                # Prevent: Output Underground, Belt
-                grid.clauses.append([
-                    -tiles[0].is_underground_out,
-                    -tiles[1].output_direction[direction],
-
-                    -tiles[1].input_direction[direction],
-                    -tiles[1].output_direction[direction],
-                    -tiles[1].is_belt,
-                ])
+        *straight_belt(cells[0, 1]),
+    ]).clauses(grid, LEFT_FRAMES, EdgeMode.NO_WRAP, min_x, min_y, max_x, max_y)
 
 
+@constraint_pass
 def expand_underground(grid: Grid, min_x: int = 0, min_y: int = 0, max_x: Optional[int] = None, max_y: Optional[int] = None):
     if grid.underground_length == float('inf'):
         expand_underground_infinite(grid, min_x, min_y, max_x, max_y)
@@ -182,77 +301,35 @@ def expand_underground(grid: Grid, min_x: int = 0, min_y: int = 0, max_x: Option
         max_y = grid.height - 1
 
     for underground_length in range(2, grid.underground_length + 1):
-        for x in range(min_x, max_x + 1):
-            for y in range(min_y, max_y + 1):
-                for direction in Direction:
-                    dx, dy = direction.vec
+        end = underground_length + 1
 
-                    far_x = x + dx * (underground_length + 1)
-                    far_y = y + dy * (underground_length + 1)
-                    if far_x > max_x or far_y > max_y or far_x < min_x or far_y < min_y:
-                        continue
+        # BI--O
+        grid.clauses += Pattern([
+            *straight_belt(cells[0, 0]),
 
-                    tiles = [grid.get_tile_instance_offset(x, y, dx * i, dy * i, EdgeMode.NO_WRAP) for i in range(underground_length + 2)]
-                    assert all(tile is not None for tile in tiles)
+            -cells[0, 1].underground[Direction.RIGHT],
 
-                    # BI--O
-                    grid.clauses.append([
-                        -tiles[0].input_direction[direction],
-                        -tiles[0].output_direction[direction],
-                        -tiles[0].is_belt,
+            *(cells[0, i].underground[Direction.RIGHT] for i in range(2, end)),
 
-                        tiles[1].underground[direction],
+            -cells[0, end].underground[Direction.RIGHT],
+        ]).clauses(grid, LEFT_FRAMES, EdgeMode.NO_WRAP, min_x, min_y, max_x, max_y)
 
-                        *(-tile.underground[direction] for tile in tiles[2:-1]),
+        # I--OB
+        grid.clauses += Pattern([
+            -cells[0, 0].underground[Direction.RIGHT],
 
-                        tiles[-1].underground[direction],
-                    ])
+            *(cells[0, i].underground[Direction.RIGHT] for i in range(1, end - 1)),
 
-                    # I--OB
-                    grid.clauses.append([
-                        tiles[0].underground[direction],
+            -cells[0, end - 1].underground[Direction.RIGHT],
 
-                        *(-tile.underground[direction] for tile in tiles[1:-2]),
-
-                        tiles[-2].underground[direction],
-
-                        -tiles[-1].input_direction[direction],
-                        -tiles[-1].output_direction[direction],
-                        -tiles[-1].is_belt,
-                    ])
+            *straight_belt(cells[0, end]),
+        ]).clauses(grid, LEFT_FRAMES, EdgeMode.NO_WRAP, min_x, min_y, max_x, max_y)
 
 
+@constraint_pass
 def prevent_belt_hooks(grid: Grid, edge_mode: EdgeModeType):
-    for x in range(grid.width):
-        for y in range(grid.height):
-            tile00 = grid.get_tile_instance(x, y)
-            for direction in Direction:
-                for tangent in (direction.next, direction.prev):
-                    inverse = direction.reverse
-
-                    dx0, dy0 = direction.vec
-                    dx1, dy1 = tangent.vec
-                    tile01 = grid.get_tile_instance_offset(x, y, dx0, dy0, edge_mode)
-                    tile10 = grid.get_tile_instance_offset(x, y, dx1, dy1, edge_mode)
-                    tile11 = grid.get_tile_instance_offset(x, y, dx0 + dx1, dy0 + dy1, edge_mode)
-
-                    if any(tile is None for tile in (tile01, tile10, tile11)):
-                        continue
-
-                    for in_direction in (direction, tangent):
-                        for out_direction in (tangent, inverse):
-                            grid.clauses.append([
-                                -tile00.is_belt,
-                                -tile00.input_direction[in_direction],
-                                -tile00.output_direction[direction],
-
-                                -tile01.output_direction[tangent],
-
-                                -tile11.output_direction[inverse],
-
-                                -tile10.is_belt,
-                                -tile10.output_direction[out_direction],
-                            ])
+    for pattern in BELT_HOOKS:
+        grid.clauses += pattern.clauses(grid, ALL_FRAMES, edge_mode)
 
 
 def get_mergeable_underground_variations(underground_length: int):
@@ -270,145 +347,36 @@ def get_mergeable_underground_variations(underground_length: int):
         ]
 
 
+@constraint_pass
 def prevent_mergeable_underground(grid: Grid, edge_mode: EdgeModeType):
     max_underground_length = min(grid.underground_length, max(grid.width, grid.height) - 2)
 
     for underground_length in range(4, max_underground_length + 1):
-        for x in range(grid.width):
-            for y in range(grid.height):
-                for direction in Direction:
-                    dx, dy = direction.vec
-                    tiles = [grid.get_tile_instance_offset(x, y, dx * i, dy * i, edge_mode) for i in range(underground_length + 2)]
-                    if any(tile is None for tile in tiles):
-                        continue
-
-                    for variation in get_mergeable_underground_variations(underground_length):
-                        grid.clauses.append([-set_literal(tile.underground[direction], is_underground) for tile, is_underground in zip(tiles, variation)])
+        for variation in get_mergeable_underground_variations(underground_length):
+            grid.clauses += Pattern(set_literal(cells[0, i].underground[Direction.RIGHT], is_underground)
+                                    for i, is_underground in enumerate(variation)).clauses(grid, LEFT_FRAMES, edge_mode)
 
 
+@constraint_pass
 def prevent_semicircles(grid: Grid, edge_mode: EdgeModeType):
-    for x in range(grid.width):
-        for y in range(grid.height):
-            for direction in Direction:
-                for tangent in (direction.next, direction.prev):
-                    inverse_tangent = tangent.reverse
-                    dx0, dy0 = direction.vec
-                    dx1, dy1 = tangent.vec
-                    func = np.frompyfunc(lambda j, i: grid.get_tile_instance_offset(x, y, dx0 * i + dx1 * j, dy0 * i + dy1 * j, edge_mode), 2, 1)
-                    tiles = func(*np.ogrid[0:2, 0:3])
-
-                    if (tiles == None).any():
-                        continue
-
-                    for in_direction in (direction, tangent):
-                        for out_direction in (inverse_tangent, direction):
-                            grid.clauses.append([
-                                -tiles[0, 0].input_direction[in_direction],
-                                *([tiles[0, 0].is_splitter] if tangent == in_direction else []),
-
-                                *tiles[0, 1].all_direction,
-
-                                -tiles[0, 2].input_direction[inverse_tangent],
-                                -tiles[0, 2].output_direction[out_direction],
-                                *([tiles[0, 2].is_splitter] if inverse_tangent == out_direction else []),
-
-                                -tiles[1, 0].input_direction[tangent],
-
-                                -tiles[1, 1].input_direction[direction],
-                                tiles[1, 1].is_splitter,
-
-                                -tiles[1, 2].input_direction[direction],
-                            ])
+    for pattern in SEMICIRCLES:
+        grid.clauses += pattern.clauses(grid, ALL_FRAMES, edge_mode)
 
 
+@constraint_pass
 def prevent_underground_hook(grid: Grid, edge_mode: EdgeModeType):
     # TODO Make sound
-    for x in range(grid.width):
-        for y in range(grid.height):
-            tile_underground_transition = grid.get_tile_instance(x, y)
-            for direction in Direction:
-                dx0, dy0 = direction.vec
-
-                tile_empty = grid.get_tile_instance_offset(x, y, dx0, dy0, edge_mode)
-                if tile_empty is None:
-                    continue
-
-                tile_a = grid.get_tile_instance_offset(x, y, -dx0, -dy0, edge_mode)
-                if tile_a is None:
-                    continue
-
-                inv_direction = direction.reverse
-
-                for tangent in (direction.next, direction.prev):
-                    inv_tangent = tangent.reverse
-                    dx1, dy1 = tangent.vec
-
-                    tile_b = grid.get_tile_instance_offset(x, y, -dx1 - dx0, -dy1 - dy0, edge_mode)
-                    if tile_b is None:
-                        continue
-                    tile_c = grid.get_tile_instance_offset(x, y, -dx1, -dy1, edge_mode)
-                    if tile_c is None:
-                        continue
-
-                    for in_direction in (inv_direction, tangent):
-                        grid.clauses.append([
-                            *tile_empty.all_direction,
-                            -tile_empty.underground[direction],
-
-                            tile_underground_transition.underground[direction],
-
-                            # -tile_a.output_direction[direction],
-                            -tile_a.input_direction[tangent],
-
-                            # -tile_b.output_direction[tangent],
-                            -tile_b.input_direction[inv_direction],
-
-                            # -tile_c.output_direction[inv_direction],
-                            -tile_c.input_direction[in_direction],
-                            tile_c.is_splitter,
-                        ])
-
-                    for out_direction in (direction, inv_tangent):
-                        grid.clauses.append([
-                            *tile_empty.all_direction,
-                            -tile_empty.underground[inv_direction],
-
-                            tile_underground_transition.underground[inv_direction],
-
-                            # -tile_a.input_direction[inv_direction],
-                            -tile_a.output_direction[inv_tangent],
-
-                            # -tile_b.input_direction[inv_tangent],
-                            -tile_b.output_direction[direction],
-
-                            # -tile_c.input_direction[direction],
-                            -tile_c.output_direction[out_direction],
-                            tile_c.is_splitter,
-                        ])
+    for pattern in UNDERGROUND_HOOKS:
+        grid.clauses += pattern.clauses(grid, ALL_FRAMES, edge_mode)
 
 
+@constraint_pass
 def prevent_zigzags(grid: Grid, edge_mode: EdgeModeType):
     # TODO Make sound
-    for direction in Direction:
-        for tangent in (direction.next, direction.prev):
-            for tiles in grid.iterate_tile_blocks(direction.vec, 2, tangent.vec, 2, edge_mode):
-                if (tiles == None).any():
-                    continue
-
-                grid.clauses.append([
-                    -tiles[0, 0].input_direction[direction],
-                    -tiles[0, 0].output_direction[tangent],
-
-                    *tiles[0, 1].all_direction,
-
-                    # -tiles[1,0].input_direction[tangent],
-                    -tiles[1, 0].output_direction[direction],
-
-                    # tiles[1,1].input_direction[direction],
-                    -tiles[1, 1].output_direction[tangent],
-                ])
+    grid.clauses += ZIGZAG.clauses(grid, ALL_FRAMES, edge_mode)
 
 
+@constraint_pass
 def break_vertical_symmetry(grid: Grid):
     top: List[LiteralType] = []
     bot: List[LiteralType] = []
@@ -430,6 +398,7 @@ def break_vertical_symmetry(grid: Grid):
         grid.clauses += break_symmetry(top, bot, grid.allocate_variable)
 
 
+@constraint_pass
 def break_horisontal_symmetry(grid: Grid, min_x: int = 0, max_x: Optional[int] = None):
     start: List[LiteralType] = []
     end: List[LiteralType] = []
@@ -451,133 +420,37 @@ def break_horisontal_symmetry(grid: Grid, min_x: int = 0, max_x: Optional[int] =
     grid.clauses += break_symmetry(start, end, grid.allocate_variable)
 
 
+@constraint_pass
 def prevent_spirals(grid: Grid):
-    for direction in Direction:
-        inv_direction = direction.reverse
-        for across_direction in (direction.next, direction.prev):
-            inv_across_direction = across_direction.reverse
-            for block in grid.iterate_tile_blocks(across_direction.vec, 3, direction.vec, 3, EdgeMode.NO_WRAP):
-                block[0, 0] = None  # Unimportant tile
-
-                if (block == None).any():
-                    continue
-
-                for spiral_input_direction in (across_direction, direction):
-                    grid.clauses.append(invert_components([
-                        block[1, 0].input_direction[spiral_input_direction],
-                        block[1, 0].output_direction[direction],
-
-                        # block[2, 0].input_direction[direction],
-                        block[2, 0].output_direction[across_direction],
-
-                        # block[2, 1].input_direction[across_direction],
-                        block[2, 1].output_direction[across_direction],
-                        block[2, 1].is_belt,
-
-                        # block[2, 2].input_direction[across_direction],
-                        block[2, 2].output_direction[inv_direction],
-
-                        # block[1, 2].input_direction[inv_direction],
-                        block[1, 2].output_direction[inv_direction],
-
-                        # block[0, 2].input_direction[inv_direction],
-                        block[0, 2].output_direction[inv_across_direction],
-
-                        # block[0, 1].input_direction[inv_across_direction],
-                        block[0, 1].output_direction[direction],
-
-                        # block[1, 1].input_direction[direction],
-                        # block[1, 1].output_direction[direction],
-                    ]))
-
-                    grid.clauses.append(invert_components([
-                        block[1, 0].output_direction[spiral_input_direction.reverse],
-                        block[1, 0].input_direction[inv_direction],
-
-                        # block[2, 0].output_direction[inv_direction],
-                        block[2, 0].input_direction[inv_across_direction],
-
-                        # block[2, 1].output_direction[inv_across_direction],
-                        block[2, 1].input_direction[inv_across_direction],
-                        block[2, 1].is_belt,
-
-                        # block[2, 2].output_direction[inv_across_direction],
-                        block[2, 2].input_direction[direction],
-
-                        # block[1, 2].output_direction[direction],
-                        block[1, 2].input_direction[direction],
-
-                        # block[0, 2].output_direction[direction],
-                        block[0, 2].input_direction[across_direction],
-
-                        # block[0, 1].output_direction[across_direction],
-                        block[0, 1].input_direction[inv_direction],
-
-                        # block[1, 1].output_direction[inv_direction],
-                        # block[1, 1].input_direction[inv_direction],
-                    ]))
+    # Drawn with the spiral going forward along its first turn, and across (the spiral's direction) down the middle
+    for pattern in SPIRALS:
+        grid.clauses += pattern.clauses(grid, [(across, direction) for direction, across in ALL_FRAMES], EdgeMode.NO_WRAP)
 
 
+@constraint_pass
 def prevent_belt_parallel_splitter(grid: Grid, edge_mode: EdgeModeType):
-    for direction in Direction:
-        for across_direction, is_head in ((direction.next, True), (direction.prev, False)):
-            for block in grid.iterate_tile_blocks(direction.vec, 2, across_direction.vec, 2, edge_mode):
-                if (block == None).any():
-                    continue
-
-                for in_direction in (direction, across_direction):
-                    grid.clauses.append(invert_components([
-                        block[0, 0].input_direction[in_direction],
-                        block[0, 0].output_direction[direction],
+    for is_head, frames in ((True, LEFT_FRAMES), (False, RIGHT_FRAMES)):
+        for in_direction in (Direction.RIGHT, Direction.DOWN):
+            grid.clauses += Pattern([
+                cells[0, 0].input_direction[in_direction],
+                cells[0, 0].output_direction[Direction.RIGHT],
 
-                        *([-block[0, 0].is_splitter] if in_direction == direction else []),
+                *([-cells[0, 0].is_splitter] if in_direction == Direction.RIGHT else []),
 
-                        block[1, 0].output_direction[across_direction],
+                cells[1, 0].output_direction[Direction.DOWN],
 
-                        block[1, 1].is_splitter,
-                        set_literal(block[1, 1].is_splitter_head, is_head),
-                    ]))
+                cells[1, 1].is_splitter,
+                set_literal(cells[1, 1].is_splitter_head, is_head),
+            ]).clauses(grid, frames, edge_mode)
 
 
+@constraint_pass
 def glue_partial_splitters(grid: Grid, edge_mode: EdgeModeType):
-    for direction in Direction:
-        across_direction = direction.next
-        for block in grid.iterate_tile_blocks(direction.vec, 2, across_direction.vec, 2, edge_mode, max_x=grid.width - 2):
-            if (block == None).any():
-                continue
-
-            grid.clauses.append(invert_components([
-                block[0, 0].input_direction[direction],
-                block[0, 0].is_splitter_head,
-
-                -block[1, 0].input_direction[direction],
-
-                block[0, 1].input_direction[direction],
-                block[0, 1].output_direction[direction],
-                block[0, 1].is_belt,
-
-                block[1, 1].input_direction[direction],
-                block[1, 1].output_direction[direction],
-                block[1, 1].is_belt,
-            ]))
-
-            grid.clauses.append(invert_components([
-                -block[0, 0].input_direction[direction],
-
-                block[1, 0].input_direction[direction],
-                block[1, 0].is_splitter,
-                -block[1, 0].is_splitter_head,
-
-                block[0, 1].input_direction[direction],
-                block[0, 1].output_direction[direction],
-                block[0, 1].is_belt,
-
-                block[1, 1].input_direction[direction],
-                block[1, 1].output_direction[direction],
-                block[1, 1].is_belt,
-            ]))
+    for pattern in PARTIAL_SPLITTERS:
+        grid.clauses += pattern.clauses(grid, LEFT_FRAMES, edge_mode, max_x=grid.width - 2)
 
 
+@constraint_pass
 def apply_generic_optimisations(grid: Grid):
     prevent_small_loops(grid)
     prevent_empty_along_underground(grid, EdgeMode.NO_WRAP)
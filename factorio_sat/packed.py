@@ -0,0 +1,398 @@
+from __future__ import annotations
+
+import argparse
+import contextlib
+import functools
+import gzip
+import io
+import itertools
+import json
+import lzma
+import struct
+import sys
+from typing import TYPE_CHECKING, Any, BinaryIO, Callable, Iterator, List, Optional, TextIO
+
+from .direction import Direction
+from .tile import AssemblingMachine, BaseTile, Belt, EmptyTile, FillerTile, Inserter, Splitter, UndergroundBelt
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Packed solution stream:
+#   file header:   MAGIC, uint8 flags
+#   each solution: uint16 height, uint16 width (little endian), then height * width uint8 tile codes (row major)
+#                  with FLAG_COLOUR: int16 colour, colour_ux and colour_uy planes (-1 for no colour), then a uint8 plane
+#                  of underground bits (bit i set when there is an underground belt going in direction i)
+# The stream may be wrapped in gzip or lzma, readers detect this (and plain JSON lines) from the first bytes.
+MAGIC = b'FSATP\x01'
+FLAG_COLOUR = 1
+
+HEADER = struct.Struct('<6sB')
+RECORD_HEADER = struct.Struct('<HH')
+
+GZIP_MAGIC = b'\x1f\x8b'
+LZMA_MAGIC = b'\xfd7zXZ\x00'
+
+FORMATS = ('json', 'packed')
+COMPRESSIONS = ('gzip', 'lzma')
+
+NO_COLOUR = -1
+
+
+def all_tiles() -> List[BaseTile]:
+    tiles: List[BaseTile] = [EmptyTile(), FillerTile()]
+    for input_direction in Direction:
+        for output_direction in Direction:
+            if input_direction.reverse != output_direction:
+                tiles.append(Belt(input_direction, output_direction))
+    for direction in Direction:
+        for flag in (False, True):
+            tiles.append(UndergroundBelt(direction, flag))
+    for direction in Direction:
+        for flag in (False, True):
+            tiles.append(Splitter(direction, flag))
+    for direction in Direction:
+        for insert_type in (0, 1):
+            tiles.append(Inserter(direction, insert_type))
+    for y in range(3):
+        for x in range(3):
+            tiles.append(AssemblingMachine(x, y))
+    return tiles
+
+
+TILES = all_tiles()
+TILE_CODES = dict((tile, code) for code, tile in enumerate(TILES))
+
+
+@functools.lru_cache(maxsize=None)
+def tile_table() -> np.ndarray:
+    import numpy as np
+
+    table = np.empty(256, dtype=object)
+    table[:len(TILES)] = TILES
+    return table
+
+
+def encode_tiles(tiles: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    return np.frompyfunc(TILE_CODES.__getitem__, 1, 1)(tiles).astype(np.uint8)
+
+
+def decode_tiles(codes: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    if np.any(codes >= len(TILES)):
+        raise RuntimeError('Invalid tile code in packed solution')
+    return tile_table()[codes]
+
+
+def cell_tile(cell) -> BaseTile:
+    from .blueprint import read_tile
+
+    return read_tile(cell)
+
+
+def cell_colour(cell, key: str) -> int:
+    if not isinstance(cell, dict):
+        return NO_COLOUR
+    colour = cell.get(key)
+    if isinstance(colour, list):
+        colour = colour[0]
+    if colour is None:
+        return NO_COLOUR
+    return colour
+
+
+def cell_underground(cell) -> int:
+    if not isinstance(cell, dict) or cell.get('underground') is None:
+        return 0
+    return sum(1 << i for i, flag in enumerate(cell['underground']) if flag)
+
+
+def pack_solution(solution: np.ndarray, colour: bool) -> bytes:
+    import numpy as np
+
+    solution = np.array(solution, dtype=object, ndmin=2)
+    height, width = solution.shape
+    parts = [RECORD_HEADER.pack(height, width), encode_tiles(np.frompyfunc(cell_tile, 1, 1)(solution)).tobytes()]
+    if colour:
+        for key in ('colour', 'colour_ux', 'colour_uy'):
+            parts.append(np.frompyfunc(lambda cell: cell_colour(cell, key), 1, 1)(solution).astype('<i2').tobytes())
+        parts.append(np.frompyfunc(cell_underground, 1, 1)(solution).astype(np.uint8).tobytes())
+    return b''.join(parts)
+
+
+def record_size(height: int, width: int, colour: bool) -> int:
+    size = height * width
+    if colour:
+        size += 3 * 2 * height * width + height * width
+    return size
+
+
+def unpack_solution(data, height: int, width: int, colour: bool) -> np.ndarray:
+    import numpy as np
+
+    area = height * width
+    tiles = decode_tiles(np.frombuffer(data, dtype=np.uint8, count=area).reshape(height, width))
+    if not colour:
+        return tiles
+
+    planes = np.frombuffer(data, dtype='<i2', count=3 * area, offset=area).reshape(3, height, width)
+    underground = np.frombuffer(data, dtype=np.uint8, count=area, offset=7 * area).reshape(height, width)
+
+    cells = np.empty((height, width), dtype=object)
+    for (y, x), tile in np.ndenumerate(tiles):
+        colours = [None if value == NO_COLOUR else int(value) for value in planes[:, y, x]]
+        cells[y, x] = {
+            'tile': tile.write(),
+            'colour': colours[0],
+            'colour_ux': colours[1],
+            'colour_uy': colours[2],
+            'underground': [bool(underground[y, x] & (1 << i)) for i in range(4)],
+        }
+    return cells
+
+
+def read_exactly(stream: BinaryIO, size: int) -> bytes:
+    data = stream.read(size)
+    if len(data) != size:
+        raise RuntimeError('Truncated packed solution stream')
+    return data
+
+
+def read_packed(stream: BinaryIO) -> Iterator[np.ndarray]:
+    magic, flags = HEADER.unpack(read_exactly(stream, HEADER.size))
+    if magic != MAGIC:
+        raise RuntimeError('Not a packed solution stream')
+    colour = bool(flags & FLAG_COLOUR)
+
+    while True:
+        header = stream.read(RECORD_HEADER.size)
+        if len(header) == 0:
+            break
+        if len(header) != RECORD_HEADER.size:
+            raise RuntimeError('Truncated packed solution stream')
+        height, width = RECORD_HEADER.unpack(header)
+        yield unpack_solution(read_exactly(stream, record_size(height, width, colour)), height, width, colour)
+
+
+def parse_json_line(line: str) -> np.ndarray:
+    import numpy as np
+
+    return np.array(json.loads(line))
+
+
+def read_lines(stream, parse_line: Callable[[str], np.ndarray]) -> Iterator[np.ndarray]:
+    for line in stream:
+        line = line.strip()
+        if len(line) == 0:
+            continue
+        yield parse_line(line)
+
+
+def read_solutions(stream=None, parse_line: Callable[[str], np.ndarray] = parse_json_line) -> Iterator[np.ndarray]:
+    if stream is None:
+        stream = sys.stdin
+
+    binary = getattr(stream, 'buffer', stream)
+    if isinstance(binary, io.TextIOBase) or not hasattr(binary, 'peek'):  # Text only streams (e.g. when run by serve) are always lines
+        yield from read_lines(stream, parse_line)
+        return
+
+    head = binary.peek(len(LZMA_MAGIC))
+    if head.startswith(GZIP_MAGIC):
+        binary = gzip.GzipFile(fileobj=binary, mode='rb')
+    elif head.startswith(LZMA_MAGIC):
+        binary = lzma.LZMAFile(binary, mode='rb')
+
+    if binary.peek(len(MAGIC))[:len(MAGIC)] == MAGIC:
+        yield from read_packed(binary)
+    else:
+        text = io.TextIOWrapper(binary, encoding='utf-8')
+        try:
+            yield from read_lines(text, parse_line)
+        finally:
+            text.detach()  # Leave the caller's stream open
+
+
+class PackedSolutionFile:
+    # Random access to an uncompressed packed file without reading it into memory
+    def __init__(self, filename: str):
+        import numpy as np
+
+        self.data = np.memmap(filename, dtype=np.uint8, mode='r')
+        if len(self.data) < HEADER.size:
+            raise RuntimeError('Not a packed solution file')
+
+        magic, flags = HEADER.unpack(self.data[:HEADER.size].tobytes())
+        if magic != MAGIC:
+            raise RuntimeError('Not a packed solution file (compressed files can only be streamed)')
+        self.colour = bool(flags & FLAG_COLOUR)
+
+        self.records = []
+        offset = HEADER.size
+        while offset < len(self.data):
+            height, width = RECORD_HEADER.unpack(self.data[offset:offset + RECORD_HEADER.size].tobytes())
+            offset += RECORD_HEADER.size
+            self.records.append((offset, height, width))
+            offset += record_size(height, width, self.colour)
+        if offset != len(self.data):
+            raise RuntimeError('Truncated packed solution file')
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def codes(self, index: int) -> np.ndarray:
+        offset, height, width = self.records[index]
+        return self.data[offset:offset + height * width].reshape(height, width)
+
+    def __getitem__(self, index: int) -> np.ndarray:
+        offset, height, width = self.records[index]
+        return unpack_solution(self.data[offset:offset + record_size(height, width, self.colour)], height, width, self.colour)
+
+    def __iter__(self) -> Iterator[np.ndarray]:
+        for i in range(len(self)):
+            yield self[i]
+
+
+def is_packed_file(filename: str) -> bool:
+    with open(filename, 'rb') as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def add_input_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--input', type=str, help='Read solutions from this file instead of standard input')
+    parser.add_argument('--index', type=int, action='append', help='Only use the solution at this position of the input (may be repeated)')
+
+
+def pick_solutions(solutions, indices: List[int]) -> Iterator[np.ndarray]:
+    for index in indices:
+        if not -len(solutions) <= index < len(solutions):
+            raise RuntimeError(f'No solution at index {index}, the input has {len(solutions)}')
+        yield solutions[index]
+
+
+def select_solutions(args: argparse.Namespace) -> Iterator[np.ndarray]:
+    if args.input is not None and is_packed_file(args.input):  # Indexed in place, skipped solutions are never decoded
+        solutions = PackedSolutionFile(args.input)
+        if args.index is None:
+            yield from solutions
+        else:
+            yield from pick_solutions(solutions, args.index)
+        return
+
+    with contextlib.ExitStack() as stack:
+        stream = None if args.input is None else stack.enter_context(open(args.input, 'rb'))
+        if args.index is None:
+            yield from read_solutions(stream)
+            return
+
+        if any(index < 0 for index in args.index):
+            solutions = list(read_solutions(stream))
+        else:
+            solutions = list(itertools.islice(read_solutions(stream), max(args.index) + 1))
+        yield from pick_solutions(solutions, args.index)
+
+
+def json_cells(solution: np.ndarray) -> Any:
+    import numpy as np
+
+    def write_cell(cell):
+        if isinstance(cell, BaseTile):
+            return {'tile': cell.write()}
+        return cell
+    return np.frompyfunc(write_cell, 1, 1)(solution).tolist()
+
+
+class SolutionWriter:
+    def __init__(self, file: Optional[TextIO] = None, format: str = 'json', compression: Optional[str] = None, colour: bool = False):
+        if format not in FORMATS:
+            raise RuntimeError(f'Unknown solution format: {format}')
+        if compression is not None and compression not in COMPRESSIONS:
+            raise RuntimeError(f'Unknown compression: {compression}')
+        if colour and format != 'packed':
+            raise RuntimeError('Colour planes are only used by the packed format')
+
+        if file is None:
+            file = sys.stdout
+
+        self.file = file
+        self.format = format
+        self.colour = colour
+        self.compressor = None
+
+        if format == 'json' and compression is None:
+            self.stream = None  # Plain JSON lines are written straight to the text stream
+            return
+
+        binary = getattr(file, 'buffer', None)
+        if binary is None:  # e.g. output relayed through serve
+            raise RuntimeError('Packed or compressed output needs a binary stream')
+        file.flush()
+        if compression == 'gzip':
+            self.compressor = binary = gzip.GzipFile(fileobj=binary, mode='wb')
+        elif compression == 'lzma':
+            self.compressor = binary = lzma.LZMAFile(binary, mode='wb')
+        self.stream = binary
+
+        if format == 'packed':
+            self.stream.write(HEADER.pack(MAGIC, FLAG_COLOUR if colour else 0))
+
+    def write(self, solution: np.ndarray):
+        if self.format == 'packed':
+            self.stream.write(pack_solution(solution, self.colour))
+            return
+
+        self.write_text(json.dumps(json_cells(solution)) + '\n')
+
+    def write_text(self, text: str):
+        if self.format == 'packed':
+            raise RuntimeError('Only solutions can be written in packed form')
+        if self.stream is None:
+            self.file.write(text)
+        else:
+            self.stream.write(text.encode('utf-8'))
+
+    def flush(self):
+        if self.stream is None:
+            self.file.flush()
+        else:
+            self.stream.flush()
+
+    def close(self):
+        if self.compressor is not None:
+            self.compressor.close()  # Writes the trailer, the underlying file is left open
+            self.compressor = None
+            self.stream = self.file.buffer
+        self.flush()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+
+def add_output_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--format', choices=FORMATS, default='json', help='Solution output format')
+    parser.add_argument('--compression', choices=COMPRESSIONS, help='Compress the solution output')
+    parser.add_argument('--colour-planes', action='store_true', help='Keep colour information in packed output (needed to render colours)')
+
+
+def open_output(args: argparse.Namespace, file: Optional[TextIO] = None) -> SolutionWriter:
+    return SolutionWriter(file, args.format, args.compression, args.colour_planes)
+
+
+__all__ = [
+    'PackedSolutionFile',
+    'SolutionWriter',
+    'add_input_arguments',
+    'add_output_arguments',
+    'decode_tiles',
+    'encode_tiles',
+    'is_packed_file',
+    'open_output',
+    'read_solutions',
+    'select_solutions',
+]
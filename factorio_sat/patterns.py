@@ -0,0 +1,143 @@
+import dataclasses
+from dataclasses import dataclass
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple, Union
+
+import numpy as np
+
+from .direction import Direction
+from .template import BaseGrid, EdgeMode, EdgeModeType, expand_edge_mode
+from .util import ClauseList
+
+# Local rules written as the components of an arrangement of tiles to forbid (as they would be passed to
+# invert_components), on the cells of a pattern rather than on tile instances. cells[row, column] is the tile `column`
+# steps forward and `row` steps across from where the pattern is placed, and directions are given as if forward were
+# RIGHT and across were DOWN. Each frame (the directions forward and across are turned to) is compiled once into cell
+# offsets and literal indices, the clauses for every position of a grid are then gathered with NumPy
+
+Frame = Tuple[Direction, Direction]  # Forward, across
+
+# Every rotation and reflection, in the order the rules used to loop over them
+ALL_FRAMES: Tuple[Frame, ...] = tuple((direction, across) for direction in Direction for across in (direction.next, direction.prev))
+# One frame per direction, with across turned anticlockwise (next) or clockwise (prev) from forward
+LEFT_FRAMES: Tuple[Frame, ...] = tuple((direction, direction.next) for direction in Direction)
+RIGHT_FRAMES: Tuple[Frame, ...] = tuple((direction, direction.prev) for direction in Direction)
+
+
+@dataclass(frozen=True)
+class Component:
+    row: int
+    column: int
+    field: str
+    index: Union[None, int, Direction] = None  # Directions are turned with the frame, numbers (e.g. colour bits) are not
+    value: bool = True
+
+    def __getitem__(self, index: Union[int, Direction]) -> 'Component':
+        assert self.index is None
+        return dataclasses.replace(self, index=index)
+
+    def __neg__(self) -> 'Component':
+        return dataclasses.replace(self, value=not self.value)
+
+
+@dataclass(frozen=True)
+class Cell:
+    row: int
+    column: int
+
+    def __getattr__(self, field: str) -> Component:
+        if field.startswith('_'):
+            raise AttributeError(field)
+        return Component(self.row, self.column, field)
+
+    @property
+    def all_direction(self) -> List[Component]:
+        return [Component(self.row, self.column, field, direction) for field in ('input_direction', 'output_direction') for direction in Direction]
+
+
+class Cells:
+    def __getitem__(self, position: Tuple[int, int]) -> Cell:
+        row, column = position
+        return Cell(row, column)
+
+
+cells = Cells()
+
+
+def turn_direction(frame: Frame, direction: Direction) -> Direction:
+    forward, across = frame
+    return {
+        Direction.RIGHT: forward,
+        Direction.DOWN: across,
+        Direction.LEFT: forward.reverse,
+        Direction.UP: across.reverse,
+    }[direction]
+
+
+class Pattern:
+    def __init__(self, components: Iterable[Component]):
+        self.components = tuple(components)
+        assert len(self.components) > 0
+        self.positions = sorted(set((component.row, component.column) for component in self.components))
+        self.compiled: Dict[Frame, Tuple[np.ndarray, List[Tuple[int, str, Optional[int], int]]]] = {}
+
+    def compile(self, frame: Frame) -> Tuple[np.ndarray, List[Tuple[int, str, Optional[int], int]]]:
+        # The (x, y) offset of each cell, then for each component its cell, field, index and the sign it has in the clause
+        compiled = self.compiled.get(frame)
+        if compiled is None:
+            forward, across = frame
+            offsets = np.array([(column * forward.dx + row * across.dx, column * forward.dy + row * across.dy) for row, column in self.positions],
+                               dtype=np.int64).reshape(-1, 2)
+            literals = []
+            for component in self.components:
+                index = component.index
+                if isinstance(index, Direction):
+                    index = turn_direction(frame, index).value
+                literals.append((self.positions.index((component.row, component.column)), component.field, index, -1 if component.value else 1))
+            compiled = self.compiled[frame] = offsets, literals
+        return compiled
+
+    def clauses(self, grid: BaseGrid, frames: Sequence[Frame], edge_mode: EdgeModeType,
+                min_x: Optional[int] = None, min_y: Optional[int] = None, max_x: Optional[int] = None, max_y: Optional[int] = None) -> ClauseList:
+        # One clause for every position and frame the whole pattern fits at, bounds apply to every cell before wrapping
+        edge_mode = expand_edge_mode(edge_mode)
+        xs, ys = (positions.ravel() for positions in np.meshgrid(np.arange(grid.width), np.arange(grid.height), indexing='ij'))
+
+        clauses: ClauseList = []
+        for frame in frames:
+            offsets, literals = self.compile(frame)
+            cell_xs = xs[:, np.newaxis] + offsets[:, 0]
+            cell_ys = ys[:, np.newaxis] + offsets[:, 1]
+
+            valid = np.ones(len(xs), dtype=bool)
+            for bound, lower, positions in ((min_x, True, cell_xs), (min_y, True, cell_ys), (max_x, False, cell_xs), (max_y, False, cell_ys)):
+                if bound is not None:
+                    valid &= (positions >= bound).all(axis=1) if lower else (positions <= bound).all(axis=1)
+
+            for mode, positions, size in ((edge_mode[0], cell_xs, grid.width), (edge_mode[1], cell_ys, grid.height)):
+                if mode == EdgeMode.WRAP:
+                    positions %= size
+                elif mode == EdgeMode.NO_WRAP:
+                    valid &= ((positions >= 0) & (positions < size)).all(axis=1)
+                else:
+                    assert False
+
+            cell_xs, cell_ys = cell_xs[valid], cell_ys[valid]
+            columns = []
+            for cell, field, index, sign in literals:
+                literals_at = grid.tile_literals(field)[cell_ys[:, cell], cell_xs[:, cell]]
+                columns.append(sign * (literals_at if index is None else literals_at[:, index]))
+            clauses += np.stack(columns, axis=1).tolist()
+        return clauses
+
+
+__all__ = [
+    'ALL_FRAMES',
+    'Cell',
+    'Component',
+    'Frame',
+    'LEFT_FRAMES',
+    'Pattern',
+    'RIGHT_FRAMES',
+    'cells',
+    'turn_direction',
+]
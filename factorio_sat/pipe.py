@@ -0,0 +1,239 @@
+from __future__ import annotations
+
+import argparse
+import importlib
+import io
+from typing import TYPE_CHECKING, Any, Callable, Iterable, Iterator, List, Optional
+
+from . import blueprint, blueprint_book, capture, encoding_report, enumeration, packed, profiling, stringifier
+from .background import DEFAULT_QUEUE_SIZE, threaded
+from .cache import open_cache
+from .network import parse_network, save_network, tidy_network
+from .rotate import Operation, transform_tiles
+from .symmetry import GROUPS, Deduplicator
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Items flowing between stages are native objects, JSON is only touched when reading the input and writing the output:
+#   np.ndarray -> grid of tiles (written in the chosen solution format)
+#   dict       -> blueprint or blueprint book (encoded into a blueprint string on output)
+#   str        -> text (e.g. stringifier output)
+#   list       -> network
+Stage = Callable[[Iterator[Any]], Iterator[Any]]
+
+STAGE_SEPARATOR = '::'
+
+GENERATOR_TOOLS = (
+    'belt_balancer',
+    'belt_balancer_net_free',
+    'belt_balancer_net_free_power_of_2',
+    'interchange',
+    'make_block',
+)
+
+
+def read_tiles(stream=None) -> Iterator[np.ndarray]:
+    import numpy as np
+
+    # JSON lines, blueprint strings and packed streams are all accepted
+    for solution in packed.read_solutions(stream, blueprint.convert_to_tiles):
+        yield np.frompyfunc(blueprint.read_tile, 1, 1)(solution)
+
+
+def write_item(item: Any, writer: packed.SolutionWriter):
+    import numpy as np
+
+    if isinstance(item, np.ndarray):
+        writer.write(item)
+    elif isinstance(item, dict):
+        writer.write_text(blueprint.encode_blueprint(item) + '\n')
+    elif isinstance(item, str):
+        writer.write_text(item + '\n')
+    elif isinstance(item, list):
+        text = io.StringIO()
+        save_network(text, item)
+        writer.write_text(text.getvalue())
+    else:
+        raise RuntimeError(f'Cannot write pipeline item of type {type(item).__name__}')
+
+
+def solve(tool: str, argv: List[str]) -> Stage:
+    if tool not in GENERATOR_TOOLS:
+        raise RuntimeError(f'Unknown generator: {tool}')
+    module = importlib.import_module('.' + tool, __package__)
+    args = module.get_parser().parse_args(argv)
+
+    if getattr(args, 'output', None) is not None:
+        raise RuntimeError('--output cannot be used inside a pipeline')
+    if args.server is not None:
+        raise RuntimeError('--server cannot be used inside a pipeline')
+    if args.count:
+        raise RuntimeError('--count cannot be used inside a pipeline')
+    if args.estimate_only:
+        raise RuntimeError('--estimate-only cannot be used inside a pipeline')
+
+    def stage(_: Iterator[Any]) -> Iterator[np.ndarray]:
+        import numpy as np
+
+        # Phases of the later stages are recorded as well, on their own threads
+        with profiling.profiled(args), capture.captured(args, tool, argv):
+            grid = encoding_report.build_grid(module.create_grid, args)
+            solutions = grid.itersolve(solver=args.solver, ignore_colour=True, cache=open_cache(args.cache), projection=args.projection,
+                                       orbit=enumeration.get_orbit(grid, args), disabled_groups=args.disable_group)
+            if args.dedupe is not None:
+                solutions = Deduplicator(args.dedupe, args.translations).filter(solutions)
+
+            for solution in solutions:
+                yield np.frompyfunc(blueprint.read_tile, 1, 1)(solution)
+                if not args.all:
+                    break
+    return stage
+
+
+def rotate(operation: Operation = Operation.ROT_90) -> Stage:
+    def stage(items: Iterator[np.ndarray]) -> Iterator[np.ndarray]:
+        for tiles in items:
+            yield transform_tiles(operation, tiles)
+    return stage
+
+
+def dedupe(group: str = 'dihedral', translations: bool = False) -> Stage:
+    def stage(items: Iterator[np.ndarray]) -> Iterator[np.ndarray]:
+        yield from Deduplicator(group, translations).filter(items)
+    return stage
+
+
+def stringify() -> Stage:
+    def stage(items: Iterator[np.ndarray]) -> Iterator[str]:
+        for tiles in items:
+            yield stringifier.encode(tiles)
+    return stage
+
+
+def blueprint_encode(label: Optional[str] = None, level: blueprint.TransportBeltLevel = blueprint.TransportBeltLevel.NORMAL) -> Stage:
+    def stage(items: Iterator[np.ndarray]) -> Iterator[dict]:
+        for tiles in items:
+            yield blueprint.make_blueprint(tiles, label, level)
+    return stage
+
+
+def book_pack(label: Optional[str] = None) -> Stage:
+    def stage(items: Iterator[dict]) -> Iterator[dict]:
+        yield blueprint_book.pack_book(list(items), label)
+    return stage
+
+
+def network_parse(assume_valid_output: bool = False) -> Stage:
+    def stage(items: Iterator[np.ndarray]) -> Iterator[list]:
+        for tiles in items:
+            yield tidy_network(parse_network(tiles, assume_valid_output))
+    return stage
+
+
+def run_pipeline(stages: List[Stage], items: Optional[Iterable[Any]] = None, threads: bool = True,
+                 queue_size: int = DEFAULT_QUEUE_SIZE) -> Iterator[Any]:
+    current: Iterator[Any] = iter(() if items is None else items)
+    for stage in stages:
+        current = stage(current)
+        if threads:
+            current = threaded(current, queue_size)
+    return current
+
+
+def parse_stage(argv: List[str], first: bool) -> Stage:
+    if len(argv) == 0:
+        raise RuntimeError('Empty pipeline stage')
+    tool, argv = argv[0], argv[1:]
+
+    if tool in GENERATOR_TOOLS:
+        if not first:
+            raise RuntimeError(f'{tool} must be the first stage of a pipeline')
+        return solve(tool, argv)
+
+    parser = argparse.ArgumentParser(prog=tool)
+    if tool == 'rotate':
+        parser.add_argument('operation', nargs='?', type=str, choices=[op.name.lower() for op in Operation], default=Operation.ROT_90.name.lower())
+        args = parser.parse_args(argv)
+        return rotate(Operation[args.operation.upper()])
+    elif tool == 'symmetry':
+        parser.add_argument('group', nargs='?', choices=GROUPS, default='dihedral')
+        parser.add_argument('--translations', action='store_true', help='Solutions that only differ by a (wrapping) translation are also duplicates')
+        args = parser.parse_args(argv)
+        return dedupe(args.group, args.translations)
+    elif tool == 'stringifier':
+        parser.add_argument('mode', choices=['encode'])
+        parser.parse_args(argv)
+        return stringify()
+    elif tool == 'blueprint':
+        parser.add_argument('mode', choices=['encode'])
+        parser.add_argument('--label', type=str, help='Label for created blueprint')
+        parser.add_argument('--level', choices=[level.name.lower() for level in blueprint.TransportBeltLevel], default='normal',
+                            help='Belt technology level to use')
+        args = parser.parse_args(argv)
+        return blueprint_encode(args.label, blueprint.TransportBeltLevel[args.level.upper()])
+    elif tool == 'blueprint_book':
+        parser.add_argument('mode', choices=['pack'])
+        parser.add_argument('--label', type=str, help='Output blueprint book label')
+        args = parser.parse_args(argv)
+        return book_pack(args.label)
+    elif tool == 'network':
+        parser.add_argument('mode', choices=['parse'])
+        parser.add_argument('--assume-valid-output', action='store_true', help='Assume splitters facing outside the balancer bounds are an input/output')
+        args = parser.parse_args(argv)
+        return network_parse(args.assume_valid_output)
+    else:
+        raise RuntimeError(f'Unknown pipeline stage: {tool}')
+
+
+def split_stages(argv: List[str]) -> List[List[str]]:
+    stages: List[List[str]] = [[]]
+    for arg in argv:
+        if arg == STAGE_SEPARATOR:
+            stages.append([])
+        else:
+            stages[-1].append(arg)
+    return stages
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Runs a chain of tools in a single process, '
+                                     f'e.g. belt_balancer networks/4x4 10 4 {STAGE_SEPARATOR} rotate {STAGE_SEPARATOR} blueprint encode')
+    parser.add_argument('--queue-size', type=int, default=DEFAULT_QUEUE_SIZE, help='Maximum number of items buffered between stages')
+    parser.add_argument('--no-threads', action='store_true', help='Run every stage on the main thread')
+    packed.add_output_arguments(parser)
+    parser.add_argument('stages', nargs=argparse.REMAINDER, help=f'Tool invocations separated by "{STAGE_SEPARATOR}"')
+    args = parser.parse_args(argv)
+
+    if args.queue_size < 1:
+        raise RuntimeError('Queue size must be positive')
+
+    stage_argvs = split_stages(args.stages)
+    stages = [parse_stage(stage_argv, i == 0) for i, stage_argv in enumerate(stage_argvs)]
+
+    items = None
+    if stage_argvs[0][0] not in GENERATOR_TOOLS:
+        items = read_tiles()
+
+    with packed.open_output(args) as writer:
+        for item in run_pipeline(stages, items, not args.no_threads, args.queue_size):
+            write_item(item, writer)
+            writer.flush()
+
+
+__all__ = [
+    'blueprint_encode',
+    'book_pack',
+    'dedupe',
+    'network_parse',
+    'read_tiles',
+    'rotate',
+    'run_pipeline',
+    'solve',
+    'stringify',
+    'write_item',
+]
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,375 @@
+import bisect
+import collections
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple, Union
+
+import numpy as np
+
+from .background import solve_releasing_gil
+from .util import ClauseList, ClauseType, LiteralType
+
+PREPROCESS_PREFIX = 'pre:'
+
+MAX_ROUNDS = 16  # Units and equivalences feed each other, but a handful of rounds reaches the fixpoint in practice
+
+
+class Unsatisfiable(Exception):
+    pass
+
+
+def propagate_units(clauses: ClauseList, assignment: Dict[int, bool]) -> ClauseList:
+    # Assigns every unit (in either the clauses or the assignment) and returns the clauses that are still undecided
+    occurrences: Dict[LiteralType, List[int]] = collections.defaultdict(list)
+    remaining = []
+    satisfied = []
+    queue = [lit if value else -lit for lit, value in assignment.items()]
+
+    for i, clause in enumerate(clauses):
+        for lit in clause:
+            occurrences[lit].append(i)
+        remaining.append(len(clause))
+        satisfied.append(False)
+        if len(clause) == 0:
+            raise Unsatisfiable
+        if len(clause) == 1:
+            queue.append(clause[0])
+
+    def value(lit: LiteralType) -> Optional[bool]:
+        current = assignment.get(abs(lit))
+        if current is None:
+            return None
+        return current == (lit > 0)
+
+    assigned: Set[int] = set()
+    while len(queue) != 0:
+        lit = queue.pop()
+        current = value(lit)
+        if current is False:
+            raise Unsatisfiable
+        if abs(lit) in assigned:
+            continue
+        assignment[abs(lit)] = lit > 0
+        assigned.add(abs(lit))
+
+        for i in occurrences[lit]:
+            satisfied[i] = True
+        for i in occurrences[-lit]:
+            if satisfied[i]:
+                continue
+            remaining[i] -= 1
+            if remaining[i] == 0:
+                raise Unsatisfiable
+            if remaining[i] == 1:
+                for other in clauses[i]:
+                    if value(other) is None:
+                        queue.append(other)
+                        break
+
+    result = []
+    for i, clause in enumerate(clauses):
+        if satisfied[i]:
+            continue
+        clause = [lit for lit in clause if value(lit) is None]
+        if len(clause) != 0:
+            result.append(clause)
+    return result
+
+
+def find_equivalences(clauses: ClauseList) -> Dict[int, LiteralType]:
+    # Literals in the same strongly connected component of the binary implication graph are equivalent,
+    # each variable is mapped to the lowest variable of its component (with the matching sign)
+    graph: Dict[LiteralType, List[LiteralType]] = collections.defaultdict(list)
+    for clause in clauses:
+        if len(clause) == 2:
+            a, b = clause
+            graph[-a].append(b)
+            graph[-b].append(a)
+
+    index: Dict[LiteralType, int] = {}
+    low: Dict[LiteralType, int] = {}
+    on_stack: Set[LiteralType] = set()
+    stack: List[LiteralType] = []
+    representative: Dict[int, LiteralType] = {}
+
+    for root in list(graph.keys()):
+        if root in index:
+            continue
+
+        # Iterative Tarjan, the implication chains are far too long for recursion
+        work = [(root, iter(graph[root]))]
+        index[root] = low[root] = len(index)
+        stack.append(root)
+        on_stack.add(root)
+        while len(work) != 0:
+            node, successors = work[-1]
+            descended = False
+            for successor in successors:
+                if successor not in index:
+                    index[successor] = low[successor] = len(index)
+                    stack.append(successor)
+                    on_stack.add(successor)
+                    work.append((successor, iter(graph.get(successor, ()))))
+                    descended = True
+                    break
+                elif successor in on_stack:
+                    low[node] = min(low[node], index[successor])
+            if descended:
+                continue
+
+            work.pop()
+            if len(work) != 0:
+                parent = work[-1][0]
+                low[parent] = min(low[parent], low[node])
+
+            if low[node] == index[node]:
+                component = []
+                while True:
+                    lit = stack.pop()
+                    on_stack.remove(lit)
+                    component.append(lit)
+                    if lit == node:
+                        break
+                if len(component) == 1:
+                    continue
+
+                best = min(component, key=abs)
+                for lit in component:
+                    if -lit == best:
+                        raise Unsatisfiable
+                    if abs(lit) != abs(best):
+                        representative[abs(lit)] = best if lit > 0 else -best
+    return representative
+
+
+def substitute(clauses: ClauseList, representative: Dict[int, LiteralType]) -> ClauseList:
+    result = []
+    for clause in clauses:
+        new_clause = []
+        tautology = False
+        for lit in clause:
+            replacement = representative.get(abs(lit))
+            if replacement is not None:
+                lit = replacement if lit > 0 else -replacement
+            if -lit in new_clause:
+                tautology = True
+                break
+            if lit not in new_clause:
+                new_clause.append(lit)
+        if not tautology:
+            result.append(new_clause)
+    return result
+
+
+def remove_subsumed(clauses: ClauseList) -> ClauseList:
+    unique = sorted(set(tuple(sorted(clause)) for clause in clauses), key=len)
+
+    occurrences: Dict[LiteralType, List[int]] = collections.defaultdict(list)
+    for i, clause in enumerate(unique):
+        for lit in clause:
+            occurrences[lit].append(i)
+
+    # Clauses are sorted by length, so only the tail of an occurrence list can be subsumed by a clause
+    lengths = [len(clause) for clause in unique]
+
+    removed = [False] * len(unique)
+    for i, clause in enumerate(unique):
+        if removed[i]:
+            continue
+        start = bisect.bisect_right(lengths, len(clause))
+        literals = set(clause)
+        rarest = min(clause, key=lambda lit: len(occurrences[lit]))
+        candidates = occurrences[rarest]
+        for j in candidates[bisect.bisect_left(candidates, start):]:
+            if not removed[j] and literals.issubset(unique[j]):
+                removed[j] = True
+    return [list(clause) for i, clause in enumerate(unique) if not removed[i]]
+
+
+class Simplification:
+    def __init__(self, clauses: ClauseList):
+        self.original_variables = max((abs(lit) for clause in clauses for lit in clause), default=0)
+        self.fixed: Dict[int, bool] = {}
+        self.unsatisfiable = False
+
+        representative: Dict[int, LiteralType] = {}
+        try:
+            for _ in range(MAX_ROUNDS):
+                clauses = propagate_units(clauses, self.fixed)
+                equivalences = find_equivalences(clauses)
+                if len(equivalences) == 0:
+                    break
+                for variable, lit in representative.items():  # Keep earlier substitutions pointing at the final representative
+                    replacement = equivalences.get(abs(lit))
+                    if replacement is not None:
+                        representative[variable] = replacement if lit > 0 else -replacement
+                representative.update(equivalences)
+                clauses = substitute(clauses, equivalences)
+            clauses = remove_subsumed(clauses)
+        except Unsatisfiable:
+            self.unsatisfiable = True
+            clauses = []
+
+        # Every remaining variable keeps a number, even if it no longer appears in a clause, so enumeration still sees it
+        self.mapping: Dict[int, LiteralType] = {}
+        self.variables = 0
+        for variable in range(1, self.original_variables + 1):
+            if variable in self.fixed or variable in representative:
+                continue
+            self.variables += 1
+            self.mapping[variable] = self.variables
+        for variable, lit in representative.items():
+            if abs(lit) in self.fixed:
+                self.fixed[variable] = self.fixed[abs(lit)] == (lit > 0)
+            else:
+                self.mapping[variable] = self.mapping[abs(lit)] if lit > 0 else -self.mapping[abs(lit)]
+
+        self.clauses = [[self.mapping[lit] if lit > 0 else -self.mapping[-lit] for lit in clause] for clause in clauses]
+        self.arrays: Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]] = None
+
+    def map_literal(self, lit: LiteralType) -> Union[bool, LiteralType]:
+        variable = abs(lit)
+        if variable in self.fixed:
+            return self.fixed[variable] == (lit > 0)
+
+        new_lit = self.mapping.get(variable)
+        if new_lit is None:  # Allocated after preprocessing, e.g. an activation literal
+            self.variables += 1
+            new_lit = self.mapping[variable] = self.variables
+            self.arrays = None
+        return new_lit if lit > 0 else -new_lit
+
+    def map_clause(self, clause: ClauseType) -> Optional[ClauseType]:
+        # None when the clause is already satisfied
+        result = []
+        for lit in clause:
+            new_lit = self.map_literal(lit)
+            if new_lit is True:
+                return None
+            if new_lit is not False:
+                result.append(new_lit)
+        return result
+
+    def map_assumptions(self, assumptions: List[LiteralType]) -> Optional[List[LiteralType]]:
+        # None when an assumption contradicts a fixed variable
+        result = []
+        for lit in assumptions:
+            new_lit = self.map_literal(lit)
+            if new_lit is False:
+                return None
+            if new_lit is not True:
+                result.append(new_lit)
+        return result
+
+    def unmap_literals(self, literals: List[LiteralType]) -> List[LiteralType]:
+        # Every original literal that follows from the given new ones (and the fixed variables)
+        literal_array = np.array(literals, dtype=np.int64)
+        literal_array = literal_array[np.abs(literal_array) <= self.variables]
+        signs = np.zeros(self.variables + 1, dtype=np.int64)
+        signs[np.abs(literal_array)] = np.sign(literal_array)
+
+        variables, targets, fixed_values = self.reconstruction_arrays()
+        result = np.where(targets == 0, np.where(fixed_values, 1, -1), signs[np.abs(targets)] * np.sign(targets))
+        return (variables * result)[result != 0].tolist()
+
+    def reconstruction_arrays(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Original variables, the new literal each one follows (0 when fixed) and the fixed values
+        if self.arrays is None:
+            variables = np.array(sorted(set(self.fixed) | set(self.mapping)), dtype=np.int64)
+            targets = np.array([self.mapping.get(variable, 0) for variable in variables.tolist()], dtype=np.int64)
+            fixed_values = np.array([self.fixed.get(variable, False) for variable in variables.tolist()], dtype=bool)
+            self.arrays = variables, targets, fixed_values
+        return self.arrays
+
+    def reconstruct(self, model: List[LiteralType]) -> List[LiteralType]:
+        model_array = np.array(model, dtype=np.int64)
+        values = np.zeros(self.variables + 1, dtype=bool)
+        values[model_array[(model_array > 0) & (model_array <= self.variables)]] = True  # Variables missing from the model are false
+
+        variables, targets, fixed_values = self.reconstruction_arrays()
+        result = np.where(targets == 0, fixed_values, values[np.abs(targets)] == (targets > 0))
+        return np.where(result, variables, -variables).tolist()
+
+
+class PreprocessedSolver:
+    # Presents a solver over the simplified clauses with the variables of the original ones
+    def __init__(self, simplification: Simplification, create_solver: Callable[[ClauseList], Any]):
+        self.simplification = simplification
+        self.unsatisfiable = simplification.unsatisfiable
+        self.solver = create_solver(simplification.clauses)
+        self.assumptions: List[LiteralType] = []
+        self.core: Optional[List[LiteralType]] = None
+
+    def add_clause(self, clause: ClauseType):
+        clause = self.simplification.map_clause(clause)
+        if clause is None:
+            return
+        if len(clause) == 0:
+            self.unsatisfiable = True
+            return
+        self.solver.add_clause(clause)
+
+    def add_clauses(self, clauses: ClauseList):
+        for clause in clauses:
+            self.add_clause(clause)
+
+    def solve(self, assumptions: List[LiteralType] = []) -> bool:
+        self.assumptions = list(assumptions)
+        self.core = None
+        if self.unsatisfiable:
+            self.core = []
+            return False
+        mapped = self.simplification.map_assumptions(assumptions)
+        if mapped is None:
+            self.core = [lit for lit in assumptions if self.simplification.map_literal(lit) is False][:1]
+            return False
+        return solve_releasing_gil(self.solver, mapped)
+
+    def get_core(self) -> Optional[List[LiteralType]]:
+        # The original assumptions whose simplified literals the backend's core contains
+        if self.core is not None:
+            return self.core
+        core = self.solver.get_core() if hasattr(self.solver, 'get_core') else None
+        if core is None:
+            return None
+        core = set(core)
+        return [lit for lit in self.assumptions if self.simplification.map_literal(lit) in core]
+
+    def get_model(self) -> List[LiteralType]:
+        return self.simplification.reconstruct(self.solver.get_model())
+
+    def propagate(self, assumptions: List[LiteralType] = []) -> Tuple[bool, List[LiteralType]]:
+        if self.unsatisfiable:
+            return False, []
+        mapped = self.simplification.map_assumptions(assumptions)
+        if mapped is None:
+            return False, []
+        ok, trail = self.solver.propagate(assumptions=mapped)
+        return ok, self.simplification.unmap_literals(trail)
+
+    def delete(self):
+        if self.solver is None:
+            return
+        if hasattr(self.solver, 'delete'):
+            self.solver.delete()
+        else:
+            self.solver.__exit__()
+        self.solver = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.delete()
+
+
+def split_solver(solver: str) -> Tuple[bool, str]:
+    if solver.startswith(PREPROCESS_PREFIX):
+        return True, solver[len(PREPROCESS_PREFIX):]
+    return False, solver
+
+
+__all__ = [
+    'PREPROCESS_PREFIX',
+    'PreprocessedSolver',
+    'Simplification',
+    'split_solver',
+]
@@ -0,0 +1,241 @@
+import argparse
+import contextlib
+import json
+import os
+import sys
+import threading
+import time
+import tracemalloc
+from dataclasses import asdict, dataclass
+from typing import Any, Dict, Iterator, List, Optional, TextIO
+
+# Phases are coarse (encoding a constraint family, one solver call, parsing one model), so a phase costs a global
+# check while nothing is being profiled. Only the standard library is used, "serve" imports this to forward requests.
+
+PROFILE_ENVIRONMENT_VARIABLE = 'FACTORIO_SAT_PROFILE'
+
+NULL_PHASE = contextlib.nullcontext()
+
+
+def current_rss() -> Optional[int]:
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    # Only the high water mark is available elsewhere, in KiB on Linux but bytes on macOS
+    maximum = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maximum if sys.platform == 'darwin' else maximum * 1024
+
+
+def process_age() -> Optional[float]:
+    # Seconds since the interpreter started, covering startup and imports before the profiler existed
+    try:
+        with open('/proc/self/stat') as f:
+            start_ticks = int(f.read().rsplit(')', 1)[1].split()[19])
+        with open('/proc/uptime') as f:
+            uptime = float(f.read().split()[0])
+    except (OSError, ValueError, IndexError):
+        return None
+    return max(uptime - start_ticks / os.sysconf('SC_CLK_TCK'), 0.0)
+
+
+@dataclass
+class PhaseStats:
+    calls: int = 0
+    time: float = 0.0
+    self_time: float = 0.0
+    max_rss: int = 0
+    peak_traced: int = 0
+
+
+class Frame:
+    def __init__(self, name: str, start: float, traced: int):
+        self.name = name
+        self.start = start
+        self.traced = traced
+        self.peak = traced
+        self.child_time = 0.0
+
+
+class Profiler:
+    def __init__(self, trace_memory: bool = False, include_startup: bool = True):
+        self.trace_memory = trace_memory
+        self.include_startup = include_startup
+        self.events: List[Dict[str, Any]] = []
+        self.stats: Dict[str, PhaseStats] = {}
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.previous: Optional['Profiler'] = None
+        self.started_tracing = False
+        self.origin = time.perf_counter()
+
+    def __enter__(self):
+        global ACTIVE
+        self.previous = ACTIVE
+        ACTIVE = self
+        if self.trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self.started_tracing = True
+
+        # The timeline starts with the process, so interpreter startup and imports show up as the first phase
+        now = time.perf_counter()
+        age = process_age() if self.include_startup else None
+        self.origin = now if age is None else now - age
+        if age is not None:
+            self.record('startup', self.origin, age, age, 0)
+        return self
+
+    def __exit__(self, *_):
+        global ACTIVE
+        if self.started_tracing:
+            tracemalloc.stop()
+            self.started_tracing = False
+        ACTIVE = self.previous
+
+    def frames(self) -> List[Frame]:
+        frames = getattr(self.local, 'frames', None)
+        if frames is None:
+            frames = self.local.frames = []
+        return frames
+
+    def traced_peak(self) -> int:
+        if not tracemalloc.is_tracing():
+            return 0
+        return tracemalloc.get_traced_memory()[1]
+
+    @contextlib.contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        frames = self.frames()
+        traced = 0
+        if tracemalloc.is_tracing():
+            # The peak is process wide, so the enclosing phase keeps the peak reached so far before it is reset
+            traced, peak = tracemalloc.get_traced_memory()
+            if len(frames) != 0:
+                frames[-1].peak = max(frames[-1].peak, peak)
+            tracemalloc.reset_peak()
+
+        frame = Frame(name, time.perf_counter(), traced)
+        frames.append(frame)
+        try:
+            yield
+        finally:
+            frames.pop()
+            elapsed = time.perf_counter() - frame.start
+            peak = max(frame.peak, self.traced_peak())
+            if len(frames) != 0:
+                frames[-1].child_time += elapsed
+                frames[-1].peak = max(frames[-1].peak, peak)
+            self.record(name, frame.start, elapsed, elapsed - frame.child_time, peak - frame.traced)
+
+    def record(self, name: str, start: float, elapsed: float, self_time: float, peak_traced: int):
+        rss = current_rss() or 0
+        timestamp = 1e6 * (start - self.origin)
+        thread = threading.get_ident()
+        event = {
+            'name': name,
+            'cat': 'phase',
+            'ph': 'X',
+            'ts': timestamp,
+            'dur': 1e6 * elapsed,
+            'pid': os.getpid(),
+            'tid': thread,
+            'args': {'rss': rss, 'peak_traced': peak_traced},
+        }
+        counter = {
+            'name': 'memory',
+            'ph': 'C',
+            'ts': timestamp + 1e6 * elapsed,
+            'pid': os.getpid(),
+            'tid': thread,
+            'args': {'rss': rss},
+        }
+
+        with self.lock:
+            self.events += [event, counter]
+            stats = self.stats.setdefault(name, PhaseStats())
+            stats.calls += 1
+            stats.time += elapsed
+            stats.self_time += self_time
+            stats.max_rss = max(stats.max_rss, rss)
+            stats.peak_traced = max(stats.peak_traced, peak_traced)
+
+    def summary(self) -> Dict[str, Dict[str, Any]]:
+        with self.lock:
+            return dict((name, asdict(stats)) for name, stats in sorted(self.stats.items(), key=lambda item: -item[1].self_time))
+
+    def write_trace(self, file: TextIO):
+        with self.lock:
+            events = list(self.events)
+        # Thread names make the timeline readable, the ids themselves are meaningless
+        names = dict((thread.ident, thread.name) for thread in threading.enumerate())
+        for ident in sorted(set(event['tid'] for event in events)):
+            events.append({'name': 'thread_name', 'ph': 'M', 'pid': os.getpid(), 'tid': ident, 'args': {'name': names.get(ident, str(ident))}})
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, file)
+
+    def write_summary(self, file: Optional[TextIO] = None):
+        if file is None:
+            file = sys.stderr
+
+        summary = self.summary()
+        if len(summary) == 0:
+            return
+        name_width = max(len(name) for name in summary)
+        print(f'{"phase":<{name_width}} {"calls":>7} {"total (s)":>10} {"self (s)":>10} {"max rss (MB)":>13} {"peak alloc (MB)":>16}', file=file)
+        for name, stats in summary.items():
+            print(f'{name:<{name_width}} {stats["calls"]:>7} {stats["time"]:>10.3f} {stats["self_time"]:>10.3f} '
+                  f'{stats["max_rss"] / 2**20:>13.1f} {stats["peak_traced"] / 2**20:>16.1f}', file=file)
+
+
+ACTIVE: Optional[Profiler] = None
+
+
+def phase(name: str):
+    if ACTIVE is None:
+        return NULL_PHASE
+    return ACTIVE.phase(name)
+
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--profile', nargs='?', const='', metavar='TRACE',
+                        help=f'Print where time and memory went to stderr, and save a Chrome trace to TRACE if given '
+                        f'(defaults to ${PROFILE_ENVIRONMENT_VARIABLE}, empty for no trace)')
+    parser.add_argument('--profile-memory', action='store_true', help='With --profile, also trace Python allocations per phase (slows everything down)')
+
+
+def get_trace_path(args: argparse.Namespace) -> Optional[str]:
+    # None when not profiling, '' when profiling without a trace file
+    if args.profile is not None:
+        return args.profile
+    return os.environ.get(PROFILE_ENVIRONMENT_VARIABLE)
+
+
+@contextlib.contextmanager
+def profiled(args: argparse.Namespace) -> Iterator[Optional[Profiler]]:
+    trace_path = get_trace_path(args)
+    if trace_path is None:
+        yield None
+        return
+
+    with Profiler(args.profile_memory) as profiler:
+        try:
+            yield profiler
+        finally:
+            profiler.write_summary()
+            if trace_path != '':
+                with open(trace_path, 'w') as f:
+                    profiler.write_trace(f)
+
+
+__all__ = [
+    'PROFILE_ENVIRONMENT_VARIABLE',
+    'PhaseStats',
+    'Profiler',
+    'add_profile_arguments',
+    'phase',
+    'profiled',
+]
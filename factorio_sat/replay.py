@@ -0,0 +1,191 @@
+import argparse
+import concurrent.futures
+import importlib
+import json
+import os
+import shlex
+import statistics
+import sys
+import time
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+from . import encoding_report
+from .capture import CLAUSES_FILENAME, find_traces, load_clauses, read_trace
+from .util import ClauseList
+
+# Every replay runs in a worker process, --jobs runs several at once (as calculate_optimal --threads does) to see how
+# the backends behave when sharing the machine
+
+
+@dataclass(frozen=True)
+class Variant:
+    solver: Optional[str] = None  # None replays with the captured solver
+    encoding: Optional[str] = None  # Extra options the captured tool invocation is encoded again with
+
+    def label(self, trace: Dict[str, Any]) -> str:
+        text = self.solver if self.solver is not None else trace['solver']
+        if self.encoding is not None:
+            text += ' ' + self.encoding
+        return text
+
+
+def encode_again(trace: Dict[str, Any], encoding: str) -> ClauseList:
+    context = trace['context']
+    if context['tool'] == 'calculate_optimal':
+        raise RuntimeError('calculate_optimal traces have no encoding options')
+
+    module = importlib.import_module('.' + context['tool'], __package__)
+    try:
+        args = module.get_parser().parse_args(context['argv'] + shlex.split(encoding))
+    except SystemExit:  # The usage has been printed, the other replays carry on
+        raise RuntimeError(f'{context["tool"]} does not accept {encoding}')
+    os.chdir(context['cwd'])  # Input files were named relative to where the tool ran
+    args.encoding_report = None  # Only the clauses are wanted, the captured run already had its report
+    grid = encoding_report.build_grid(module.create_grid, args)
+    # Disabled constraint groups are assumed off as they were in the captured solve, the same formula as the saved clauses
+    return grid.assumed_clauses(grid.group_assumptions(args.disable_group))
+
+
+def replay(directory: str, variant: Variant) -> Dict[str, Any]:
+    from .template import create_solver, is_command_solver, solve_with_command
+
+    trace = read_trace(directory)
+    solver = variant.solver if variant.solver is not None else trace['solver']
+
+    start = time.perf_counter()
+    if variant.encoding is None:
+        clauses = load_clauses(os.path.join(directory, CLAUSES_FILENAME))
+    else:
+        clauses = encode_again(trace, variant.encoding)
+    encode_time = time.perf_counter() - start
+    clause_count = len(clauses)
+
+    start = time.perf_counter()
+    if is_command_solver(solver):
+        satisfiable = solve_with_command(solver, clauses) is not None
+    else:
+        with create_solver(solver, clauses) as s:
+            satisfiable = s.solve()
+    return {
+        'status': 'sat' if satisfiable else 'unsat',
+        'time': time.perf_counter() - start,
+        'load_time': encode_time,
+        'clauses': clause_count,
+    }
+
+
+def captured_time(trace: Dict[str, Any]) -> Optional[float]:
+    # Replays only look for the first model, so that is what they are compared with
+    result = trace.get('result')
+    if result is None:
+        return None
+    if result['first_model_time'] is not None:
+        return result['first_model_time']
+    return result['total_time'] if result['completed'] else None
+
+
+def describe(trace: Dict[str, Any]) -> str:
+    context = trace['context']
+    if context['tool'] == 'calculate_optimal':
+        return f'calculate_optimal {"x".join(map(str, context["size"]))}'
+    return ' '.join([context['tool']] + context['argv'])
+
+
+def run_replays(directories: List[str], variants: List[Variant], repetitions: int, jobs: Optional[int]) -> List[Dict[str, Any]]:
+    rows = []
+    with concurrent.futures.ProcessPoolExecutor(max_workers=jobs) as executor:
+        submitted: List[Tuple[Dict[str, Any], List[concurrent.futures.Future]]] = []
+        for directory in directories:
+            trace = read_trace(directory)
+            for variant in variants:
+                row = {
+                    'trace': directory,
+                    'command': describe(trace),
+                    'variant': variant.label(trace),
+                    'captured_status': None if trace['result'] is None else trace['result']['status'],
+                    'captured_time': captured_time(trace),
+                    'captured_clauses': trace['layout']['clauses'],
+                    'same_encoding': variant.encoding is None,
+                }
+                submitted.append((row, [executor.submit(replay, directory, variant) for _ in range(repetitions)]))
+
+        for row, futures in submitted:
+            try:
+                results = [future.result() for future in futures]
+            except Exception as e:
+                row['error'] = f'{type(e).__name__}: {e}'
+                rows.append(row)
+                continue
+
+            row['status'] = results[0]['status']
+            row['clauses'] = results[0]['clauses']
+            row['times'] = [result['time'] for result in results]
+            row['time'] = statistics.median(row['times'])
+            row['load_time'] = statistics.median(result['load_time'] for result in results)
+            if row['captured_time'] is not None and row['time'] > 0:
+                row['speedup'] = row['captured_time'] / row['time']
+            rows.append(row)
+    return rows
+
+
+def write_table(rows: List[Dict[str, Any]], file=None):
+    if file is None:
+        file = sys.stdout
+
+    traces = list(dict.fromkeys(row['trace'] for row in rows))
+    variant_width = max([len(row['variant']) for row in rows] + [len('variant')])
+    for trace in traces:
+        trace_rows = [row for row in rows if row['trace'] == trace]
+        first = trace_rows[0]
+        captured = '?' if first['captured_time'] is None else f'{first["captured_time"]:.3f}s'
+        print(f'{os.path.basename(trace)}: {first["command"]} (captured {first["captured_status"] or "unfinished"} in {captured}, '
+              f'{first["captured_clauses"]} clauses)', file=file)
+        print(f'  {"variant":<{variant_width}} {"result":>7} {"clauses":>10} {"time (s)":>10} {"speedup":>8}', file=file)
+        for row in trace_rows:
+            if 'error' in row:
+                print(f'  {row["variant"]:<{variant_width}} {row["error"]}', file=file)
+                continue
+            status = row['status']
+            # A different answer from the same clauses is a solver bug, not a performance difference
+            if row['same_encoding'] and row['captured_status'] in ('sat', 'unsat') and status != row['captured_status']:
+                status += '!'
+            speedup = f'{row["speedup"]:.2f}x' if 'speedup' in row else ''
+            print(f'  {row["variant"]:<{variant_width}} {status:>7} {row["clauses"]:>10} {row["time"]:>10.3f} {speedup:>8}', file=file)
+        print(file=file)
+
+
+def get_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description='Solves captured traces again with other backends or encodings and compares the timings')
+    parser.add_argument('traces', nargs='+', help='Trace directories, or capture directories containing them')
+    parser.add_argument('--solver', type=str, action='append', default=[],
+                        help='Backend SAT solver to replay with, can be given more than once (defaults to the captured solver)')
+    parser.add_argument('--encoding', type=str, action='append', default=[],
+                        help='Encode again with these extra tool options (e.g. --encoding=--fast), can be given more than once')
+    parser.add_argument('--repetitions', type=int, default=1, help='Number of times every replay is run')
+    parser.add_argument('--jobs', type=int, default=1, help='Number of replays run at the same time')
+    parser.add_argument('--format', type=str, choices=('table', 'json'), default='table', help='Output format')
+    return parser
+
+
+def main(argv: Optional[List[str]] = None):
+    args = get_parser().parse_args(argv)
+
+    directories = find_traces(args.traces)
+    if len(directories) == 0:
+        raise RuntimeError('No traces found')
+
+    solvers: List[Optional[str]] = args.solver if len(args.solver) != 0 else [None]
+    variants = [Variant(solver) for solver in solvers]
+    variants += [Variant(solver, encoding) for encoding in args.encoding for solver in solvers]
+
+    rows = run_replays(directories, variants, args.repetitions, args.jobs)
+    if args.format == 'json':
+        json.dump(rows, sys.stdout, indent=2)
+        print()
+    else:
+        write_table(rows)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,18 +1,22 @@
+from __future__ import annotations
+
 import argparse
-import json
 from enum import Enum
-from typing import Callable
-
-import numpy as np
+from typing import TYPE_CHECKING, Callable, List, Optional
 
+from . import packed, serve
 from .tile import BaseTile, TransformableTile
 
+if TYPE_CHECKING:
+    import numpy as np
+
 
 class Operation(Enum):
+    # The same views np.rot90 returns, without needing NumPy before a grid is read
     NO_OP = (lambda tile: tile, lambda grid: grid)
-    ROT_90 = (lambda tile: tile.rotate_90(), lambda grid: np.rot90(grid, k=1))
-    ROT_180 = (lambda tile: tile.rotate_180(), lambda grid: np.rot90(grid, k=2))
-    ROT_270 = (lambda tile: tile.rotate_270(), lambda grid: np.rot90(grid, k=3))
+    ROT_90 = (lambda tile: tile.rotate_90(), lambda grid: grid.swapaxes(0, 1)[::-1])
+    ROT_180 = (lambda tile: tile.rotate_180(), lambda grid: grid[::-1, ::-1])
+    ROT_270 = (lambda tile: tile.rotate_270(), lambda grid: grid.swapaxes(0, 1)[:, ::-1])
     FLIP_X = (lambda tile: tile.flip_x(), lambda grid: grid[:, ::-1])
     FLIP_Y = (lambda tile: tile.flip_y(), lambda grid: grid[::-1, :])
 
@@ -21,21 +25,46 @@ class Operation(Enum):
         self.grid = grid
 
 
-def main():
+def transform_tiles(operation: Operation, tiles: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    def transform_tile(tile: BaseTile) -> BaseTile:
+        if isinstance(tile, TransformableTile):
+            return operation.tile(tile)
+        return tile
+
+    return np.frompyfunc(transform_tile, 1, 1)(operation.grid(tiles))
+
+
+def main(argv: Optional[List[str]] = None):
     parser = argparse.ArgumentParser(description='Apply transformations to tile grids')
+    parser.add_argument('--server', type=str, help='Forward the request to a running "serve" process at this address')
     parser.add_argument('operation', nargs='?', type=str, choices=[op.name.lower() for op in Operation], default=Operation.ROT_90.name.lower())
-    args = parser.parse_args()
+    packed.add_output_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.server is not None:
+        serve.forward(args.server, 'rotate', argv, serve.read_stdin())
+        return
+
+    import numpy as np
+
     operation = Operation[args.operation.upper()]
 
-    while True:
-        solution = np.array(json.loads(input()))
-        solution = operation.grid(solution)
-        for cell in solution.flat:
-            tile = BaseTile.read(cell['tile'])
-            if isinstance(tile, TransformableTile):
-                cell['tile'] = operation.tile(tile).write()
+    with packed.open_output(args) as writer:
+        for solution in packed.read_solutions():
+            solution = operation.grid(solution).copy()
+            for index, cell in np.ndenumerate(solution):
+                if isinstance(cell, BaseTile):  # Packed input without colour planes holds tiles directly
+                    if isinstance(cell, TransformableTile):
+                        solution[index] = operation.tile(cell)
+                    continue
+
+                tile = BaseTile.read(cell['tile'])
+                if isinstance(tile, TransformableTile):
+                    cell['tile'] = operation.tile(tile).write()
 
-        print(json.dumps(solution.tolist()))
+            writer.write(solution)
 
 
 if __name__ == '__main__':
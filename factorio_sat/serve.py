@@ -0,0 +1,409 @@
+import argparse
+import base64
+import contextlib
+import hashlib
+import importlib
+import io
+import json
+import os
+import socket
+import socketserver
+import sys
+import threading
+import traceback
+from collections import OrderedDict
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# Only the standard library is imported at module level, forwarding a request must not pay for NumPy/pysat
+
+GENERATOR_TOOLS = {
+    'belt_balancer',
+    'belt_balancer_net_free',
+    'belt_balancer_net_free_power_of_2',
+    'interchange',
+    'make_block',
+}
+STREAM_TOOLS = {
+    'blueprint',
+    'blueprint_book',
+    'network',
+    'rotate',
+    'stringifier',
+    'symmetry',
+}
+
+# Options that only affect how an encoded grid is solved or where results go, not the encoding itself
+SOLVE_OPTIONS = {
+    'all', 'block_orbits', 'cache', 'capture', 'colour_planes', 'compression', 'count', 'dedupe', 'disable_group', 'format', 'output', 'profile',
+    'profile_memory', 'projection', 'queue_size', 'server', 'solver', 'translations',
+}
+
+DEFAULT_MAX_GRIDS = 16
+
+BINARY_CHUNK_SIZE = 1 << 16  # Packed and compressed output is relayed in base64 messages of up to this many bytes
+
+
+def parse_address(address: str) -> Tuple[int, Any]:
+    if '/' not in address and ':' in address:
+        host, port = address.rsplit(':', 1)
+        return socket.AF_INET, (host, int(port))
+    return socket.AF_UNIX, address
+
+
+def strip_server_option(argv: List[str]) -> List[str]:
+    result = []
+    skip_next = False
+    for arg in argv:
+        if skip_next:
+            skip_next = False
+        elif arg == '--server':
+            skip_next = True
+        elif not arg.startswith('--server='):
+            result.append(arg)
+    return result
+
+
+def read_stdin() -> Optional[bytes]:
+    # Stream tools are forwarded as a batch, an interactive terminal has nothing to send. Bytes, the input may be packed
+    if sys.stdin is None or sys.stdin.isatty():
+        return None
+    return getattr(sys.stdin, 'buffer', sys.stdin).read()
+
+
+def forward(address: str, tool: str, argv: Optional[List[str]] = None, stdin: Optional[bytes] = None):
+    if argv is None:
+        argv = sys.argv[1:]
+    if isinstance(stdin, str):
+        stdin = stdin.encode('utf-8')
+
+    request = {
+        'tool': tool,
+        'argv': strip_server_option(argv),
+        'cwd': os.getcwd(),
+        'stdin': None if stdin is None else base64.b64encode(stdin).decode('ascii'),
+    }
+
+    family, socket_address = parse_address(address)
+    with socket.socket(family, socket.SOCK_STREAM) as sock:
+        sock.connect(socket_address)
+        with sock.makefile('rwb') as stream:
+            stream.write(json.dumps(request).encode('utf-8') + b'\n')
+            stream.flush()
+
+            for line in stream:
+                message = json.loads(line)
+                if 'stdout' in message:
+                    sys.stdout.write(message['stdout'])
+                    sys.stdout.flush()
+                elif 'stdout_binary' in message:
+                    sys.stdout.buffer.write(base64.b64decode(message['stdout_binary']))
+                    sys.stdout.buffer.flush()
+                elif 'stderr' in message:
+                    sys.stderr.write(message['stderr'])
+                elif 'error' in message:
+                    raise RuntimeError(message['error'])
+                elif 'exit' in message:
+                    if message['exit'] != 0:
+                        sys.exit(message['exit'])
+                    return
+    raise RuntimeError('Server closed the connection before finishing the request')
+
+
+def send_message(stream, message: Dict[str, Any]):
+    stream.write(json.dumps(message).encode('utf-8') + b'\n')
+    stream.flush()
+
+
+class BinaryMessageWriter(io.BufferedIOBase):
+    # The buffer of a MessageWriter, what is written to it is sent base64 encoded under "<key>_binary"
+    def __init__(self, text: 'MessageWriter'):
+        self.text = text
+        self.pending = bytearray()
+
+    def writable(self):
+        return True
+
+    def write(self, data) -> int:
+        self.text.flush_text()  # Keep text written before the binary data in front of it
+        self.pending += data
+        if len(self.pending) >= BINARY_CHUNK_SIZE:
+            self.flush()
+        return len(data)
+
+    def flush(self):
+        if len(self.pending) == 0:
+            return
+        message = {self.text.key + '_binary': base64.b64encode(bytes(self.pending)).decode('ascii')}
+        self.pending.clear()
+        send_message(self.text.stream, message)
+
+
+class MessageWriter(io.TextIOBase):
+    def __init__(self, stream, key: str):
+        self.stream = stream
+        self.key = key
+        self.pending: List[str] = []
+        self.buffer = BinaryMessageWriter(self)
+
+    def writable(self):
+        return True
+
+    def write(self, text: str) -> int:
+        self.buffer.flush()
+        self.pending.append(text)
+        if '\n' in text:
+            self.flush_text()
+        return len(text)
+
+    def flush_text(self):
+        if len(self.pending) == 0:
+            return
+        message = {self.key: ''.join(self.pending)}
+        self.pending.clear()
+        send_message(self.stream, message)
+
+    def flush(self):
+        self.buffer.flush()
+        self.flush_text()
+
+
+def encoding_key(tool: str, args: argparse.Namespace) -> str:
+    digest = hashlib.sha256(tool.encode('utf-8'))
+    for name, value in sorted(vars(args).items()):
+        if name in SOLVE_OPTIONS:
+            continue
+        if isinstance(value, io.IOBase):  # Input files are keyed by their content, not their name
+            contents = value.read()
+            value.seek(0)
+            value = contents
+        digest.update(json.dumps([name, value], default=repr).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class WarmGrid:
+    def __init__(self, grid):
+        self.grid = grid
+        self.solvers: Dict[str, Any] = {}
+
+    def get_solver(self, solver: str):
+        from .template import create_solver
+
+        if solver not in self.solvers:
+            self.solvers[solver] = create_solver(solver, self.grid.clauses)
+        return self.solvers[solver]
+
+    def itermodels(self, solver: str, enumerate_all: bool, cache=None, projection: str = 'tiles', orbit=None, disabled_groups: List[str] = []) -> Iterator[Any]:
+        from .background import solve_releasing_gil
+        from .template import blocking_clause, is_command_solver
+
+        if is_command_solver(solver):  # External solvers keep no state between calls
+            yield from self.grid.itermodels(solver=solver, ignore_colour=True, cache=cache, projection=projection, orbit=orbit, disabled_groups=disabled_groups)
+            return
+
+        # Guarded constraint groups are switched on and off by assumptions, the warm solver serves every combination
+        assumptions = self.grid.group_assumptions(disabled_groups)
+        self.grid.unsat_groups = None
+        if cache is not None and not enumerate_all:
+            cached = cache.lookup(cache.key(self.grid.assumed_clauses(assumptions)))
+            if cached is not None:
+                if cached.satisfiable:
+                    yield cached.model
+                return
+
+        from . import capture
+
+        warm = solver in self.solvers
+        s = self.get_solver(solver)
+        important_variables = self.grid.enumeration_variables(ignore_colour=True, projection=projection)
+
+        # Blocking clauses are guarded by a fresh literal, retiring it afterwards leaves the solver reusable
+        activation = self.grid.allocate_variable()
+        request_assumptions = assumptions + [activation]
+        recording_context = capture.solving(self.grid, solver, kind='enumerate' if enumerate_all else 'solve', assumptions=assumptions,
+                                            important_variables=len(important_variables), orbit=orbit is not None, warm_solver=warm)
+        try:
+            with recording_context as recording:
+                first = True
+                while True:
+                    if not solve_releasing_gil(s, request_assumptions):
+                        if first:
+                            self.grid.unsat_groups = self.grid.core_groups(s, assumptions)
+                        break
+                    first = False
+                    solution = s.get_model()
+                    recording.model()
+                    yield solution
+
+                    if not enumerate_all:
+                        break
+                    s.add_clause([-activation] + blocking_clause(s, solution, important_variables, request_assumptions))
+                    if orbit is not None:
+                        for image in orbit(solution):
+                            s.add_clause([-activation] + blocking_clause(s, image, important_variables, request_assumptions))
+        finally:
+            s.add_clause([-activation])
+
+    def close(self):
+        for s in self.solvers.values():
+            if hasattr(s, 'delete'):
+                s.delete()
+            else:
+                s.__exit__()
+        self.solvers.clear()
+
+
+class ToolServer:
+    def __init__(self, max_grids: int = DEFAULT_MAX_GRIDS):
+        self.max_grids = max_grids
+        self.grids: 'OrderedDict[str, WarmGrid]' = OrderedDict()
+        # Tools write to the process wide stdout and working directory, so requests are handled one at a time
+        self.lock = threading.Lock()
+
+    def get_grid(self, tool: str, module, args: argparse.Namespace) -> WarmGrid:
+        from . import encoding_report
+
+        key = encoding_key(tool, args)
+        warm_grid = self.grids.get(key)
+        if warm_grid is None or args.encoding_report is not None:  # A report needs the grid to be encoded again
+            if warm_grid is not None:
+                warm_grid.close()
+            warm_grid = WarmGrid(encoding_report.build_grid(module.create_grid, args))
+            self.grids[key] = warm_grid
+            while len(self.grids) > self.max_grids:
+                _, evicted = self.grids.popitem(last=False)
+                evicted.close()
+        else:
+            self.grids.move_to_end(key)
+        return warm_grid
+
+    def run_generator(self, tool: str, module, argv: List[str]):
+        from . import capture, enumeration, estimate, packed, profiling
+        from .cache import open_cache
+
+        args = module.get_parser().parse_args(argv)
+        try:
+            if args.estimate_only:
+                estimate.write_estimate(estimate.estimate_generator(module.create_grid, args))
+                return
+
+            # Trace and capture files are written by the server, relative to its working directory
+            with profiling.profiled(args), capture.captured(args, tool, argv):
+                warm_grid = self.get_grid(tool, module, args)
+
+                output = getattr(args, 'output', None)
+                if output is None:
+                    output = sys.stdout
+
+                orbit = enumeration.get_orbit(warm_grid.grid, args)
+                models = warm_grid.itermodels(args.solver, args.all or args.count, open_cache(args.cache), args.projection, orbit, args.disable_group)
+                with contextlib.closing(models), packed.open_output(args, output) as writer:
+                    enumeration.write_models(warm_grid.grid, models, args, writer)
+        finally:
+            for value in vars(args).values():
+                if isinstance(value, io.IOBase) and not value.closed:
+                    value.close()
+
+    def run_stream_tool(self, module, argv: List[str]):
+        try:
+            module.main(argv)
+        except EOFError:  # Stream tools read until their input runs out
+            pass
+
+    def handle(self, request: Dict[str, Any], stream):
+        tool = request['tool']
+        if tool not in GENERATOR_TOOLS and tool not in STREAM_TOOLS:
+            raise RuntimeError(f'Unknown tool: {tool}')
+        module = importlib.import_module('.' + tool, __package__)
+
+        stdout = MessageWriter(stream, 'stdout')
+        stderr = MessageWriter(stream, 'stderr')
+        # Tools peek at the buffer of stdin to tell packed and compressed input from JSON lines
+        stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(base64.b64decode(request.get('stdin') or ''))), encoding='utf-8')
+
+        with self.lock:
+            previous_directory = os.getcwd()
+            previous_stdin = sys.stdin
+            try:
+                os.chdir(request['cwd'])
+                sys.stdin = stdin
+                with contextlib.redirect_stdout(stdout), contextlib.redirect_stderr(stderr):
+                    if tool in GENERATOR_TOOLS:
+                        self.run_generator(tool, module, request['argv'])
+                    else:
+                        self.run_stream_tool(module, request['argv'])
+            finally:
+                sys.stdin = previous_stdin
+                os.chdir(previous_directory)
+                stdout.flush()
+                stderr.flush()
+
+
+def make_request_handler(server: ToolServer):
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            line = self.rfile.readline()
+            if len(line) == 0:
+                return
+
+            try:
+                self.wfile.write(json.dumps(self.run(json.loads(line))).encode('utf-8') + b'\n')
+            except (BrokenPipeError, ConnectionResetError):  # Client went away (e.g. piped into head)
+                pass
+
+        def run(self, request: Dict[str, Any]) -> Dict[str, Any]:
+            try:
+                server.handle(request, self.wfile)
+            except SystemExit as e:  # argparse errors
+                return {'exit': e.code if isinstance(e.code, int) else 1}
+            except (BrokenPipeError, ConnectionResetError):
+                raise
+            except Exception as e:
+                traceback.print_exc()
+                return {'error': f'{type(e).__name__}: {e}'}
+            return {'exit': 0}
+
+    return RequestHandler
+
+
+class ThreadingUnixStreamServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+class ThreadingTCPServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Serves tool requests from a long running process with warm caches')
+    parser.add_argument('address', type=str, help='Unix socket path or host:port to listen on')
+    parser.add_argument('--max-grids', type=int, default=DEFAULT_MAX_GRIDS, help='Number of encoded grids (and their solvers) kept in memory')
+    args = parser.parse_args()
+
+    if args.max_grids < 1:
+        raise RuntimeError('At least one grid must be kept')
+
+    tool_server = ToolServer(args.max_grids)
+    handler = make_request_handler(tool_server)
+
+    family, address = parse_address(args.address)
+    if family == socket.AF_UNIX:
+        if os.path.exists(address):
+            os.unlink(address)
+        server = ThreadingUnixStreamServer(address, handler)
+    else:
+        server = ThreadingTCPServer(address, handler)
+
+    print(f'Listening on {args.address}', file=sys.stderr)
+    try:
+        with server:
+            server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        if family == socket.AF_UNIX and os.path.exists(address):
+            os.unlink(address)
+
+
+if __name__ == '__main__':
+    main()
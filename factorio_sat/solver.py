@@ -1,13 +1,18 @@
-from typing import Callable, List, Dict, Any, Optional, Protocol, Tuple, Union
+from typing import Callable, Iterable, List, Dict, Any, Optional, Protocol, Set, Tuple, Union
 
 from pysat.formula import IDPool
 
-from .cardinality import quadratic_amo, quadratic_one
+from .cache import SolveCache
+from .cardinality import exactly_one, quadratic_amo, quadratic_one
 from .direction import Axis, Direction
+from .encoding_report import constraint_pass
+from .enumeration import PROJECTIONS
 from .template import (ArrayTemplate, BoolTemplate, CompositeTemplate, CompositeTemplateParams, EdgeMode,
-                       EdgeModeType, FactorioGrid, NestedArray, NumberTemplate, OneHotTemplate, flatten)
+                       EdgeModeType, FactorioGrid, NestedArray, NumberTemplate, OneHotTemplate, OrderTemplate, expand_edge_mode,
+                       flatten)
 from .tile import BaseTile, Belt, EmptyTile, FillerTile, Splitter, UndergroundBelt
-from .util import LiteralType, implies, invert_components, literals_same, set_all_false, set_literal, set_maximum, set_not_number, set_number, set_numbers_equal
+from .util import (COLOUR_ENCODINGS, ClauseList, ClauseType, LiteralType, get_bits, implies, invert_components, literals_same, set_all_false,
+                   set_literal, set_maximum, set_numbers, set_numbers_equal, set_order_ladder)
 
 
 class TileTemplate(Protocol):
@@ -30,16 +35,21 @@ class TileTemplate(Protocol):
 
 
 class Grid(FactorioGrid[TileTemplate, Dict[str, Any]]):
+    @constraint_pass
     def __init__(self,
                  width: int,
                  height: int,
                  colours: Optional[int],
                  underground_length: int = 4,
                  extras: CompositeTemplateParams = {},
-                 pool: Optional[IDPool] = None):
+                 pool: Optional[IDPool] = None,
+                 colour_encoding: str = 'binary'):
         assert colours is None or colours >= 1
         assert underground_length >= 0
+        if colour_encoding not in COLOUR_ENCODINGS:
+            raise RuntimeError(f'Unknown colour encoding: {colour_encoding}')
         self.colours = colours
+        self.colour_encoding = colour_encoding
         self.underground_length = underground_length
 
         template = {
@@ -66,10 +76,16 @@ class Grid(FactorioGrid[TileTemplate, Dict[str, Any]]):
         }
         if colours is not None:
             self.colour_bits = (colours - 1).bit_length()
+            if colour_encoding == 'binary':
+                colour_template = NumberTemplate(self.colour_bits)
+            elif colour_encoding == 'one_hot':
+                colour_template = OneHotTemplate(colours)
+            else:
+                colour_template = OrderTemplate(colours - 1)
             template.update({
-                'colour': NumberTemplate(self.colour_bits),
-                'colour_ux': NumberTemplate(self.colour_bits),
-                'colour_uy': NumberTemplate(self.colour_bits),
+                'colour': colour_template,
+                'colour_ux': colour_template,
+                'colour_uy': colour_template,
             })
         else:
             self.colour_bits = None
@@ -124,7 +140,12 @@ class Grid(FactorioGrid[TileTemplate, Dict[str, Any]]):
             # Prevent colours beyond end of range
             if self.colours is not None:
                 for colour_range in (tile.colour, tile.colour_ux, tile.colour_uy):
-                    self.clauses += set_maximum(self.colours - 1, colour_range)
+                    if colour_encoding == 'binary':
+                        self.clauses += set_maximum(self.colours - 1, colour_range)
+                    elif colour_encoding == 'one_hot':
+                        self.clauses += exactly_one(colour_range, self.allocate_variable)
+                    else:
+                        self.clauses += set_order_ladder(colour_range)
 
         for direction in Direction:
             inv_direction = direction.reverse
@@ -216,6 +237,7 @@ class Grid(FactorioGrid[TileTemplate, Dict[str, Any]]):
                     self.clauses.append([-tile.is_input])
                     self.clauses.append([-tile.is_output])
 
+    @constraint_pass
     def set_tile(self, x: int, y: int, tile: BaseTile):
         tile_instance = self.get_tile_instance(x, y)
 
@@ -268,20 +290,56 @@ class Grid(FactorioGrid[TileTemplate, Dict[str, Any]]):
         else:
             assert False
 
+    def colour_value(self, value: int, colour: List[LiteralType]) -> List[LiteralType]:
+        # The literals that are all set when a colour field has this value
+        assert 0 <= value < self.colours
+        if self.colour_encoding == 'binary':
+            return [set_literal(lit, bit) for lit, bit in zip(colour, get_bits(value, len(colour)))]
+        elif self.colour_encoding == 'one_hot':
+            return [colour[value]]
+        else:
+            literals = []
+            if value > 0:
+                literals.append(colour[value - 1])  # Greater than value - 1
+            if value < len(colour):
+                literals.append(-colour[value])  # and not greater than value
+            return literals
+
+    def set_colour_value(self, value: int, colour: List[LiteralType]) -> ClauseList:
+        return [[lit] for lit in self.colour_value(value, colour)]
+
+    def set_not_colour_value(self, value: int, colour: List[LiteralType]) -> ClauseType:
+        return [-lit for lit in self.colour_value(value, colour)]
+
+    def set_colour_values(self, value_a: int, value_b: int, colour_a: List[LiteralType], colour_b: List[LiteralType]) -> ClauseList:
+        # One colour field is set to value_a, the other to value_b
+        if self.colour_encoding == 'binary':
+            return set_numbers(value_a, value_b, colour_a, colour_b)
+
+        clauses = []
+        for colour in (colour_a, colour_b):
+            clauses += [[lit_a, lit_b] for lit_a in self.colour_value(value_a, colour) for lit_b in self.colour_value(value_b, colour)]
+        clauses += implies(self.colour_value(value_a, colour_a), self.set_colour_value(value_b, colour_b))
+        clauses += implies(self.colour_value(value_b, colour_a), self.set_colour_value(value_a, colour_b))
+        return clauses
+
+    @constraint_pass
     def prevent_colour(self, colour: int):
         for x in range(self.width):
             for y in range(self.height):
                 tile = self.get_tile_instance(x, y)
                 if colour == 0:
-                    self.clauses += [[-lit, *set_not_number(0, tile.colour)] for lit in tile.all_direction]
+                    self.clauses += [[-lit, *self.set_not_colour_value(0, tile.colour)] for lit in tile.all_direction]
                 else:
-                    self.clauses += [set_not_number(colour, colour_range) for colour_range in (tile.colour, tile.colour_ux, tile.colour_uy)]
+                    self.clauses += [self.set_not_colour_value(colour, colour_range) for colour_range in (tile.colour, tile.colour_ux, tile.colour_uy)]
 
+    @constraint_pass
     def set_colour(self, x: int, y: int, colour: int):
         assert 0 <= colour < self.colours
         tile = self.get_tile_instance(x, y)
-        self.clauses += set_number(colour, tile.colour)
+        self.clauses += self.set_colour_value(colour, tile.colour)
 
+    @constraint_pass
     def transport_quantity(self,
                            quantity: Callable[[TileTemplate], NestedArray[LiteralType]],
                            quantity_ux: Callable[[TileTemplate], NestedArray[LiteralType]],
@@ -329,11 +387,13 @@ class Grid(FactorioGrid[TileTemplate, Dict[str, Any]]):
                         ],
                         set_numbers_equal(quantity_ua, quantity_b))
 
+    @constraint_pass
     def prevent_bad_colouring(self, edge_mode: EdgeModeType):
         if self.colours in (1, None):
             return
         self.transport_quantity(lambda tile: tile.colour, lambda tile: tile.colour_ux, lambda tile: tile.colour_uy, edge_mode)
 
+    @constraint_pass
     def block_underground_through_edges(self, edges: Union[bool, Tuple[bool, bool], Tuple[bool, bool, bool, bool]] = True):
         if isinstance(edges, bool):
             edges = edges, edges
@@ -369,6 +429,7 @@ class Grid(FactorioGrid[TileTemplate, Dict[str, Any]]):
                 self.clauses += implies([tile.input_direction[Direction.DOWN]], [[-tile.is_underground_in]])
                 self.clauses += implies([tile.output_direction[Direction.UP]], [[-tile.is_underground_out]])
 
+    @constraint_pass
     def block_belts_through_edges(self, edges: Union[bool, Tuple[bool, bool], Tuple[bool, bool, bool, bool]] = True):
         if isinstance(edges, bool):
             edges = edges, edges
@@ -403,6 +464,7 @@ class Grid(FactorioGrid[TileTemplate, Dict[str, Any]]):
                 self.clauses.append([-tile.input_direction[3], *tile.output_direction])
                 self.clauses.append([-tile.output_direction[1], *tile.input_direction])
 
+    @constraint_pass
     def prevent_bad_undergrounding(self, edge_mode: EdgeModeType):
         for direction in Direction:
             reverse_dir = direction.reverse
@@ -452,12 +514,19 @@ class Grid(FactorioGrid[TileTemplate, Dict[str, Any]]):
                             ]
                         )
 
-    def enforce_maximum_underground_length(self, edge_mode: EdgeModeType):
+    @constraint_pass
+    def enforce_maximum_underground_length(self, edge_mode: EdgeModeType, encoding: str = 'window'):
         assert self.underground_length >= 1
 
         if self.underground_length == float('inf'):
             return
 
+        if encoding == 'ladder':
+            self.enforce_maximum_underground_length_ladder(edge_mode)
+            return
+        if encoding != 'window':
+            raise RuntimeError(f'Unknown underground encoding: {encoding}')
+
         for direction in Direction:
             dx, dy = direction.vec
             for x in range(self.width):
@@ -473,6 +542,60 @@ class Grid(FactorioGrid[TileTemplate, Dict[str, Any]]):
                     else:
                         self.clauses.append(clause)
 
+    def enforce_maximum_underground_length_ladder(self, edge_mode: EdgeModeType):
+        # Each line of tiles is cut into blocks of underground_length + 1, any window that long is a suffix of one block
+        # and a prefix of the next (or a whole block), so it is ruled out by a binary clause on two run variables: one set
+        # when the tiles from it to the end of its block all have the underground set, the other from the start of its block
+        edge_mode = expand_edge_mode(edge_mode)
+        length = self.underground_length + 1
+
+        for direction in Direction:
+            dx, dy = direction.vec
+            axis = 0 if dx != 0 else 1
+            size = (self.width, self.height)[axis]
+            wrap = edge_mode[axis] == EdgeMode.WRAP
+            if not wrap and size < length:
+                continue
+
+            for other in range((self.height, self.width)[axis]):
+                line = []
+                for position in range(size):
+                    coordinate = position if dx + dy > 0 else size - 1 - position
+                    tile = self.get_tile_instance(coordinate, other) if axis == 0 else self.get_tile_instance(other, coordinate)
+                    line.append(tile.underground[direction])
+
+                runs: Dict[Tuple[int, int], LiteralType] = {}
+
+                def run(start: int, end: int, step: int) -> LiteralType:
+                    if start == end:
+                        return line[start]
+                    if (start, end) not in runs:
+                        inner = run(start, end - step, step)
+                        runs[start, end] = self.allocate_variable()
+                        self.clauses.append([-inner, -line[end], runs[start, end]])
+                    return runs[start, end]
+
+                for start in range(size if wrap else size - length + 1):
+                    positions = [(start + i) % size for i in range(length)]
+                    clause = []
+                    while len(positions) > 0:
+                        block_start = positions[0] // length * length
+                        block_end = min(block_start + length, size) - 1
+                        count = 1
+                        while count < len(positions) and positions[count] == positions[count - 1] + 1 and positions[count] <= block_end:
+                            count += 1
+                        first, last = positions[0], positions[count - 1]
+                        positions = positions[count:]
+
+                        if first == block_start:
+                            clause.append(-run(first, last, 1))
+                        elif last == block_end:
+                            clause.append(-run(last, first, -1))
+                        else:
+                            clause += [-line[position] for position in range(first, last + 1)]
+                    self.clauses.append(clause)
+
+    @constraint_pass
     def prevent_intersection(self, edge_mode: EdgeModeType):
         for direction in Direction:
             for tile_a, tile_b in self.iterate_tile_lines(direction.vec, 2, edge_mode):
@@ -493,14 +616,34 @@ class Grid(FactorioGrid[TileTemplate, Dict[str, Any]]):
                     [-tile_b.input_direction[direction.reverse], -tile_b.output_direction[direction.prev]],
                 ])
 
-    def itersolve(self, important_variables=set(), solver='g3', ignore_colour=False):
-        important_variables = set(important_variables)
+    def enumeration_variables(self, ignore_colour=False, projection: str = 'tiles') -> Set[LiteralType]:
+        if projection not in PROJECTIONS:
+            raise RuntimeError(f'Unknown projection: {projection}')
+
+        important_variables = set()
         for x in range(self.width):
             for y in range(self.height):
                 tile = self.get_tile_instance(x, y)
 
-                important_variables |= set([*tile.all_direction, tile.is_splitter])
+                if projection == 'tiles':
+                    important_variables |= set([*tile.all_direction, tile.is_splitter])
 
-                if not ignore_colour:
-                    important_variables |= set(tile.colour + tile.colour_ux + tile.colour_uy)
-        return super().itersolve(important_variables, solver)
+                    if not ignore_colour:
+                        important_variables |= set(tile.colour + tile.colour_ux + tile.colour_uy)
+                elif projection == 'types':
+                    important_variables |= set(tile.type)
+                elif projection == 'splitters':
+                    important_variables.add(tile.is_splitter)
+                else:
+                    assert False
+        return important_variables
+
+    def itermodels(self, important_variables=set(), solver='g3', ignore_colour=False, cache: Optional[SolveCache] = None, projection: str = 'tiles',
+                   orbit: Optional[Callable[[List[LiteralType]], Iterable[List[LiteralType]]]] = None, disabled_groups: Iterable[str] = ()):
+        important_variables = set(important_variables) | self.enumeration_variables(ignore_colour, projection)
+        return super().itermodels(important_variables, solver, cache, orbit, disabled_groups)
+
+    def itersolve(self, important_variables=set(), solver='g3', ignore_colour=False, cache: Optional[SolveCache] = None, projection: str = 'tiles',
+                  orbit: Optional[Callable[[List[LiteralType]], Iterable[List[LiteralType]]]] = None, disabled_groups: Iterable[str] = ()):
+        for solution in self.itermodels(important_variables, solver, ignore_colour, cache, projection, orbit, disabled_groups):
+            yield self.parse_solution(solution)
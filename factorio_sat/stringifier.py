@@ -1,10 +1,9 @@
 import argparse
-import json
 import sys
+from typing import List, Optional
 
-import numpy as np
-
-from .blueprint import read_tile, write_tile
+from . import packed, serve
+from .blueprint import read_tile
 from .direction import Direction
 from .tile import Belt, EmptyTile, FillerTile, Splitter, UndergroundBelt
 
@@ -90,7 +89,6 @@ INV_MAPPING = dict((val, key) for key, val in MAPPING.items())
 END_STOP = '┘'
 
 
-@np.vectorize
 def encode_tile(tile):
     return MAPPING.get(tile, 'U')
 
@@ -100,8 +98,10 @@ def decode_char(character):
 
 
 def encode(grid):
+    import numpy as np
+
     char_grid = np.full((grid.shape[0] + 2, 2 * grid.shape[1] + 1), ' ', dtype='<U1')
-    char_grid[1:-1, 1:-1:2] = encode_tile(grid)
+    char_grid[1:-1, 1:-1:2] = np.vectorize(encode_tile, otypes=['<U1'])(grid)
 
     # raw_print(style_seq(bold=True))
 
@@ -116,6 +116,8 @@ def encode(grid):
 
 
 def decode(input_lines):
+    import numpy as np
+
     grid = np.full((len(input_lines) - 2, len(input_lines[0]) // 2), None, dtype=object)
 
     for row, line in enumerate(input_lines[1:-1]):
@@ -128,25 +130,31 @@ def decode(input_lines):
     return grid
 
 
-def main():
+def main(argv: Optional[List[str]] = None):
     parser = argparse.ArgumentParser(description='Converts grids to and from an ascii representation')
+    parser.add_argument('--server', type=str, help='Forward the request to a running "serve" process at this address')
     parser.add_argument('mode', choices=['encode', 'decode'])
-    args = parser.parse_args()
+    packed.add_output_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.server is not None:
+        serve.forward(args.server, 'stringifier', argv, serve.read_stdin())
+        return
+
+    import numpy as np
 
     if args.mode == 'encode':
-        while True:
-            tiles = np.array(json.loads(input()))
+        for tiles in packed.read_solutions():
             tiles = np.vectorize(read_tile)(tiles)
             print(encode(tiles))
     else:
-        while True:
+        with packed.open_output(args) as writer:
             lines = []
-            while True:
-                lines.append(input().strip())
+            for line in sys.stdin:
+                lines.append(line.strip())
                 if lines[-1].endswith(END_STOP):
-                    break
-            grid = np.vectorize(write_tile)(decode(lines))
-            print(json.dumps(grid.tolist()))
+                    writer.write(decode(lines))
+                    lines = []
 
 
 if __name__ == '__main__':
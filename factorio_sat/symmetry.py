@@ -0,0 +1,218 @@
+from __future__ import annotations
+
+import argparse
+import functools
+import hashlib
+from typing import TYPE_CHECKING, Callable, Dict, Iterator, List, Optional, Set, Tuple
+
+from . import packed, serve
+from .direction import Direction
+from .rotate import Operation
+from .tile import Belt, Splitter, TransformableTile
+from .util import LiteralType
+
+if TYPE_CHECKING:
+    import numpy as np
+
+    from .solver import Grid
+
+# A transform is a sequence of operations applied left to right
+Transform = Tuple[Operation, ...]
+
+GROUPS: Dict[str, Tuple[Transform, ...]] = {
+    'mirror': (
+        (Operation.NO_OP,),
+        (Operation.FLIP_X,),
+    ),
+    'rotations': (
+        (Operation.NO_OP,),
+        (Operation.ROT_90,),
+        (Operation.ROT_180,),
+        (Operation.ROT_270,),
+    ),
+    'dihedral': (
+        (Operation.NO_OP,),
+        (Operation.ROT_90,),
+        (Operation.ROT_180,),
+        (Operation.ROT_270,),
+        (Operation.FLIP_X,),
+        (Operation.FLIP_Y,),
+        (Operation.ROT_90, Operation.FLIP_X),
+        (Operation.ROT_270, Operation.FLIP_X),
+    ),
+}
+
+
+# Operations act on tile codes and directions through lookup tables, so canonical forms never touch tile objects.
+# The tables are built on first use rather than on import.
+@functools.lru_cache(maxsize=None)
+def code_table(operation: Operation) -> np.ndarray:
+    import numpy as np
+
+    def transform_tile(tile):
+        if isinstance(tile, TransformableTile):
+            return operation.tile(tile)
+        return tile
+
+    table = np.arange(256, dtype=np.uint8)
+    table[:len(packed.TILES)] = [packed.TILE_CODES[transform_tile(tile)] for tile in packed.TILES]
+    return table
+
+
+@functools.lru_cache(maxsize=None)
+def direction_table(operation: Operation) -> List[Direction]:
+    return [operation.tile(Belt(direction, direction)).output_direction for direction in Direction]
+
+
+@functools.lru_cache(maxsize=None)
+def normalise_table() -> np.ndarray:
+    import numpy as np
+
+    # Which half of a splitter is the head is not part of any projection and flips with the splitter, so it is ignored
+    table = np.arange(256, dtype=np.uint8)
+    for code, tile in enumerate(packed.TILES):
+        if isinstance(tile, Splitter):
+            table[code] = packed.TILE_CODES[Splitter(tile.direction, False)]
+    return table
+
+
+def transform_codes(transform: Transform, codes: np.ndarray) -> np.ndarray:
+    for operation in transform:
+        codes = code_table(operation)[operation.grid(codes)]
+    return codes
+
+
+def solution_codes(solution: np.ndarray) -> np.ndarray:
+    import numpy as np
+
+    return packed.encode_tiles(np.frompyfunc(packed.cell_tile, 1, 1)(np.array(solution, dtype=object, ndmin=2)))
+
+
+def canonical_form(codes: np.ndarray, group: str = 'dihedral', translations: bool = False) -> bytes:
+    import numpy as np
+
+    best = None
+    for transform in GROUPS[group]:
+        transformed = normalise_table()[transform_codes(transform, codes)]
+        height, width = transformed.shape
+        offsets = [(dy, dx) for dy in range(height) for dx in range(width)] if translations else [(0, 0)]
+        for dy, dx in offsets:
+            form = packed.RECORD_HEADER.pack(height, width) + np.roll(transformed, (dy, dx), axis=(0, 1)).tobytes()
+            if best is None or form < best:
+                best = form
+    assert best is not None
+    return best
+
+
+def solution_key(solution: np.ndarray, group: str = 'dihedral', translations: bool = False) -> bytes:
+    return hashlib.blake2b(canonical_form(solution_codes(solution), group, translations), digest_size=16).digest()
+
+
+class Deduplicator:
+    def __init__(self, group: str = 'dihedral', translations: bool = False):
+        if group not in GROUPS:
+            raise RuntimeError(f'Unknown symmetry group: {group}')
+        self.group = group
+        self.translations = translations
+        self.seen: Set[bytes] = set()
+        self.duplicates = 0
+
+    def add(self, solution: np.ndarray) -> bool:
+        key = solution_key(solution, self.group, self.translations)
+        if key in self.seen:
+            self.duplicates += 1
+            return False
+        self.seen.add(key)
+        return True
+
+    def filter(self, solutions: Iterator[np.ndarray]) -> Iterator[np.ndarray]:
+        for solution in solutions:
+            if self.add(solution):
+                yield solution
+
+
+def cell_mapping(transform: Transform, height: int, width: int) -> Optional[np.ndarray]:
+    import numpy as np
+
+    # mapping[y, x] is the flat index of the source cell that ends up at (x, y), None if the grid changes shape
+    mapping = np.arange(height * width).reshape(height, width)
+    for operation in transform:
+        mapping = operation.grid(mapping)
+    if mapping.shape != (height, width):
+        return None
+    return mapping
+
+
+def orbit_images(grid: Grid, group: str, translations: bool = False) -> Callable[[List[LiteralType]], Iterator[List[LiteralType]]]:
+    import numpy as np
+
+    # Images of a model under the group, over the tile type and direction variables only.
+    # Blocking an image that is not a solution is harmless, its clause is satisfied by every model.
+    tiles = [grid.get_tile_instance(x, y) for y in range(grid.height) for x in range(grid.width)]
+
+    mappings = []
+    for transform in GROUPS[group]:
+        mapping = cell_mapping(transform, grid.height, grid.width)
+        if mapping is None:  # e.g. rotating a non square grid
+            continue
+
+        directions = list(Direction)
+        for operation in transform:
+            directions = [direction_table(operation)[direction] for direction in directions]
+
+        offsets = [(dy, dx) for dy in range(grid.height) for dx in range(grid.width)] if translations else [(0, 0)]
+        for dy, dx in offsets:
+            if transform == (Operation.NO_OP,) and (dy, dx) == (0, 0):
+                continue
+            mappings.append((np.roll(mapping, (dy, dx), axis=(0, 1)).flatten(), directions))
+
+    def images(model: List[LiteralType]) -> Iterator[List[LiteralType]]:
+        true = set(lit for lit in model if lit > 0)
+
+        def value(lit: LiteralType) -> bool:
+            return (abs(lit) in true) == (lit > 0)
+
+        for mapping, directions in mappings:
+            image = []
+            for target, source in zip(tiles, mapping):
+                source = tiles[source]
+                for target_lit, source_lit in zip(target.type, source.type):
+                    image.append(target_lit if value(source_lit) else -target_lit)
+                for direction in Direction:
+                    new_direction = directions[direction]
+                    for target_lits, source_lits in ((target.input_direction, source.input_direction), (target.output_direction, source.output_direction)):
+                        image.append(target_lits[new_direction] if value(source_lits[direction]) else -target_lits[new_direction])
+            yield image
+
+    return images
+
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description='Removes solutions that are a symmetric image of an earlier solution')
+    parser.add_argument('--server', type=str, help='Forward the request to a running "serve" process at this address')
+    parser.add_argument('group', nargs='?', choices=GROUPS, default='dihedral', help='Symmetry group solutions are compared under')
+    parser.add_argument('--translations', action='store_true', help='Solutions that only differ by a (wrapping) translation are also duplicates')
+    packed.add_output_arguments(parser)
+    args = parser.parse_args(argv)
+
+    if args.server is not None:
+        serve.forward(args.server, 'symmetry', argv, serve.read_stdin())
+        return
+
+    with packed.open_output(args) as writer:
+        for solution in Deduplicator(args.group, args.translations).filter(packed.read_solutions()):
+            writer.write(solution)
+            writer.flush()
+
+
+__all__ = [
+    'GROUPS',
+    'Deduplicator',
+    'canonical_form',
+    'orbit_images',
+    'solution_key',
+]
+
+
+if __name__ == '__main__':
+    main()
@@ -7,16 +7,21 @@ import shlex
 import subprocess
 import sys
 import tempfile
+import time
 from dataclasses import dataclass
-from typing import Any, Callable, Dict, Generic, Iterator, List, NamedTuple, Optional, Protocol, Sequence, Tuple, TypeVar, Union
+from typing import Any, Callable, Dict, Generic, Iterable, Iterator, List, NamedTuple, Optional, Protocol, Sequence, Tuple, TypeVar, Union
 
 import numpy as np
 from pysat.formula import CNF, IDPool
 from pysat.solvers import Solver
 
+from . import capture, profiling
+from .background import solve_releasing_gil
+from .cache import SolveCache
 from .ipasir import IPASIRLibrary
+from .preprocess import PreprocessedSolver, Simplification, split_solver
 from .tile import BaseTile
-from .util import ClauseList, LiteralType, read_number
+from .util import ClauseList, ClauseType, LiteralType, read_number
 
 
 class EdgeMode(enum.Enum):
@@ -97,6 +102,65 @@ def run_command_solver(cmd: str, clauses: ClauseList) -> Optional[List[LiteralTy
             return interpret_solver_answer(process)
 
 
+def is_command_solver(solver: str) -> bool:
+    return split_solver(solver)[1].startswith('cmd:')
+
+
+def solve_with_command(solver: str, clauses: ClauseList) -> Optional[List[LiteralType]]:
+    preprocess, solver = split_solver(solver)
+    if not preprocess:
+        return run_command_solver(solver[4:], clauses)
+
+    with profiling.phase('preprocess'):
+        simplification = Simplification(clauses)
+    if simplification.unsatisfiable:
+        return None
+    solution = run_command_solver(solver[4:], simplification.clauses)
+    if solution is None:
+        return None
+    return simplification.reconstruct(solution)
+
+
+def create_solver(solver: str, clauses: ClauseList):
+    preprocess, solver = split_solver(solver)
+    if preprocess:  # e.g. "pre:g3", the backend gets the simplified clauses
+        with profiling.phase('preprocess'):
+            simplification = Simplification(clauses)
+        return PreprocessedSolver(simplification, functools.partial(create_solver, solver))
+
+    if solver.startswith('lib:'):
+        s = IPASIRLibrary(solver[4:]).create_solver()
+        s.add_clauses(clauses)
+        return s
+    else:
+        return Solver(name=solver, bootstrap_with=clauses)
+
+
+def blocking_clause(s, solution: List[LiteralType], important_variables, assumptions: List[LiteralType] = []) -> ClauseType:
+    projected = [lit for lit in solution if abs(lit) in important_variables]
+
+    # Only block the literals that are not already implied (by unit propagation) by earlier ones and the assumptions the
+    # solver was called with, every model with these decisions has the same projection so nothing else gets blocked.
+    # The assumptions are left out of the clause, so it is only valid for a solver that keeps being called with them.
+    decisions: List[LiteralType] = []
+    implied = set()
+    trail_length = 0
+    try:
+        for lit in projected:
+            if lit in implied:
+                continue
+            decisions.append(lit)
+            _, propagated = s.propagate(assumptions=assumptions + decisions)
+            if isinstance(s, PreprocessedSolver):  # Its trail is sorted by variable, not in propagation order
+                implied = set(propagated)
+            else:  # pysat's trail only grows as decisions are added, only the tail is new
+                implied.update(propagated[trail_length:])
+                trail_length = len(propagated)
+    except (AttributeError, NotImplementedError):  # IPASIR and some pysat backends can't propagate on their own
+        decisions = projected
+    return [-lit for lit in decisions]
+
+
 T = TypeVar('T')
 NestedArray = Union[T, List['NestedArray']]
 
@@ -211,6 +275,14 @@ class NumberTemplate(SizedTemplate[int]):
         return read_number([mapping[lit] for lit in instance], self.is_signed)
 
 
+@dataclass(frozen=True)
+class OrderTemplate(SizedTemplate[int]):
+    # Literal i is set when the value is greater than i, so a value of n is the first n literals set
+    def parse(self, instance: List[LiteralType], mapping: Dict[int, bool]) -> int:
+        assert isinstance(instance, list)
+        return sum(mapping[lit] for lit in instance)
+
+
 CompositeTemplateParams = Dict[str, Union[Template[Any, Any], Callable, 'CompositeTemplateParams']]
 
 
@@ -280,9 +352,14 @@ class BaseGrid(Generic[InstanceType, ParsedType]):
         else:
             self.pool = pool
 
-        self.tiles = np.frompyfunc(lambda i, j: template.instantiate(self.pool), 2, 1)(*np.ogrid[0:height, 0:width])
+        with profiling.phase('instantiate'):
+            self.tiles = np.frompyfunc(lambda i, j: template.instantiate(self.pool), 2, 1)(*np.ogrid[0:height, 0:width])
 
         self.clauses: ClauseList = []
+        self.field_literals: Dict[str, np.ndarray] = {}
+        # Selector literals of the guarded constraint groups (see constraint_groups.py), and the groups the last unsatisfiable answer depended on
+        self.selectors: Dict[str, LiteralType] = {}
+        self.unsat_groups: Optional[List[str]] = None
 
     @property
     def total_variables(self):
@@ -355,6 +432,14 @@ class BaseGrid(Generic[InstanceType, ParsedType]):
             for y in range(self.height):
                 yield np.frompyfunc(lambda i: self.get_tile_instance_offset(x, y, dx * i, dy * i, edge_mode), 1, 1)(np.arange(length))
 
+    def tile_literals(self, field: str) -> np.ndarray:
+        # The literals of one field of every tile, indexed by y then x (then by the field's own index)
+        literals = self.field_literals.get(field)
+        if literals is None:
+            literals = np.array([[getattr(tile, field) for tile in row] for row in self.tiles], dtype=np.int64)
+            self.field_literals[field] = literals
+        return literals
+
     def allocate_variable(self) -> LiteralType:
         return self.pool._next()
 
@@ -383,53 +468,166 @@ class BaseGrid(Generic[InstanceType, ParsedType]):
         return self.template.parse(tile, mapping)
 
     def parse_solution(self, solution: List[LiteralType]) -> np.ndarray:
-        mapping = {abs(lit): lit > 0 for lit in solution}
-        return np.frompyfunc(functools.partial(self.parse_cell, mapping), 1, 1)(self.tiles)
-
-    def check(self, solver: str = 'g3'):
-        return self.solve(solver) is not None
+        with profiling.phase('parse'):
+            mapping = {abs(lit): lit > 0 for lit in solution}
+            return np.frompyfunc(functools.partial(self.parse_cell, mapping), 1, 1)(self.tiles)
+
+    def group_assumptions(self, disabled_groups: Iterable[str] = ()) -> List[LiteralType]:
+        # Every selector has to be assumed one way or the other, otherwise the solver is free to switch groups off
+        disabled = set(disabled_groups)
+        unknown = disabled - self.selectors.keys()
+        if len(unknown) != 0:
+            raise RuntimeError(f'Unknown constraint groups (only guarded passes can be disabled): {", ".join(sorted(unknown))}')
+        return [-selector if name in disabled else selector for name, selector in self.selectors.items()]
+
+    def assumed_clauses(self, assumptions: List[LiteralType]) -> ClauseList:
+        # For everything that can't take assumptions (command solvers, the cache key, captures and exported CNF)
+        if len(assumptions) == 0:
+            return self.clauses
+        return self.clauses + [[lit] for lit in assumptions]
+
+    def core_groups(self, s, assumptions: List[LiteralType]) -> Optional[List[str]]:
+        # The enabled groups an unsatisfiable answer depended on, None when the solver can't tell
+        if len(assumptions) == 0 or not hasattr(s, 'get_core'):
+            return None
+        core = s.get_core()
+        if core is None:
+            return None
+        names = dict((selector, name) for name, selector in self.selectors.items())
+        return sorted(names[lit] for lit in set(core) if lit in names)
+
+    def check(self, solver: str = 'g3', cache: Optional[SolveCache] = None, disabled_groups: Iterable[str] = ()):
+        return self.solve(solver, cache, disabled_groups) is not None
+
+    def solve_stats(self, solver: str, solve_time: float) -> Dict[str, Any]:
+        return {
+            'solver': solver,
+            'time': solve_time,
+            'variables': self.pool.top,
+            'clauses': len(self.clauses),
+        }
+
+    def solve(self, solver: str = 'g3', cache: Optional[SolveCache] = None, disabled_groups: Iterable[str] = ()):
+        assumptions = self.group_assumptions(disabled_groups)
+        self.unsat_groups = None
+        if cache is not None:
+            with profiling.phase('cache lookup'):
+                key = cache.key(self.assumed_clauses(assumptions))
+                cached = cache.lookup(key)
+            if cached is not None:
+                if not cached.satisfiable:
+                    return None
+                return self.parse_solution(cached.model)
 
-    def solve(self, solver: str = 'g3'):
-        if solver.startswith('cmd:'):
-            solution = run_command_solver(solver[4:], self.clauses)
-            if solution is None:
-                return None
-            return self.parse_solution(solution)
-        else:
-            if solver.startswith('lib:'):
-                s = IPASIRLibrary(solver[4:]).create_solver()
-                s.add_clauses(self.clauses)
+        start = time.perf_counter()
+        with capture.solving(self, solver, kind='solve', assumptions=assumptions) as recording:
+            if is_command_solver(solver):
+                with profiling.phase('command solver'):
+                    solution = solve_with_command(solver, self.assumed_clauses(assumptions))
             else:
-                s = Solver(name=solver, bootstrap_with=self.clauses)
+                with profiling.phase('solver bootstrap'):
+                    s = create_solver(solver, self.clauses)
+                with s:
+                    with profiling.phase('search'):
+                        satisfiable = solve_releasing_gil(s, assumptions)
+                    with profiling.phase('model'):
+                        solution = s.get_model() if satisfiable else None
+                    if not satisfiable:
+                        self.unsat_groups = self.core_groups(s, assumptions)
+            if solution is not None:
+                recording.model()
+
+        if cache is not None:
+            cache.store(key, solution, self.solve_stats(solver, time.perf_counter() - start))
+
+        if solution is None:
+            return None
+        return self.parse_solution(solution)
+
+    def itermodels(self, important_variables=set(), solver: str = 'g3', cache: Optional[SolveCache] = None,
+                   orbit: Optional[Callable[[List[LiteralType]], Iterable[List[LiteralType]]]] = None,
+                   disabled_groups: Iterable[str] = ()) -> Iterator[List[LiteralType]]:
+        def block(s, solution: List[LiteralType]):
+            with profiling.phase('block'):
+                s.add_clause(blocking_clause(s, solution, important_variables, assumptions))
+                if orbit is not None:  # Symmetric images of the solution
+                    for image in orbit(solution):
+                        s.add_clause(blocking_clause(s, image, important_variables, assumptions))
+
+        assumptions = self.group_assumptions(disabled_groups)
+        self.unsat_groups = None
+
+        # Only the first model is cached, later models depend on the order the blocking clauses were added in
+        cached_solution = None
+        if cache is not None:
+            with profiling.phase('cache lookup'):
+                key = cache.key(self.assumed_clauses(assumptions))
+                cached = cache.lookup(key)
+            if cached is not None:
+                if not cached.satisfiable:
+                    return
+                cached_solution = cached.model
+                yield cached_solution
+
+        if is_command_solver(solver):
+            if cached_solution is not None:
+                return
 
-            with s:
-                if s.solve():
-                    return self.parse_solution(s.get_model())
-                else:
-                    return None
+            start = time.perf_counter()
+            with capture.solving(self, solver, kind='solve', assumptions=assumptions) as recording:
+                with profiling.phase('command solver'):
+                    solution = solve_with_command(solver, self.assumed_clauses(assumptions))
+                if solution is not None:
+                    recording.model()
+            if cache is not None:
+                cache.store(key, solution, self.solve_stats(solver, time.perf_counter() - start))
 
-    def itersolve(self, important_variables=set(), solver: str = 'g3') -> Iterator[np.ndarray]:
-        if solver.startswith('cmd:'):
-            solution = run_command_solver(solver[4:], self.clauses)
             if solution is None:
                 return
-            yield self.parse_solution(solution)
+            yield solution
         else:
-            if solver.startswith('lib:'):
-                s = IPASIRLibrary(solver[4:]).create_solver()
-                s.add_clauses(self.clauses)
-            else:
-                s = Solver(name=solver, bootstrap_with=self.clauses)
-
-            with s:
-                while s.solve():
-                    solution = s.get_model()
-                    yield self.parse_solution(solution)
-
-                    s.add_clause([-lit for lit in solution if abs(lit) in important_variables])
+            recording_context = capture.solving(self, solver, kind='enumerate', assumptions=assumptions, important_variables=len(important_variables),
+                                                orbit=orbit is not None, cached_first_model=cached_solution is not None)
+            with recording_context as recording:
+                with profiling.phase('solver bootstrap'):
+                    s = create_solver(solver, self.clauses)
+                with s:
+                    if cached_solution is not None:
+                        block(s, cached_solution)
+
+                    needs_store = cache is not None and cached_solution is None
+                    first = True
+                    start = time.perf_counter()
+                    while True:
+                        # Phases never span a yield, the consumer may be profiled on another thread
+                        with profiling.phase('search'):
+                            satisfiable = solve_releasing_gil(s, assumptions)
+                        if not satisfiable:
+                            if cached_solution is None and first:  # Later answers only depend on the blocking clauses
+                                self.unsat_groups = self.core_groups(s, assumptions)
+                            break
+                        with profiling.phase('model'):
+                            solution = s.get_model()
+                        recording.model()
+                        if needs_store:
+                            cache.store(key, solution, self.solve_stats(solver, time.perf_counter() - start))
+                            needs_store = False
+
+                        yield solution
+
+                        first = False
+                        block(s, solution)
+
+                    if needs_store:
+                        cache.store(key, None, self.solve_stats(solver, time.perf_counter() - start))
+
+    def itersolve(self, important_variables=set(), solver: str = 'g3', cache: Optional[SolveCache] = None,
+                  disabled_groups: Iterable[str] = ()) -> Iterator[np.ndarray]:
+        for solution in self.itermodels(important_variables, solver, cache, disabled_groups=disabled_groups):
+            yield self.parse_solution(solution)
 
-    def write(self, filename: str, comments: Optional[List[str]] = None):
-        cnf = CNF(from_clauses=self.clauses)
+    def write(self, filename: str, comments: Optional[List[str]] = None, disabled_groups: Iterable[str] = ()):
+        cnf = CNF(from_clauses=self.assumed_clauses(self.group_assumptions(disabled_groups)))
         cnf.to_file(filename, comments)
 
 
@@ -460,5 +658,9 @@ __all__ = [
     'NestedArray',
     'NumberTemplate',
     'OneHotTemplate',
+    'OrderTemplate',
+    'blocking_clause',
+    'create_solver',
+    'is_command_solver',
     'flatten'
 ]
@@ -6,7 +6,8 @@ from os import path
 from OpenGL.GL import *
 from PIL import Image
 
-ASSETS_DIR = os.path.join(os.getenv("XDG_DATA_HOME"), "factorio-sat/assets")
+from .assets.fetch import get_assets_directory
+
 
 def get_texture_size(texture: int) -> Tuple[int, int]:
     glBindTexture(GL_TEXTURE_2D, texture)
@@ -92,27 +93,29 @@ class Tilemap:
 def init():
     global BELT, UNDERGROUND, SPLITTER_EAST, SPLITTER_WEST, SPLITTER_NORTH, SPLITTER_SOUTH, INSERTER_PLATFORM, INSERTER_HAND_BASE, INSERTER_HAND_OPEN, INSERTER_HAND_CLOSED, ASSEMBLING_MACHINE
 
-    BELT = Tilemap(load_image(path.join(ASSETS_DIR, 'hr-transport-belt.png')), (128, 128), PIXELS_PER_UNIT)
-    UNDERGROUND = Tilemap(load_image(path.join(ASSETS_DIR, 'hr-underground-belt-structure.png')), (192, 192), PIXELS_PER_UNIT)
+    assets_dir = get_assets_directory()
+
+    BELT = Tilemap(load_image(path.join(assets_dir, 'hr-transport-belt.png')), (128, 128), PIXELS_PER_UNIT)
+    UNDERGROUND = Tilemap(load_image(path.join(assets_dir, 'hr-underground-belt-structure.png')), (192, 192), PIXELS_PER_UNIT)
     SPLITTER_EAST = [
-        Tilemap(load_image(path.join(ASSETS_DIR, 'hr-splitter-east.png')), (90, 84), PIXELS_PER_UNIT),
-        Tilemap(load_image(path.join(ASSETS_DIR, 'hr-splitter-east-top_patch.png')), (90, 104), PIXELS_PER_UNIT),
+        Tilemap(load_image(path.join(assets_dir, 'hr-splitter-east.png')), (90, 84), PIXELS_PER_UNIT),
+        Tilemap(load_image(path.join(assets_dir, 'hr-splitter-east-top_patch.png')), (90, 104), PIXELS_PER_UNIT),
     ]
     SPLITTER_WEST = [
-        Tilemap(load_image(path.join(ASSETS_DIR, 'hr-splitter-west.png')), (90, 86), PIXELS_PER_UNIT),
-        Tilemap(load_image(path.join(ASSETS_DIR, 'hr-splitter-west-top_patch.png')), (90, 96), PIXELS_PER_UNIT),
+        Tilemap(load_image(path.join(assets_dir, 'hr-splitter-west.png')), (90, 86), PIXELS_PER_UNIT),
+        Tilemap(load_image(path.join(assets_dir, 'hr-splitter-west-top_patch.png')), (90, 96), PIXELS_PER_UNIT),
     ]
-    SPLITTER_SOUTH = Tilemap(load_image(path.join(ASSETS_DIR, 'hr-splitter-south.png')), (164, 64), PIXELS_PER_UNIT)
-    SPLITTER_NORTH = Tilemap(load_image(path.join(ASSETS_DIR, 'hr-splitter-north.png')), (160, 70), PIXELS_PER_UNIT)
+    SPLITTER_SOUTH = Tilemap(load_image(path.join(assets_dir, 'hr-splitter-south.png')), (164, 64), PIXELS_PER_UNIT)
+    SPLITTER_NORTH = Tilemap(load_image(path.join(assets_dir, 'hr-splitter-north.png')), (160, 70), PIXELS_PER_UNIT)
 
-    INSERTER_PLATFORM = Tilemap(load_image(path.join(ASSETS_DIR, 'hr-inserter-platform.png')), (105, 79),
-                                PIXELS_PER_UNIT), Tilemap(load_image(path.join(ASSETS_DIR, 'hr-long-handed-inserter-platform.png')), (105, 79), PIXELS_PER_UNIT)
+    INSERTER_PLATFORM = Tilemap(load_image(path.join(assets_dir, 'hr-inserter-platform.png')), (105, 79),
+                                PIXELS_PER_UNIT), Tilemap(load_image(path.join(assets_dir, 'hr-long-handed-inserter-platform.png')), (105, 79), PIXELS_PER_UNIT)
 
-    INSERTER_HAND_BASE = load_image(path.join(ASSETS_DIR, 'hr-inserter-hand-base.png')), load_image(path.join(ASSETS_DIR, 'hr-long-handed-inserter-hand-base.png'))
-    INSERTER_HAND_OPEN = load_image(path.join(ASSETS_DIR, 'hr-inserter-hand-open.png')), load_image(path.join(ASSETS_DIR, 'hr-long-handed-inserter-hand-open.png'))
-    INSERTER_HAND_CLOSED = load_image(path.join(ASSETS_DIR, 'hr-inserter-hand-closed.png')), load_image(path.join(ASSETS_DIR, 'hr-long-handed-inserter-hand-closed.png'))
+    INSERTER_HAND_BASE = load_image(path.join(assets_dir, 'hr-inserter-hand-base.png')), load_image(path.join(assets_dir, 'hr-long-handed-inserter-hand-base.png'))
+    INSERTER_HAND_OPEN = load_image(path.join(assets_dir, 'hr-inserter-hand-open.png')), load_image(path.join(assets_dir, 'hr-long-handed-inserter-hand-open.png'))
+    INSERTER_HAND_CLOSED = load_image(path.join(assets_dir, 'hr-inserter-hand-closed.png')), load_image(path.join(assets_dir, 'hr-long-handed-inserter-hand-closed.png'))
 
-    ASSEMBLING_MACHINE = Tilemap(load_image(path.join(ASSETS_DIR, 'hr-assembling-machine-1.png')), (214, 226), PIXELS_PER_UNIT)
+    ASSEMBLING_MACHINE = Tilemap(load_image(path.join(assets_dir, 'hr-assembling-machine-1.png')), (214, 226), PIXELS_PER_UNIT)
 
 
 PIXELS_PER_UNIT = 64
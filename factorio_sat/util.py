@@ -9,6 +9,14 @@ ClauseType = List[LiteralType]
 ClauseList = List[ClauseType]
 AllocatorType = Callable[[], int]
 
+# How the underground length rules are encoded: a clause per window of tiles, or a ladder of auxiliary variables running
+# along each line of tiles (see Grid.enforce_maximum_underground_length and optimisations.prevent_empty_along_underground)
+UNDERGROUND_ENCODINGS = ('window', 'ladder')
+
+# How Grid colours are represented: bits of the colour number, a literal per colour, or literal i set when the colour is
+# greater than i (see Grid.set_colour_value)
+COLOUR_ENCODINGS = ('binary', 'one_hot', 'order')
+
 
 def get_stack():  # Doesn't include caller
     result = []
@@ -119,6 +127,38 @@ def sum_numbers(numbers: List[List[LiteralType]], output: List[LiteralType], all
     return clauses
 
 
+def add_order_numbers(input_a: List[LiteralType], input_b: List[LiteralType], output: List[LiteralType], shift: int = 0) -> ClauseList:
+    # Order encoded numbers (literal i is set when the number is greater than i), output = (input_a + input_b) >> shift where
+    # the sum must be a multiple of 1 << shift. Rounding the lower bound up and the upper bound down rules out the rest
+    divisor = 1 << shift
+
+    clauses = []
+    for i in range(len(input_a) + 1):
+        for j in range(len(input_b) + 1):
+            # At least i and j, so at least the sum
+            at_least = -(-(i + j) // divisor)
+            if at_least > 0:
+                clause = []
+                if i > 0:
+                    clause.append(-input_a[i - 1])
+                if j > 0:
+                    clause.append(-input_b[j - 1])
+                if at_least <= len(output):
+                    clause.append(output[at_least - 1])
+                clauses.append(clause)
+
+            # At most i and j, so at most the sum
+            at_most = (i + j) // divisor
+            if at_most < len(output):
+                clause = [-output[at_most]]
+                if i < len(input_a):
+                    clause.append(input_a[i])
+                if j < len(input_b):
+                    clause.append(input_b[j])
+                clauses.append(clause)
+    return clauses
+
+
 def increment_number(input: List[LiteralType], output: List[LiteralType]):
     assert len(input) == len(output)
     assert len(input) > 0
@@ -241,6 +281,16 @@ def set_numbers_equal(number_a: List[LiteralType], number_b: List[LiteralType],
     return clauses
 
 
+def set_order_number(value: int, literals: List[LiteralType]) -> ClauseList:
+    assert 0 <= value <= len(literals)
+    return set_all_true(literals[:value]) + set_all_false(literals[value:])
+
+
+def set_order_ladder(literals: List[LiteralType]) -> ClauseList:
+    # Makes literals an order encoded number: each implies the one before it
+    return [[-upper, lower] for lower, upper in zip(literals, literals[1:])]
+
+
 def set_not_number(value: int, literals: List[LiteralType]) -> ClauseType:
     return [-lit[0] for lit in set_number(value, literals)]
 
@@ -385,9 +435,12 @@ def break_symmetry(left: List[LiteralType], right: List[LiteralType], allocator:
 
 __all__ = [
     'AllocatorType',
+    'COLOUR_ENCODINGS',
     'ClauseList',
     'ClauseType',
     'LiteralType',
+    'UNDERGROUND_ENCODINGS',
+    'add_order_numbers',
     'bin_length',
     'break_symmetry',
     'get_popcount',
@@ -405,4 +458,6 @@ __all__ = [
     'set_number',
     'set_numbers',
     'set_numbers_equal',
+    'set_order_ladder',
+    'set_order_number',
 ]
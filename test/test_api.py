@@ -0,0 +1,44 @@
+import asyncio
+import unittest
+
+from factorio_sat.api import BalancerOptions, BalancerPool, enumerate_balancers, generate_balancer
+
+
+class TestApi(unittest.TestCase):
+    def test_generate_balancer(self):
+        solution = asyncio.run(generate_balancer('networks/2x2', 3, 2))
+        self.assertEqual(len(solution), 2)
+        self.assertEqual(len(solution[0]), 3)
+
+        self.assertIsNone(asyncio.run(generate_balancer('networks/4x4', 6, 4)))
+
+    def test_enumerate_balancers(self):
+        async def collect():
+            return [solution async for solution in enumerate_balancers('networks/2x2', 3, 2)]
+        self.assertEqual(len(asyncio.run(collect())), 2)
+
+    def test_worker_errors_propagate(self):
+        with self.assertRaises(RuntimeError):
+            asyncio.run(generate_balancer('networks/2x2', 3, 2, BalancerOptions(edge_splitters=True, edge_belts=True)))
+
+    def test_constraint_groups(self):
+        options = BalancerOptions(fast=True, guard=('optimisations.*',), disable_group=('optimisations.prevent_small_loops',))
+        self.assertIsNotNone(asyncio.run(generate_balancer('networks/2x2', 3, 2, options)))
+        with self.assertRaises(RuntimeError):  # Not guarded, so it can't be disabled
+            asyncio.run(generate_balancer('networks/2x2', 3, 2, BalancerOptions(disable_group=('optimisations.prevent_small_loops',))))
+
+    def test_cancellation_releases_worker(self):
+        async def run():
+            pool = BalancerPool(1)
+            task = asyncio.ensure_future(pool.generate_balancer('networks/8x8', 30, 8))
+            await asyncio.sleep(0.5)
+            task.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await task
+            # The slot is free again once the worker has been killed
+            return await asyncio.wait_for(pool.generate_balancer('networks/2x2', 3, 2), 60)
+        self.assertIsNotNone(asyncio.run(run()))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,56 @@
+import tempfile
+import unittest
+
+from factorio_sat import tile
+from factorio_sat.cache import SolveCache
+from factorio_sat.direction import Direction
+from test.grid_test_case import BaseGridTest
+
+
+class TestSolveCache(BaseGridTest):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = SolveCache(self.directory.name)
+        self.make_grid(3, 3)
+
+    def tearDown(self):
+        self.directory.cleanup()
+        super().tearDown()
+
+    def test_sat_result_reused(self):
+        self.grid.set_tile(1, 1, tile.Belt(Direction.RIGHT, Direction.RIGHT))
+        solution = self.grid.solve(cache=self.cache)
+        self.assertIsNotNone(solution)
+
+        cached = self.cache.lookup(self.cache.key(self.grid.clauses))
+        self.assertTrue(cached.satisfiable)
+        self.assertEqual(cached.stats['clauses'], len(self.grid.clauses))
+
+        # A cache hit never constructs a solver, so an unknown backend is not an error
+        self.assertEqual(self.grid.solve('not-a-solver', self.cache).tolist(), solution.tolist())
+
+    def test_unsat_result_reused(self):
+        self.grid.set_tile(0, 1, tile.Belt(Direction.UP, Direction.UP))
+        self.grid.set_tile(1, 1, tile.Belt(Direction.RIGHT, Direction.RIGHT))
+        self.assertIsNone(self.grid.solve(cache=self.cache))
+        self.assertFalse(self.cache.lookup(self.cache.key(self.grid.clauses)).satisfiable)
+        self.assertIsNone(self.grid.solve('not-a-solver', self.cache))
+
+    def test_itersolve_continues_after_cached_model(self):
+        for x in range(3):
+            self.grid.set_tile(x, 0, tile.EmptyTile())
+            self.grid.set_tile(x, 2, tile.EmptyTile())
+        self.grid.set_tile(0, 1, tile.Belt(Direction.RIGHT, Direction.RIGHT))
+        self.grid.set_tile(2, 1, tile.Belt(Direction.RIGHT, Direction.RIGHT))
+
+        uncached = [solution.tolist() for solution in self.grid.itersolve(ignore_colour=True)]
+        first = next(self.grid.itersolve(ignore_colour=True, cache=self.cache))
+        cached = [solution.tolist() for solution in self.grid.itersolve(ignore_colour=True, cache=self.cache)]
+
+        self.assertEqual(cached[0], first.tolist())
+        self.assertEqual(len(cached), len(uncached))
+
+
+if __name__ == '__main__':
+    unittest.main()
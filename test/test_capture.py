@@ -0,0 +1,47 @@
+import os
+import tempfile
+import unittest
+
+from factorio_sat import capture, encoding_report, interchange, replay
+from factorio_sat.capture import Capture
+
+
+class TestCapture(unittest.TestCase):
+    def test_capture_and_replay(self):
+        args = interchange.get_parser().parse_args(['6', '4'])
+        grid = interchange.create_grid(args)
+        with tempfile.TemporaryDirectory() as directory:
+            with Capture(directory, {'tool': 'interchange', 'argv': ['6', '4'], 'cwd': os.getcwd()}):
+                self.assertIsNotNone(grid.solve())
+            self.assertIsNone(capture.ACTIVE)
+
+            traces = capture.find_traces([directory])
+            self.assertEqual(len(traces), 1)
+            trace = capture.read_trace(traces[0])
+            self.assertEqual(trace['result']['status'], 'sat')
+            self.assertEqual(trace['layout']['clauses'], len(grid.clauses))
+            self.assertEqual(capture.load_clauses(os.path.join(traces[0], capture.CLAUSES_FILENAME)), grid.clauses)
+
+            rows = replay.run_replays(traces, [replay.Variant('g3'), replay.Variant('g3', '--underground-length 2')], 1, 1)
+            self.assertEqual([row['status'] for row in rows], ['sat', 'unsat'])  # Too short to cross over at this size
+            self.assertEqual(rows[0]['clauses'], len(grid.clauses))
+            self.assertNotEqual(rows[1]['clauses'], len(grid.clauses))
+
+    def test_replay_guarded(self):
+        argv = ['6', '4', '--guard', 'optimisations.*']
+        grid = encoding_report.build_grid(interchange.create_grid, interchange.get_parser().parse_args(argv))
+        argv += ['--disable-group', sorted(grid.selectors)[0]]
+        with tempfile.TemporaryDirectory() as directory:
+            with Capture(directory, {'tool': 'interchange', 'argv': argv, 'cwd': os.getcwd()}):
+                self.assertIsNotNone(grid.solve(disabled_groups=[argv[-1]]))
+
+            (trace,) = capture.find_traces([directory])
+            saved = capture.load_clauses(os.path.join(trace, capture.CLAUSES_FILENAME))
+            clauses = replay.encode_again(capture.read_trace(trace), '')
+            self.assertEqual(len(clauses), len(saved))
+            self.assertTrue(clauses == saved)  # Too long for assertEqual to show the difference
+
+    def test_inactive(self):
+        with capture.solving(None, 'g3') as recording:
+            self.assertIs(recording, capture.NULL_RECORDING)
+        self.assertEqual(capture.strip_capture_option(['4', '--capture', 'x', '4', '--capture=y']), ['4', '4'])
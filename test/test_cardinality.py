@@ -0,0 +1,60 @@
+import itertools
+import unittest
+
+from pysat.formula import IDPool
+from pysat.solvers import Solver
+
+from factorio_sat.cardinality import AMO_ENCODINGS, Cardinality, at_most_one, exactly_one
+
+
+def satisfiable(clauses, assumptions) -> bool:
+    with Solver(name='g3', bootstrap_with=clauses) as solver:
+        return solver.solve(assumptions=assumptions)
+
+
+class TestCardinality(unittest.TestCase):
+    def check_encoding(self, encode, count: int, minimum: int):
+        pool = IDPool(start_from=count + 1)
+        literals = list(range(1, count + 1))
+        clauses = encode(literals, pool._next) + [[lit, -lit] for lit in literals]
+        for values in itertools.product((False, True), repeat=count):
+            assumptions = [lit if value else -lit for lit, value in zip(literals, values)]
+            self.assertEqual(satisfiable(clauses, assumptions), minimum <= sum(values) <= 1, (count, values))
+
+    def test_amo_encodings(self):
+        for name in AMO_ENCODINGS:
+            with self.subTest(encoding=name):
+                for count in range(1, 10):
+                    self.check_encoding(lambda literals, allocator: at_most_one(literals, allocator, name), count, 0)
+
+    def test_exactly_one(self):
+        for name in ('auto', 'ladder', 'logarithmic'):
+            with self.subTest(encoding=name):
+                for count in range(1, 8):
+                    self.check_encoding(lambda literals, allocator: exactly_one(literals, allocator, name), count, 1)
+
+    def test_shared_counts(self):
+        count = 6
+        literals = list(range(1, count + 1))
+        parts = [literals[:2], literals[2:5], literals[5:]]
+        for kind in ('equals', 'atmost', 'atleast'):
+            for n in range(count + 1):
+                with self.subTest(kind=kind, n=n):
+                    pool = IDPool(start_from=count + 1)
+                    cardinality = Cardinality({'*': 'shared'})
+                    clauses = cardinality.constrain(kind, 'all', literals, n, pool, parts)
+                    # A second constraint on one of the parts reuses its count, when that was built to count high enough
+                    top = pool.top
+                    part_clauses = cardinality.atmost('part', parts[1], 1, pool)
+                    if n >= 1:
+                        self.assertEqual(pool.top, top)
+                    for values in itertools.product((False, True), repeat=count):
+                        assumptions = [lit if value else -lit for lit, value in zip(literals, values)]
+                        expected = {'equals': sum(values) == n, 'atmost': sum(values) <= n, 'atleast': sum(values) >= n}[kind]
+                        self.assertEqual(satisfiable(clauses + [[lit, -lit] for lit in literals], assumptions), expected, values)
+                        self.assertEqual(satisfiable(clauses + part_clauses + [[lit, -lit] for lit in literals], assumptions),
+                                         expected and sum(values[2:5]) <= 1, values)
+
+
+if __name__ == '__main__':
+    unittest.main()
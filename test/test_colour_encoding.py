@@ -0,0 +1,60 @@
+import itertools
+import unittest
+
+import numpy as np
+
+from factorio_sat import belt_balancer, blueprint, stringifier
+from factorio_sat.network import deduplicate_network, open_network
+from factorio_sat.solver import Grid
+from factorio_sat.util import COLOUR_ENCODINGS
+
+
+def build(argv, colour_encoding: str) -> Grid:
+    args = belt_balancer.get_parser().parse_args(argv + ['--colour-encoding', colour_encoding])
+    return belt_balancer.build_balancer(deduplicate_network(open_network(args.network)), args)
+
+
+def read_tiles(solution) -> np.ndarray:
+    return np.vectorize(blueprint.read_tile)(solution)
+
+
+class TestColourEncoding(unittest.TestCase):
+    def test_colour_values(self):
+        for colour_encoding in COLOUR_ENCODINGS:
+            with self.subTest(colour_encoding=colour_encoding):
+                grid = Grid(2, 1, 5, colour_encoding=colour_encoding)
+                tile_a, tile_b = grid.get_tile_instance(0, 0), grid.get_tile_instance(1, 0)
+                grid.clauses += grid.set_colour_values(1, 3, tile_a.colour, tile_b.colour)
+
+                pairs = set()
+                for solution in grid.itersolve(important_variables=set(tile_a.colour + tile_b.colour), projection='splitters'):
+                    pairs.add((solution[0, 0]['colour'], solution[0, 1]['colour']))
+                self.assertEqual(pairs, {(1, 3), (3, 1)})
+
+    def test_same_balancers(self):
+        for argv in (['networks/2x2', '4', '2'], ['networks/3x3', '5', '3', '--fast']):
+            expected = None
+            for colour_encoding in COLOUR_ENCODINGS:
+                with self.subTest(argv=argv, colour_encoding=colour_encoding):
+                    solutions = set(tuple(stringifier.encode(read_tiles(solution)))
+                                    for solution in build(argv, colour_encoding).itersolve(ignore_colour=True))
+                    if expected is None:
+                        expected = solutions
+                    self.assertEqual(solutions, expected)
+
+    def test_solutions_carry_over(self):
+        argv = ['networks/4x4', '10', '4', '--fast']
+        solutions = [read_tiles(solution) for solution in itertools.islice(build(argv, 'binary').itersolve(ignore_colour=True), 3)]
+        self.assertEqual(len(solutions), 3)
+
+        for colour_encoding in COLOUR_ENCODINGS[1:]:
+            for tiles in solutions:
+                with self.subTest(colour_encoding=colour_encoding):
+                    grid = build(argv, colour_encoding)
+                    for (y, x), tile in np.ndenumerate(tiles):
+                        grid.set_tile(x, y, tile)
+                    self.assertTrue(grid.check())
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+
+from pysat.solvers import Solver
+
+from factorio_sat import encoding_report, interchange, optimisations, tile
+from factorio_sat.cardinality import Cardinality
+from factorio_sat.constraint_groups import ConstraintGroups
+from factorio_sat.direction import Direction
+from factorio_sat.encoding_report import EncodingReport
+from factorio_sat.serve import WarmGrid
+from factorio_sat.template import blocking_clause
+from test.grid_test_case import BaseGridTest
+
+SMALL_LOOPS = 'optimisations.prevent_small_loops'
+SET_TILE = 'solver.Grid.set_tile'
+
+
+CARDINALITY = Cardinality({'*': 'shared'})
+
+
+@encoding_report.constraint_pass
+def at_least_one(grid, literals):
+    grid.clauses += CARDINALITY.atleast('nodes', literals, 1, grid.pool)
+
+
+@encoding_report.constraint_pass
+def at_most_one(grid, literals):
+    grid.clauses += CARDINALITY.atmost('nodes', literals, 1, grid.pool)
+
+
+class TestConstraintGroups(BaseGridTest):
+    def make_loop(self):
+        with ConstraintGroups([SET_TILE, 'optimisations.*']):
+            self.make_grid(2, 2, 1)
+            for x, y, input_direction, output_direction in ((0, 0, Direction.UP, Direction.RIGHT), (1, 0, Direction.RIGHT, Direction.DOWN),
+                                                            (1, 1, Direction.DOWN, Direction.LEFT), (0, 1, Direction.LEFT, Direction.UP)):
+                self.grid.set_tile(x, y, tile.Belt(input_direction, output_direction))
+            optimisations.prevent_small_loops(self.grid)
+
+    def test_guarded_clauses(self):
+        with EncodingReport() as report:
+            expected = interchange.create_grid(interchange.get_parser().parse_args(['6', '4']))
+        optimisation_clauses = sum(stats.clauses for name, stats in report.passes.items() if name.startswith('optimisations.'))
+
+        grid = encoding_report.build_grid(interchange.create_grid, interchange.get_parser().parse_args(['6', '4', '--guard', 'optimisations.*']))
+        self.assertGreater(len(grid.selectors), 0)
+        self.assertEqual(set(grid.selectors), set(name for name in report.passes if name.startswith('optimisations.')))
+        self.assertEqual(len(grid.clauses), len(expected.clauses))
+
+        guards = set(-selector for selector in grid.selectors.values())
+        self.assertEqual(sum(clause[-1] in guards for clause in grid.clauses), optimisation_clauses)
+        self.assertTrue(grid.check())
+
+    def test_disabled_groups(self):
+        self.make_loop()
+        self.assertFalse(self.grid.check())
+        self.assertEqual(self.grid.unsat_groups, [SMALL_LOOPS, SET_TILE])
+
+        self.assertTrue(self.grid.check(disabled_groups=[SMALL_LOOPS]))
+        self.assertTrue(self.grid.check(disabled_groups=[SET_TILE]))
+        self.assertFalse(self.grid.check(solver='pre:g3'))
+        self.assertEqual(self.grid.unsat_groups, [SMALL_LOOPS, SET_TILE])
+
+        with self.assertRaises(RuntimeError):
+            self.grid.check(disabled_groups=['optimisations.prevent_zigzags'])
+
+    def test_blocking_clause_assumptions(self):
+        with ConstraintGroups([SET_TILE]):
+            self.make_grid(2, 1, 1)
+            self.grid.set_tile(0, 0, tile.Belt(Direction.RIGHT, Direction.RIGHT))
+            self.grid.set_tile(1, 0, tile.Belt(Direction.RIGHT, Direction.RIGHT))
+
+        important_variables = self.grid.enumeration_variables(ignore_colour=True)
+        assumptions = self.grid.group_assumptions()
+        with Solver(name='g3', bootstrap_with=self.grid.clauses) as s:
+            self.assertTrue(s.solve(assumptions=assumptions))
+            solution = s.get_model()
+            # The tiles are implied by the guarded set_tile clauses, but only once their selectors are assumed
+            self.assertGreater(len(blocking_clause(s, solution, important_variables)), 0)
+            self.assertLess(len(blocking_clause(s, solution, important_variables, assumptions)), len(blocking_clause(s, solution, important_variables)))
+
+        self.assertEqual(len(list(self.grid.itermodels(important_variables))), 1)
+        warm_grid = WarmGrid(self.grid)
+        self.assertEqual(len(list(warm_grid.itermodels('g3', True))), 1)
+        self.assertEqual(len(list(warm_grid.itermodels('g3', True))), 1)
+        warm_grid.close()
+
+    def test_shared_counts(self):
+        with ConstraintGroups(['test_constraint_groups.*']):
+            self.make_grid(2, 1, 1)
+            literals = [self.grid.allocate_variable() for _ in range(3)]
+            at_least_one(self.grid, literals)
+            at_most_one(self.grid, literals)  # Reuses the count built by at_least_one, only adding a unit clause
+
+        with Solver(name='g3', bootstrap_with=self.grid.clauses) as s:
+            self.assertTrue(s.solve(assumptions=self.grid.group_assumptions() + literals[:1]))
+            self.assertFalse(s.solve(assumptions=self.grid.group_assumptions(['test_constraint_groups.at_least_one']) + literals[:2]))
+            self.assertTrue(s.solve(assumptions=self.grid.group_assumptions(['test_constraint_groups.at_most_one']) + literals[:2]))
+            self.assertTrue(s.solve(assumptions=self.grid.group_assumptions(['test_constraint_groups.at_least_one']) + [-lit for lit in literals]))
+
+    def test_warm_grid(self):
+        self.make_loop()
+        warm_grid = WarmGrid(self.grid)
+        self.assertEqual(list(warm_grid.itermodels('g3', False)), [])
+        self.assertEqual(self.grid.unsat_groups, [SMALL_LOOPS, SET_TILE])
+        # The solver kept from the unsatisfiable request answers with the group switched off
+        self.assertEqual(len(list(warm_grid.itermodels('g3', False, disabled_groups=[SMALL_LOOPS]))), 1)
+        self.assertIsNone(self.grid.unsat_groups)
+        self.assertEqual(len(warm_grid.solvers), 1)
+        warm_grid.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import io
+import json
+import unittest
+
+from factorio_sat import belt_balancer, interchange
+from factorio_sat.encoding_report import EncodingReport
+
+
+class TestEncodingReport(unittest.TestCase):
+    def test_totals(self):
+        args = interchange.get_parser().parse_args(['4', '4'])
+        with EncodingReport() as report:
+            grid = interchange.create_grid(args)
+
+        summary = report.summary(grid)
+        self.assertEqual(summary['total']['clauses'], len(grid.clauses))
+        self.assertEqual(summary['total']['variables'], grid.pool.top)
+        self.assertEqual(sum(stats['clauses'] for stats in summary['passes'].values()), len(grid.clauses))
+        self.assertGreater(summary['passes']['solver.Grid.prevent_intersection']['clauses'], 0)
+        self.assertIn('cardinality.quadratic_one', summary['helpers'])
+
+    def test_no_report(self):
+        args = interchange.get_parser().parse_args(['4', '4'])
+        with EncodingReport():
+            expected = interchange.create_grid(args).clauses
+        self.assertEqual(interchange.create_grid(args).clauses, expected)
+
+    def test_cardinality_sites(self):
+        args = belt_balancer.get_parser().parse_args(['networks/4x4', '10', '4', '--fast', '--cardinality', 'shared', '--cardinality', 'inputs=seqcounter'])
+        with EncodingReport() as report:
+            grid = belt_balancer.create_grid(args)
+
+        sites = report.summary(grid)['sites']
+        self.assertEqual(sites['inputs']['encoding'], 'seqcounter')
+        self.assertEqual(sites['nodes']['encoding'], 'shared')
+        # The edge columns were already counted for the splitter types
+        self.assertEqual(sites['edge_splitters']['variables'], 0)
+
+    def test_json(self):
+        args = belt_balancer.get_parser().parse_args(['networks/2x2', '2', '2', '--encoding-report', 'json'])
+        self.assertEqual(args.encoding_report, 'json')
+        with EncodingReport() as report:
+            grid = belt_balancer.create_grid(args)
+
+        output = io.StringIO()
+        report.write(grid, 'json', output)
+        self.assertEqual(json.loads(output.getvalue())['total']['clauses'], len(grid.clauses))
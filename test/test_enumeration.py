@@ -0,0 +1,136 @@
+import argparse
+import io
+import signal
+import subprocess
+import sys
+import threading
+import time
+import unittest
+
+from pysat.examples.genhard import PHP
+from pysat.solvers import Solver
+
+from factorio_sat import enumeration
+from factorio_sat.background import interrupt_solve, threaded
+from factorio_sat.packed import SolutionWriter
+from factorio_sat.template import blocking_clause
+from test.grid_test_case import BaseGridTest
+
+
+class TestEnumeration(BaseGridTest):
+    def setUp(self):
+        super().setUp()
+        self.make_grid(2, 1)
+
+    def count(self, projection: str) -> int:
+        return len(list(self.grid.itermodels(ignore_colour=True, projection=projection)))
+
+    def test_projections_nest(self):
+        tiles = self.count('tiles')
+        types = self.count('types')
+        splitters = self.count('splitters')
+
+        self.assertEqual(tiles, len(list(self.grid.itersolve(ignore_colour=True))))
+        self.assertLessEqual(types, tiles)
+        self.assertLessEqual(splitters, types)
+        self.assertGreater(splitters, 1)
+
+    def test_minimal_blocking_matches_full_blocking(self):
+        important_variables = self.grid.enumeration_variables(ignore_colour=True)
+
+        count = 0
+        with Solver(name='g3', bootstrap_with=self.grid.clauses) as s:
+            while s.solve():
+                s.add_clause([-lit for lit in s.get_model() if abs(lit) in important_variables])
+                count += 1
+        self.assertEqual(count, self.count('tiles'))
+
+        with Solver(name='g3', bootstrap_with=self.grid.clauses) as s:
+            s.solve()
+            model = s.get_model()
+            self.assertLessEqual(len(blocking_clause(s, model, important_variables)), len([lit for lit in model if abs(lit) in important_variables]))
+
+    def test_background_output_matches(self):
+        outputs = []
+        for queue_size in (0, 1, 16):
+            parser = argparse.ArgumentParser()
+            parser.add_argument('--all', action='store_true')
+            enumeration.add_enumeration_arguments(parser)
+            args = parser.parse_args(['--all', '--queue-size', str(queue_size)])
+
+            output = io.StringIO()
+            enumeration.write_models(self.grid, self.grid.itermodels(ignore_colour=True), args, SolutionWriter(output))
+            outputs.append(output.getvalue())
+
+        self.assertEqual(len(outputs[0].splitlines()), self.count('tiles'))
+        self.assertEqual(outputs[1], outputs[0])
+        self.assertEqual(outputs[2], outputs[0])
+
+    def test_main_thread_runs_while_solving(self):
+        self.add_pigeonhole(7)
+
+        for solver in ('g3', 'pre:g3'):
+            with self.subTest(solver=solver):
+                done = threading.Event()
+                results = []
+
+                def search():
+                    try:
+                        results.append(list(self.grid.itermodels(solver=solver, ignore_colour=True)))
+                    finally:
+                        done.set()
+
+                thread = threading.Thread(target=search)
+                thread.start()
+                ticks = 0
+                while not done.is_set():  # Holding the GIL in the search would leave this at one
+                    ticks += 1
+                    time.sleep(0.001)
+                thread.join()
+                self.assertEqual(results, [[]])
+                self.assertGreater(ticks, 10)
+
+    def add_pigeonhole(self, holes: int):
+        # An unsatisfiable pigeonhole problem on variables of its own takes the search a while
+        pigeonhole = PHP(holes)
+        offset = self.grid.pool.top
+        for _ in range(pigeonhole.nv):
+            self.grid.allocate_variable()
+        self.grid.clauses += [[lit + offset if lit > 0 else lit - offset for lit in clause] for clause in pigeonhole.clauses]
+
+    def test_interrupt_background_solve(self):
+        self.add_pigeonhole(9)  # Far longer than the test waits for
+
+        for solver in ('g3', 'pre:g3'):
+            with self.subTest(solver=solver):
+                def models():
+                    yield []
+                    yield from self.grid.itermodels(solver=solver, ignore_colour=True)
+
+                stream = threaded(models(), wait=True, stop=interrupt_solve)
+                self.assertEqual(next(stream), [])
+                time.sleep(0.5)  # Into the search
+                start = time.perf_counter()
+                stream.close()
+                self.assertLess(time.perf_counter() - start, 5)
+
+    def test_interrupt_main_thread_solve(self):
+        script = 'from pysat.examples.genhard import PHP\n' \
+                 'from pysat.solvers import Solver\n' \
+                 'from factorio_sat.background import solve_releasing_gil\n' \
+                 'print("solving", flush=True)\n' \
+                 'solve_releasing_gil(Solver(name="g3", bootstrap_with=PHP(9).clauses))\n'
+        process = subprocess.Popen([sys.executable, '-c', script], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL)
+        try:
+            self.assertEqual(process.stdout.readline(), b'solving\n')
+            time.sleep(0.5)
+            process.send_signal(signal.SIGINT)
+            self.assertNotEqual(process.wait(timeout=5), 0)  # Ctrl-C still stops a plain solve
+        finally:
+            process.kill()
+            process.wait()
+            process.stdout.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
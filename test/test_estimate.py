@@ -0,0 +1,26 @@
+import unittest
+
+from factorio_sat import make_block
+from factorio_sat.estimate import CostModel, estimate_generator
+
+
+class TestEstimate(unittest.TestCase):
+    def test_polynomial_recovered(self):
+        def summary(width, height):
+            return {'passes': {'family': {'clauses': 3 * width * height + 2 * width + 5, 'literals': 7 * width * height, 'variables': height}}}
+
+        sizes = [(width, height) for width in range(6, 9) for height in range(6, 9)]
+        estimate = CostModel([(size, summary(*size)) for size in sizes]).predict(30, 20)
+        self.assertEqual(estimate.clauses, 3 * 30 * 20 + 2 * 30 + 5)
+        self.assertEqual(estimate.literals, 7 * 30 * 20)
+        self.assertEqual(estimate.variables, 20)
+
+    def test_make_block(self):
+        args = make_block.get_parser().parse_args(['9', '8', '--estimate-only'])
+        estimate = estimate_generator(make_block.create_grid, args)
+
+        grid = make_block.create_grid(make_block.get_parser().parse_args(['9', '8']))
+        self.assertAlmostEqual(estimate.clauses / len(grid.clauses), 1, delta=0.05)
+        self.assertAlmostEqual(estimate.literals / sum(len(clause) for clause in grid.clauses), 1, delta=0.05)
+        self.assertAlmostEqual(estimate.variables / grid.pool.top, 1, delta=0.05)
+        self.assertGreater(estimate.memory, 0)
@@ -0,0 +1,47 @@
+import unittest
+import warnings
+
+import numpy as np
+from pysat.solvers import Solver
+
+from factorio_sat import belt_balancer_net_free, blueprint, stringifier
+from factorio_sat.util import add_order_numbers, set_order_ladder
+
+
+def find_solutions(argv) -> set:
+    args = belt_balancer_net_free.get_parser().parse_args(argv)
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore', RuntimeWarning)  # n to m balancers warn that they may be wrong
+        grid = belt_balancer_net_free.create_grid(args)
+    return set(tuple(stringifier.encode(np.vectorize(blueprint.read_tile)(solution))) for solution in grid.itersolve(ignore_colour=True))
+
+
+class TestFlowEncoding(unittest.TestCase):
+    def test_add_order_numbers(self):
+        for size_a, size_b, size_out, shift in ((4, 4, 4, 1), (3, 0, 2, 1), (3, 2, 5, 0), (5, 5, 3, 0), (4, 4, 2, 2)):
+            with self.subTest(sizes=(size_a, size_b, size_out), shift=shift):
+                input_a = list(range(1, size_a + 1))
+                input_b = list(range(size_a + 1, size_a + size_b + 1))
+                output = list(range(size_a + size_b + 1, size_a + size_b + size_out + 1))
+                clauses = set_order_ladder(input_a) + set_order_ladder(input_b) + set_order_ladder(output)
+                clauses += add_order_numbers(input_a, input_b, output, shift)
+
+                values = set()
+                with Solver(name='g3', bootstrap_with=clauses) as solver:
+                    for model in solver.enum_models():
+                        values.add(tuple(sum(model[lit - 1] > 0 for lit in number) for number in (input_a, input_b, output)))
+
+                expected = set((a, b, (a + b) >> shift) for a in range(size_a + 1) for b in range(size_b + 1)
+                               if (a + b) % (1 << shift) == 0 and (a + b) >> shift <= size_out)
+                self.assertEqual(values, expected)
+
+    def test_same_balancers(self):
+        for argv in (['3', '2', '2', '2'], ['9', '4', '4', '4'], ['4', '2', '1', '2'], ['5', '4', '4', '2']):
+            with self.subTest(argv=argv):
+                binary = find_solutions(argv)
+                self.assertNotEqual(len(binary), 0)
+                self.assertEqual(find_solutions(argv + ['--flow-encoding', 'order']), binary)
+
+
+if __name__ == '__main__':
+    unittest.main()
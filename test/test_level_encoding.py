@@ -0,0 +1,54 @@
+import unittest
+
+from factorio_sat import belt_balancer_net_free_power_of_2
+from factorio_sat.belt_balancer_net_free_power_of_2 import LEVEL_ENCODINGS
+from factorio_sat.solver import Grid
+from factorio_sat.template import EdgeMode, OneHotTemplate
+from test.grid_test_case import BaseGridTest
+
+
+def build_balancer(width: int, height: int, underground_length: int, level_encoding: str) -> Grid:
+    grid = belt_balancer_net_free_power_of_2.create_balancer(width, height, underground_length, level_encoding)
+    grid.block_belts_through_edges((False, True))
+    grid.prevent_intersection(EdgeMode.NO_WRAP)
+    grid.enforce_maximum_underground_length(EdgeMode.NO_WRAP)
+    return grid
+
+
+class TestLevelEncoding(BaseGridTest):
+    def test_level_clauses(self):
+        for level_encoding in LEVEL_ENCODINGS:
+            with self.subTest(level_encoding=level_encoding):
+                grid = Grid(1, 1, 2**8, extras={'level': OneHotTemplate(3)})
+                tile = grid.get_tile_instance(0, 0)
+                grid.clauses += belt_balancer_net_free_power_of_2.level_clauses(grid, tile, 3, level_encoding)
+
+                pairs = set()
+                for model in grid.itersolve(important_variables=set(tile.colour + tile.level), projection='splitters'):
+                    pairs.add((bin(model[0, 0]['colour']).count('1'), model[0, 0]['level']))
+                self.assertEqual(pairs, set((count, None) for count in range(9)) | {(1, 0), (2, 1), (4, 2)})
+
+    def test_balancers(self):
+        for level_encoding in LEVEL_ENCODINGS:
+            with self.subTest(level_encoding=level_encoding):
+                self.grid = build_balancer(10, 8, 4, level_encoding)
+                self.set_content('''
+┌───────────────────┐
+│→ → → → → f G → → →│
+│→ → l     k ↑ L D →│
+│→ → f G l G h L d →│
+│→ l ↓ I   ↑ L D → →│
+│→ l T D → h L d → →│
+│→ → → d f K G → D →│
+│→ → l i ↓ T h L d →│
+│→ → → h T → → → → →│
+└───────────────────┘
+                ''')
+                self.assert_sat()
+
+                self.grid = build_balancer(10, 8, 2, level_encoding)
+                self.assert_unsat()
+
+
+if __name__ == '__main__':
+    unittest.main()
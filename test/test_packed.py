@@ -0,0 +1,85 @@
+import argparse
+import io
+import os
+import tempfile
+import unittest
+
+import numpy as np
+
+from factorio_sat import packed
+from factorio_sat.direction import Direction
+from factorio_sat.tile import Belt, EmptyTile, Splitter, UndergroundBelt
+
+
+def write_solutions(solutions, **kwargs) -> bytes:
+    raw = io.BytesIO()
+    file = io.TextIOWrapper(raw, encoding='utf-8')
+    with packed.SolutionWriter(file, **kwargs) as writer:
+        for solution in solutions:
+            writer.write(solution)
+    file.flush()
+    return raw.getvalue()
+
+
+def read_solutions(data: bytes):
+    return list(packed.read_solutions(io.TextIOWrapper(io.BufferedReader(io.BytesIO(data)), encoding='utf-8')))
+
+
+class TestPacked(unittest.TestCase):
+    def setUp(self):
+        self.tiles = np.array([
+            [Belt(Direction.RIGHT, Direction.UP), Splitter(Direction.DOWN, True), EmptyTile()],
+            [UndergroundBelt(Direction.LEFT, False), Splitter(Direction.DOWN, False), Belt(Direction.UP, Direction.UP)],
+        ], dtype=object)
+
+    def test_tile_codes_round_trip(self):
+        codes = np.arange(len(packed.TILES), dtype=np.uint8)
+        self.assertTrue(np.array_equal(packed.encode_tiles(packed.decode_tiles(codes)), codes))
+
+    def test_formats_round_trip(self):
+        for kwargs in ({}, {'format': 'packed'}, {'format': 'packed', 'compression': 'gzip'}, {'compression': 'lzma'}):
+            with self.subTest(**kwargs):
+                solutions = read_solutions(write_solutions([self.tiles, self.tiles[:, ::-1]], **kwargs))
+                self.assertEqual(len(solutions), 2)
+                tiles = np.frompyfunc(packed.cell_tile, 1, 1)(solutions[1])
+                self.assertTrue(np.array_equal(tiles, self.tiles[:, ::-1]))
+
+    def test_colour_planes(self):
+        cell = {'tile': EmptyTile().write(), 'colour': 3, 'colour_ux': None, 'colour_uy': [5], 'underground': [True, False, False, True]}
+        (solution,) = read_solutions(write_solutions([np.array([[cell]])], format='packed', colour=True))
+        self.assertEqual(solution[0, 0], {**cell, 'colour_uy': 5})
+
+    def test_memory_mapped_file(self):
+        data = write_solutions([self.tiles, np.full((4, 5), EmptyTile())], format='packed')
+        with tempfile.TemporaryDirectory() as directory:
+            filename = os.path.join(directory, 'solutions.bin')
+            with open(filename, 'wb') as f:
+                f.write(data)
+
+            solutions = packed.PackedSolutionFile(filename)
+            self.assertEqual(len(solutions), 2)
+            self.assertEqual(solutions[1].shape, (4, 5))
+            self.assertTrue(np.array_equal(solutions[0], self.tiles))
+            del solutions
+
+    def test_select_solutions(self):
+        rows = [np.full((1, width), EmptyTile()) for width in range(1, 5)]
+        parser = argparse.ArgumentParser()
+        packed.add_input_arguments(parser)
+        with tempfile.TemporaryDirectory() as directory:
+            for kwargs in ({'format': 'packed'}, {'format': 'packed', 'compression': 'gzip'}, {}):
+                with self.subTest(**kwargs):
+                    filename = os.path.join(directory, 'solutions')
+                    with open(filename, 'wb') as f:
+                        f.write(write_solutions(rows, **kwargs))
+
+                    self.assertEqual(packed.is_packed_file(filename), kwargs == {'format': 'packed'})
+                    args = parser.parse_args(['--input', filename, '--index', '2', '--index', '-4'])
+                    self.assertEqual([solution.shape for solution in packed.select_solutions(args)], [(1, 3), (1, 1)])
+                    self.assertEqual(len(list(packed.select_solutions(parser.parse_args(['--input', filename])))), 4)
+                    with self.assertRaises(RuntimeError):
+                        list(packed.select_solutions(parser.parse_args(['--input', filename, '--index', '4'])))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,69 @@
+import unittest
+
+from factorio_sat.direction import Direction
+from factorio_sat.patterns import ALL_FRAMES, Pattern, cells, turn_direction
+from factorio_sat.solver import Grid
+from factorio_sat.template import EdgeMode
+
+PATTERNS = (
+    Pattern([cells[0, 0].is_belt]),
+    Pattern([
+        cells[0, 0].input_direction[Direction.RIGHT],
+        -cells[0, 1].is_splitter,
+        cells[1, 2].underground[Direction.UP],
+        -cells[1, 2].colour[1],
+    ]),
+    Pattern([
+        *cells[0, 1].all_direction,
+        -cells[-1, -1].output_direction[Direction.LEFT],
+        cells[2, 0].is_empty,
+    ]),
+)
+
+EDGE_MODES = (EdgeMode.NO_WRAP, EdgeMode.WRAP, (EdgeMode.WRAP, EdgeMode.NO_WRAP))
+
+
+def reference_clauses(grid: Grid, pattern: Pattern, edge_mode, max_x=None) -> set:
+    clauses = set()
+    for forward, across in ALL_FRAMES:
+        for x in range(grid.width):
+            for y in range(grid.height):
+                clause = []
+                for component in pattern.components:
+                    dx = component.column * forward.dx + component.row * across.dx
+                    dy = component.column * forward.dy + component.row * across.dy
+                    tile = grid.get_tile_instance_offset(x, y, dx, dy, edge_mode)
+                    if tile is None or (max_x is not None and x + dx > max_x):
+                        break
+                    literals = getattr(tile, component.field)
+                    if isinstance(component.index, Direction):
+                        literals = literals[turn_direction((forward, across), component.index)]
+                    elif component.index is not None:
+                        literals = literals[component.index]
+                    clause.append(-literals if component.value else literals)
+                else:
+                    clauses.add((forward, across, tuple(clause)))
+    return clauses
+
+
+class TestPatterns(unittest.TestCase):
+    def test_turn_direction(self):
+        for forward, across in ALL_FRAMES:
+            self.assertEqual(turn_direction((forward, across), Direction.RIGHT).vec, forward.vec)
+            self.assertEqual(turn_direction((forward, across), Direction.UP), across.reverse)
+
+    def test_matches_reference(self):
+        for width, height in ((5, 4), (2, 3)):
+            grid = Grid(width, height, 4)
+            for pattern in PATTERNS:
+                for edge_mode in EDGE_MODES:
+                    for max_x in (None, width - 2):
+                        with self.subTest(size=(width, height), components=len(pattern.components), edge_mode=edge_mode, max_x=max_x):
+                            clauses = set()
+                            for frame in ALL_FRAMES:
+                                clauses.update((*frame, tuple(clause)) for clause in pattern.clauses(grid, [frame], edge_mode, max_x=max_x))
+                            self.assertEqual(clauses, reference_clauses(grid, pattern, edge_mode, max_x))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,39 @@
+import unittest
+
+import numpy as np
+
+from factorio_sat import blueprint_book, pipe
+from factorio_sat.blueprint import make_blueprint
+from factorio_sat.rotate import Operation
+from factorio_sat.tile import EmptyTile, TransformableTile
+
+
+class TestPipe(unittest.TestCase):
+    def test_pipeline_matches_individual_stages(self):
+        solutions = list(pipe.run_pipeline([pipe.solve('belt_balancer', ['networks/2x2', '3', '2', '--all'])]))
+        self.assertEqual(len(solutions), 2)
+
+        for threads in (False, True):
+            (book,) = pipe.run_pipeline([
+                pipe.solve('belt_balancer', ['networks/2x2', '3', '2', '--all']),
+                pipe.rotate(Operation.ROT_180),
+                pipe.blueprint_encode('label'),
+                pipe.book_pack(),
+            ], threads=threads)
+
+            rotate_tile = np.frompyfunc(lambda tile: tile.rotate_180() if isinstance(tile, TransformableTile) else tile, 1, 1)
+            expected = blueprint_book.pack_book([make_blueprint(np.rot90(rotate_tile(tiles), k=2), 'label') for tiles in solutions])
+            self.assertEqual(book, expected)
+
+    def test_stage_errors_propagate(self):
+        def failing(items):
+            yield from items
+            raise RuntimeError('stage failed')
+
+        tiles = np.full((1, 1), EmptyTile())
+        with self.assertRaises(RuntimeError):
+            list(pipe.run_pipeline([failing, pipe.stringify()], [tiles]))
+
+
+if __name__ == '__main__':
+    unittest.main()
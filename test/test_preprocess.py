@@ -0,0 +1,86 @@
+import unittest
+
+from pysat.solvers import Solver
+
+from factorio_sat import tile
+from factorio_sat.direction import Direction
+from factorio_sat.preprocess import PreprocessedSolver, Simplification
+from factorio_sat.template import blocking_clause, create_solver
+from test.grid_test_case import BaseGridTest
+
+
+def satisfies(clauses, model) -> bool:
+    true = set(model)
+    return all(any(lit in true for lit in clause) for clause in clauses)
+
+
+class TestSimplification(unittest.TestCase):
+    def test_simplify(self):
+        clauses = [
+            [1],
+            [-1, 2],  # 2 is implied
+            [-3, 4], [3, -4],  # 3 == 4
+            [3, 5, 6], [4, 5, 6, 7],  # The second is subsumed after substitution
+            [-5, -6],
+            [3, 5, 6],
+        ]
+        simplification = Simplification(clauses)
+        self.assertFalse(simplification.unsatisfiable)
+        self.assertEqual(simplification.fixed, {1: True, 2: True})
+        self.assertEqual(simplification.variables, 4)  # 3 (and 4), 5, 6 and the unconstrained 7
+        self.assertEqual(len(simplification.clauses), 2)
+
+        models = 0
+        with PreprocessedSolver(simplification, lambda clauses: Solver(bootstrap_with=clauses)) as s:
+            while s.solve():
+                model = s.get_model()
+                self.assertTrue(satisfies(clauses, model))
+                s.add_clause([-lit for lit in model])
+                models += 1
+
+        with Solver(bootstrap_with=clauses) as s:
+            expected = 0
+            while s.solve():
+                s.add_clause([-lit for lit in s.get_model()])
+                expected += 1
+        self.assertEqual(models, expected)
+
+    def test_unsatisfiable(self):
+        self.assertTrue(Simplification([[1, 2], [-1], [-2]]).unsatisfiable)
+        self.assertTrue(Simplification([[-1, 2], [-2, -1], [1, 3], [1, -3]]).unsatisfiable)
+
+
+class TestPreprocessedGrid(BaseGridTest):
+    def test_enumeration_unchanged(self):
+        self.make_grid(2, 1)
+        self.assertEqual(len(list(self.grid.itermodels(solver='pre:g3', ignore_colour=True))), len(list(self.grid.itermodels(ignore_colour=True))))
+
+    def test_solution_parses(self):
+        self.make_grid(3, 3)
+        self.grid.set_tile(1, 1, tile.Belt(Direction.RIGHT, Direction.RIGHT))
+        solution = self.grid.solve('pre:g3')
+        self.assertEqual(self.grid.read_tile(solution[1, 1]), tile.Belt(Direction.RIGHT, Direction.RIGHT))
+
+        self.grid.set_tile(0, 1, tile.Belt(Direction.UP, Direction.UP))
+        self.assertIsNone(self.grid.solve('pre:g3'))
+
+    def test_minimal_blocking_clause(self):
+        # The trail of the simplified solver is sorted by variable, it doesn't grow as decisions are added
+        self.make_grid(3, 2)
+        self.grid.set_tile(1, 0, tile.Belt(Direction.RIGHT, Direction.RIGHT))
+        important_variables = self.grid.enumeration_variables(ignore_colour=True)
+        with create_solver('pre:g3', self.grid.clauses) as s:
+            self.assertTrue(s.solve())
+            model = s.get_model()
+
+            decisions = []
+            implied = set()
+            for lit in model:
+                if abs(lit) in important_variables and lit not in implied:
+                    decisions.append(lit)
+                    implied = set(s.propagate(assumptions=decisions)[1])
+            self.assertEqual(blocking_clause(s, model, important_variables), [-lit for lit in decisions])
+
+
+if __name__ == '__main__':
+    unittest.main()
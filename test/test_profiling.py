@@ -0,0 +1,35 @@
+import io
+import json
+import unittest
+
+from factorio_sat import interchange, profiling
+from factorio_sat.profiling import Profiler
+
+
+class TestProfiling(unittest.TestCase):
+    def test_phases(self):
+        args = interchange.get_parser().parse_args(['4', '4'])
+        with Profiler(trace_memory=True) as profiler:
+            with profiling.phase('encode'):
+                grid = interchange.create_grid(args)
+            grid.solve()
+        self.assertIsNone(profiling.ACTIVE)
+
+        summary = profiler.summary()
+        for name in ('encode', 'instantiate', 'solver.Grid.prevent_intersection', 'solver bootstrap', 'search', 'model'):
+            self.assertIn(name, summary)
+        self.assertEqual(summary['encode']['calls'], 1)
+        # Constraint passes are nested inside the encoding, so it keeps little time to itself
+        self.assertLess(summary['encode']['self_time'], summary['encode']['time'])
+        self.assertGreater(summary['encode']['peak_traced'], 0)
+
+        trace = io.StringIO()
+        profiler.write_trace(trace)
+        events = json.loads(trace.getvalue())['traceEvents']
+        self.assertIn('search', set(event['name'] for event in events if event['ph'] == 'X'))
+
+    def test_inactive(self):
+        self.assertIs(profiling.phase('encode'), profiling.NULL_PHASE)
+        args = interchange.get_parser().parse_args(['4', '4'])
+        self.assertIsNone(args.profile)
+        self.assertFalse(args.profile_memory)
@@ -0,0 +1,83 @@
+import contextlib
+import gzip
+import io
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+
+from factorio_sat import packed, rotate, serve, tile
+from factorio_sat.direction import Direction
+from factorio_sat.serve import WarmGrid, strip_server_option
+from test.grid_test_case import BaseGridTest
+
+
+def binary_stdout(function, *args, stdin: bytes = b'') -> bytes:
+    # Runs a tool with stdin and stdout backed by bytes, as they are when redirected from a shell
+    stdout = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+    previous_stdin = sys.stdin
+    sys.stdin = io.TextIOWrapper(io.BufferedReader(io.BytesIO(stdin)), encoding='utf-8')
+    try:
+        with contextlib.redirect_stdout(stdout):
+            function(*args)
+            stdout.flush()
+    finally:
+        sys.stdin = previous_stdin
+    return stdout.buffer.getvalue()
+
+
+class TestServe(BaseGridTest):
+    def test_strip_server_option(self):
+        self.assertEqual(strip_server_option(['a', '--server', '/tmp/sock', 'b', '--server=x:1']), ['a', 'b'])
+
+    def test_warm_grid_enumeration_repeatable(self):
+        self.make_grid(3, 3)
+        for x in range(3):
+            self.grid.set_tile(x, 0, tile.EmptyTile())
+            self.grid.set_tile(x, 2, tile.EmptyTile())
+        self.grid.set_tile(0, 1, tile.Belt(Direction.RIGHT, Direction.RIGHT))
+        self.grid.set_tile(2, 1, tile.Belt(Direction.RIGHT, Direction.RIGHT))
+
+        expected = len(list(self.grid.itersolve(ignore_colour=True)))
+
+        warm_grid = WarmGrid(self.grid)
+        # The same solver is reused, earlier blocking clauses must not hide solutions from later requests
+        self.assertIsNotNone(next(warm_grid.itermodels('g3', False)))
+        self.assertEqual(len(list(warm_grid.itermodels('g3', True))), expected)
+        self.assertEqual(len(list(warm_grid.itermodels('g3', True))), expected)
+        self.assertEqual(len(warm_grid.solvers), 1)
+        warm_grid.close()
+
+    def test_packed_round_trip(self):
+        # The server runs in its own process, it redirects the process wide stdout and stderr while handling a request
+        with tempfile.TemporaryDirectory() as directory:
+            address = os.path.join(directory, 'serve.sock')
+            process = subprocess.Popen([sys.executable, '-m', 'factorio_sat.serve', address], stderr=subprocess.DEVNULL)
+            try:
+                deadline = time.monotonic() + 60
+                while not os.path.exists(address):
+                    self.assertIsNone(process.poll())
+                    self.assertLess(time.monotonic(), deadline)
+                    time.sleep(0.05)
+
+                # The warm solver may find another interchange than a fresh one, only the format is compared
+                argv = ['6', '4', '--format', 'packed']
+                output = binary_stdout(serve.forward, address, 'interchange', argv)
+                self.assertEqual([solution.shape for solution in packed.read_solutions(io.BufferedReader(io.BytesIO(output)))], [(4, 6)])
+
+                compressed = binary_stdout(serve.forward, address, 'interchange', argv + ['--compression', 'gzip'])
+                self.assertEqual(len(list(packed.read_solutions(io.BufferedReader(io.BytesIO(gzip.decompress(compressed)))))), 1)
+
+                # Packed (and compressed) input is forwarded as it is, the server detects the format
+                rotated = binary_stdout(rotate.main, ['--format', 'packed'], stdin=output)
+                self.assertEqual(binary_stdout(serve.forward, address, 'rotate', ['--format', 'packed'], output), rotated)
+                self.assertEqual(binary_stdout(serve.forward, address, 'rotate', ['--format', 'packed'], gzip.compress(output)), rotated)
+            finally:
+                process.terminate()
+                process.wait()
+
+
+if __name__ == '__main__':
+    unittest.main()
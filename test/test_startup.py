@@ -0,0 +1,27 @@
+import json
+import subprocess
+import sys
+import unittest
+
+from benchmarks.startup import HEAVY_MODULES, TOOLS
+
+# Run in a fresh interpreter, the test run itself has long since imported everything
+CHECK = '''
+import importlib, json, sys
+for name in sys.argv[1:]:
+    module = importlib.import_module(name)
+    if hasattr(module, 'get_parser'):
+        module.get_parser()
+print(json.dumps(sorted(set(name.split('.')[0] for name in sys.modules))))
+'''
+
+
+class TestStartup(unittest.TestCase):
+    def test_parsers_load_no_heavy_modules(self):
+        modules = [f'factorio_sat.{tool}' for tool in TOOLS] + ['factorio_sat.assets.fetch']
+        output = subprocess.run([sys.executable, '-c', CHECK] + modules, capture_output=True, text=True, check=True).stdout
+        self.assertEqual(set(json.loads(output)) & set(HEAVY_MODULES), set())
+
+
+if __name__ == '__main__':
+    unittest.main()
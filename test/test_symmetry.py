@@ -0,0 +1,37 @@
+import unittest
+
+import numpy as np
+
+from factorio_sat import packed, symmetry
+from factorio_sat.rotate import Operation, transform_tiles
+from test.grid_test_case import BaseGridTest
+
+
+class TestSymmetry(BaseGridTest):
+    def setUp(self):
+        super().setUp()
+        self.make_grid(2, 1)
+
+    def unique_count(self, group: str, translations: bool = False, block_orbits: bool = False) -> int:
+        orbit = symmetry.orbit_images(self.grid, group, translations) if block_orbits else None
+        deduplicator = symmetry.Deduplicator(group, translations)
+        return len(list(deduplicator.filter(self.grid.itersolve(ignore_colour=True, orbit=orbit))))
+
+    def test_canonical_form_invariant(self):
+        solution = next(self.grid.itersolve(ignore_colour=True))
+        tiles = np.frompyfunc(packed.cell_tile, 1, 1)(solution)
+        key = symmetry.solution_key(tiles)
+        for operation in Operation:
+            self.assertEqual(symmetry.solution_key(transform_tiles(operation, tiles)), key)
+
+    def test_block_orbits_matches_dedupe(self):
+        total = len(list(self.grid.itermodels(ignore_colour=True)))
+        for group in symmetry.GROUPS:
+            for translations in (False, True):
+                unique = self.unique_count(group, translations)
+                self.assertLess(unique, total)
+                self.assertEqual(self.unique_count(group, translations, block_orbits=True), unique)
+
+
+if __name__ == '__main__':
+    unittest.main()
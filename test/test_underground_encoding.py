@@ -0,0 +1,47 @@
+import unittest
+
+from pysat.solvers import Solver
+
+from factorio_sat import optimisations
+from factorio_sat.solver import Grid
+from factorio_sat.template import EdgeMode
+
+CASES = ((6, 1, 3, EdgeMode.NO_WRAP), (5, 3, 2, EdgeMode.NO_WRAP), (9, 2, 3, EdgeMode.NO_WRAP), (4, 3, 1, EdgeMode.WRAP), (7, 2, 2, EdgeMode.WRAP),
+         (5, 2, 4, EdgeMode.WRAP), (3, 2, 5, EdgeMode.WRAP))
+
+
+def build(width: int, height: int, underground_length: int, edge_mode, encoding: str):
+    grid = Grid(width, height, None, underground_length)
+    grid.prevent_intersection(edge_mode)
+    grid.prevent_bad_undergrounding(edge_mode)
+    start = len(grid.clauses)
+    grid.enforce_maximum_underground_length(edge_mode, encoding)
+    optimisations.prevent_empty_along_underground(grid, edge_mode, encoding)
+    return grid, grid.clauses[start:]
+
+
+class TestUndergroundEncoding(unittest.TestCase):
+    def test_ladder_matches_window(self):
+        for case in CASES:
+            with self.subTest(case=case):
+                window, window_rules = build(*case, 'window')
+                ladder, _ = build(*case, 'ladder')
+                tile_variables = window.pool.top
+
+                with Solver(name='g3', bootstrap_with=ladder.clauses) as solver:
+                    # Every window is ruled out by the ladder as well
+                    for clause in window_rules:
+                        self.assertFalse(solver.solve(assumptions=[-lit for lit in clause]), clause)
+
+                    # and tiles allowed by the windows are allowed by the ladder
+                    with Solver(name='g3', bootstrap_with=window.clauses) as window_solver:
+                        for _ in range(50):
+                            if not window_solver.solve():
+                                break
+                            model = [lit for lit in window_solver.get_model() if abs(lit) <= tile_variables]
+                            self.assertTrue(solver.solve(assumptions=model))
+                            window_solver.add_clause([-lit for lit in model])
+
+
+if __name__ == '__main__':
+    unittest.main()